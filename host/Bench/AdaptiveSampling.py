@@ -0,0 +1,175 @@
+"""
+Adaptive sampling benchmark: replays sensor traces against a fixed read
+interval and MainApp.AdaptiveInterval, reporting the sensor wakes saved and
+the delay with which step events in the trace are detected.
+
+The built-in traces are synthetic: a week of soil moisture that slowly dries
+out between irrigations, and a week of temperature with a daily cycle and
+sudden drops. Recorded traces (CSV lines of time in seconds and value) can
+be replayed with:
+    from host.Bench import AdaptiveSampling
+    AdaptiveSampling.Replay(AdaptiveSampling.Load("moist.csv"), 20, 3600)
+"""
+import math
+import random
+
+from host.Harness import Harness
+
+
+DAY = 86400
+DAYS = 7
+DAYS_QUICK = 2
+
+FILTER_DEPTH = 5
+RESOLUTION = 1
+
+# Policy name -> maximum read interval (sec), None reads at a fixed interval.
+POLICIES = {
+    "fixed": None,
+    "adaptive900": 900,
+    "adaptive3600": 3600,
+}
+
+# Trace name -> read interval of the sensor (sec).
+TRACES = {
+    "moisture": 20,
+    "temperature": 50,
+}
+
+
+def _Moisture(days, rng):
+    """
+    :return: Tuple of (trace, events). The trace is a list of (time, value) at a
+    one minute resolution, the events a list of (time, magnitude).
+    """
+    trace = []
+    events = []
+    level = 60.0
+    irrigation = int(1.7 * DAY)
+    for t in range(0, days * DAY, 60):
+        if t >= irrigation:
+            events.append((t, 25))
+            level += 25
+            irrigation += int(rng.uniform(1.5, 2.5) * DAY)
+        level -= 0.01
+        trace.append((t, level + rng.gauss(0, 0.2)))
+    return trace, events
+
+
+def _Temperature(days, rng):
+    trace = []
+    events = []
+    drop = 0.0
+    event = int(0.6 * DAY)
+    for t in range(0, days * DAY, 60):
+        if t >= event:
+            events.append((t, 8))
+            drop = 8.0
+            event += int(rng.uniform(1.0, 2.0) * DAY)
+        drop *= 0.998
+        value = 18 + 6 * math.sin(2 * math.pi * t / DAY) - drop
+        trace.append((t, value + rng.gauss(0, 0.2)))
+    return trace, events
+
+
+def Load(path):
+    """
+    Load a recorded trace.
+    :return: List of (time, value).
+    """
+    trace = []
+    with open(path) as f:
+        for line in f:
+            fields = line.strip().split(",")
+            if len(fields) >= 2 and fields[0].strip().lstrip("-").isdigit():
+                trace.append((int(fields[0]), float(fields[1])))
+    return trace
+
+
+def Replay(trace, interval, interval_max=None, events=()):
+    """
+    Read a trace at the interval of the sensor, the read values are filtered
+    like Sensor does.
+    :param trace: List of (time, value), sorted by time.
+    :param interval: Read interval (sec), the minimum of the adaptive interval.
+    :param interval_max: Maximum interval when the interval is adapted with
+    AdaptiveInterval, None to read at a fixed interval.
+    :param events: List of (time, magnitude) of step events in the trace.
+    :return: Tuple of (number of reads, list of detection delays in seconds).
+    """
+    import machine
+    from MainApp.AdaptiveInterval import AdaptiveInterval
+    from MainApp.RtcMemory import RtcMemory
+
+    machine.RTC.Memory = b""
+    current = [interval]
+
+    def interval_set(value):
+        current[0] = value
+
+    observer = None
+    if interval_max is not None:
+        observer = AdaptiveInterval(RtcMemory.REGION_ADAPT_MOIST, interval, interval_max,
+                                    RESOLUTION, interval_set)
+
+    reads = 0
+    window = []
+    index = 0
+    pending = list(events)
+    delays = []
+    t = trace[0][0]
+    end = trace[-1][0]
+    while t <= end:
+        while index + 1 < len(trace) and trace[index + 1][0] <= t:
+            index += 1
+        window.append(trace[index][1])
+        if len(window) > FILTER_DEPTH:
+            window.pop(0)
+        value = sum(window) / len(window)
+        reads += 1
+
+        # An event is detected once the filtered value moved half its magnitude.
+        while len(pending) > 0 and pending[0][0] <= t:
+            event_time, magnitude = pending[0]
+            before = _ValueAt(trace, event_time - 1)
+            if abs(value - before) < magnitude / 2:
+                break
+            delays.append(t - event_time)
+            pending.pop(0)
+
+        if observer is not None:
+            observer.Update(value)
+        t += current[0]
+    return reads, delays
+
+
+def _ValueAt(trace, t):
+    value = trace[0][1]
+    for time, v in trace:
+        if time > t:
+            break
+        value = v
+    return value
+
+
+def Run(quick=False):
+    days = DAYS_QUICK if quick else DAYS
+    results = {}
+    with Harness():
+        for name, interval in TRACES.items():
+            rng = random.Random(1)
+            trace, events = _Moisture(days, rng) if name == "moisture" else _Temperature(days, rng)
+            results["{}.events".format(name)] = len(events)
+            fixed_reads = None
+            for policy, interval_max in POLICIES.items():
+                reads, delays = Replay(trace, interval, interval_max, events)
+                if fixed_reads is None:
+                    fixed_reads = reads
+                key = "{}.{}.".format(name, policy)
+                results[key + "reads"] = reads
+                results[key + "wakes_saved_pct"] = round(100 * (1 - reads / fixed_reads), 1)
+                results[key + "detected"] = len(delays)
+                results[key + "delay_mean_sec"] = \
+                    round(sum(delays) / len(delays)) if len(delays) > 0 else 0
+                results[key + "delay_max_sec"] = max(delays) if len(delays) > 0 else 0
+    return results
@@ -0,0 +1,80 @@
+"""
+Adaptive spreading factor benchmark: uplink delivery and airtime of the
+MainApp with a fixed spreading factor versus LinkAdr, over a simulated channel
+(see host.Channel) with a near, a medium and a far gateway.
+
+Uplinks are unconfirmed, so LinkAdr only learns about the link from the
+downlinks the network sends. The adaptive modes differ in the downlinks: the
+network only answers the ADRACKReq of the node, never answers (the node backs
+off to SF12), or acknowledges every uplink (confirmed uplinks, which are sent
+again when the acknowledgement is lost).
+"""
+from host.Harness import Harness
+
+
+WAKES = 200
+WAKES_QUICK = 60
+
+# One report every 10 minutes keeps SF12 within the duty cycle budget.
+INTERVALS = {
+    "MsgExInterval": 600,
+    "SensorReadInterval": 600,
+    "MoistReadInterval": 600,
+}
+
+# Scenario name -> mean path loss (dB).
+LINKS = {
+    "near": 120,
+    "medium": 134,
+    "far": 143,
+}
+
+NETWORK_SILENT = "silent"
+NETWORK_ADR_ACK = "adr_ack"
+NETWORK_CONFIRMED = "confirmed"
+
+# Mode name -> MainApp overrides on top of the LoRa configuration of the node
+# and the downlinks of the network.
+MODES = {
+    "sf7": {"ADAPTIVE_SF": False, "sf": 7, "network": NETWORK_SILENT},
+    "sf12": {"ADAPTIVE_SF": False, "sf": 12, "network": NETWORK_SILENT},
+    "adaptive": {"ADAPTIVE_SF": True, "sf": 12, "network": NETWORK_ADR_ACK},
+    "adaptive_silent": {"ADAPTIVE_SF": True, "sf": 12, "network": NETWORK_SILENT},
+    "adaptive_confirmed": {"ADAPTIVE_SF": True, "sf": 12, "network": NETWORK_CONFIRMED},
+}
+
+
+def _Run(wakes, path_loss, mode):
+    config = dict(INTERVALS)
+    config["ADAPTIVE_SF"] = mode["ADAPTIVE_SF"]
+    with Harness(overrides=config) as h:
+        lora_config = h._Import()().NodeLoraConfig()
+        lora_config["sf"] = mode["sf"]
+        lora_config["ldro"] = 1 if mode["sf"] >= 11 else 0
+        config["LORA_CONFIG"] = lora_config
+
+        from host.Channel import ChannelModel
+        from MainApp.LinkAdr import LinkAdr
+        h.Radio.Channel = ChannelModel(path_loss)
+        h.Radio.Confirmed = mode["network"] == NETWORK_CONFIRMED
+        h.Radio.AdrAckLimit = LinkAdr.ACK_LIMIT if mode["network"] == NETWORK_ADR_ACK else None
+        h.Cycles(wakes)
+        radio = h.Radio
+        sent = len(radio.Uplinks) + radio.Lost
+        return {
+            "uplinks": sent,
+            "delivered_pct": round(100 * len(radio.Uplinks) / max(sent, 1), 1),
+            "airtime_ms": round(radio.AirtimeMs),
+            "airtime_ms_per_delivered": round(radio.AirtimeMs / max(len(radio.Uplinks), 1), 1),
+            "sf_last": radio.Uplinks[-1][1] if len(radio.Uplinks) > 0 else 0,
+        }
+
+
+def Run(quick=False):
+    wakes = WAKES_QUICK if quick else WAKES
+    results = {}
+    for link, path_loss in LINKS.items():
+        for mode_name, mode in MODES.items():
+            for metric, value in _Run(wakes, path_loss, mode).items():
+                results["{}.{}.{}".format(link, mode_name, metric)] = value
+    return results
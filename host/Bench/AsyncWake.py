@@ -0,0 +1,53 @@
+"""
+Cooperative execution benchmark: active time per wake of the MainApp with
+the services run one at a time by the ServiceScheduler versus as uasyncio
+tasks (MainApp.ASYNC_MODE), for grouped sensors behind a supply that has to
+settle before they can be read (MainApp.SENSOR_SUPPLY_SETTLE_MS). In the
+async mode the supply stays on while the radio is busy, its on time is
+reported as well.
+"""
+from host.Harness import Harness
+
+
+WAKES = 40
+WAKES_QUICK = 12
+
+# The sensors and the Message Exchange are due in the same wakes, the samples
+# are sent as one combined report (MainApp.REPORT_COMBINED).
+CONFIG = {
+    "SAMPLING_GROUP": True,
+    "REPORT_MODE": 2,
+    "MsgExInterval": 300,
+    "SensorReadInterval": 300,
+    "MoistReadInterval": 300,
+}
+
+# Mode name -> MainApp overrides.
+MODES = {
+    "sequential": {"ASYNC_MODE": False},
+    "async": {"ASYNC_MODE": True},
+}
+
+
+def Run(quick=False):
+    wakes = WAKES_QUICK if quick else WAKES
+    results = {}
+    for mode, overrides in MODES.items():
+        config = dict(CONFIG)
+        config.update(overrides)
+        reports = []
+        supply_ms = 0
+        with Harness(overrides=config) as h:
+            for _ in range(0, wakes):
+                reports.append(h.Wake())
+                supply_ms += h.App.SensorSupply.OnMs
+
+        # Wakes in which a report was sent, the sensors were read in the same wake.
+        sent = [r for r in reports[1:] if r.Uplinks > 0]
+        results["{}.cold.awake_ms".format(mode)] = reports[0].AwakeMs
+        results["{}.report.awake_ms".format(mode)] = \
+            round(sum(r.AwakeMs for r in sent) / len(sent), 1) if len(sent) > 0 else 0
+        results["{}.awake_ms_total".format(mode)] = round(sum(r.AwakeMs for r in reports), 1)
+        results["{}.uplinks".format(mode)] = sum(r.Uplinks for r in reports)
+        results["{}.supply_on_ms".format(mode)] = round(supply_ms / wakes, 1)
+    return results
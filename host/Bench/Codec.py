@@ -0,0 +1,104 @@
+"""
+Codec benchmark: encoded size, encode time and allocations of the fixed
+layout codec versus CBOR, for a representative message of every schema.
+Encode times are measured with the host CBOR encoder and only indicate the
+relative cost on the device.
+"""
+import timeit
+import tracemalloc
+
+from host import Cbor
+from host import PayloadDecoder
+
+from Codec import Varint
+from Schemas import Metadata
+from Schemas.SensorReport import SensorReport, MoistureSensorReport, \
+    BatterySensorReport, TemperatureSensorReport
+from Schemas.RegistrationInfo import RegistrationInfo
+from Schemas.EventReport import EventReport
+
+
+ITERATIONS = 20000
+ITERATIONS_QUICK = 1000
+
+
+def _Batch(samples, interval):
+    buf = bytearray(64)
+    offset = Varint.EncodeInto(1600000000, buf, 0)
+    offset = Varint.EncodeInto(interval, buf, offset)
+    offset = Varint.EncodeSignedInto(samples[0], buf, offset)
+    for prev, sample in zip(samples, samples[1:]):
+        offset = Varint.EncodeInto(Varint.ZigZag(sample - prev) << 1, buf, offset)
+    return bytes(buf[0:offset])
+
+
+def _Events(events):
+    buf = bytearray(64)
+    offset = 0
+    for code, arg, count, age in events:
+        offset = EventReport.EventPackInto(buf, offset, code, arg, count, age)
+    return bytes(buf[0:offset])
+
+
+def Messages():
+    """
+    :return: Dictionary of schema name -> (message specification, data section).
+    """
+    return {
+        "moisture": (MoistureSensorReport(),
+                     {SensorReport.DATA_KEY_MEASUREMENTS: [512, 515, 509]}),
+        "battery": (BatterySensorReport(),
+                    {SensorReport.DATA_KEY_MEASUREMENTS: [3.71, 3.7]}),
+        "temperature": (TemperatureSensorReport(),
+                        {SensorReport.DATA_KEY_MEASUREMENTS: [21, 22]}),
+        "moisture_batch": (MoistureSensorReport(),
+                           {SensorReport.DATA_KEY_SAMPLES:
+                            _Batch([512 + (i % 5) - 2 for i in range(0, 30)], 20)}),
+        "registration": (RegistrationInfo(),
+                         {RegistrationInfo.DATA_KEY_HW_ID: "240ac4000001",
+                          RegistrationInfo.DATA_KEY_SW_VER: 200,
+                          RegistrationInfo.DATA_KEY_FW_VER: 100}),
+        "event": (EventReport(),
+                  {EventReport.DATA_KEY_EVENT: _Events([(EventReport.EVENT_RESET, 1, 1, 0),
+                                                        (EventReport.EVENT_JOIN_FAILED, 0, 3, 600)])}),
+    }
+
+
+def _Message(msg_spec, data):
+    return {
+        Metadata.MSG_SECTION_META: {
+            Metadata.MSG_META_VERSION: 1,
+            Metadata.MSG_META_TYPE: msg_spec.Type,
+            Metadata.MSG_META_SUBTYPE: msg_spec.Subtype,
+        },
+        Metadata.MSG_SECTION_DATA: data,
+    }
+
+
+def _Allocated(func):
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def Run(quick=False):
+    iterations = ITERATIONS_QUICK if quick else ITERATIONS
+    parser = PayloadDecoder.FixedLayoutParserCreate()
+    results = {}
+    for name, (msg_spec, data) in Messages().items():
+        msg = _Message(msg_spec, data)
+        cbor = Cbor.Encode(msg)
+        fixed = parser.Encode(msg)
+        assert parser.Decode(fixed)[Metadata.MSG_SECTION_DATA].keys() >= data.keys()
+
+        results["{}.cbor_bytes".format(name)] = len(cbor)
+        results["{}.fixed_bytes".format(name)] = len(fixed)
+        results["{}.cbor_encode_us".format(name)] = round(
+            timeit.timeit(lambda: Cbor.Encode(msg), number=iterations) / iterations * 1e6, 2)
+        results["{}.fixed_encode_us".format(name)] = round(
+            timeit.timeit(lambda: parser.Encode(msg), number=iterations) / iterations * 1e6, 2)
+        results["{}.cbor_alloc_bytes".format(name)] = _Allocated(lambda: Cbor.Encode(msg))
+        results["{}.fixed_alloc_bytes".format(name)] = _Allocated(lambda: parser.Encode(msg))
+    return results
@@ -0,0 +1,67 @@
+"""
+Export decoder benchmark: throughput in uplinks per second of decoding a
+synthetic TTN export with a representative mix of messages into the series
+files of host.ExportDecoder, with one process and with a process per core.
+"""
+import base64
+import json
+import multiprocessing
+import os
+import tempfile
+
+from host import Cbor
+from host import ExportDecoder
+from host.Bench import Codec
+
+from Schemas import Metadata
+
+
+UPLINKS = 100000
+UPLINKS_QUICK = 5000
+
+DEVICES = 100
+
+
+def _Payloads():
+    payloads = []
+    for msg_spec, data in Codec.Messages().values():
+        payloads.append(Cbor.Encode({
+            Metadata.MSG_SECTION_META: {
+                Metadata.MSG_META_VERSION: 1,
+                Metadata.MSG_META_TYPE: msg_spec.Type,
+                Metadata.MSG_META_SUBTYPE: msg_spec.Subtype,
+            },
+            Metadata.MSG_SECTION_DATA: data,
+        }))
+    return payloads
+
+
+def _Export(path, uplinks):
+    payloads = [base64.b64encode(payload).decode() for payload in _Payloads()]
+    with open(path, "w") as f:
+        for i in range(0, uplinks):
+            seconds = 1600000000 + i * 9
+            f.write(json.dumps({
+                "end_device_ids": {"device_id": "node-{}".format(i % DEVICES)},
+                "received_at": "2020-09-13T{:02}:{:02}:{:02}.123456789Z".format(
+                    (seconds // 3600) % 24, (seconds // 60) % 60, seconds % 60),
+                "uplink_message": {"f_port": 1, "frm_payload": payloads[i % len(payloads)]},
+            }))
+            f.write("\n")
+
+
+def Run(quick=False):
+    uplinks = UPLINKS_QUICK if quick else UPLINKS
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="lorasensor_export_") as tmp:
+        path = os.path.join(tmp, "export.jsonl")
+        _Export(path, uplinks)
+        results["export_kib"] = os.path.getsize(path) // 1024
+
+        jobs = sorted({1, multiprocessing.cpu_count()})
+        for n in jobs:
+            stats = ExportDecoder.Decode(path, os.path.join(tmp, "jobs_{}".format(n)), jobs=n)
+            assert stats["uplinks"] == uplinks and stats["errors"] == 0
+            results["jobs_{}.uplinks_per_sec".format(n)] = round(uplinks / stats["seconds"])
+            results["jobs_{}.samples".format(n)] = stats["samples"]
+    return results
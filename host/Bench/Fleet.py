@@ -0,0 +1,44 @@
+"""
+Fleet benchmark: delivery ratio, join attempts and gateway load of a fleet of
+nodes running the MainApp, simulated by host.Fleet, for fleets that power up
+at once (e.g. after a power failure) and fleets that power up spread out.
+"""
+from host import Fleet
+
+
+HOURS = 6
+HOURS_QUICK = 2
+
+TRACE_HOURS = 1.0
+TRACE_HOURS_QUICK = 0.5
+
+SIZES = [100, 1000]
+
+MIX = {7: 0.6, 9: 0.3, 12: 0.1}
+
+# Field intervals instead of the short development defaults of the MainApp.
+OVERRIDES = {
+    "MsgExInterval": 900,
+    "SensorReadInterval": 900,
+    "MoistReadInterval": 900,
+}
+
+# Mode name -> power-up spread in seconds.
+MODES = {
+    "simultaneous": 0,
+    "spread": 600,
+}
+
+
+def Run(quick=False):
+    hours = HOURS_QUICK if quick else HOURS
+    trace_hours = TRACE_HOURS_QUICK if quick else TRACE_HOURS
+
+    results = {}
+    for count in SIZES:
+        for mode, spread in MODES.items():
+            metrics = Fleet.Simulate(count, MIX, hours, spread_sec=spread,
+                                     trace_hours=trace_hours, overrides=OVERRIDES)
+            for metric, value in metrics.items():
+                results["{}.{}.{}".format(count, mode, metric)] = value
+    return results
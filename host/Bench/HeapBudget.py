@@ -0,0 +1,62 @@
+"""
+Heap budget benchmark: a cold boot followed by a number of timer wakes with
+the MainApp.HEAP_MONITOR enabled in strict mode. Reports the bytes allocated
+by every Setup() stage and the largest allocation of every service run, and
+fails with a HeapBudgetExceeded when a stage or service exceeds its budget.
+
+The budgets are CPython bytes, with headroom over the measured allocations.
+A deferred service is constructed in the 'scheduler' stage or in its first
+run of a timer wake, which dominates those budgets.
+"""
+from host.Harness import Harness
+
+
+WAKES = 40
+WAKES_QUICK = 8
+
+# Stage or service name -> bytes it may allocate.
+BUDGETS = {
+    "dirs": 2048,
+    "logging": 2048,
+    "device_info": 2048,
+    "lora": 4096,
+    "sensors": 4096,
+    "msgex": 16384,
+    "scheduler": 28672,
+    "observers": 1024,
+    "intervals": 1024,
+    "Dummy": 24576,
+    "Temp": 24576,
+    "MsgEx": 4096,
+    "Reg": 1024,
+}
+
+
+def Run(quick=False):
+    wakes = WAKES_QUICK if quick else WAKES
+    overrides = {
+        "HEAP_MONITOR": True,
+        "HEAP_BUDGETS": BUDGETS,
+        "HEAP_STRICT": True,
+    }
+    results = {}
+    peaks = {}
+    free_min = None
+    with Harness(overrides=overrides) as h:
+        for wake in range(0, wakes):
+            h.Wake()
+            heap = h.App.Heap
+            free_min = heap.FreeMin if free_min is None else min(free_min, heap.FreeMin)
+            for name, alloc, free in heap.Stages:
+                if wake == 0:
+                    results["cold.{}.alloc_bytes".format(name)] = alloc
+                peaks[name] = max(peaks.get(name, 0), alloc)
+            for name, stats in heap.Runs.items():
+                peaks[name] = max(peaks.get(name, 0), stats[1])
+
+    for name, alloc in peaks.items():
+        results["peak.{}.alloc_bytes".format(name)] = alloc
+    results["headroom_pct_min"] = min(round(100 * (BUDGETS[name] - alloc) / BUDGETS[name], 1)
+                                      for name, alloc in peaks.items() if name in BUDGETS)
+    results["free_min"] = free_min
+    return results
@@ -0,0 +1,97 @@
+"""
+Sample history benchmark: appends days of samples to MainApp.SampleHistory
+at the read interval of the moisture and temperature sensors, reporting the
+cost of an append, the bytes written to flash per day, the fixed flash use
+of the tier files and the number of history entries a backfill uplink holds.
+
+The flash writes are compared with an append-only log of (uint32 time,
+float sample) records, which is what keeping every sample costs without the
+tiers and grows without bound. The written bytes of the history include the
+erase of a ring block, a full block write every time a block is started.
+"""
+import os
+import random
+import time
+
+from host.Harness import Harness
+
+
+DAY = 86400
+DAYS = 7
+DAYS_QUICK = 2
+
+# Sensor name -> read interval (sec).
+SENSORS = {
+    "moisture": 20,
+    "temperature": 50,
+}
+
+# Bytes of a record of the append-only log.
+LOG_RECORD_SIZE = 8
+
+# Maximum payload of an uplink at SF12 in the EU868 band.
+MTU_SF12 = 51
+
+
+def _Backfill(history, start, end):
+    """
+    :return: Number of entries of the range that fit in one HistoryReport.
+    """
+    from Schemas.HistoryReport import HistoryReport
+    from MainApp.SampleBatcher import SampleBatcher
+
+    space = MTU_SF12 - SampleBatcher.MSG_OVERHEAD
+    entries = history.Query(start, end, count_max=space // 2)
+    size = 0
+    t = 0
+    n = 0
+    for entry in entries:
+        entry_size = HistoryReport.EntrySize(entry[0] - t, *entry[1:])
+        if size + entry_size > space:
+            break
+        size += entry_size
+        t = entry[0]
+        n += 1
+    return n
+
+
+def Run(quick=False):
+    days = DAYS_QUICK if quick else DAYS
+    results = {}
+    with Harness() as harness:
+        import uos
+        from MainApp.SampleHistory import SampleHistory
+
+        epoch = harness.Epoch
+        uos.mkdir("/sensor")
+        for name, interval in SENSORS.items():
+            rng = random.Random(1)
+            history = SampleHistory("/sensor", name, interval)
+            history.Clear()
+            uos.CountersReset()
+
+            appends = days * DAY // interval
+            value = 500.0
+            elapsed = 0.0
+            for i in range(0, appends):
+                value += rng.gauss(0, 2)
+                t = epoch + i * interval
+                start = time.perf_counter()
+                history.Append(t, int(value))
+                elapsed += time.perf_counter() - start
+            now = epoch + appends * interval
+
+            written = uos.Bytes.get("written", 0)
+            files = sum(os.path.getsize(uos.Map("/sensor/{}.h{}".format(name, tier)))
+                        for tier in range(0, len(history.Tiers)))
+            key = name + "."
+            results[key + "appends"] = appends
+            results[key + "append_us"] = round(elapsed / appends * 1e6, 1)
+            results[key + "written_bytes_per_day"] = written * DAY // (now - epoch)
+            results[key + "log_bytes_per_day"] = LOG_RECORD_SIZE * DAY // interval
+            results[key + "flash_bytes"] = files
+            results[key + "log_flash_bytes"] = LOG_RECORD_SIZE * appends
+            results[key + "backfill_raw_entries"] = _Backfill(history, now - 3600, now)
+            results[key + "backfill_day_entries"] = _Backfill(history, now - DAY, now - 3600)
+            results[key + "backfill_month_entries"] = _Backfill(history, epoch, now - DAY)
+    return results
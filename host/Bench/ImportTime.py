@@ -0,0 +1,114 @@
+"""
+Import time benchmark: importing the application from .py sources, which are
+compiled on every boot, versus from .mpy bytecode built by host.Deploy.
+
+With the MicroPython unix port and mpy-cross available (on the PATH or set by
+the MICROPYTHON and MPY_CROSS environment variables) every module is imported
+in a fresh interpreter from both forms. Modules that cannot be imported by the
+unix port (e.g. those that need the upyiot library or machine) are skipped.
+
+The CPython figures are always reported: the time to compile all sources
+versus the time to load the same code objects from their serialized form,
+the analogue of .py versus .mpy on the host.
+"""
+import marshal
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from host import Deploy
+from host.Paths import SRC_DIR
+
+
+REPEAT = 5
+REPEAT_QUICK = 1
+
+IMPORT_SCRIPT = (
+    "import sys, utime\n"
+    "sys.path.insert(0, {!r})\n"
+    "t = utime.ticks_us()\n"
+    "import {}\n"
+    "print(utime.ticks_diff(utime.ticks_us(), t))\n"
+)
+
+
+def _CPython(sources, repeat):
+    texts = []
+    for src in sources:
+        with open(os.path.join(SRC_DIR, src)) as f:
+            texts.append((src, f.read()))
+
+    start = time.perf_counter()
+    for _ in range(0, repeat):
+        codes = [compile(text, src, "exec") for src, text in texts]
+    compile_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    blobs = [marshal.dumps(code) for code in codes]
+    start = time.perf_counter()
+    for _ in range(0, repeat):
+        for blob in blobs:
+            marshal.loads(blob)
+    load_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    return {
+        "cpython.compile_ms": round(compile_ms, 3),
+        "cpython.load_ms": round(load_ms, 3),
+        "cpython.source_bytes": sum(len(text) for src, text in texts),
+        "cpython.code_bytes": sum(len(blob) for blob in blobs),
+    }
+
+
+def _ImportUs(micropython, path, module):
+    result = subprocess.run([micropython, "-c", IMPORT_SCRIPT.format(path, module)],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+def _MicroPython(micropython, mpy_cross, sources, repeat):
+    modules = [src[:-3].replace("/", ".") for src in sources
+               if os.path.basename(src) not in Deploy.SCRIPTS]
+    with tempfile.TemporaryDirectory(prefix="lorasensor_import_") as tmp:
+        py_dir = os.path.join(tmp, "py")
+        for src in sources:
+            os.makedirs(os.path.dirname(os.path.join(py_dir, src)), exist_ok=True)
+            shutil.copyfile(os.path.join(SRC_DIR, src), os.path.join(py_dir, src))
+        mpy_dir = os.path.join(tmp, "mpy")
+        Deploy.Compiler(mpy_dir, mpy_cross=mpy_cross).Build(sources)
+
+        py_us = 0
+        mpy_us = 0
+        imported = 0
+        for module in modules:
+            py = [_ImportUs(micropython, py_dir, module) for _ in range(0, repeat)]
+            mpy = [_ImportUs(micropython, mpy_dir, module) for _ in range(0, repeat)]
+            if None in py or None in mpy:
+                continue
+            py_us += min(py)
+            mpy_us += min(mpy)
+            imported += 1
+
+    return {
+        "micropython.modules": imported,
+        "micropython.py_ms": round(py_us / 1000, 3),
+        "micropython.mpy_ms": round(mpy_us / 1000, 3),
+        "micropython.speedup": round(py_us / mpy_us, 2) if mpy_us > 0 else 0,
+    }
+
+
+def Run(quick=False):
+    repeat = REPEAT_QUICK if quick else REPEAT
+    sources = [src for src in Deploy.Sources() if os.path.basename(src) not in Deploy.SCRIPTS]
+    results = _CPython(sources, repeat * 10)
+
+    micropython = os.environ.get("MICROPYTHON") or shutil.which("micropython")
+    mpy_cross = os.environ.get("MPY_CROSS") or shutil.which("mpy-cross")
+    if micropython is None or mpy_cross is None:
+        results["micropython.modules"] = 0
+        return results
+
+    results.update(_MicroPython(micropython, mpy_cross, sources, repeat))
+    return results
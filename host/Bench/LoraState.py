@@ -0,0 +1,96 @@
+"""
+Frame counter persistence benchmark: flash writes per 10k uplinks of the
+single frame counter file versus the RTC memory backed, wear leveled log of
+MainApp.LoraState, with and without RTC retention during deep sleep. Every
+scenario also injects power losses, checks that a frame counter value is
+never reused and reports the number of skipped frame counter values.
+"""
+import random
+
+from host.Harness import Harness
+
+
+UPLINKS = 10000
+UPLINKS_QUICK = 1000
+
+# Scenario name -> (uplinks per wake, RTC memory retained in deep sleep).
+SCENARIOS = {
+    "rtc_retained": (1, True),
+    "supply_cut": (1, False),
+    "supply_cut_4_per_wake": (4, False),
+}
+
+# Probability of a power loss in the middle of a wake.
+POWER_LOSS_RATE = 0.001
+
+
+def _Erase():
+    import uos
+    try:
+        uos.mkdir("/lora")
+    except OSError:
+        pass
+    for name in uos.listdir("/lora"):
+        uos.remove("/lora/" + name)
+
+
+def _Legacy(uplinks):
+    import uos
+    from host.Loopback import LoopbackParams
+    _Erase()
+    params = LoopbackParams("/lora")
+    uos.CountersReset()
+    for _ in range(0, uplinks):
+        params.FrameCounterStore(params.FrameCounter() + 1)
+    return uos.Counters.get("open_w", 0), uos.Bytes.get("written", 0), 0, 0
+
+
+def _Log(uplinks, per_wake, retained, rng):
+    import machine
+    import uos
+    from MainApp.LoraState import LoraState
+    _Erase()
+    machine.RTC.Memory = b""
+    uos.CountersReset()
+
+    state = LoraState("/lora")
+    sent = 0
+    highest = -1
+    losses = 0
+    while sent < uplinks:
+        for _ in range(0, per_wake):
+            fcnt = state.FrameCounter()
+            assert fcnt > highest, "Frame counter {} reused".format(fcnt)
+            highest = fcnt
+            state.FrameCounterStore(fcnt + 1)
+            sent += 1
+            if rng.random() < POWER_LOSS_RATE:
+                break
+        else:
+            # Deep sleep.
+            if retained is False:
+                machine.RTC.Memory = b""
+            state = LoraState("/lora")
+            continue
+        # Power loss: the RTC memory is lost and nothing is committed.
+        losses += 1
+        machine.RTC.Memory = b""
+        state = LoraState("/lora")
+    return uos.Counters.get("open_w", 0), uos.Bytes.get("written", 0), losses, highest + 1 - sent
+
+
+def Run(quick=False):
+    uplinks = UPLINKS_QUICK if quick else UPLINKS
+    scale = UPLINKS / uplinks
+    results = {}
+    with Harness():
+        writes, written, _, _ = _Legacy(uplinks)
+        results["legacy.writes"] = round(writes * scale)
+        results["legacy.bytes_written"] = round(written * scale)
+        for name, (per_wake, retained) in SCENARIOS.items():
+            writes, written, losses, skipped = _Log(uplinks, per_wake, retained, random.Random(1))
+            results["{}.writes".format(name)] = round(writes * scale)
+            results["{}.bytes_written".format(name)] = round(written * scale)
+            results["{}.power_losses".format(name)] = losses
+            results["{}.fcnt_skipped".format(name)] = skipped
+    return results
@@ -0,0 +1,105 @@
+"""
+Store-and-forward queue benchmark: enqueue and drain cost (including the
+uplinks of the drain), flash bytes
+written and RAM use of MainApp.MessageQueue for growing outage backlogs. The
+queue file and the RAM use are expected to stay constant when the backlog
+exceeds the queue capacity.
+"""
+import time
+import tracemalloc
+
+from host.Harness import Harness
+from host import PayloadDecoder
+
+
+BACKLOGS = (10, 100, 1000)
+BACKLOGS_QUICK = (10, 100)
+SLOTS = 32
+
+# Every EVENT_EVERY-th message is an event, which outranks the sensor reports.
+EVENT_EVERY = 10
+
+
+def _Exchange(app):
+    from host.Loopback import LoopbackLoraProtocol
+    from MainApp.MessageQueue import MessageQueue, QueuedMessageExchange
+    from MainApp.SampleBatcher import SampleBatcher
+    from MainApp.UplinkPlanner import UplinkPlanner
+
+    config = app().NodeLoraConfig()
+    proto = LoopbackLoraProtocol(config, "/lora")
+    parser = PayloadDecoder.FixedLayoutParserCreate()
+    queue = MessageQueue("/msg", slots=SLOTS, record_max=proto.Mtu)
+    planner = UplinkPlanner(config, directory="/sys")
+    msg_ex = QueuedMessageExchange(queue, parser, proto.Mtu - SampleBatcher.MSG_OVERHEAD,
+                                   planner, 100,
+                                   directory="/msg",
+                                   proto_obj=proto,
+                                   send_retries=1,
+                                   msg_size_max=proto.Mtu,
+                                   msg_send_limit=1)
+    return proto, queue, msg_ex
+
+
+def _Outage(app, backlog):
+    import uos
+    from Schemas.SensorReport import SensorReport, MoistureSensorReport
+    from Schemas.EventReport import EventReport
+
+    for path in ("/msg", "/sys", "/lora"):
+        try:
+            uos.mkdir(path)
+        except OSError:
+            pass
+        # Every outage starts without a session and with an empty queue.
+        for name in uos.listdir(path):
+            uos.remove(path + "/" + name)
+    proto, queue, msg_ex = _Exchange(app)
+
+    uos.CountersReset()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for i in range(0, backlog):
+        if i % EVENT_EVERY == 0:
+            msg_ex.MessagePut({EventReport.DATA_KEY_EVENT: bytes((i & 0xFF,))},
+                              EventReport.TYPE_EVENT, EventReport.SUBTYPE_EVENT_REPORT)
+        else:
+            msg_ex.MessagePut({SensorReport.DATA_KEY_MEASUREMENTS: [20 + i % 7, 21 + i % 5]},
+                              SensorReport.TYPE_REPORT,
+                              MoistureSensorReport.SUBTYPE_MOISTURE_REPORT)
+    put_us = (time.perf_counter() - start) * 1e6 / backlog
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    put_written = uos.Bytes.get("written", 0)
+
+    # Reconnect and drain.
+    proto.Params.StoreSession(bytes(4), bytes(16), bytes(16))
+    queued = queue.Count()
+    batches = 0
+    start = time.perf_counter()
+    while queue.Count() > 0:
+        msg_ex.SvcRun()
+        batches += 1
+    drain_us = (time.perf_counter() - start) * 1e6 / max(queued, 1)
+
+    return {
+        "put_us": round(put_us, 1),
+        "put_bytes_written": round(put_written / backlog, 1),
+        "put_peak_alloc_bytes": peak,
+        "queued": queued,
+        "dropped": queue.Dropped,
+        "drain_us_per_record": round(drain_us, 1),
+        "drain_uplinks": batches,
+        "file_bytes": uos.stat("/msg/" + queue.FILE_NAME)[6],
+    }
+
+
+def Run(quick=False):
+    results = {}
+    with Harness() as harness:
+        app = harness._Import()
+        for backlog in BACKLOGS_QUICK if quick else BACKLOGS:
+            for metric, value in _Outage(app, backlog).items():
+                results["backlog_{}.{}".format(backlog, metric)] = value
+    return results
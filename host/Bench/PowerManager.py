@@ -0,0 +1,72 @@
+"""
+Power manager benchmark: virtual time from a sleep request until the supply
+is cut, with and without lost or corrupted replies, the time until a sleep
+request is given up when the power manager does not reply, and the cost of a
+status poll.
+"""
+import tracemalloc
+
+from host.Harness import Harness
+
+
+SCENARIOS = {
+    "clean": {},
+    "drop1": {"Drop": 1},
+    "corrupt1": {"Corrupt": 1},
+    "drop2": {"Drop": 2},
+}
+
+REPEAT = 50
+REPEAT_QUICK = 5
+
+# Worst case of the former implementation: five blind attempts, 10 s apart.
+LEGACY_NO_REPLY_MS = 5 * 10 * 1000
+
+
+def _Elapsed(fn):
+    import utime
+    start = utime.NowUs()
+    try:
+        fn()
+    except Exception as e:
+        return (utime.NowUs() - start) / 1000, type(e).__name__
+    return (utime.NowUs() - start) / 1000, None
+
+
+def _PowerManagerCreate(**faults):
+    from host.Loopback import LoopbackPowerManager
+    from MainApp.PowerManager.PowerManager import PowerManager
+    uart = LoopbackPowerManager()
+    uart.CutPower = True
+    for attr, value in faults.items():
+        setattr(uart, attr, value)
+    return PowerManager(uart), uart
+
+
+def Run(quick=False):
+    repeat = REPEAT_QUICK if quick else REPEAT
+    results = {}
+    with Harness():
+        for name, faults in SCENARIOS.items():
+            total = 0
+            for _ in range(0, repeat):
+                pm, uart = _PowerManagerCreate(**faults)
+                elapsed, outcome = _Elapsed(lambda: pm.DeepSleep(60000))
+                assert outcome == "DeepSleepSignal", outcome
+                total += elapsed
+            results["sleep.{}.ms".format(name)] = round(total / repeat, 1)
+
+        pm, uart = _PowerManagerCreate(Drop=1000)
+        elapsed, _ = _Elapsed(lambda: pm.DeepSleep(60000))
+        results["sleep.no_reply.ms"] = round(elapsed, 1)
+        results["sleep.no_reply.legacy_ms"] = LEGACY_NO_REPLY_MS
+
+        pm, uart = _PowerManagerCreate()
+        elapsed, _ = _Elapsed(pm.Status)
+        results["status.ms"] = round(elapsed, 1)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        pm.Status()
+        results["status.peak_alloc_bytes"] = tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+    return results
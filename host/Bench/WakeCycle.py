@@ -0,0 +1,35 @@
+"""
+Wake cycle benchmark: a cold boot followed by a number of timer wakes of the
+MainApp, reporting per-stage Setup() cost and the cost of a full wake.
+"""
+from host.Harness import Harness
+
+
+WAKES = 20
+WAKES_QUICK = 4
+
+
+def Run(quick=False):
+    wakes = WAKES_QUICK if quick else WAKES
+    with Harness() as h:
+        reports = h.Cycles(wakes)
+
+    cold = reports[0]
+    warm = reports[1:]
+    results = {}
+    for stage in cold.Stages:
+        results["cold.{}.cpu_ms".format(stage.Name)] = round(stage.CpuMs, 3)
+        results["cold.{}.fs_ops".format(stage.Name)] = stage.FsOps
+        results["cold.{}.alloc_bytes".format(stage.Name)] = stage.AllocBytes
+    results["cold.awake_ms"] = cold.AwakeMs
+
+    n = len(warm)
+    results["warm.setup_cpu_ms"] = round(sum(r.Total("CpuMs") - r.Stage("run").CpuMs
+                                             for r in warm) / n, 3)
+    results["warm.awake_ms"] = round(sum(r.AwakeMs for r in warm) / n, 1)
+    results["warm.fs_ops"] = round(sum(sum(r.FsOps.values()) for r in warm) / n, 1)
+    results["warm.bytes_written"] = round(sum(r.FsBytes.get("written", 0) for r in warm) / n, 1)
+    results["warm.alloc_bytes"] = round(sum(r.Total("AllocBytes") for r in warm) / n)
+    results["warm.uplinks"] = sum(r.Uplinks for r in warm)
+    results["warm.sleep_ms"] = round(sum(r.SleepMs for r in warm) / n)
+    return results
@@ -0,0 +1,36 @@
+"""
+Host benchmark suite. Every benchmark is a module in this package with a
+Run(quick) function that returns a flat dict of metric name -> number.
+
+Run all benchmarks with:
+    python -m host.Bench [--quick] [--json] [name ...]
+"""
+import importlib
+
+
+BENCHMARKS = [
+    "WakeCycle",
+    "Codec",
+    "PowerManager",
+    "LoraState",
+    "MessageQueue",
+    "AdaptiveSf",
+    "AdaptiveSampling",
+    "AsyncWake",
+    "HeapBudget",
+    "ImportTime",
+    "Fleet",
+    "ExportDecoder",
+    "History",
+]
+
+
+def Load(name):
+    return importlib.import_module("host.Bench." + name)
+
+
+def RunAll(names=None, quick=False):
+    results = {}
+    for name in names or BENCHMARKS:
+        results[name] = Load(name).Run(quick)
+    return results
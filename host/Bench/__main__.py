@@ -0,0 +1,28 @@
+import argparse
+import json
+import sys
+
+from host import Bench
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m host.Bench")
+    parser.add_argument("names", nargs="*", help="Benchmarks to run, all if omitted.")
+    parser.add_argument("--quick", action="store_true", help="Run reduced iteration counts.")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args(argv)
+
+    results = Bench.RunAll(args.names, args.quick)
+    if args.json:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+        return 0
+
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            print("{}.{} {}".format(name, metric, value))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Minimal CBOR (RFC 7049) encoder and decoder for the host tools, covering the
+types used in the uplink messages: integers, byte and text strings, arrays,
+maps, floats, booleans and null.
+"""
+import struct
+
+
+class CborError(ValueError):
+    pass
+
+
+def _Head(major, value, out):
+    if value < 24:
+        out.append((major << 5) | value)
+    elif value < 0x100:
+        out.append((major << 5) | 24)
+        out.append(value)
+    elif value < 0x10000:
+        out.append((major << 5) | 25)
+        out += struct.pack(">H", value)
+    elif value < 0x100000000:
+        out.append((major << 5) | 26)
+        out += struct.pack(">I", value)
+    else:
+        out.append((major << 5) | 27)
+        out += struct.pack(">Q", value)
+
+
+def _Encode(obj, out):
+    if obj is None:
+        out.append(0xF6)
+    elif obj is True:
+        out.append(0xF5)
+    elif obj is False:
+        out.append(0xF4)
+    elif isinstance(obj, int):
+        if obj >= 0:
+            _Head(0, obj, out)
+        else:
+            _Head(1, -1 - obj, out)
+    elif isinstance(obj, float):
+        packed = struct.pack(">f", obj)
+        if struct.unpack(">f", packed)[0] == obj:
+            out.append(0xFA)
+            out += packed
+        else:
+            out.append(0xFB)
+            out += struct.pack(">d", obj)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        _Head(2, len(obj), out)
+        out += obj
+    elif isinstance(obj, str):
+        data = obj.encode()
+        _Head(3, len(data), out)
+        out += data
+    elif isinstance(obj, (list, tuple)):
+        _Head(4, len(obj), out)
+        for item in obj:
+            _Encode(item, out)
+    elif isinstance(obj, dict):
+        _Head(5, len(obj), out)
+        for key, value in obj.items():
+            _Encode(key, out)
+            _Encode(value, out)
+    else:
+        raise CborError("Cannot encode {}".format(type(obj)))
+
+
+def Encode(obj):
+    out = bytearray()
+    _Encode(obj, out)
+    return bytes(out)
+
+
+def _Decode(buf, offset):
+    try:
+        initial = buf[offset]
+    except IndexError:
+        raise CborError("Truncated message")
+    offset += 1
+    major = initial >> 5
+    info = initial & 0x1F
+
+    if major == 7:
+        if info == 20:
+            return False, offset
+        if info == 21:
+            return True, offset
+        if info == 22 or info == 23:
+            return None, offset
+        if info == 25:
+            return struct.unpack_from(">e", buf, offset)[0], offset + 2
+        if info == 26:
+            return struct.unpack_from(">f", buf, offset)[0], offset + 4
+        if info == 27:
+            return struct.unpack_from(">d", buf, offset)[0], offset + 8
+        raise CborError("Unsupported simple value {}".format(info))
+
+    if info < 24:
+        value = info
+    elif info == 24:
+        value = buf[offset]
+        offset += 1
+    elif info == 25:
+        value = struct.unpack_from(">H", buf, offset)[0]
+        offset += 2
+    elif info == 26:
+        value = struct.unpack_from(">I", buf, offset)[0]
+        offset += 4
+    elif info == 27:
+        value = struct.unpack_from(">Q", buf, offset)[0]
+        offset += 8
+    else:
+        raise CborError("Indefinite lengths are not supported")
+
+    if major == 0:
+        return value, offset
+    if major == 1:
+        return -1 - value, offset
+    if major == 2 or major == 3:
+        if offset + value > len(buf):
+            raise CborError("Truncated message")
+        data = bytes(buf[offset:offset + value])
+        return (data if major == 2 else data.decode()), offset + value
+    if major == 4:
+        items = []
+        for _ in range(0, value):
+            item, offset = _Decode(buf, offset)
+            items.append(item)
+        return items, offset
+    if major == 5:
+        items = {}
+        for _ in range(0, value):
+            key, offset = _Decode(buf, offset)
+            items[key], offset = _Decode(buf, offset)
+        return items, offset
+    # Tags are ignored, the tagged item is returned.
+    return _Decode(buf, offset)
+
+
+def Decode(buf):
+    obj, offset = _Decode(buf, 0)
+    if offset != len(buf):
+        raise CborError("Trailing bytes")
+    return obj
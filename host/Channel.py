@@ -0,0 +1,46 @@
+"""
+Simulated LoRa channel for the loopback radio: a fixed path loss with log-normal
+shadowing per frame. A frame is received when its SNR is above the demodulation
+floor of its spreading factor. Uplinks and downlinks are propagated as separate
+frames over the same channel. Whether the network answers an uplink with a
+downlink is up to the loopback radio (see LoopbackRadio.Confirmed and
+AdrAckLimit), an unconfirmed uplink that is lost goes unnoticed by the node.
+
+Usage:
+    harness.Radio.Channel = ChannelModel(path_loss_db=140)
+"""
+import math
+import random
+
+from MainApp import Airtime
+
+
+# Thermal noise in 125 kHz (-174 dBm/Hz + 51 dB) plus the receiver noise figure.
+NOISE_FLOOR_DBM = -174 + 10 * math.log10(125000) + 6
+
+
+class ChannelModel:
+
+    def __init__(self, path_loss_db, shadowing_db=4.0, tx_power_dbm=14, seed=1):
+        """
+        :param path_loss_db: Mean path loss between node and gateway.
+        :param shadowing_db: Standard deviation of the per frame shadowing.
+        :param tx_power_dbm: Transmit power.
+        :param seed: Seed of the shadowing.
+        """
+        self.PathLoss = path_loss_db
+        self.Shadowing = shadowing_db
+        self.TxPower = tx_power_dbm
+        self.Rng = random.Random(seed)
+        return
+
+    def Frame(self, sf):
+        """
+        Propagate a frame.
+        :return: Tuple of (received, rssi, snr).
+        """
+        rssi = self.TxPower - self.PathLoss + self.Rng.gauss(0, self.Shadowing)
+        snr = rssi - NOISE_FLOOR_DBM
+        # The RSSI of a frame below the noise floor is dominated by the noise.
+        rssi = max(rssi, NOISE_FLOOR_DBM)
+        return snr >= Airtime.SNR_FLOOR[sf], round(rssi), round(snr, 1)
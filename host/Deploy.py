@@ -0,0 +1,418 @@
+"""
+Incremental deploy of the application to a device.
+
+The packages in src/ are cross-compiled to .mpy bytecode in parallel, so the
+device does not compile the sources on every boot. A manifest of the content
+hashes of the deployed files is kept on the device, only files of which the
+hash changed are uploaded and files that are no longer part of the build are
+removed. The runtime state directories (LoRa session, scheduler state,
+queued messages, samples and logs) are kept unless --wipe-state is given.
+
+Usage:
+    python -m host.Deploy --port /dev/ttyUSB0 [--no-compile] [--wipe-state] [--dry-run]
+    python -m host.Deploy --mount /pyboard ...
+    python -m host.Deploy --port /dev/ttyUSB0 --bundle build/nodes/<node> [--wipe-state]
+
+--port uploads with mpremote, --mount writes to a mounted device file system
+(e.g. rshell's /pyboard) or a directory. --bundle deploys a node bundle of
+host.Provision instead of building src/, its pre-seeded runtime state (e.g.
+the LoRa session) is only written together with --wipe-state, so a live
+session and frame counter are never replaced.
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from host.Paths import REPO_DIR, SRC_DIR
+
+
+# Packages that are deployed, relative to src/.
+PACKAGES = ("MainApp", "Schemas", "Codec", "Config")
+# Scripts that are run by the firmware by name, they are never compiled.
+SCRIPTS = ("boot.py", "main.py")
+# Runtime state directories, see MainApp.DIR_TREE.
+STATE_DIRS = ("/lora", "/sys", "/msg", "/sensor", "/log")
+
+MANIFEST_PATH = "/deploy.json"
+BUILD_DIR = os.path.join(REPO_DIR, "build")
+# Build cache: source path -> [hash of the source and compile options, hash of the output].
+CACHE_FILE = "cache.json"
+
+
+class CompileError(Exception):
+    pass
+
+
+class Compiler:
+    """
+    Cross-compiles sources with mpy-cross. A source is only compiled again if
+    its contents or the options changed since the previous build.
+    """
+
+    def __init__(self, out_dir, mpy_cross=None, opt=1, march=None, jobs=None, src_dir=SRC_DIR):
+        """
+        :param out_dir: Build directory.
+        :param mpy_cross: Path of mpy-cross, None to compile nothing and
+        deploy the sources.
+        :param opt: Optimization level (-O), at 1 or higher debug records and
+        assertions are compiled out.
+        :param march: Architecture of native code, e.g. xtensawin for the ESP32.
+        :param jobs: Number of parallel compilations.
+        :param src_dir: Directory the sources are relative to.
+        """
+        self.OutDir = out_dir
+        self.SrcDir = src_dir
+        self.MpyCross = mpy_cross
+        self.Opt = opt
+        self.March = march
+        self.Jobs = jobs or os.cpu_count() or 1
+        self.CachePath = os.path.join(out_dir, CACHE_FILE)
+        self.Cache = {}
+        self.Compiled = 0
+
+    def Build(self, sources):
+        """
+        :param sources: List of source paths relative to the source directory.
+        :return: Dictionary of device path -> (local path, content hash).
+        :rtype: dict
+        """
+        self._CacheLoad()
+        files = {}
+        jobs = []
+        for src in sources:
+            if self.MpyCross is None or os.path.basename(src) in SCRIPTS:
+                path = os.path.join(self.SrcDir, src)
+                files["/" + src] = (path, _Hash(_Read(path)))
+            else:
+                jobs.append(src)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.Jobs) as pool:
+            for src, out, digest in pool.map(self._Compile, jobs):
+                files["/" + src[:-3] + ".mpy"] = (out, digest)
+
+        self._CacheStore()
+        return files
+
+    def _Compile(self, src):
+        source = _Read(os.path.join(self.SrcDir, src))
+        key = _Hash(source + " ".join(self._Args()).encode())
+        out = os.path.join(self.OutDir, src[:-3] + ".mpy")
+        cached = self.Cache.get(src)
+        if cached is not None and cached[0] == key and os.path.exists(out):
+            return src, out, cached[1]
+
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        # The source name embedded in the bytecode is the relative path, so the
+        # output does not depend on the location of the checkout.
+        cmd = [self.MpyCross] + self._Args() + ["-s", src, "-o", out, os.path.join(self.SrcDir, src)]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CompileError("{}: {}".format(src, result.stderr.strip()))
+
+        digest = _Hash(_Read(out))
+        self.Cache[src] = [key, digest]
+        self.Compiled += 1
+        return src, out, digest
+
+    def _Args(self):
+        args = ["-O{}".format(self.Opt)]
+        if self.March is not None:
+            args.append("-march={}".format(self.March))
+        return args
+
+    def _CacheLoad(self):
+        try:
+            with open(self.CachePath) as f:
+                self.Cache = json.load(f)
+        except (OSError, ValueError):
+            self.Cache = {}
+
+    def _CacheStore(self):
+        os.makedirs(self.OutDir, exist_ok=True)
+        with open(self.CachePath, "w") as f:
+            json.dump(self.Cache, f, indent=1, sort_keys=True)
+
+
+class LocalTransport:
+    """
+    Device file system that is mounted on the host, or a directory.
+    """
+
+    def __init__(self, root):
+        self.Root = root
+
+    def Read(self, path):
+        try:
+            return _Read(self._Map(path))
+        except OSError:
+            return None
+
+    def Write(self, path, local):
+        os.makedirs(os.path.dirname(self._Map(path)), exist_ok=True)
+        shutil.copyfile(local, self._Map(path))
+
+    def Remove(self, path):
+        try:
+            os.remove(self._Map(path))
+        except OSError:
+            pass
+
+    def RemoveTree(self, path):
+        shutil.rmtree(self._Map(path), ignore_errors=True)
+
+    def Commit(self):
+        return
+
+    def _Map(self, path):
+        return os.path.join(self.Root, path.lstrip("/"))
+
+
+class MpremoteTransport:
+    """
+    Device connected to a serial port, accessed with mpremote. All changes
+    are collected and executed in a single mpremote session by Commit().
+    """
+
+    # Helpers executed on the device before the changes.
+    DEVICE_HELPERS = (
+        "import os\n"
+        "def _mkdirs(p):\n"
+        "    d = ''\n"
+        "    for s in p.split('/')[1:-1]:\n"
+        "        d += '/' + s\n"
+        "        try:\n"
+        "            os.mkdir(d)\n"
+        "        except OSError:\n"
+        "            pass\n"
+        "def _rm(p):\n"
+        "    try:\n"
+        "        if os.stat(p)[0] & 0x4000:\n"
+        "            for n in os.listdir(p):\n"
+        "                _rm(p + '/' + n)\n"
+        "            os.rmdir(p)\n"
+        "        else:\n"
+        "            os.remove(p)\n"
+        "    except OSError:\n"
+        "        pass\n"
+    )
+
+    def __init__(self, port, mpremote="mpremote"):
+        self.Port = port
+        self.Mpremote = mpremote
+        self.Code = []
+        self.Copies = []
+
+    def Read(self, path):
+        result = subprocess.run([self.Mpremote, "connect", self.Port, "fs", "cat", ":" + path],
+                                capture_output=True)
+        if result.returncode != 0:
+            return None
+        return result.stdout
+
+    def Write(self, path, local):
+        self.Code.append("_mkdirs({!r})".format(path))
+        self.Copies.append((local, path))
+
+    def Remove(self, path):
+        self.Code.append("_rm({!r})".format(path))
+
+    def RemoveTree(self, path):
+        self.Code.append("_rm({!r})".format(path))
+
+    def Commit(self):
+        if len(self.Code) == 0 and len(self.Copies) == 0:
+            return
+        cmd = [self.Mpremote, "connect", self.Port,
+               "exec", self.DEVICE_HELPERS + "\n".join(self.Code)]
+        for local, path in self.Copies:
+            cmd += ["+", "fs", "cp", local, ":" + path]
+        subprocess.run(cmd, check=True)
+        self.Code = []
+        self.Copies = []
+
+
+def Sources():
+    """
+    :return: Source paths relative to src/ of the scripts and packages.
+    :rtype: list
+    """
+    sources = [script for script in SCRIPTS if os.path.exists(os.path.join(SRC_DIR, script))]
+    for package in PACKAGES:
+        for root, dirs, files in os.walk(os.path.join(SRC_DIR, package)):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for name in sorted(files):
+                if name.endswith(".py"):
+                    sources.append(os.path.relpath(os.path.join(root, name), SRC_DIR).replace(os.sep, "/"))
+    return sources
+
+
+def BundleFiles(directory):
+    """
+    :param directory: Node bundle, see host.Provision.
+    :return: Tuple of (dictionary of device path -> (local path, content hash)
+    of the application, dictionary of device path -> local path of the
+    runtime state).
+    :rtype: tuple
+    """
+    files = {}
+    state = {}
+    for root, dirs, names in os.walk(directory):
+        dirs.sort()
+        for name in sorted(names):
+            local = os.path.join(root, name)
+            path = "/" + os.path.relpath(local, directory).replace(os.sep, "/")
+            if any(path.startswith(d + "/") for d in STATE_DIRS):
+                state[path] = local
+            else:
+                files[path] = (local, _Hash(_Read(local)))
+    return files, state
+
+
+def Plan(files, manifest):
+    """
+    :param files: Dictionary of device path -> (local path, content hash).
+    :param manifest: Dictionary of device path -> content hash of the files on
+    the device, or None if unknown.
+    :return: Tuple of (device paths to upload, device paths to remove).
+    :rtype: tuple
+    """
+    uploads = sorted(path for path, (local, digest) in files.items()
+                     if manifest is None or manifest.get(path) != digest)
+    if manifest is not None:
+        removes = sorted(path for path in manifest if path not in files)
+    else:
+        # A source next to its bytecode takes precedence at import, remove the
+        # twins of all files as the device contents are unknown.
+        removes = []
+        for path in files:
+            base, ext = os.path.splitext(path)
+            twin = base + (".py" if ext == ".mpy" else ".mpy")
+            if twin not in files and os.path.basename(path) not in SCRIPTS:
+                removes.append(twin)
+        removes.sort()
+    return uploads, removes
+
+
+def Deploy(transport, files, full=False, wipe_state=False, dry_run=False, state=None):
+    """
+    :param transport: LocalTransport or MpremoteTransport.
+    :param files: Dictionary of device path -> (local path, content hash).
+    :param full: Ignore the manifest on the device and upload all files.
+    :param wipe_state: Remove the runtime state directories and write the
+    given state.
+    :param dry_run: Only determine the changes.
+    :param state: Dictionary of device path -> local path of runtime state
+    files, e.g. a pre-seeded LoRa session.
+    :return: Tuple of (uploaded paths, removed paths).
+    :rtype: tuple
+    """
+    manifest = None if full is True else _ManifestLoad(transport)
+    uploads, removes = Plan(files, manifest)
+    if dry_run is True or (manifest is not None and len(uploads) == 0 and len(removes) == 0
+                           and wipe_state is False):
+        return uploads, removes
+
+    # The manifest is removed first and written last, an interrupted deploy
+    # is repeated in full.
+    transport.Remove(MANIFEST_PATH)
+    if wipe_state is True:
+        for directory in STATE_DIRS:
+            transport.RemoveTree(directory)
+        for path, local in sorted((state or {}).items()):
+            transport.Write(path, local)
+    for path in removes:
+        transport.Remove(path)
+    for path in uploads:
+        transport.Write(path, files[path][0])
+
+    manifest = {path: digest for path, (local, digest) in files.items()}
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(manifest, f, sort_keys=True)
+    try:
+        transport.Write(MANIFEST_PATH, f.name)
+        transport.Commit()
+    finally:
+        os.remove(f.name)
+    return uploads, removes
+
+
+def _ManifestLoad(transport):
+    data = transport.Read(MANIFEST_PATH)
+    if data is None:
+        return None
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+def _Read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _Hash(data):
+    return hashlib.sha256(data).hexdigest()[0:16]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m host.Deploy")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--port", help="Serial port of the device, uploads with mpremote.")
+    target.add_argument("--mount", help="Mounted device file system or directory.")
+    parser.add_argument("--mpremote", default="mpremote")
+    parser.add_argument("--mpy-cross", default=shutil.which("mpy-cross"),
+                        help="Path of mpy-cross, found on the PATH by default.")
+    parser.add_argument("--no-compile", action="store_true", help="Deploy the sources.")
+    parser.add_argument("--bundle", help="Node bundle of host.Provision, deployed instead of src/.")
+    parser.add_argument("--opt", type=int, default=1, help="mpy-cross optimization level.")
+    parser.add_argument("--march", help="mpy-cross architecture, e.g. xtensawin.")
+    parser.add_argument("--jobs", type=int, help="Parallel compilations.")
+    parser.add_argument("--full", action="store_true", help="Upload all files.")
+    parser.add_argument("--wipe-state", action="store_true",
+                        help="Remove the runtime state directories ({}).".format(", ".join(STATE_DIRS)))
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    state = None
+    compiled = 0
+    if args.bundle is not None:
+        files, state = BundleFiles(args.bundle)
+    else:
+        mpy_cross = None if args.no_compile else args.mpy_cross
+        if mpy_cross is None and not args.no_compile:
+            parser.error("mpy-cross not found, pass --mpy-cross or --no-compile")
+
+        compiler = Compiler(os.path.join(BUILD_DIR, "mpy"), mpy_cross=mpy_cross, opt=args.opt,
+                            march=args.march, jobs=args.jobs)
+        try:
+            files = compiler.Build(Sources())
+        except CompileError as e:
+            print("Compile error: {}".format(e), file=sys.stderr)
+            return 1
+        compiled = compiler.Compiled
+
+    if args.port is not None:
+        transport = MpremoteTransport(args.port, args.mpremote)
+    else:
+        transport = LocalTransport(args.mount)
+    uploads, removes = Deploy(transport, files, full=args.full, wipe_state=args.wipe_state,
+                              dry_run=args.dry_run, state=state)
+
+    for path in removes:
+        print("rm {}".format(path))
+    for path in uploads:
+        print("cp {}".format(path))
+    print("{} compiled, {} uploaded, {} removed, {} unchanged".format(
+        compiled, len(uploads), len(removes), len(files) - len(uploads)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
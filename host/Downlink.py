@@ -0,0 +1,112 @@
+"""
+Encode downlink payloads on the host, for both the CBOR and the fixed layout
+codec.
+
+Usage:
+    python -m host.Downlink [--codec cbor|fixed] --seq <n> <parameter>=<value> ...
+    python -m host.Downlink [--codec cbor|fixed] --history <subtype>,<start>,<end>
+
+The parameters are the MainApp attributes of MainApp.RemoteConfig.PARAMS,
+e.g. MsgExInterval=900. A history request asks for the sample history of the
+sensor with the given report subtype (1 moisture, 3 temperature) from start
+up to end, in seconds since the epoch.
+"""
+import argparse
+import binascii
+import sys
+
+from host import Cbor
+from host import Paths
+from host import PayloadDecoder
+
+Paths.Install()
+
+from Schemas import Metadata
+from Schemas.ConfigUpdate import ConfigUpdate
+from Schemas.HistoryReport import HistoryRequest
+from MainApp.RemoteConfig import RemoteConfig
+
+
+def ConfigUpdateMessage(seq, values):
+    """
+    :param seq: Sequence number of the update.
+    :param values: Dictionary of MainApp attribute name -> value.
+    :return: ConfigUpdate message.
+    :rtype: dict
+    """
+    params = []
+    for param, spec in RemoteConfig.PARAMS.items():
+        if spec[0] in values:
+            params += [param, values[spec[0]]]
+    unknown = set(values) - set(spec[0] for spec in RemoteConfig.PARAMS.values())
+    if len(unknown) > 0:
+        raise ValueError("Unknown parameter(s): {}".format(", ".join(sorted(unknown))))
+
+    return {
+        Metadata.MSG_SECTION_META: {
+            Metadata.MSG_META_VERSION: Metadata.Metadata[Metadata.MSG_META_VERSION],
+            Metadata.MSG_META_TYPE: ConfigUpdate.TYPE_CONFIG,
+            Metadata.MSG_META_SUBTYPE: ConfigUpdate.SUBTYPE_CONFIG_UPDATE,
+        },
+        Metadata.MSG_SECTION_DATA: {
+            ConfigUpdate.DATA_KEY_SEQ: seq,
+            ConfigUpdate.DATA_KEY_PARAMS: params,
+        },
+    }
+
+
+def HistoryRequestMessage(subtype, start, end):
+    """
+    :param subtype: Sensor report subtype of the sensor.
+    :param start: Start of the range in seconds since the epoch.
+    :param end: End of the range in seconds since the epoch, exclusive.
+    :return: HistoryRequest message.
+    :rtype: dict
+    """
+    return {
+        Metadata.MSG_SECTION_META: {
+            Metadata.MSG_META_VERSION: Metadata.Metadata[Metadata.MSG_META_VERSION],
+            Metadata.MSG_META_TYPE: HistoryRequest.TYPE_HISTORY,
+            Metadata.MSG_META_SUBTYPE: HistoryRequest.SUBTYPE_HISTORY_REQUEST,
+        },
+        Metadata.MSG_SECTION_DATA: {
+            HistoryRequest.DATA_KEY_SENSOR: subtype,
+            HistoryRequest.DATA_KEY_START: start,
+            HistoryRequest.DATA_KEY_END: end,
+        },
+    }
+
+
+def Encode(msg, codec=PayloadDecoder.CODEC_CBOR):
+    if codec == PayloadDecoder.CODEC_FIXED:
+        return bytes(PayloadDecoder.FixedLayoutParserCreate().Encode(msg))
+    return Cbor.Encode(msg)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m host.Downlink")
+    parser.add_argument("--codec", choices=(PayloadDecoder.CODEC_CBOR, PayloadDecoder.CODEC_FIXED),
+                        default=PayloadDecoder.CODEC_CBOR)
+    parser.add_argument("--seq", type=int, help="Sequence number of the update.")
+    parser.add_argument("--history", help="History request as <subtype>,<start>,<end>.")
+    parser.add_argument("params", nargs="*", help="Parameters as <name>=<value>.")
+    args = parser.parse_args(argv)
+
+    if args.history is not None:
+        subtype, start, end = (int(value) for value in args.history.split(","))
+        print(binascii.hexlify(Encode(HistoryRequestMessage(subtype, start, end), args.codec)).decode())
+        return 0
+    if args.seq is None or len(args.params) == 0:
+        parser.error("a config update needs --seq and at least one parameter")
+
+    values = {}
+    for param in args.params:
+        name, _, value = param.partition("=")
+        values[name] = int(value)
+
+    print(binascii.hexlify(Encode(ConfigUpdateMessage(args.seq, values), args.codec)).decode())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,432 @@
+"""
+Decode a network server export of uplinks into columnar time series per
+device and series (e.g. moisture, battery, event), for the backend.
+
+The export is read as JSON lines, either TTN (v3 storage integration or MQTT
+uplink messages) or KPN (DevEUI_uplink) messages, and decoded in batches of
+lines by a pool of processes. The decoded samples of a batch are collected in
+typed arrays and appended to the series files of the output directory when
+the buffered samples exceed a limit, so the memory use is bounded by the
+batch size, the number of batches in flight and that limit, whatever the
+size of the export.
+
+Every series is stored as two raw little-endian columns:
+    <device>/<series>.t     int64 time in milliseconds since the epoch
+    <device>/<series>.v     float64 value
+Samples are appended in the order of the export, a series is sorted by time
+when it is loaded, with NumPy if it is available.
+
+Usage:
+    python -m host.ExportDecoder [--codec cbor|fixed] [--jobs N] <export> <output directory>
+"""
+import argparse
+import array
+import base64
+import binascii
+import calendar
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from host import Paths
+from host import PayloadDecoder
+
+Paths.Install()
+
+from Codec.FixedLayout import FixedLayoutException
+from Schemas import Metadata
+from Schemas.SensorReport import SensorReport, CombinedSensorReport, MoistureSensorReport, \
+    BatterySensorReport, TemperatureSensorReport
+from Schemas.RegistrationInfo import RegistrationInfo
+from Schemas.EventReport import EventReport
+from Schemas.BacklogReport import BacklogReport
+from Schemas.HistoryReport import HistoryRequest, HistoryReport
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+BATCH_LINES = 2000
+# Number of batches in flight per process.
+BATCH_WINDOW = 2
+# Number of buffered samples after which the series files are appended.
+BUFFER_SAMPLES = 1 << 20
+
+TIME_EXT = ".t"
+VALUE_EXT = ".v"
+TIME_TYPE = "q"
+VALUE_TYPE = "d"
+
+SERIES_MOISTURE = "moisture"
+SERIES_BATTERY = "battery"
+SERIES_TEMPERATURE = "temperature"
+SERIES_EVENT = "event"
+SERIES_DUTY = "duty"
+SERIES_SW_VER = "sw_ver"
+SERIES_FW_VER = "fw_ver"
+
+# Sensor report subtype -> series.
+REPORT_SERIES = {
+    MoistureSensorReport.SUBTYPE_MOISTURE_REPORT: SERIES_MOISTURE,
+    BatterySensorReport.SUBTYPE_BATTERY_REPORT: SERIES_BATTERY,
+    TemperatureSensorReport.SUBTYPE_TEMPERATURE_REPORT: SERIES_TEMPERATURE,
+}
+
+# Combined sensor report data key -> series.
+COMBINED_SERIES = {
+    CombinedSensorReport.DATA_KEY_MOISTURE: SERIES_MOISTURE,
+    CombinedSensorReport.DATA_KEY_TEMPERATURE: SERIES_TEMPERATURE,
+    CombinedSensorReport.DATA_KEY_BATTERY: SERIES_BATTERY,
+}
+
+
+def Uplink(line):
+    """
+    :param line: JSON line of the export.
+    :return: Tuple of (device, time in ms, payload) or None if the line is not
+    an uplink with a payload.
+    """
+    msg = json.loads(line)
+    if "result" in msg:
+        msg = msg["result"]
+
+    uplink = msg.get("uplink_message")
+    if uplink is not None:
+        if "frm_payload" not in uplink:
+            return None
+        device = msg["end_device_ids"]["device_id"]
+        received = msg.get("received_at") or uplink["received_at"]
+        return device, _TimeMs(received), base64.b64decode(uplink["frm_payload"])
+
+    uplink = msg.get("DevEUI_uplink")
+    if uplink is not None:
+        if "payload_hex" not in uplink:
+            return None
+        return uplink["DevEUI"], _TimeMs(uplink["Time"]), binascii.unhexlify(uplink["payload_hex"])
+    return None
+
+
+def _TimeMs(text):
+    """
+    :param text: ISO 8601 time, e.g. 2020-06-01T12:00:00.123456789Z or
+    2020-06-01T14:00:00.123+02:00.
+    """
+    seconds = calendar.timegm((int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                               int(text[11:13]), int(text[14:16]), int(text[17:19])))
+    ms = 0
+    end = 19
+    if end < len(text) and text[end] == ".":
+        end += 1
+        start = end
+        while end < len(text) and text[end].isdigit():
+            end += 1
+        ms = int((text[start:end] + "00")[0:3])
+    if end < len(text) and text[end] in "+-":
+        offset = int(text[end + 1:end + 3]) * 3600 + int(text[end + 4:end + 6]) * 60
+        seconds += -offset if text[end] == "+" else offset
+    return seconds * 1000 + ms
+
+
+class Columns:
+    """
+    Samples per (device, series) in typed arrays.
+    """
+
+    def __init__(self):
+        # (device, series) -> (times, values).
+        self.Series = {}
+        self.Count = 0
+        return
+
+    def Add(self, device, series, time_ms, value):
+        columns = self.Series.get((device, series))
+        if columns is None:
+            columns = (array.array(TIME_TYPE), array.array(VALUE_TYPE))
+            self.Series[(device, series)] = columns
+        columns[0].append(time_ms)
+        columns[1].append(value)
+        self.Count += 1
+
+    def Extend(self, other):
+        for key, (times, values) in other.Series.items():
+            columns = self.Series.get(key)
+            if columns is None:
+                self.Series[key] = (times, values)
+            else:
+                columns[0].extend(times)
+                columns[1].extend(values)
+        self.Count += other.Count
+
+
+def Samples(msg, device, time_ms, columns):
+    """
+    Add the samples of a decoded message to the columns.
+    :param msg: Message as decoded by the PayloadDecoder.
+    :param time_ms: Receive time, the time of samples that carry no time.
+    :return: Number of messages, including the records of a BacklogReport.
+    """
+    meta = msg[Metadata.MSG_SECTION_META]
+    data = msg[Metadata.MSG_SECTION_DATA]
+    msg_type = meta.get(Metadata.MSG_META_TYPE)
+    subtype = meta.get(Metadata.MSG_META_SUBTYPE)
+    count = 1
+
+    if Metadata.MSG_META_DUTY in meta:
+        columns.Add(device, SERIES_DUTY, time_ms, meta[Metadata.MSG_META_DUTY])
+
+    if msg_type == SensorReport.TYPE_REPORT:
+        if subtype == CombinedSensorReport.SUBTYPE_COMBINED_REPORT:
+            for key, series in COMBINED_SERIES.items():
+                for value in data.get(key, ()):
+                    columns.Add(device, series, time_ms, value)
+        series = REPORT_SERIES.get(subtype)
+        if series is not None:
+            for value in data.get(SensorReport.DATA_KEY_MEASUREMENTS, ()):
+                columns.Add(device, series, time_ms, value)
+            if SensorReport.DATA_KEY_SAMPLES in data:
+                for t, value in SensorReport.SamplesUnpack(data[SensorReport.DATA_KEY_SAMPLES]):
+                    columns.Add(device, series, t * 1000, value)
+            if SensorReport.DATA_KEY_SUMMARY in data:
+                minimum, maximum, n = data[SensorReport.DATA_KEY_SUMMARY]
+                columns.Add(device, series + ".min", time_ms, minimum)
+                columns.Add(device, series + ".max", time_ms, maximum)
+                columns.Add(device, series + ".count", time_ms, n)
+    elif msg_type == RegistrationInfo.TYPE_REGISTRATION:
+        columns.Add(device, SERIES_SW_VER, time_ms, data[RegistrationInfo.DATA_KEY_SW_VER])
+        columns.Add(device, SERIES_FW_VER, time_ms, data[RegistrationInfo.DATA_KEY_FW_VER])
+    elif msg_type == BacklogReport.TYPE_BACKLOG:
+        for record in data.get(BacklogReport.DATA_KEY_RECORDS, ()):
+            count += Samples(record, device, time_ms, columns)
+    elif msg_type == HistoryRequest.TYPE_HISTORY and subtype == HistoryReport.SUBTYPE_HISTORY_REPORT:
+        _History(data, device, columns)
+
+    # Events, in an EventReport or sent along with another message.
+    if EventReport.DATA_KEY_EVENT in data:
+        _Events(data, device, time_ms, columns)
+    # Registration info sent along with another message.
+    if RegistrationInfo.DATA_KEY_DEVICE in data:
+        hw_id, sw_ver, fw_ver = RegistrationInfo.DeviceInfoUnpack(data[RegistrationInfo.DATA_KEY_DEVICE])
+        columns.Add(device, SERIES_SW_VER, time_ms, sw_ver)
+        columns.Add(device, SERIES_FW_VER, time_ms, fw_ver)
+    return count
+
+
+def _Events(data, device, time_ms, columns):
+    # The event series holds the code at the time of the first occurrence.
+    for code, arg, count, age in EventReport.EventsUnpack(data[EventReport.DATA_KEY_EVENT]):
+        t = time_ms - age * 1000
+        columns.Add(device, SERIES_EVENT, t, code)
+        columns.Add(device, SERIES_EVENT + ".arg", t, arg)
+        columns.Add(device, SERIES_EVENT + ".count", t, count)
+
+
+def _History(data, device, columns):
+    # Raw samples are backfilled into the series, buckets into its aggregates.
+    series = REPORT_SERIES.get(data.get(HistoryRequest.DATA_KEY_SENSOR))
+    if series is None:
+        return
+    for t, minimum, maximum, mean, n in data.get(HistoryReport.DATA_KEY_ENTRIES, ()):
+        if n == 1:
+            columns.Add(device, series, t * 1000, minimum)
+            continue
+        columns.Add(device, series + ".min", t * 1000, minimum)
+        columns.Add(device, series + ".max", t * 1000, maximum)
+        columns.Add(device, series + ".mean", t * 1000, mean)
+        columns.Add(device, series + ".count", t * 1000, n)
+
+
+# Decoder of a worker process.
+_Decoder = None
+
+
+def _WorkerInit(codec):
+    global _Decoder
+    _Decoder = PayloadDecoder.PayloadDecoder(codec)
+
+
+def _Batch(lines):
+    """
+    Decode a batch of export lines.
+    :return: Tuple of (uplinks, messages, errors, columns).
+    """
+    columns = Columns()
+    uplinks = 0
+    messages = 0
+    errors = 0
+    for line in lines:
+        try:
+            uplink = Uplink(line)
+            if uplink is None:
+                continue
+            device, time_ms, payload = uplink
+            messages += Samples(_Decoder.Decode(payload), device, time_ms, columns)
+        except (ValueError, KeyError, IndexError, TypeError, FixedLayoutException):
+            errors += 1
+            continue
+        uplinks += 1
+    return uplinks, messages, errors, columns
+
+
+class SeriesWriter:
+    """
+    Appends the columns to the series files of the output directory once
+    the number of buffered samples exceeds a limit.
+    """
+
+    def __init__(self, directory, limit=BUFFER_SAMPLES):
+        self.Dir = directory
+        self.Limit = limit
+        self.Buffer = Columns()
+        self.Samples = 0
+        return
+
+    def Add(self, columns):
+        self.Buffer.Extend(columns)
+        if self.Buffer.Count >= self.Limit:
+            self.Flush()
+
+    def Flush(self):
+        for (device, series), (times, values) in self.Buffer.Series.items():
+            path = SeriesPath(self.Dir, device, series)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if sys.byteorder != "little":
+                times.byteswap()
+                values.byteswap()
+            with open(path + TIME_EXT, "ab") as f:
+                times.tofile(f)
+            with open(path + VALUE_EXT, "ab") as f:
+                values.tofile(f)
+        self.Samples += self.Buffer.Count
+        self.Buffer = Columns()
+
+
+def SeriesPath(directory, device, series):
+    """
+    :return: Path of a series without the column extension.
+    """
+    return os.path.join(directory, device.replace(os.sep, "_"), series)
+
+
+def Series(directory):
+    """
+    :return: Sorted list of the (device, series) in an output directory.
+    """
+    series = []
+    for device in os.listdir(directory):
+        path = os.path.join(directory, device)
+        if not os.path.isdir(path):
+            continue
+        for name in os.listdir(path):
+            if name.endswith(TIME_EXT):
+                series.append((device, name[:-len(TIME_EXT)]))
+    return sorted(series)
+
+
+def Load(directory, device, series):
+    """
+    Load a series sorted by time.
+    :return: Tuple of (times, values), NumPy arrays if NumPy is available,
+    otherwise typed arrays.
+    """
+    path = SeriesPath(directory, device, series)
+    if numpy is not None:
+        times = numpy.fromfile(path + TIME_EXT, dtype="<i8")
+        values = numpy.fromfile(path + VALUE_EXT, dtype="<f8")
+        order = numpy.argsort(times, kind="stable")
+        return times[order], values[order]
+
+    times = array.array(TIME_TYPE)
+    values = array.array(VALUE_TYPE)
+    with open(path + TIME_EXT, "rb") as f:
+        times.frombytes(f.read())
+    with open(path + VALUE_EXT, "rb") as f:
+        values.frombytes(f.read())
+    if sys.byteorder != "little":
+        times.byteswap()
+        values.byteswap()
+    order = sorted(range(0, len(times)), key=times.__getitem__)
+    return array.array(TIME_TYPE, (times[i] for i in order)), \
+        array.array(VALUE_TYPE, (values[i] for i in order))
+
+
+def _Batches(f, lines):
+    batch = []
+    for line in f:
+        batch.append(line)
+        if len(batch) == lines:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+def Decode(path, directory, codec=PayloadDecoder.CODEC_CBOR, jobs=1, lines=BATCH_LINES,
+           limit=BUFFER_SAMPLES):
+    """
+    Decode an export into the series files of a directory. Samples are
+    appended to existing series.
+    :param path: Path of the export, JSON lines.
+    :param directory: Output directory.
+    :param codec: Payload codec.
+    :param jobs: Number of processes.
+    :param lines: Number of lines per batch.
+    :param limit: Number of buffered samples after which the series files are
+    appended.
+    :return: Dictionary of statistics.
+    :rtype: dict
+    """
+    writer = SeriesWriter(directory, limit)
+    stats = {"uplinks": 0, "messages": 0, "errors": 0}
+
+    def Collect(result):
+        uplinks, messages, errors, columns = result
+        stats["uplinks"] += uplinks
+        stats["messages"] += messages
+        stats["errors"] += errors
+        writer.Add(columns)
+
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        if jobs > 1:
+            with multiprocessing.Pool(jobs, _WorkerInit, (codec,)) as pool:
+                # Bounded number of batches in flight, Pool.imap would read the
+                # whole export ahead.
+                pending = []
+                for batch in _Batches(f, lines):
+                    pending.append(pool.apply_async(_Batch, (batch,)))
+                    if len(pending) >= jobs * BATCH_WINDOW:
+                        Collect(pending.pop(0).get())
+                for result in pending:
+                    Collect(result.get())
+        else:
+            _WorkerInit(codec)
+            for batch in _Batches(f, lines):
+                Collect(_Batch(batch))
+    writer.Flush()
+
+    stats["samples"] = writer.Samples
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m host.ExportDecoder")
+    parser.add_argument("--codec", choices=(PayloadDecoder.CODEC_CBOR, PayloadDecoder.CODEC_FIXED),
+                        default=PayloadDecoder.CODEC_CBOR)
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("export", help="Uplink export, JSON lines.")
+    parser.add_argument("output", help="Output directory.")
+    args = parser.parse_args(argv)
+
+    stats = Decode(args.export, args.output, args.codec, args.jobs)
+    for name, value in stats.items():
+        print("{} {}".format(name, value))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,372 @@
+"""
+Fleet simulator: collisions and network load of many nodes per gateway.
+
+The frames of a node are recorded by running the real MainApp service
+configuration (sensors, Message Exchange, Registration) in a Harness on
+virtual time, once per spreading factor. Every node replays the trace of its
+spreading factor from its own power-up time, with its own sleep clock error
+and wake jitter. Running the MainApp itself for every node does not scale to
+thousands of nodes. The trace is recorded for a limited time: its second half
+is repeated to cover longer runs, the first half holds the join and
+registration. Uplinks are unconfirmed, a lost uplink does not change the
+schedule of its node.
+
+Collisions follow pure ALOHA: frames on the same channel and spreading factor
+that overlap in time are all lost. Spreading factors are orthogonal and the
+capture effect is not modelled. Every frame is sent on a random channel.
+
+The join requests after power-up are resolved first, event by event. A node
+of which the join request collided retries after the join accept windows and
+its duty cycle backoff, all its later frames shift by the delay. A simultaneous
+power-up of the fleet (--spread 0) shows the join storm. The uplinks are
+then swept per channel and spreading factor in a process pool.
+
+Usage:
+    python -m host.Fleet --nodes 1000 [--hours 24] [--sf 7=0.6,9=0.3,12=0.1]
+                         [--spread <sec>] [--jobs <n>] [--set MsgExInterval=600 ...]
+"""
+import argparse
+import heapq
+import multiprocessing
+import random
+import sys
+
+from host import Paths
+from host.Harness import Harness
+
+Paths.Install()
+
+from host.Loopback import LoopbackRadio
+
+
+# EU868 default channels.
+CHANNELS = 3
+# Duty cycle of the default channels.
+DUTY_CYCLE = 0.01
+# The join accept windows close this long after the join request.
+JOIN_ACCEPT_MS = LoopbackRadio.JOIN_TIME_MS
+# Random backoff on top of the duty cycle backoff, per failed attempt.
+JOIN_BACKOFF_SEC = 30
+JOIN_ATTEMPTS_MAX = 16
+
+# Standard deviation of the sleep clock error and the maximum wake jitter.
+CLOCK_ERROR = 0.005
+JITTER_MS = 200
+
+TRACE_HOURS = 1.0
+
+US_PER_HOUR = 3600 * 1000 * 1000
+
+
+class Profile:
+    """
+    Frames transmitted by a node, relative to its power-up.
+    """
+
+    def __init__(self, sf, frames, length_us):
+        """
+        :param sf: Spreading factor of the node configuration.
+        :param frames: List of (offset us, sf, time on air us, kind).
+        :param length_us: Duration of the trace.
+        """
+        self.Sf = sf
+        self.Joins = [f for f in frames if f[3] == LoopbackRadio.FRAME_JOIN]
+        self.Uplinks = [f for f in frames if f[3] == LoopbackRadio.FRAME_UPLINK]
+        self.Sfs = set(f[1] for f in frames)
+        self.LengthUs = length_us
+        return
+
+    def Replay(self, horizon_us):
+        """
+        :return: Uplink frames within the horizon, the second half of the
+        trace is repeated.
+        :rtype: list
+        """
+        half = self.LengthUs // 2
+        frames = [f for f in self.Uplinks if f[0] < min(half, horizon_us)]
+        tail = [f for f in self.Uplinks if f[0] >= half]
+        shift = 0
+        while len(tail) > 0 and half + shift < horizon_us:
+            frames.extend((f[0] + shift, f[1], f[2], f[3]) for f in tail
+                          if f[0] + shift < horizon_us)
+            shift += self.LengthUs - half
+        return frames
+
+
+class Node:
+
+    def __init__(self, index, profile, powerup_us, rate):
+        self.Index = index
+        self.Profile = profile
+        self.PowerupUs = powerup_us
+        self.Rate = rate
+        # Delay of the join by failed attempts, None if the node never joined.
+        self.DelayUs = 0
+        self.JoinAttempts = 0
+        return
+
+
+def Trace(sf, hours=TRACE_HOURS, overrides=None):
+    """
+    Record the frames of the MainApp for a spreading factor.
+    :param sf: Spreading factor.
+    :param hours: Duration of the trace.
+    :param overrides: MainApp overrides, e.g. the service intervals.
+    :return: Tuple of (sf, list of frames, length us), see Profile.
+    """
+    with Harness(overrides=dict(overrides or {})) as h:
+        lora_config = h._Import()().NodeLoraConfig()
+        lora_config["sf"] = sf
+        lora_config["ldro"] = 1 if sf >= 11 else 0
+        h.Overrides["LORA_CONFIG"] = lora_config
+
+        import utime
+        start = utime.NowUs()
+        length = int(hours * US_PER_HOUR)
+        while utime.NowUs() - start < length:
+            h.Wake()
+        frames = [(t - start, frame_sf, int(toa * 1000), kind)
+                  for t, frame_sf, toa, kind in h.Radio.Frames if t - start < length]
+    return sf, frames, length
+
+
+def _Trace(args):
+    return Trace(*args)
+
+
+def Nodes(count, mix, profiles, spread_sec, seed):
+    """
+    :param mix: Dictionary of spreading factor -> share of the nodes.
+    :param profiles: Dictionary of spreading factor -> Profile.
+    :param spread_sec: Power-up times are spread uniformly over this time.
+    :return: List of Nodes.
+    """
+    rng = random.Random("{}:nodes".format(seed))
+    sfs = sorted(mix)
+    weights = [mix[sf] for sf in sfs]
+    nodes = []
+    for index in range(0, count):
+        sf = rng.choices(sfs, weights)[0]
+        nodes.append(Node(index, profiles[sf],
+                          int(rng.uniform(0, spread_sec) * 1000000),
+                          1 + rng.gauss(0, CLOCK_ERROR)))
+    return nodes
+
+
+def Join(nodes, channels, seed):
+    """
+    Resolve the join requests of all nodes, sets the join delay and attempts
+    of every node.
+    :return: List of join request frames (start us, end us, channel, sf).
+    """
+    rng = random.Random("{}:join".format(seed))
+    # Heap of (time, event, node index, start, end, channel, sf, frame index),
+    # the frame index is set at the start of the request.
+    events = []
+    for node in nodes:
+        if len(node.Profile.Joins) == 0:
+            continue
+        offset, sf, toa, kind = node.Profile.Joins[0]
+        start = node.PowerupUs + int(offset * node.Rate)
+        heapq.heappush(events, (start, 1, node.Index, start, start + toa,
+                                rng.randrange(channels), sf, -1))
+
+    frames = []
+    # (channel, sf) -> list of [end, frame index] of the frames on air.
+    on_air = {}
+    collided = []
+    first = {}
+    while len(events) > 0:
+        time, event, index, start, end, channel, sf, frame = heapq.heappop(events)
+        node = nodes[index]
+        key = (channel, sf)
+        if event == 1:
+            # Start of a join request.
+            first.setdefault(index, start)
+            node.JoinAttempts += 1
+            frame = len(frames)
+            frames.append((start, end, channel, sf))
+            collided.append(False)
+            active = [f for f in on_air.get(key, []) if f[0] > start]
+            if len(active) > 0:
+                collided[frame] = True
+                for f in active:
+                    collided[f[1]] = True
+            active.append([end, frame])
+            on_air[key] = active
+            heapq.heappush(events, (end, 0, index, start, end, channel, sf, frame))
+            continue
+
+        # End of a join request.
+        if collided[frame] is False:
+            node.DelayUs = start - first[index]
+        elif node.JoinAttempts >= JOIN_ATTEMPTS_MAX:
+            node.DelayUs = None
+        else:
+            toa = end - start
+            retry = end + JOIN_ACCEPT_MS * 1000 + \
+                max(int(toa * (1 / DUTY_CYCLE - 1)), 0) + \
+                int(rng.uniform(0, JOIN_BACKOFF_SEC) * node.JoinAttempts * 1000000)
+            heapq.heappush(events, (retry, 1, index, retry, retry + toa,
+                                    rng.randrange(channels), sf, -1))
+    return frames
+
+
+def _Sweep(args):
+    """
+    Detect the collisions of the uplinks on one channel and spreading factor.
+    :return: Tuple of (dictionary of node index -> [sent, lost, airtime us],
+    uplinks per hour).
+    """
+    channel, sf, channels, nodes, profiles, joins, horizon_us, seed = args
+    frames = []
+    for index, profile_sf, powerup, rate, delay in nodes:
+        rng = random.Random("{}:{}".format(seed, index))
+        start_us = powerup + delay
+        for offset, frame_sf, toa, kind in profiles[profile_sf]:
+            frame_channel = rng.randrange(channels)
+            jitter = int(rng.random() * JITTER_MS * 1000)
+            if frame_channel != channel or frame_sf != sf:
+                continue
+            start = start_us + int(offset * rate) + jitter
+            if start < horizon_us:
+                frames.append((start, start + toa, index))
+    # Join requests interfere with the uplinks.
+    frames.extend((start, end, -1) for start, end, join_channel, join_sf in joins
+                  if join_channel == channel and join_sf == sf)
+    frames.sort()
+
+    stats = {}
+    hourly = [0] * (horizon_us // US_PER_HOUR + 1)
+    end_max = 0
+    for i, (start, end, index) in enumerate(frames):
+        lost = start < end_max or (i + 1 < len(frames) and frames[i + 1][0] < end)
+        end_max = max(end_max, end)
+        if index < 0:
+            continue
+        node = stats.setdefault(index, [0, 0, 0])
+        node[0] += 1
+        node[1] += 1 if lost else 0
+        node[2] += end - start
+        hourly[start // US_PER_HOUR] += 1
+    return stats, hourly
+
+
+def Simulate(count, mix, hours, spread_sec=0, channels=CHANNELS, trace_hours=TRACE_HOURS,
+             overrides=None, jobs=1, seed=1):
+    """
+    :param count: Number of nodes.
+    :param mix: Dictionary of spreading factor -> share of the nodes.
+    :param hours: Simulated time.
+    :param spread_sec: Power-up times are spread uniformly over this time.
+    :param channels: Number of uplink channels.
+    :param trace_hours: Duration of the MainApp trace per spreading factor.
+    :param overrides: MainApp overrides of every node.
+    :param jobs: Number of processes.
+    :return: Dictionary of metrics.
+    :rtype: dict
+    """
+    pool = multiprocessing.Pool(jobs) if jobs > 1 else None
+    mapper = pool.map if pool is not None else map
+    try:
+        traces = list(mapper(_Trace, [(sf, trace_hours, overrides) for sf in sorted(mix)]))
+        profiles = {sf: Profile(sf, frames, length) for sf, frames, length in traces}
+
+        nodes = Nodes(count, mix, profiles, spread_sec, seed)
+        joins = Join(nodes, channels, seed)
+
+        horizon = int(hours * US_PER_HOUR)
+        uplinks = {sf: profile.Replay(horizon) for sf, profile in profiles.items()}
+        tasks = []
+        for sf in sorted(set().union(*(p.Sfs for p in profiles.values()))):
+            members = [(n.Index, n.Profile.Sf, n.PowerupUs, n.Rate, n.DelayUs) for n in nodes
+                       if n.DelayUs is not None and sf in n.Profile.Sfs]
+            for channel in range(0, channels):
+                tasks.append((channel, sf, channels, members, uplinks, joins, horizon, seed))
+        sweeps = list(mapper(_Sweep, tasks))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return _Report(nodes, sweeps, tasks, hours)
+
+
+def _Report(nodes, sweeps, tasks, hours):
+    per_node = {}
+    hourly = None
+    # Airtime per channel and spreading factor.
+    airtime = {}
+    for (stats, task_hourly), task in zip(sweeps, tasks):
+        for index, (sent, lost, air) in stats.items():
+            node = per_node.setdefault(index, [0, 0, 0])
+            node[0] += sent
+            node[1] += lost
+            node[2] += air
+            airtime[task[0:2]] = airtime.get(task[0:2], 0) + air
+        hourly = task_hourly if hourly is None else [a + b for a, b in zip(hourly, task_hourly)]
+
+    sent = sum(n[0] for n in per_node.values())
+    lost = sum(n[1] for n in per_node.values())
+    ratios = sorted(1 - n[1] / n[0] for n in per_node.values() if n[0] > 0)
+    joined = [n for n in nodes if n.DelayUs is not None and n.JoinAttempts > 0]
+    full_hours = [count for count in hourly[0:int(hours)]] if hourly is not None else []
+    horizon_us = hours * US_PER_HOUR
+    return {
+        "nodes": len(nodes),
+        "join.attempts_mean": round(sum(n.JoinAttempts for n in nodes) / max(len(nodes), 1), 2),
+        "join.delay_sec_max": round(max((n.DelayUs for n in joined), default=0) / 1000000, 1),
+        "join.failed": sum(1 for n in nodes if n.DelayUs is None),
+        "uplinks": sent,
+        "delivery_ratio": round(1 - lost / sent, 4) if sent > 0 else 0,
+        "delivery_ratio_p5": round(ratios[len(ratios) // 20], 4) if len(ratios) > 0 else 0,
+        "node.airtime_ms_per_hour": round(sum(n[2] for n in per_node.values()) / 1000 /
+                                          max(len(per_node), 1) / hours, 1),
+        "gateway.uplinks_per_hour": round(sent / hours),
+        "gateway.uplinks_peak_hour": max(full_hours or hourly or [0]),
+        "gateway.downlinks_per_hour": round(len(joined) / hours),
+        # Of the busiest channel and spreading factor.
+        "gateway.channel_utilization_pct": round(100 * max(airtime.values(), default=0) /
+                                                 horizon_us, 2),
+    }
+
+
+def _Mix(text):
+    mix = {}
+    for item in text.split(","):
+        sf, share = item.split("=")
+        mix[int(sf)] = float(share)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m host.Fleet")
+    parser.add_argument("--nodes", type=int, default=100)
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--sf", type=_Mix, default={7: 1.0},
+                        help="Spreading factor mix, e.g. 7=0.6,9=0.3,12=0.1.")
+    parser.add_argument("--spread", type=float, default=0,
+                        help="Power-up times are spread over this many seconds.")
+    parser.add_argument("--channels", type=int, default=CHANNELS)
+    parser.add_argument("--trace-hours", type=float, default=TRACE_HOURS)
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="MainApp override of every node, e.g. MsgExInterval=600.")
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    for item in args.set:
+        name, value = item.split("=")
+        overrides[name] = int(value)
+
+    results = Simulate(args.nodes, args.sf, args.hours, spread_sec=args.spread,
+                       channels=args.channels, trace_hours=args.trace_hours,
+                       overrides=overrides, jobs=args.jobs, seed=args.seed)
+    for metric, value in results.items():
+        print("{} {}".format(metric, value))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
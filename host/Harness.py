@@ -0,0 +1,326 @@
+"""
+Host-side harness that runs the MainApp on CPython.
+
+The MicroPython modules (machine, utime, uos, micropython, u*) are replaced by
+the stand-ins in host/Stubs, the LoRa protocol is replaced by a loopback radio
+and all time is virtual. Every wake cycle starts from a clean interpreter
+state, like the device does after deep sleep, while the sandboxed file system,
+RTC memory and virtual clock carry over.
+
+Usage:
+    with Harness() as h:
+        report = h.Wake()
+        print(report.Format())
+"""
+import builtins
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+from host import Paths
+from host.Paths import SRC_DIR, UPYIOT_DIR
+
+LORA_PROTOCOL_MODULE = "upyiot.comm.Messaging.Protocol.LoraProtocol"
+
+
+class StageRecord:
+
+    def __init__(self, name, virtual_ms, cpu_ms, fs_ops, alloc_bytes, alloc_blocks):
+        self.Name = name
+        self.VirtualMs = virtual_ms
+        self.CpuMs = cpu_ms
+        self.FsOps = fs_ops
+        self.AllocBytes = alloc_bytes
+        self.AllocBlocks = alloc_blocks
+
+    def AsDict(self):
+        return {"name": self.Name, "virtual_ms": self.VirtualMs, "cpu_ms": self.CpuMs,
+                "fs_ops": self.FsOps, "alloc_bytes": self.AllocBytes,
+                "alloc_blocks": self.AllocBlocks}
+
+
+class WakeReport:
+
+    OUTCOME_DEEPSLEEP   = "deepsleep"
+    OUTCOME_RESET       = "reset"
+    OUTCOME_TIMEOUT     = "timeout"
+
+    def __init__(self, reset_cause):
+        self.ResetCause = reset_cause
+        self.Stages = []
+        self.Outcome = None
+        self.AwakeMs = 0
+        self.SleepMs = 0
+        self.Uplinks = 0
+        self.FsOps = {}
+        self.FsBytes = {}
+
+    def Stage(self, name):
+        for stage in self.Stages:
+            if stage.Name == name:
+                return stage
+        return None
+
+    def Total(self, attr):
+        return sum(getattr(stage, attr) for stage in self.Stages)
+
+    def AsDict(self):
+        return {"reset_cause": self.ResetCause, "outcome": self.Outcome,
+                "awake_ms": self.AwakeMs, "sleep_ms": self.SleepMs,
+                "uplinks": self.Uplinks, "fs_ops": dict(self.FsOps),
+                "fs_bytes": dict(self.FsBytes),
+                "stages": [stage.AsDict() for stage in self.Stages]}
+
+    def Format(self):
+        lines = ["{:<14} {:>10} {:>9} {:>7} {:>10} {:>8}".format(
+            "stage", "virt_ms", "cpu_ms", "fs_ops", "alloc_B", "blocks")]
+        for s in self.Stages:
+            lines.append("{:<14} {:>10.1f} {:>9.3f} {:>7} {:>10} {:>8}".format(
+                s.Name, s.VirtualMs, s.CpuMs, s.FsOps, s.AllocBytes, s.AllocBlocks))
+        lines.append("outcome={} awake_ms={:.1f} sleep_ms={} uplinks={} fs={} bytes={}".format(
+            self.Outcome, self.AwakeMs, self.SleepMs, self.Uplinks, self.FsOps, self.FsBytes))
+        return "\n".join(lines)
+
+
+class _CountingFile:
+    """
+    File proxy that counts the bytes transferred to and from the sandboxed file
+    system.
+    """
+
+    def __init__(self, f, counter):
+        self._File = f
+        self._Count = counter
+
+    def write(self, data):
+        self._Count("written", len(data))
+        return self._File.write(data)
+
+    def read(self, *args):
+        data = self._File.read(*args)
+        self._Count("read", len(data))
+        return data
+
+    def readinto(self, buf):
+        n = self._File.readinto(buf)
+        self._Count("read", n or 0)
+        return n
+
+    def __iter__(self):
+        return iter(self._File)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._File.close()
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._File, name)
+
+
+class Harness:
+
+    # Virtual time limit of a single wake cycle.
+    WAKE_LIMIT_SEC = 3600
+    # Heap reported as free at the start of a wake by the HeapMonitor probes.
+    # CPython objects are several times larger than their MicroPython
+    # counterparts, so only the allocations are comparable to the device.
+    HEAP_BYTES = 2 * 1024 * 1024
+
+    def __init__(self, sandbox=None, overrides=None, epoch=1600000000):
+        """
+        :param sandbox: Host directory used as device file system, a temporary
+        directory is created if None.
+        :param overrides: MainApp class attributes to override after every import,
+        e.g. {"NETWORK": 0} to select KPN.
+        :param epoch: Virtual time (sec) at the first boot.
+        """
+        if sandbox is None:
+            self._TmpDir = tempfile.TemporaryDirectory(prefix="lorasensor_")
+            sandbox = self._TmpDir.name
+        else:
+            self._TmpDir = None
+        self.Sandbox = sandbox
+        self.Overrides = overrides or {}
+        self.Epoch = epoch
+        self.App = None
+        self.Radio = None
+        self._Open = None
+        self._SysPath = None
+        self._Report = None
+        self._Mark = None
+        self._HeapBase = 0
+
+    def __enter__(self):
+        self.Install()
+        return self
+
+    def __exit__(self, *exc):
+        self.Uninstall()
+        return False
+
+    def Install(self):
+        self._SysPath = list(sys.path)
+        Paths.Install()
+
+        import utime
+        import uos
+        utime.Set(self.Epoch)
+        uos.Mount(self.Sandbox, ("/log", "/lora", "/sensor", "/msg", "/sys",
+                                 "/Version", "/MainApp", "/Schemas", "/Config"))
+
+        self._Open = builtins.open
+        real_open = self._Open
+
+        def device_open(file, mode="r", *args, **kwargs):
+            mapped = uos.Map(file)
+            if mapped is file:
+                return real_open(file, mode, *args, **kwargs)
+            uos.Count("open_w" if ("w" in mode or "a" in mode or "+" in mode) else "open_r")
+            return _CountingFile(real_open(mapped, mode, *args, **kwargs), uos.CountBytes)
+
+        builtins.open = device_open
+
+        from host import Loopback
+        self.Radio = Loopback.LoopbackLoraProtocol.Radio
+        self.Radio.Reset()
+
+    def Uninstall(self):
+        if self._Open is not None:
+            builtins.open = self._Open
+            self._Open = None
+        self._Purge()
+        if self._SysPath is not None:
+            sys.path[:] = self._SysPath
+        if self._TmpDir is not None:
+            self._TmpDir.cleanup()
+
+    @staticmethod
+    def _Purge():
+        """
+        Forget all application and upyiot modules so the next import starts
+        from a clean state, like a boot after deep sleep.
+        """
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, "__file__", None) or ""
+            if path.startswith(SRC_DIR) or path.startswith(UPYIOT_DIR) \
+                    or name == "upyiot" or name.startswith("upyiot.") \
+                    or name in ("MainApp", "Schemas", "Config") \
+                    or name.startswith(("MainApp.", "Schemas.", "Config.")):
+                del sys.modules[name]
+
+    def _Import(self):
+        import upyiot.comm.Messaging.Protocol
+        from host import Loopback
+        module = types.ModuleType(LORA_PROTOCOL_MODULE)
+        module.LoraProtocol = Loopback.LoopbackLoraProtocol
+        sys.modules[LORA_PROTOCOL_MODULE] = module
+
+        # The probes of the HeapMonitor, also used by the Profiler.
+        from MainApp.HeapMonitor import HeapMonitor
+        HeapMonitor.MemAlloc = staticmethod(lambda: tracemalloc.get_traced_memory()[0])
+        HeapMonitor.MemFree = staticmethod(
+            lambda: self.HEAP_BYTES - tracemalloc.get_traced_memory()[0] + self._HeapBase)
+
+        from MainApp import MainApp
+        for attr, value in self.Overrides.items():
+            setattr(MainApp.MainApp, attr, value)
+        return MainApp.MainApp
+
+    def _Snapshot(self):
+        import uos
+        import utime
+        return (utime.NowUs(), time.perf_counter(), sum(uos.Counters.values()),
+                tracemalloc.get_traced_memory()[0], sys.getallocatedblocks())
+
+    def _Record(self, name):
+        now = self._Snapshot()
+        prev = self._Mark
+        self._Report.Stages.append(StageRecord(name,
+                                               (now[0] - prev[0]) / 1000,
+                                               (now[1] - prev[1]) * 1000,
+                                               now[2] - prev[2],
+                                               now[3] - prev[3],
+                                               now[4] - prev[4]))
+        # Take a fresh mark so the probe itself is not accounted.
+        self._Mark = self._Snapshot()
+
+    def Wake(self, reset_cause=None, run=True):
+        """
+        Execute one wake cycle: import, MainApp.Setup() and, if run is True,
+        MainApp.Run() until the device goes to deep sleep or resets.
+        :param reset_cause: machine reset cause, defaults to a power-on reset
+        for the first wake and a deep sleep reset for all others.
+        :return: WakeReport
+        """
+        import machine
+        import uos
+        import utime
+
+        if reset_cause is None:
+            reset_cause = machine.PWRON_RESET if self.App is None else machine.DEEPSLEEP_RESET
+        machine.SetResetCause(reset_cause)
+        if reset_cause != machine.DEEPSLEEP_RESET:
+            machine.RTC.Memory = b""
+
+        self._Purge()
+        self.App = None
+        uos.CountersReset()
+        uplinks = len(self.Radio.Uplinks)
+        self._Report = WakeReport(reset_cause)
+
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        start_us = utime.NowUs()
+        self._HeapBase = tracemalloc.get_traced_memory()[0]
+        utime.LimitSet(self.WAKE_LIMIT_SEC)
+        main_app = None
+        try:
+            self._Mark = self._Snapshot()
+            main_app = self._Import()
+            self._Record("import")
+
+            main_app.StageProbe = self._Record
+            self.App = main_app()
+            self.App.Setup()
+
+            if run is True:
+                self.App.Run()
+                self._Record("run")
+        except machine.DeepSleepSignal as sleep:
+            self._Record("run")
+            self._Report.Outcome = WakeReport.OUTCOME_DEEPSLEEP
+            self._Report.SleepMs = sleep.Msec
+        except machine.ResetSignal:
+            self._Record("run")
+            self._Report.Outcome = WakeReport.OUTCOME_RESET
+        except utime.WakeBudgetExceeded:
+            self._Record("run")
+            self._Report.Outcome = WakeReport.OUTCOME_TIMEOUT
+        finally:
+            if main_app is not None:
+                main_app.StageProbe = None
+            utime.LimitSet(None)
+            if not tracing:
+                tracemalloc.stop()
+
+        self._Report.AwakeMs = (utime.NowUs() - start_us) / 1000
+        self._Report.Uplinks = len(self.Radio.Uplinks) - uplinks
+        self._Report.FsOps = dict(uos.Counters)
+        self._Report.FsBytes = dict(uos.Bytes)
+
+        # Time passes while the device is in deep sleep.
+        utime.Advance(self._Report.SleepMs * 1000)
+        return self._Report
+
+    def Cycles(self, count):
+        """
+        Run a cold boot followed by count - 1 timer wakes.
+        :return: List of WakeReports.
+        """
+        return [self.Wake() for _ in range(0, count)]
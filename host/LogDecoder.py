@@ -0,0 +1,138 @@
+"""
+Decode the binary log of the application (see MainApp.LogRing) on the host.
+The log files are decoded oldest first, a directory is expanded to its log
+files. Records that were still held in RTC memory can be decoded from a dump
+of the RTC memory.
+
+Usage:
+    python -m host.LogDecoder [--rtc <rtc memory dump>] <log file or directory> ...
+"""
+import argparse
+import os
+import struct
+import sys
+
+from host import Paths
+
+Paths.Install()
+
+from Codec import Varint
+from MainApp.LogRing import LogRing
+from MainApp.RtcMemory import RtcMemory
+from MainApp import LogFormats
+
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+
+def Decode(data):
+    """
+    :param data: Records as written by the LogRing.
+    :return: List of (time, level, format ID, arguments). A truncated last
+    record is skipped.
+    :rtype: list
+    """
+    records = []
+    offset = 0
+    while offset + LogRing.REC_HDR_SIZE <= len(data):
+        length, info, time = struct.unpack_from(LogRing.REC_HDR_FMT, data, offset)
+        end = offset + length
+        if length < LogRing.REC_HDR_SIZE or end > len(data):
+            break
+        fmt, pos = Varint.Decode(data, offset + LogRing.REC_HDR_SIZE)
+        args = []
+        for _ in range(0, info & 0x1F):
+            value, pos = Varint.Decode(data, pos)
+            if value & 1:
+                args.append(bytes(data[pos:pos + (value >> 1)]))
+                pos += value >> 1
+            else:
+                args.append(Varint.UnZigZag(value >> 1))
+        records.append((time, info >> 5, fmt, args))
+        offset = end
+    return records
+
+
+def RtcRecords(dump):
+    """
+    :param dump: Contents of the RTC memory.
+    :return: Records held in the log region of the RTC memory.
+    :rtype: bytes
+    """
+    offset = 0
+    for region, size in RtcMemory.REGIONS:
+        if region == RtcMemory.REGION_LOG:
+            break
+        offset += size
+    if len(dump) < offset + LogRing.RTC_SIZE:
+        return b""
+    magic, length = struct.unpack_from(LogRing.RTC_FMT, dump, offset)
+    if magic != LogRing.RTC_MAGIC:
+        return b""
+    offset += LogRing.RTC_SIZE
+    return bytes(dump[offset:offset + length])
+
+
+def Format(record, formats):
+    """
+    :return: Line of the record.
+    :rtype: str
+    """
+    time, level, fmt, args = record
+    args = [_Text(arg) if isinstance(arg, bytes) else arg for arg in args]
+    text = formats.get(fmt)
+    if text is None or text.count("{}") != len(args):
+        text = "Format {}: {}".format(fmt, args)
+    else:
+        text = text.format(*args)
+    level = LEVELS[level] if level < len(LEVELS) else str(level)
+    return "{} {} {}".format(time, level, text)
+
+
+def _Text(arg):
+    # Binary arguments (e.g. the device ID) are shown in hex.
+    try:
+        text = arg.decode()
+    except UnicodeDecodeError:
+        return arg.hex()
+    return text if text.isprintable() else arg.hex()
+
+
+def LogFiles(path):
+    """
+    :return: Log files of a directory, oldest first.
+    :rtype: list
+    """
+    files = []
+    index = 0
+    while os.path.exists(os.path.join(path, LogRing.FILE_NAME.format(index))):
+        files.insert(0, os.path.join(path, LogRing.FILE_NAME.format(index)))
+        index += 1
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m host.LogDecoder")
+    parser.add_argument("--rtc", help="Dump of the RTC memory, decoded after the files.")
+    parser.add_argument("paths", nargs="*", help="Log files or directories.")
+    args = parser.parse_args(argv)
+
+    data = []
+    for path in args.paths:
+        files = LogFiles(path) if os.path.isdir(path) else [path]
+        for file in files:
+            with open(file, "rb") as f:
+                data.append(f.read())
+    if args.rtc is not None:
+        with open(args.rtc, "rb") as f:
+            data.append(RtcRecords(f.read()))
+
+    formats = LogFormats.Formats()
+    for chunk in data:
+        for record in Decode(chunk):
+            print(Format(record, formats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
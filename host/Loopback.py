@@ -0,0 +1,323 @@
+import struct
+
+import machine
+import utime
+import uos
+
+from MainApp import Airtime
+from MainApp.PowerManager import Protocol
+
+
+class LoopbackRadio:
+    """
+    Virtual LoRa radio and network server. Uplinks are recorded instead of
+    transmitted and downlinks can be queued to be delivered in the RX window
+    that follows the next uplink. Without a channel model (see host.Channel)
+    every frame is received and no link quality is reported.
+
+    Uplinks are unconfirmed unless Confirmed is set: the network only answers
+    with a downlink when one is queued, when the uplink is confirmed (an
+    acknowledgement) or, if AdrAckLimit is set, when the node has sent that
+    many uplinks without receiving a downlink (the LoRaWAN stack sets
+    ADRACKReq). The link quality of a received downlink is kept in Rssi and
+    Snr. Delivered tells whether the network received the last uplink, which
+    the node cannot know.
+    """
+
+    # LoRaWAN RX1 and RX2 windows open 1 s and 2 s after the uplink.
+    RX_WINDOW_MS = 2000
+
+    JOIN_TIME_MS = 6000
+    # MHDR, AppEUI, DevEUI, DevNonce and MIC.
+    JOIN_REQUEST_SIZE = 23
+
+    FRAME_JOIN = "join"
+    FRAME_UPLINK = "uplink"
+
+    def __init__(self):
+        self.Uplinks = []
+        # Every transmitted frame, also the lost ones: (start us, sf, time on air ms, kind).
+        self.Frames = []
+        self.Downlinks = []
+        self.Joins = 0
+        self.JoinAccept = True
+        self.Channel = None
+        self.Confirmed = False
+        self.AdrAckLimit = None
+        # Uplinks since the node received the last downlink.
+        self.Unanswered = 0
+        self.Lost = 0
+        self.AirtimeMs = 0
+        self.Delivered = True
+        self.Rssi = None
+        self.Snr = None
+        return
+
+    def Reset(self):
+        self.Uplinks.clear()
+        self.Frames.clear()
+        self.Downlinks.clear()
+        self.Joins = 0
+        self.Channel = None
+        self.Confirmed = False
+        self.AdrAckLimit = None
+        self.Unanswered = 0
+        self.Lost = 0
+        self.AirtimeMs = 0
+
+    def DownlinkQueue(self, payload, port=1):
+        self.Downlinks.append((port, bytes(payload)))
+
+    def Join(self, config):
+        self.Joins += 1
+        sf = config.get("sf", 7)
+        self.Frames.append((utime.NowUs(), sf,
+                            Airtime.TimeOnAir(self.JOIN_REQUEST_SIZE, sf, config.get("ldro", 0),
+                                              lorawan=False),
+                            self.FRAME_JOIN))
+        utime.sleep_ms(self.JOIN_TIME_MS)
+        return self.JoinAccept
+
+    def Transmit(self, config, payload):
+        """
+        Record an uplink and return the downlink received in its RX windows.
+        The downlink is sent at the spreading factor of the uplink and takes
+        the same channel.
+        :param config: LoRa configuration of the transmitting node.
+        :param payload: Uplink payload.
+        :return: Tuple of (port, payload) or None. A downlink without
+        application payload (an acknowledgement or MAC command) is (0, b"").
+        """
+        sf = config.get("sf", 7)
+        toa = Airtime.TimeOnAir(len(payload), sf, config.get("ldro", 0))
+        self.AirtimeMs += toa
+        self.Frames.append((utime.NowUs(), sf, toa, self.FRAME_UPLINK))
+        utime.sleep_ms(toa)
+        utime.sleep_ms(self.RX_WINDOW_MS)
+        self.Rssi = None
+        self.Snr = None
+        self.Unanswered += 1
+        self.Delivered = self.Channel is None or self.Channel.Frame(sf)[0]
+        if self.Delivered is False:
+            self.Lost += 1
+            return None
+        self.Uplinks.append((utime.time(), sf, bytes(payload)))
+
+        if len(self.Downlinks) > 0:
+            downlink = self.Downlinks.pop(0)
+        elif self.Confirmed is True or \
+                (self.AdrAckLimit is not None and self.Unanswered >= self.AdrAckLimit):
+            downlink = (0, b"")
+        else:
+            return None
+        if self.Channel is not None:
+            received, self.Rssi, self.Snr = self.Channel.Frame(sf)
+            if received is False:
+                self.Rssi = None
+                self.Snr = None
+                if len(downlink[1]) > 0:
+                    # The network sends it again after the next uplink.
+                    self.Downlinks.insert(0, downlink)
+                return None
+        self.Unanswered = 0
+        return downlink
+
+
+class LoopbackParams:
+
+    SESSION_FILE = "session"
+    FCNT_FILE = "fcnt"
+
+    def __init__(self, directory):
+        self.Dir = directory
+        return
+
+    def StoreSession(self, dev_addr, app_skey, nwk_skey):
+        with open(self.Dir + "/" + self.SESSION_FILE, "wb") as f:
+            f.write(bytes(dev_addr) + bytes(nwk_skey) + bytes(app_skey))
+
+    def HasSession(self):
+        try:
+            uos.stat(self.Dir + "/" + self.SESSION_FILE)
+        except OSError:
+            return False
+        return True
+
+    def FrameCounter(self):
+        try:
+            with open(self.Dir + "/" + self.FCNT_FILE, "rb") as f:
+                return struct.unpack("<Q", f.read(8))[0]
+        except OSError:
+            return 0
+
+    def FrameCounterStore(self, fcnt):
+        with open(self.Dir + "/" + self.FCNT_FILE, "wb") as f:
+            f.write(struct.pack("<Q", fcnt))
+
+
+class LoopbackLoraProtocol:
+    """
+    Stand-in for upyiot's LoraProtocol that talks to a LoopbackRadio instead
+    of an SX127x modem. Session and frame counter files are kept in the same
+    format as the real protocol, see devices/*/lora/.
+    """
+
+    Radio = LoopbackRadio()
+
+    def __init__(self, lora_config, directory):
+        self.Config = lora_config
+        self.Params = LoopbackParams(directory)
+        self.Mtu = Airtime.PAYLOAD_MAX[lora_config["sf"]]
+        self.RecvCallback = None
+        self.Connected = False
+        # Link quality of the downlink received after the last uplink.
+        self.Rssi = None
+        self.Snr = None
+        return
+
+    def Setup(self, recv_callback=None, msg_mappings=None, *args):
+        self.RecvCallback = recv_callback
+
+    def HasSession(self):
+        return self.Params.HasSession()
+
+    def Connect(self, *args):
+        if self.HasSession() is False:
+            if self.Radio.Join(self.Config) is False:
+                return False
+            self.Params.StoreSession(bytes(4), bytes(16), bytes(16))
+        self.Connected = True
+        return True
+
+    def Disconnect(self, *args):
+        self.Connected = False
+
+    def IsConnected(self):
+        return self.Connected
+
+    def Send(self, *args):
+        payload = None
+        for arg in args:
+            if isinstance(arg, (bytes, bytearray, memoryview)):
+                payload = bytes(arg)
+        if payload is None:
+            return False
+        fcnt = self.Params.FrameCounter()
+        downlink = self.Radio.Transmit(self.Config, payload)
+        self.Params.FrameCounterStore(fcnt + 1)
+        self.Rssi = self.Radio.Rssi
+        self.Snr = self.Radio.Snr
+        if downlink is not None and len(downlink[1]) > 0 and self.RecvCallback is not None:
+            self.RecvCallback(downlink[1])
+        # A confirmed uplink fails without an acknowledgement, an unconfirmed
+        # uplink is sent whether the network receives it or not.
+        if self.Radio.Confirmed is True:
+            return downlink is not None
+        return True
+
+    def Receive(self, *args):
+        return None
+
+
+class LoopbackSupply:
+    """
+    Stand-in for upyiot's Supply that switches a virtual sensor supply. Like
+    the real one, Enable() blocks for the settle time. The time the supply
+    has been on is accounted.
+    """
+
+    def __init__(self, settle_ms=0):
+        self.SettleMs = settle_ms
+        self.On = False
+        self.OnMs = 0
+        self._EnabledUs = 0
+
+    def Enable(self):
+        self.On = True
+        self._EnabledUs = utime.NowUs()
+        utime.sleep_ms(self.SettleMs)
+
+    def Disable(self):
+        if self.On is True:
+            self.OnMs += (utime.NowUs() - self._EnabledUs) / 1000
+        self.On = False
+
+
+class LoopbackPowerManager(machine.UART):
+    """
+    Virtual power manager behind a UART. Command frames written to the UART
+    are answered with ACK or NACK frames, delayed by the transfer time at the
+    configured baudrate. Replies can be dropped or corrupted to exercise the
+    retries of the protocol.
+    """
+
+    # Time the power manager takes to process a command.
+    PROCESS_MS = 5
+
+    def __init__(self, baudrate=2400):
+        super().__init__(2, baudrate)
+        self.SupplyMv = 3300
+        self.BatteryMv = 3900
+        self.Flags = 0
+        # Number of upcoming replies to drop and to corrupt.
+        self.Drop = 0
+        self.Corrupt = 0
+        # Cut the supply (raise machine.DeepSleepSignal) once the ACK of a
+        # sleep command has been read.
+        self.CutPower = False
+        self.Commands = []
+        self.Sleeps = []
+        self._SleepMs = None
+
+    def _TransferUs(self, nbytes):
+        # 8N1: 10 bits per byte.
+        return nbytes * 10 * 1000000 // self.Baudrate
+
+    def write(self, buf):
+        buf = bytes(buf)
+        utime.Advance(self._TransferUs(len(buf)))
+        payload_len = Protocol.FrameCheck(bytearray(buf), len(buf))
+        if payload_len < 0:
+            # The power manager only NACKs frames it could synchronize on.
+            if len(buf) >= Protocol.FRAME_HEADER and buf[0] == Protocol.FRAME_SOF:
+                self._Reply(buf[1], Protocol.RSP_NACK, bytes((Protocol.NACK_CRC,)))
+            return len(buf)
+
+        seq = buf[1]
+        code = buf[2]
+        payload = buf[Protocol.FRAME_HEADER:Protocol.FRAME_HEADER + payload_len]
+        self.Commands.append((code, payload))
+        if code == Protocol.CommandSleep.CMD_CODE:
+            sec = struct.unpack(">I", payload)[0]
+            self.Sleeps.append(sec)
+            self._SleepMs = sec * 1000
+            self._Reply(seq, Protocol.RSP_ACK, b"")
+        elif code == Protocol.CommandStatus.CMD_CODE:
+            self._Reply(seq, Protocol.RSP_ACK,
+                        struct.pack(">HHB", self.SupplyMv, self.BatteryMv, self.Flags))
+        else:
+            self._Reply(seq, Protocol.RSP_NACK, bytes((Protocol.NACK_UNKNOWN,)))
+        return len(buf)
+
+    def _Reply(self, seq, code, payload):
+        if self.Drop > 0:
+            self.Drop -= 1
+            self._SleepMs = None
+            return
+        frame = bytearray(Protocol.FRAME_SIZE_MAX)
+        frame[Protocol.FRAME_HEADER:Protocol.FRAME_HEADER + len(payload)] = payload
+        length = Protocol.FrameBuild(frame, seq, code, len(payload))
+        if self.Corrupt > 0:
+            self.Corrupt -= 1
+            self._SleepMs = None
+            frame[length - 1] ^= 0xFF
+        utime.Advance(self.PROCESS_MS * 1000 + self._TransferUs(length))
+        self.Rx.extend(frame[0:length])
+
+    def readinto(self, buf, nbytes=None):
+        n = super().readinto(buf, nbytes)
+        if self.CutPower and self._SleepMs is not None and len(self.Rx) == 0:
+            msec = self._SleepMs
+            self._SleepMs = None
+            raise machine.DeepSleepSignal(msec)
+        return n
@@ -0,0 +1,17 @@
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(REPO_DIR, "src")
+STUBS_DIR = os.path.join(REPO_DIR, "host", "Stubs")
+UPYIOT_DIR = os.path.join(REPO_DIR, "upyiot")
+
+
+def Install():
+    """
+    Make the application sources, the upyiot submodule and the MicroPython
+    stand-ins importable on the host.
+    """
+    for path in (REPO_DIR, SRC_DIR, STUBS_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
@@ -0,0 +1,115 @@
+"""
+Decode uplink payloads on the host, for both the CBOR and the fixed layout
+codec.
+
+Usage:
+    python -m host.PayloadDecoder [--codec cbor|fixed] <hex payload> ...
+"""
+import argparse
+import binascii
+import sys
+
+from host import Cbor
+from host import Paths
+
+Paths.Install()
+
+from Codec import Varint
+from Codec.FixedLayout import FixedLayoutParser
+from Schemas import Metadata
+from Schemas.SensorReport import SensorReport, MoistureSensorReport, \
+    BatterySensorReport, TemperatureSensorReport
+from Schemas.RegistrationInfo import RegistrationInfo
+from Schemas.EventReport import EventReport
+from Schemas.ProfileReport import ProfileReport
+from Schemas.BacklogReport import BacklogReport
+from Schemas.ConfigUpdate import ConfigUpdate, ConfigAck
+from Schemas.HistoryReport import HistoryRequest, HistoryReport
+
+
+CODEC_CBOR  = "cbor"
+CODEC_FIXED = "fixed"
+
+
+def MessageSpecs():
+    """
+    :return: All message specifications known to the application.
+    """
+    return [MoistureSensorReport(), BatterySensorReport(), TemperatureSensorReport(),
+            RegistrationInfo(), EventReport(), ProfileReport(), BacklogReport(),
+            ConfigUpdate(), ConfigAck(), HistoryRequest(), HistoryReport()]
+
+
+def FixedLayoutParserCreate():
+    parser = FixedLayoutParser()
+    for msg_spec in MessageSpecs():
+        parser.Register(msg_spec)
+    return parser
+
+
+class PayloadDecoder:
+
+    def __init__(self, codec=CODEC_CBOR):
+        self.Codec = codec
+        self.Parser = FixedLayoutParserCreate() if codec == CODEC_FIXED else None
+
+    def Decode(self, payload):
+        """
+        :param payload: Uplink payload.
+        :return: Message with a metadata and data section. The records of a
+        BacklogReport are decoded into a list of messages, a sensor report
+        summary into a list of [minimum, maximum, count] and the entries of a
+        HistoryReport into a list of [time, minimum, maximum, mean, count].
+        :rtype: dict
+        """
+        msg = self._Decode(payload)
+        meta = msg[Metadata.MSG_SECTION_META]
+        data = msg[Metadata.MSG_SECTION_DATA]
+        if meta.get(Metadata.MSG_META_TYPE) == BacklogReport.TYPE_BACKLOG \
+                and BacklogReport.DATA_KEY_RECORDS in data:
+            data[BacklogReport.DATA_KEY_RECORDS] = \
+                [self.Decode(record) for record in Records(data[BacklogReport.DATA_KEY_RECORDS])]
+        if meta.get(Metadata.MSG_META_TYPE) == SensorReport.TYPE_REPORT \
+                and SensorReport.DATA_KEY_SUMMARY in data:
+            data[SensorReport.DATA_KEY_SUMMARY] = \
+                list(SensorReport.SummaryUnpack(data[SensorReport.DATA_KEY_SUMMARY]))
+        if meta.get(Metadata.MSG_META_TYPE) == HistoryRequest.TYPE_HISTORY \
+                and HistoryReport.DATA_KEY_ENTRIES in data:
+            data[HistoryReport.DATA_KEY_ENTRIES] = \
+                [list(entry) for entry in HistoryReport.EntriesUnpack(data[HistoryReport.DATA_KEY_ENTRIES])]
+        return msg
+
+    def _Decode(self, payload):
+        if self.Parser is not None:
+            return self.Parser.Decode(payload)
+        return Cbor.Decode(payload)
+
+
+def Records(data):
+    """
+    Split the records of a BacklogReport.
+    :return: List of encoded messages.
+    """
+    records = []
+    offset = 0
+    while offset < len(data):
+        length, offset = Varint.Decode(data, offset)
+        records.append(bytes(data[offset:offset + length]))
+        offset += length
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m host.PayloadDecoder")
+    parser.add_argument("--codec", choices=(CODEC_CBOR, CODEC_FIXED), default=CODEC_CBOR)
+    parser.add_argument("payloads", nargs="+", help="Hex encoded payloads.")
+    args = parser.parse_args(argv)
+
+    decoder = PayloadDecoder(args.codec)
+    for payload in args.payloads:
+        print(decoder.Decode(binascii.unhexlify(payload)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+Provisioning of a fleet of nodes from an inventory.
+
+The inventory is a CSV file or a JSON list of objects with a node per row:
+    name                    Node name, the name of its bundle.
+    network                 ttn or kpn.
+    activation              otaa or abp.
+    codec                   cbor or fixed, empty for cbor. The network server
+                            of a fixed node must decode the fixed layout.
+    dev_eui, app_eui        EUIs (hex).
+    app_key                 Application key (hex), OTAA.
+    dev_addr                Device address (hex), ABP.
+    nwk_skey, app_skey      Session keys (hex), ABP.
+    sf                      Spreading factor, empty for the default of the network.
+    lora                    Directory with a dumped session and fcnt file to
+                            pre-seed, relative to the inventory, see devices/*/lora/.
+    msgex_interval, sensor_read_interval, moist_read_interval
+                            Service intervals in seconds, empty for the defaults.
+
+For every node a Config/Node.py module is generated and a bundle of the
+application is built in <output directory>/<name>/ that mirrors the device
+file system. The application is cross-compiled once, the node modules of all
+nodes in parallel. The LoRa session of an ABP node, or a dumped session, is
+pre-seeded in the lora/ directory of the bundle, it is written by
+host.Deploy --bundle ... --wipe-state.
+
+Usage:
+    python -m host.Provision [--no-compile] [--jobs N] [--node <name> ...] <inventory> <output directory>
+    python -m host.Provision --module <name> <inventory>
+"""
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import shutil
+import struct
+import sys
+
+from host import Deploy
+
+
+NODE_SOURCE = "Config/Node.py"
+OUT_DIR = os.path.join(Deploy.BUILD_DIR, "nodes")
+
+# See MainApp.KPN/TTN, MainApp.ABP/OTAA and MainApp.CODEC_*.
+NETWORKS = {"kpn": 0, "ttn": 1}
+ACTIVATIONS = {"abp": 0, "otaa": 1}
+CODECS = {"cbor": 0, "fixed": 1}
+
+# Field -> size in bytes of the keys and EUIs.
+KEYS = {
+    "dev_eui": 8,
+    "app_eui": 8,
+    "app_key": 16,
+    "dev_addr": 4,
+    "nwk_skey": 16,
+    "app_skey": 16,
+}
+REQUIRED = {
+    "otaa": ("dev_eui", "app_eui", "app_key"),
+    "abp": ("dev_addr", "nwk_skey", "app_skey"),
+}
+
+# Field -> default service interval in seconds.
+INTERVALS = {
+    "msgex_interval": 100,
+    "sensor_read_interval": 50,
+    "moist_read_interval": 20,
+}
+
+# Session: device address, network session key, application session key,
+# frame counter: 8 bytes little endian, see MainApp.LoraState.
+SESSION_FILE = "session"
+FCNT_FILE = "fcnt"
+FCNT_FMT = "<Q"
+
+
+class InventoryError(Exception):
+    pass
+
+
+def Inventory(path):
+    """
+    :param path: CSV or JSON inventory.
+    :return: List of nodes, dictionaries of the validated fields. Keys and
+    EUIs are lists of byte values, missing optional fields None.
+    :rtype: list
+    """
+    with open(path, newline="") as f:
+        if path.endswith(".json"):
+            records = json.load(f)
+        else:
+            records = list(csv.DictReader(f))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    nodes = []
+    names = set()
+    for record in records:
+        node = _Node(record, directory)
+        if node["name"] in names:
+            raise InventoryError("{}: duplicate node".format(node["name"]))
+        names.add(node["name"])
+        nodes.append(node)
+    return nodes
+
+
+def _Node(record, directory):
+    record = {key: str(value).strip() for key, value in record.items() if value is not None}
+    name = record.get("name", "")
+    if name == "":
+        raise InventoryError("node without a name")
+
+    node = {"name": name}
+    for field, choices in (("network", NETWORKS), ("activation", ACTIVATIONS)):
+        value = record.get(field, "").lower()
+        if value not in choices:
+            raise InventoryError("{}: {} must be one of {}".format(name, field, ", ".join(choices)))
+        node[field] = value
+    node["codec"] = record.get("codec", "").lower() or "cbor"
+    if node["codec"] not in CODECS:
+        raise InventoryError("{}: codec must be one of {}".format(name, ", ".join(CODECS)))
+
+    for field, size in KEYS.items():
+        value = record.get(field, "")
+        if value == "":
+            node[field] = None
+            continue
+        try:
+            key = list(bytes.fromhex(value))
+        except ValueError:
+            key = []
+        if len(key) != size:
+            raise InventoryError("{}: {} must be {} hex bytes".format(name, field, size))
+        node[field] = key
+    for field in REQUIRED[node["activation"]]:
+        if node[field] is None:
+            raise InventoryError("{}: {} is required for {}".format(name, field, node["activation"]))
+
+    node["sf"] = int(record["sf"]) if record.get("sf", "") != "" else None
+    if node["sf"] is not None and not 7 <= node["sf"] <= 12:
+        raise InventoryError("{}: sf must be 7 to 12".format(name))
+    for field, default in INTERVALS.items():
+        node[field] = int(record[field]) if record.get(field, "") != "" else default
+    node["lora"] = os.path.join(directory, record["lora"]) if record.get("lora", "") != "" else None
+    return node
+
+
+def NodeModule(node):
+    """
+    :return: Source of the Config/Node.py module of the node.
+    :rtype: str
+    """
+    lines = [
+        "# Configuration of node {}, generated by host.Provision.".format(node["name"]),
+        "from micropython import const",
+        "",
+        "CFG_NODE_NAME               = \"{}\"".format(node["name"]),
+        "# Network, activation and message codec, see MainApp.KPN/TTN, MainApp.ABP/OTAA",
+        "# and MainApp.CODEC_*.",
+        "CFG_NODE_NETWORK            = const({})".format(NETWORKS[node["network"]]),
+        "CFG_NODE_REG                = const({})".format(ACTIVATIONS[node["activation"]]),
+        "CFG_NODE_CODEC              = const({})".format(CODECS[node["codec"]]),
+        "",
+        "# Spreading factor, None for the default of the network.",
+        "CFG_LORA_SF                 = {}".format(node["sf"]),
+        "CFG_LORA_DEV_EUI            = {}".format(_List(node["dev_eui"])),
+        "CFG_LORA_APP_EUI            = {}".format(_List(node["app_eui"])),
+        "CFG_LORA_APP_KEY            = {}".format(_List(node["app_key"])),
+        "# ABP session.",
+        "CFG_LORA_DEV_ADDR           = {}".format(_List(node["dev_addr"])),
+        "CFG_LORA_NWK_SKEY           = {}".format(_List(node["nwk_skey"])),
+        "CFG_LORA_APP_SKEY           = {}".format(_List(node["app_skey"])),
+        "",
+        "# Service intervals in seconds.",
+        "CFG_MSGEX_INTERVAL          = const({})".format(node["msgex_interval"]),
+        "CFG_SENSOR_READ_INTERVAL    = const({})".format(node["sensor_read_interval"]),
+        "CFG_MOIST_READ_INTERVAL     = const({})".format(node["moist_read_interval"]),
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def _List(key):
+    if key is None:
+        return "None"
+    return "[" + ", ".join("0x{:02X}".format(b) for b in key) + "]"
+
+
+def LoraFiles(node):
+    """
+    :return: Dictionary of file name -> contents of the files to pre-seed in
+    the lora/ directory: the dumped session of the node, or the session of
+    an ABP node with a frame counter of 0.
+    :rtype: dict
+    """
+    files = {}
+    if node["lora"] is not None:
+        for name in (SESSION_FILE, FCNT_FILE):
+            path = os.path.join(node["lora"], name)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    files[name] = f.read()
+    elif node["activation"] == "abp":
+        files[SESSION_FILE] = bytes(node["dev_addr"] + node["nwk_skey"] + node["app_skey"])
+        files[FCNT_FILE] = struct.pack(FCNT_FMT, 0)
+    return files
+
+
+def Provision(nodes, out_dir=OUT_DIR, mpy_cross=None, opt=1, march=None, jobs=None):
+    """
+    Build a bundle per node.
+    :param nodes: List of nodes, see Inventory.
+    :param out_dir: Directory of the bundles.
+    :param mpy_cross: Path of mpy-cross, None to bundle the sources.
+    :return: Dictionary of node name -> number of files in its bundle.
+    :rtype: dict
+    """
+    jobs = jobs or os.cpu_count() or 1
+    common = Deploy.Compiler(os.path.join(Deploy.BUILD_DIR, "mpy"), mpy_cross=mpy_cross,
+                             opt=opt, march=march, jobs=jobs)
+    files = common.Build([src for src in Deploy.Sources() if src != NODE_SOURCE])
+
+    def Bundle(node):
+        # The node module is built in a source tree of its own.
+        src_dir = os.path.join(Deploy.BUILD_DIR, "provision", node["name"])
+        path = os.path.join(src_dir, NODE_SOURCE)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(NodeModule(node))
+        compiler = Deploy.Compiler(os.path.join(src_dir, "mpy"), mpy_cross=mpy_cross,
+                                   opt=opt, march=march, jobs=1, src_dir=src_dir)
+        bundle_files = dict(files)
+        bundle_files.update(compiler.Build([NODE_SOURCE]))
+
+        bundle = os.path.join(out_dir, node["name"])
+        shutil.rmtree(bundle, ignore_errors=True)
+        for device_path, (local, digest) in bundle_files.items():
+            _Write(bundle, device_path, local)
+        lora = LoraFiles(node)
+        for name, data in lora.items():
+            target = os.path.join(bundle, "lora", name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(data)
+        return node["name"], len(bundle_files) + len(lora)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        return dict(pool.map(Bundle, nodes))
+
+
+def _Write(bundle, device_path, local):
+    target = os.path.join(bundle, device_path.lstrip("/"))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copyfile(local, target)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m host.Provision")
+    parser.add_argument("--mpy-cross", default=shutil.which("mpy-cross"),
+                        help="Path of mpy-cross, found on the PATH by default.")
+    parser.add_argument("--no-compile", action="store_true", help="Bundle the sources.")
+    parser.add_argument("--opt", type=int, default=1, help="mpy-cross optimization level.")
+    parser.add_argument("--march", help="mpy-cross architecture, e.g. xtensawin.")
+    parser.add_argument("--jobs", type=int, help="Parallel compilations.")
+    parser.add_argument("--node", action="append", help="Only provision the named node(s).")
+    parser.add_argument("--module", help="Print the Config/Node.py module of the named node.")
+    parser.add_argument("inventory")
+    parser.add_argument("out_dir", nargs="?", default=OUT_DIR)
+    args = parser.parse_args(argv)
+
+    try:
+        nodes = Inventory(args.inventory)
+    except (InventoryError, OSError, ValueError) as e:
+        print("Inventory error: {}".format(e), file=sys.stderr)
+        return 1
+
+    if args.module is not None:
+        args.node = [args.module]
+    if args.node is not None:
+        unknown = set(args.node) - set(node["name"] for node in nodes)
+        if len(unknown) > 0:
+            parser.error("unknown node(s): {}".format(", ".join(sorted(unknown))))
+        nodes = [node for node in nodes if node["name"] in args.node]
+    if args.module is not None:
+        sys.stdout.write(NodeModule(nodes[0]))
+        return 0
+
+    mpy_cross = None if args.no_compile else args.mpy_cross
+    if mpy_cross is None and not args.no_compile:
+        parser.error("mpy-cross not found, pass --mpy-cross or --no-compile")
+
+    try:
+        bundles = Provision(nodes, args.out_dir, mpy_cross=mpy_cross, opt=args.opt,
+                            march=args.march, jobs=args.jobs)
+    except Deploy.CompileError as e:
+        print("Compile error: {}".format(e), file=sys.stderr)
+        return 1
+
+    for name in sorted(bundles):
+        print("{} {} files".format(os.path.join(args.out_dir, name), bundles[name]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
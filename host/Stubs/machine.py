@@ -0,0 +1,236 @@
+# Host stand-in for the MicroPython 'machine' module.
+# Deep sleep and reset end the current wake cycle by raising a signal that the
+# host harness catches.
+import utime
+
+
+PWRON_RESET     = 1
+HARD_RESET      = 2
+WDT_RESET       = 3
+DEEPSLEEP_RESET = 4
+SOFT_RESET      = 5
+
+PIN_WAKE        = 2
+RTC_WAKE        = 3
+
+
+class DeepSleepSignal(Exception):
+
+    def __init__(self, msec):
+        super().__init__(msec)
+        self.Msec = msec
+
+
+class ResetSignal(Exception):
+    pass
+
+
+_ResetCause = PWRON_RESET
+_UniqueId = b"\x24\x0a\xc4\x00\x00\x01"
+
+
+def SetResetCause(cause):
+    global _ResetCause
+    _ResetCause = cause
+
+
+def SetUniqueId(uid):
+    global _UniqueId
+    _UniqueId = bytes(uid)
+
+
+def reset_cause():
+    return _ResetCause
+
+
+def wake_reason():
+    return RTC_WAKE if _ResetCause == DEEPSLEEP_RESET else 0
+
+
+def unique_id():
+    return _UniqueId
+
+
+def freq(hz=None):
+    return 240000000
+
+
+def idle():
+    return
+
+
+def deepsleep(msec=0):
+    raise DeepSleepSignal(msec)
+
+
+def lightsleep(msec=0):
+    utime.sleep_ms(msec)
+
+
+def reset():
+    raise ResetSignal()
+
+
+def soft_reset():
+    raise ResetSignal()
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    return
+
+
+class Pin:
+
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 2
+    PULL_DOWN = 1
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    # Pin number -> level, shared so tests can observe driven outputs.
+    Levels = {}
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.Id = id
+        if value is not None:
+            Pin.Levels[id] = value
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if value is not None:
+            Pin.Levels[self.Id] = value
+
+    def value(self, val=None):
+        if val is None:
+            return Pin.Levels.get(self.Id, 0)
+        Pin.Levels[self.Id] = 1 if val else 0
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, handler=None, trigger=0):
+        return
+
+
+class ADC:
+
+    ATTN_0DB = 0
+    ATTN_11DB = 3
+    WIDTH_12BIT = 3
+
+    # Pin number -> raw reading.
+    Readings = {}
+
+    def __init__(self, pin):
+        self.Id = pin.Id if isinstance(pin, Pin) else pin
+
+    def atten(self, attn):
+        return
+
+    def width(self, width):
+        return
+
+    def read(self):
+        return ADC.Readings.get(self.Id, 2048)
+
+    def read_u16(self):
+        return self.read() << 4
+
+
+class UART:
+
+    def __init__(self, id, baudrate=9600, **kwargs):
+        self.Id = id
+        self.Baudrate = baudrate
+        self.Tx = bytearray()
+        self.Rx = bytearray()
+
+    def init(self, baudrate=9600, **kwargs):
+        self.Baudrate = baudrate
+
+    def write(self, buf):
+        self.Tx.extend(buf)
+        return len(buf)
+
+    def any(self):
+        return len(self.Rx)
+
+    def read(self, nbytes=None):
+        if len(self.Rx) == 0:
+            return None
+        if nbytes is None:
+            nbytes = len(self.Rx)
+        data = bytes(self.Rx[:nbytes])
+        del self.Rx[:nbytes]
+        return data
+
+    def readinto(self, buf, nbytes=None):
+        data = self.read(len(buf) if nbytes is None else nbytes)
+        if data is None:
+            return None
+        buf[0:len(data)] = data
+        return len(data)
+
+
+class RTC:
+
+    # RTC slow memory survives deep sleep but not a power cycle.
+    Memory = b""
+
+    def __init__(self, id=0):
+        return
+
+    def memory(self, data=None):
+        if data is None:
+            return RTC.Memory
+        RTC.Memory = bytes(data)
+
+    def datetime(self, dt=None):
+        return utime.localtime()
+
+
+class WDT:
+
+    def __init__(self, id=0, timeout=5000):
+        return
+
+    def feed(self):
+        return
+
+
+class SPI:
+
+    def __init__(self, id, *args, **kwargs):
+        self.Id = id
+
+    def init(self, *args, **kwargs):
+        return
+
+    def write(self, buf):
+        return
+
+    def read(self, nbytes, write=0x00):
+        return bytes(nbytes)
+
+    def readinto(self, buf, write=0x00):
+        return
+
+    def write_readinto(self, write_buf, read_buf):
+        return
+
+
+class I2C:
+
+    def __init__(self, id, *args, **kwargs):
+        self.Id = id
+
+    def scan(self):
+        return []
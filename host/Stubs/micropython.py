@@ -0,0 +1,33 @@
+# Host stand-in for the MicroPython 'micropython' module.
+
+
+def const(value):
+    return value
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
+
+
+def opt_level(level=None):
+    return 0
+
+
+def alloc_emergency_exception_buf(size):
+    return
+
+
+def mem_info(verbose=None):
+    return
+
+
+def qstr_info(verbose=None):
+    return
+
+
+def schedule(func, arg):
+    func(arg)
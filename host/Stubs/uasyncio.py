@@ -0,0 +1,110 @@
+# Host stand-in for the MicroPython 'uasyncio' module.
+# A minimal event loop on the virtual clock of utime: when every task waits,
+# the clock is advanced to the first task that is due, like the device idles
+# until its next timer. Only the subset used by the application is provided.
+import heapq
+
+import utime
+
+
+class CancelledError(BaseException):
+    pass
+
+
+class _Sleep:
+
+    def __init__(self, msec):
+        self.Msec = msec
+
+    def __await__(self):
+        yield self
+
+
+def sleep_ms(msec):
+    return _Sleep(msec)
+
+
+def sleep(sec):
+    return _Sleep(sec * 1000)
+
+
+class Task:
+
+    def __init__(self, coro):
+        self.Coro = coro
+        self.Finished = False
+        self.Result = None
+        self.Error = None
+        self.Waiters = []
+
+    def done(self):
+        return self.Finished
+
+    def __await__(self):
+        if not self.Finished:
+            yield self
+        if self.Error is not None:
+            raise self.Error
+        return self.Result
+
+
+# Heap of (wake time in virtual microseconds, sequence number, task).
+_Queue = []
+_Seq = 0
+
+
+def _Schedule(task, wake_us):
+    global _Seq
+    _Seq += 1
+    heapq.heappush(_Queue, (wake_us, _Seq, task))
+
+
+def create_task(coro):
+    task = Task(coro)
+    _Schedule(task, utime.NowUs())
+    return task
+
+
+async def gather(*aws):
+    tasks = [aw if isinstance(aw, Task) else create_task(aw) for aw in aws]
+    results = []
+    for task in tasks:
+        results.append(await task)
+    return results
+
+
+def _Step(task):
+    try:
+        waits = task.Coro.send(None)
+    except StopIteration as stop:
+        task.Result = stop.value
+        task.Finished = True
+    except Exception as error:
+        task.Error = error
+        task.Finished = True
+    else:
+        if isinstance(waits, _Sleep):
+            _Schedule(task, utime.NowUs() + int(waits.Msec * 1000))
+        elif isinstance(waits, Task) and not waits.Finished:
+            waits.Waiters.append(task)
+        else:
+            _Schedule(task, utime.NowUs())
+        return
+
+    for waiter in task.Waiters:
+        _Schedule(waiter, utime.NowUs())
+    task.Waiters = []
+
+
+def run(coro):
+    _Queue.clear()
+    main = create_task(coro)
+    while len(_Queue) > 0:
+        wake_us, _, task = heapq.heappop(_Queue)
+        now = utime.NowUs()
+        if wake_us > now:
+            utime.sleep_us(wake_us - now)
+        _Step(task)
+    if main.Error is not None:
+        raise main.Error
+    return main.Result
@@ -0,0 +1,2 @@
+# Host stand-in for the MicroPython 'uerrno' module.
+from errno import *
@@ -0,0 +1,2 @@
+# Host stand-in for the MicroPython 'uhashlib' module.
+from hashlib import *
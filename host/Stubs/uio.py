@@ -0,0 +1,2 @@
+# Host stand-in for the MicroPython 'uio' module.
+from io import *
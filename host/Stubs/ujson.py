@@ -0,0 +1,2 @@
+# Host stand-in for the MicroPython 'ujson' module.
+from json import *
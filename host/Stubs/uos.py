@@ -0,0 +1,122 @@
+# Host stand-in for the MicroPython 'uos' module.
+# Device paths are mapped into a sandbox directory on the host and every file
+# system operation is counted, see Counters.
+import os as _os
+
+
+# Host directory that represents the device root file system.
+Root = None
+
+# Device top-level entries that are redirected into Root.
+Mounts = set()
+
+# Operation name -> count.
+Counters = {}
+
+# Direction ("read"/"written") -> number of bytes.
+Bytes = {}
+
+
+def Mount(root, entries):
+    global Root
+    Root = root
+    Mounts.clear()
+    for entry in entries:
+        Mounts.add(entry.strip("/").split("/")[0])
+
+
+def Map(path):
+    """
+    Map a device path to the host sandbox.
+    :param path: Device path.
+    :return: Host path, or the given path if it is not a device path.
+    """
+    if Root is None or not isinstance(path, str):
+        return path
+    if path.startswith("/"):
+        if path.strip("/").split("/")[0] in Mounts or path == "/":
+            return _os.path.join(Root, path.lstrip("/"))
+        return path
+    return path
+
+
+def Count(op, n=1):
+    Counters[op] = Counters.get(op, 0) + n
+
+
+def CountBytes(direction, n):
+    Bytes[direction] = Bytes.get(direction, 0) + n
+
+
+def CountersReset():
+    Counters.clear()
+    Bytes.clear()
+
+
+def mkdir(path):
+    Count("mkdir")
+    _os.mkdir(Map(path))
+
+
+def rmdir(path):
+    Count("rmdir")
+    _os.rmdir(Map(path))
+
+
+def remove(path):
+    Count("remove")
+    _os.remove(Map(path))
+
+
+unlink = remove
+
+
+def rename(old, new):
+    Count("rename")
+    _os.rename(Map(old), Map(new))
+
+
+def listdir(path="/"):
+    Count("listdir")
+    return sorted(_os.listdir(Map(path)))
+
+
+def ilistdir(path="/"):
+    Count("listdir")
+    for name in sorted(_os.listdir(Map(path))):
+        st = _os.stat(_os.path.join(Map(path), name))
+        kind = 0x4000 if _os.path.isdir(_os.path.join(Map(path), name)) else 0x8000
+        yield (name, kind, 0, st.st_size)
+
+
+def stat(path):
+    Count("stat")
+    st = _os.stat(Map(path))
+    return (st.st_mode, 0, 0, 0, 0, 0, st.st_size,
+            int(st.st_atime), int(st.st_mtime), int(st.st_ctime))
+
+
+def statvfs(path):
+    Count("statvfs")
+    # Report a 1.5 MB file system with 4 kB blocks, the ESP32 default layout.
+    return (4096, 4096, 384, 256, 256, 0, 0, 0, 0, 255)
+
+
+def getcwd():
+    return "/"
+
+
+def chdir(path):
+    return
+
+
+def sync():
+    Count("sync")
+
+
+def urandom(n):
+    return _os.urandom(n)
+
+
+def uname():
+    return ("esp32", "esp32", "1.13.0", "host", "ESP32 module (host) with ESP32")
@@ -0,0 +1,2 @@
+# Host stand-in for the MicroPython 'urandom' module.
+from random import *
@@ -0,0 +1,2 @@
+# Host stand-in for the MicroPython 'uselect' module.
+from select import *
@@ -0,0 +1,108 @@
+# Host stand-in for the MicroPython 'utime' module.
+# All time is virtual: sleeping advances the clock instantly, so wake cycles
+# can be replayed on the host at full speed.
+import time as _time
+
+
+class WakeBudgetExceeded(Exception):
+    pass
+
+
+# Virtual time in microseconds since the epoch.
+_NowUs = 0
+
+# Optional limit (in virtual microseconds) after which sleeping raises
+# WakeBudgetExceeded, guards against schedulers that never go to deep sleep.
+_LimitUs = None
+
+# Total virtual time spent in (light) sleep calls.
+SleptUs = 0
+
+
+def Set(sec):
+    global _NowUs
+    _NowUs = int(sec * 1000000)
+
+
+def Advance(us):
+    global _NowUs
+    _NowUs += int(us)
+    if _LimitUs is not None and _NowUs > _LimitUs:
+        raise WakeBudgetExceeded("Virtual wake time exceeded.")
+
+
+def LimitSet(sec):
+    global _LimitUs
+    if sec is None:
+        _LimitUs = None
+    else:
+        _LimitUs = _NowUs + int(sec * 1000000)
+
+
+def NowUs():
+    return _NowUs
+
+
+def _Slept(us):
+    global SleptUs
+    SleptUs += int(us)
+    Advance(us)
+
+
+def time():
+    return _NowUs // 1000000
+
+
+def time_ns():
+    return _NowUs * 1000
+
+
+def ticks_ms():
+    return (_NowUs // 1000) & 0x3FFFFFFF
+
+
+def ticks_us():
+    return _NowUs & 0x3FFFFFFF
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & 0x3FFFFFFF
+
+
+def ticks_diff(ticks1, ticks2):
+    diff = (ticks1 - ticks2) & 0x3FFFFFFF
+    if diff & 0x20000000:
+        diff -= 0x40000000
+    return diff
+
+
+def sleep(sec):
+    _Slept(sec * 1000000)
+
+
+def sleep_ms(msec):
+    _Slept(msec * 1000)
+
+
+def sleep_us(usec):
+    _Slept(usec)
+
+
+def localtime(secs=None):
+    if secs is None:
+        secs = time()
+    t = _time.gmtime(secs)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec,
+            t.tm_wday, t.tm_yday - 1)
+
+
+gmtime = localtime
+
+
+def mktime(tm):
+    import calendar
+    return calendar.timegm(tuple(tm[0:6]) + (0, 0, 0))
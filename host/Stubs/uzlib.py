@@ -0,0 +1,2 @@
+# Host stand-in for the MicroPython 'uzlib' module.
+from zlib import *
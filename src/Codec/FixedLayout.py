@@ -0,0 +1,227 @@
+from Codec import Varint
+from Schemas import Metadata
+
+from micropython import const
+import ustruct
+
+
+class FixedLayoutException(Exception):
+    pass
+
+
+class Layout:
+    """
+    Fixed byte layout of a message specification. The fields are the keys of
+    the specification's DataDef in ascending order, the encoding of each field
+    follows from the type of its default value. Fields that are missing from a
+    message are encoded with their default value.
+    """
+
+    KIND_INT    = const(0)
+    KIND_FLOAT  = const(1)
+    KIND_STR    = const(2)
+    KIND_BYTES  = const(3)
+    KIND_LIST   = const(4)
+
+    def __init__(self, msg_type, msg_subtype, data_def):
+        if msg_type > 0x0F or msg_subtype > 0x0F:
+            raise FixedLayoutException("Type/subtype does not fit in a nibble.")
+        self.Type = msg_type
+        self.Subtype = msg_subtype
+        self.Keys = tuple(sorted(data_def.keys()))
+        self.Fields = tuple((key, Layout.Kind(data_def[key]), data_def[key]) for key in self.Keys)
+        return
+
+    @staticmethod
+    def Kind(value):
+        if isinstance(value, bool) or isinstance(value, int):
+            return Layout.KIND_INT
+        if isinstance(value, float):
+            return Layout.KIND_FLOAT
+        if isinstance(value, str):
+            return Layout.KIND_STR
+        if isinstance(value, (bytes, bytearray)):
+            return Layout.KIND_BYTES
+        if isinstance(value, list):
+            return Layout.KIND_LIST
+        raise FixedLayoutException("Unsupported field type {}".format(type(value)))
+
+
+class FixedLayoutParser:
+    """
+    Compact binary message codec, alternative to the CborParser.
+
+    A message is encoded as:
+        byte     message version (MSG_META_VERSION), VERSION
+        byte     type << 4 | subtype
+        fields   in layout order, without keys:
+                 int    zigzag varint
+                 float  32-bit little endian
+                 str    varint length + UTF-8
+                 bytes  varint length + bytes
+                 list   varint count << 1 | scaled, first element as zigzag
+                        varint, then zigzag varint deltas. Lists containing
+                        floats are scaled by LIST_SCALE (scaled = 1).
+        extensions (optional, until the end of the message), for data keys
+                 that are not part of the layout:
+                 varint key << 1 | is_bytes, followed by a zigzag varint or
+                 a varint length + bytes.
+    """
+
+    # Message version of this layout, messages of another version are rejected.
+    VERSION     = const(1)
+    LIST_SCALE  = const(100)
+    BUF_SIZE    = const(256)
+
+    def __init__(self, buf_size=BUF_SIZE):
+        self.Layouts = {}
+        self.Buf = bytearray(buf_size)
+        return
+
+    def Register(self, msg_spec):
+        """
+        Compile the layout of a message specification.
+        :param msg_spec: Message specification
+        :type msg_spec: <MessageSpecification>
+        """
+        self.RegisterLayout(msg_spec.Type, msg_spec.Subtype, msg_spec.DataDef)
+
+    def RegisterLayout(self, msg_type, msg_subtype, data_def):
+        layout = Layout(msg_type, msg_subtype, data_def)
+        type_byte = (msg_type << 4) | msg_subtype
+        if type_byte in self.Layouts and self.Layouts[type_byte].Fields != layout.Fields:
+            raise FixedLayoutException("Conflicting layout for type {} subtype {}".format(
+                msg_type, msg_subtype))
+        self.Layouts[type_byte] = layout
+        return layout
+
+    def Encode(self, msg_dict):
+        """
+        Encode a message.
+        :param msg_dict: Message with a metadata and data section.
+        :return: Encoded message.
+        :rtype: bytes
+        """
+        meta = msg_dict[Metadata.MSG_SECTION_META]
+        data = msg_dict[Metadata.MSG_SECTION_DATA]
+        type_byte = (meta[Metadata.MSG_META_TYPE] << 4) | meta[Metadata.MSG_META_SUBTYPE]
+        try:
+            layout = self.Layouts[type_byte]
+        except KeyError:
+            raise FixedLayoutException("No layout for type byte {}".format(type_byte))
+
+        buf = self.Buf
+        try:
+            buf[0] = meta.get(Metadata.MSG_META_VERSION, self.VERSION)
+            buf[1] = type_byte
+            offset = 2
+            for key, kind, default in layout.Fields:
+                offset = self._EncodeField(kind, data.get(key, default), buf, offset)
+            for key in data:
+                if key not in layout.Keys:
+                    offset = self._EncodeExtension(key, data[key], buf, offset)
+        except IndexError:
+            raise FixedLayoutException("Message exceeds {} bytes".format(len(buf)))
+
+        return bytes(buf[0:offset])
+
+    def Decode(self, msg_bytes):
+        """
+        Decode a message.
+        :param msg_bytes: Encoded message.
+        :return: Message with a metadata and data section.
+        :rtype: dict
+        """
+        try:
+            layout = self.Layouts[msg_bytes[1]]
+        except (KeyError, IndexError):
+            raise FixedLayoutException("Unknown message")
+        if msg_bytes[0] != self.VERSION:
+            raise FixedLayoutException("Unsupported message version {}".format(msg_bytes[0]))
+
+        data = {}
+        offset = 2
+        try:
+            for key, kind, default in layout.Fields:
+                data[key], offset = self._DecodeField(kind, msg_bytes, offset)
+            while offset < len(msg_bytes):
+                tag, offset = Varint.Decode(msg_bytes, offset)
+                if tag & 1:
+                    data[tag >> 1], offset = self._DecodeField(Layout.KIND_BYTES, msg_bytes, offset)
+                else:
+                    data[tag >> 1], offset = Varint.DecodeSigned(msg_bytes, offset)
+        except IndexError:
+            # A varint runs past the end of the message.
+            raise FixedLayoutException("Truncated message")
+        except UnicodeError:
+            raise FixedLayoutException("Invalid string")
+
+        return {
+            Metadata.MSG_SECTION_META: {
+                Metadata.MSG_META_VERSION: msg_bytes[0],
+                Metadata.MSG_META_TYPE: layout.Type,
+                Metadata.MSG_META_SUBTYPE: layout.Subtype,
+            },
+            Metadata.MSG_SECTION_DATA: data,
+        }
+
+    def _EncodeField(self, kind, value, buf, offset):
+        if kind == Layout.KIND_INT:
+            return Varint.EncodeSignedInto(int(value), buf, offset)
+        if kind == Layout.KIND_FLOAT:
+            ustruct.pack_into("<f", buf, offset, value)
+            return offset + 4
+        if kind == Layout.KIND_STR:
+            value = value.encode()
+        if kind == Layout.KIND_STR or kind == Layout.KIND_BYTES:
+            offset = Varint.EncodeInto(len(value), buf, offset)
+            if offset + len(value) > len(buf):
+                raise IndexError
+            buf[offset:offset + len(value)] = value
+            return offset + len(value)
+
+        scaled = 0
+        for item in value:
+            if isinstance(item, float):
+                scaled = 1
+                break
+        offset = Varint.EncodeInto((len(value) << 1) | scaled, buf, offset)
+        prev = 0
+        for item in value:
+            item = int(round(item * self.LIST_SCALE)) if scaled else int(item)
+            offset = Varint.EncodeSignedInto(item - prev, buf, offset)
+            prev = item
+        return offset
+
+    def _EncodeExtension(self, key, value, buf, offset):
+        if isinstance(value, (bytes, bytearray)):
+            offset = Varint.EncodeInto((key << 1) | 1, buf, offset)
+            return self._EncodeField(Layout.KIND_BYTES, value, buf, offset)
+        offset = Varint.EncodeInto(key << 1, buf, offset)
+        return Varint.EncodeSignedInto(int(value), buf, offset)
+
+    def _DecodeField(self, kind, buf, offset):
+        if kind == Layout.KIND_INT:
+            return Varint.DecodeSigned(buf, offset)
+        if kind == Layout.KIND_FLOAT:
+            if offset + 4 > len(buf):
+                raise IndexError
+            return ustruct.unpack_from("<f", buf, offset)[0], offset + 4
+        if kind == Layout.KIND_STR or kind == Layout.KIND_BYTES:
+            length, offset = Varint.Decode(buf, offset)
+            if offset + length > len(buf):
+                raise IndexError
+            value = bytes(buf[offset:offset + length])
+            if kind == Layout.KIND_STR:
+                value = value.decode()
+            return value, offset + length
+
+        count, offset = Varint.Decode(buf, offset)
+        scaled = count & 1
+        items = []
+        prev = 0
+        for i in range(0, count >> 1):
+            delta, offset = Varint.DecodeSigned(buf, offset)
+            prev += delta
+            items.append(prev / self.LIST_SCALE if scaled else prev)
+        return items, offset
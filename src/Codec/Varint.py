@@ -0,0 +1,63 @@
+# Variable length integer encoding (LEB128) with zigzag mapping for signed
+# values. Small magnitudes take a single byte.
+
+
+def ZigZag(value):
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def UnZigZag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def Size(value):
+    """
+    Number of bytes an unsigned value occupies when encoded.
+    """
+    n = 1
+    while value > 0x7F:
+        value >>= 7
+        n += 1
+    return n
+
+
+def SizeSigned(value):
+    return Size(ZigZag(value))
+
+
+def EncodeInto(value, buf, offset):
+    """
+    Encode an unsigned value into buf at offset.
+    :return: Offset after the encoded value.
+    """
+    while value > 0x7F:
+        buf[offset] = (value & 0x7F) | 0x80
+        value >>= 7
+        offset += 1
+    buf[offset] = value
+    return offset + 1
+
+
+def EncodeSignedInto(value, buf, offset):
+    return EncodeInto(ZigZag(value), buf, offset)
+
+
+def Decode(buf, offset):
+    """
+    Decode an unsigned value from buf at offset.
+    :return: Tuple of (value, offset after the value).
+    """
+    value = 0
+    shift = 0
+    while True:
+        b = buf[offset]
+        offset += 1
+        value |= (b & 0x7F) << shift
+        if b & 0x80 == 0:
+            return value, offset
+        shift += 7
+
+
+def DecodeSigned(buf, offset):
+    value, offset = Decode(buf, offset)
+    return UnZigZag(value), offset
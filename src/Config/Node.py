@@ -0,0 +1,24 @@
+# Configuration of node ttn_otaa_03, generated by host.Provision.
+from micropython import const
+
+CFG_NODE_NAME               = "ttn_otaa_03"
+# Network, activation and message codec, see MainApp.KPN/TTN, MainApp.ABP/OTAA
+# and MainApp.CODEC_*.
+CFG_NODE_NETWORK            = const(1)
+CFG_NODE_REG                = const(1)
+CFG_NODE_CODEC              = const(0)
+
+# Spreading factor, None for the default of the network.
+CFG_LORA_SF                 = None
+CFG_LORA_DEV_EUI            = [0x00, 0x68, 0xE0, 0x3A, 0xB9, 0xF3, 0x5E, 0x7C]
+CFG_LORA_APP_EUI            = [0x70, 0xB3, 0xD5, 0x7E, 0xD0, 0x03, 0x2C, 0xDC]
+CFG_LORA_APP_KEY            = [0x37, 0xA2, 0x75, 0x26, 0x3C, 0xE8, 0xD6, 0x47, 0x2F, 0x3E, 0xCF, 0xF2, 0x08, 0x47, 0x27, 0x34]
+# ABP session.
+CFG_LORA_DEV_ADDR           = None
+CFG_LORA_NWK_SKEY           = None
+CFG_LORA_APP_SKEY           = None
+
+# Service intervals in seconds.
+CFG_MSGEX_INTERVAL          = const(100)
+CFG_SENSOR_READ_INTERVAL    = const(50)
+CFG_MOIST_READ_INTERVAL     = const(20)
@@ -0,0 +1,99 @@
+from upyiot.middleware.SubjectObserver.SubjectObserver import Observer
+
+from MainApp.RtcMemory import RtcMemory
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+from micropython import const
+import ustruct
+
+
+class AdaptiveInterval(Observer):
+    """
+    Sensor sample observer that adapts the read interval of its sensor to the
+    variation of the samples. The variance of the change between two
+    consecutive samples is tracked as an exponentially weighted moving
+    average. While its square root stays below half the resolution, the
+    interval is doubled. When it exceeds twice the resolution, the interval is
+    cut to a quarter, so a rapid change is followed closely. The interval is
+    kept between the given bounds.
+
+    The state is kept in RTC memory. When it is lost, the interval restarts at
+    the minimum.
+    """
+
+    # Weight of a new squared change: 1 / (1 << VAR_SHIFT).
+    VAR_SHIFT   = const(2)
+    # Fraction bits of the variance.
+    VAR_FRAC    = const(4)
+    # Factors by which the interval is stretched and shortened.
+    STRETCH     = const(2)
+    SHORTEN     = const(4)
+
+    # Magic, last sample, variance, interval.
+    RTC_FMT     = "<HiII"
+    RTC_MAGIC   = const(0x4149)
+
+    def __init__(self, region, interval_min, interval_max, resolution, interval_set):
+        """
+        :param region: RtcMemory region of the state.
+        :param interval_min: Minimum read interval in seconds.
+        :param interval_max: Maximum read interval in seconds.
+        :param resolution: Change per read that is considered significant.
+        :param interval_set: Callable that applies a new interval to the sensor
+        service.
+        """
+        self.Region = region
+        self.IntervalMin = interval_min
+        self.IntervalMax = interval_max
+        # Thresholds on the variance: (resolution / 2)^2 and (2 * resolution)^2.
+        self.VarLow = (resolution * resolution << self.VAR_FRAC) // 4
+        self.VarHigh = (resolution * resolution << self.VAR_FRAC) * 4
+        self.IntervalSet = interval_set
+        self.Rtc = RtcMemory()
+        self.Value = None
+        self.Var = 0
+        self.Interval = interval_min
+        # Interval that has been applied to the service during this wake.
+        self.Applied = None
+        self.Log = LogRing.Create()
+        self._Load()
+        return
+
+    def Update(self, sample):
+        """
+        New sample observer callback.
+        :param sample: Sensor sample.
+        """
+        value = int(round(sample))
+        if self.Value is not None:
+            delta = value - self.Value
+            self.Var += ((delta * delta << self.VAR_FRAC) - self.Var) >> self.VAR_SHIFT
+
+            interval = self.Interval
+            if self.Var > self.VarHigh:
+                interval = max(interval // self.SHORTEN, self.IntervalMin)
+            elif self.Var < self.VarLow:
+                interval = min(interval * self.STRETCH, self.IntervalMax)
+            if interval != self.Interval:
+                self.Log.debug(LogFormats.ADAPT_INTERVAL, self.Interval, interval)
+                self.Interval = interval
+
+        if self.Interval != self.Applied:
+            self.IntervalSet(self.Interval)
+            self.Applied = self.Interval
+
+        self.Value = value
+        self.Rtc.Write(self.Region, ustruct.pack(self.RTC_FMT, self.RTC_MAGIC, self.Value,
+                                                 self.Var, self.Interval))
+
+    def _Load(self):
+        data = self.Rtc.Read(self.Region)
+        if data is None:
+            return
+        magic, value, var, interval = ustruct.unpack_from(self.RTC_FMT, data, 0)
+        if magic != self.RTC_MAGIC or not self.IntervalMin <= interval <= self.IntervalMax:
+            return
+        self.Value = value
+        self.Var = var
+        self.Interval = interval
@@ -0,0 +1,158 @@
+from micropython import const
+import ustruct
+import utime
+
+
+# LoRaWAN frame overhead: MHDR (1), FHDR without options (7), FPort (1), MIC (4).
+LORAWAN_OVERHEAD    = const(13)
+
+# Maximum application payload per spreading factor (EU868, 125 kHz).
+PAYLOAD_MAX = {7: 222, 8: 222, 9: 115, 10: 51, 11: 51, 12: 51}
+
+# Lowest SNR (dB) at which a frame can be demodulated per spreading factor.
+SNR_FLOOR = {7: -7.5, 8: -10.0, 9: -12.5, 10: -15.0, 11: -17.5, 12: -20.0}
+
+
+def TimeOnAir(payload_len, sf, ldro=0, bw_khz=125, cr=1, preamble=8,
+              explicit_header=True, crc=True, lorawan=True):
+    """
+    Calculate the time on air of a LoRa frame (Semtech AN1200.13).
+    :param payload_len: Application payload length in bytes.
+    :param sf: Spreading factor (7..12).
+    :param ldro: Low data rate optimization enabled (1) or disabled (0).
+    :param bw_khz: Bandwidth in kHz.
+    :param cr: Coding rate 1..4 (4/5..4/8).
+    :param preamble: Number of preamble symbols.
+    :param lorawan: Add the LoRaWAN frame overhead to the payload length.
+    :return: Time on air in milliseconds.
+    :rtype: float
+    """
+    if lorawan is True:
+        payload_len += LORAWAN_OVERHEAD
+    t_sym = (1 << sf) / bw_khz
+    t_preamble = (preamble + 4.25) * t_sym
+    num = 8 * payload_len - 4 * sf + 28 + (16 if crc else 0) - (0 if explicit_header else 20)
+    den = 4 * (sf - 2 * (1 if ldro else 0))
+    n_payload = 8 + max(((num + den - 1) // den) * (cr + 4), 0)
+    return t_preamble + n_payload * t_sym
+
+
+def DutyCycleLimit(freq_mhz):
+    """
+    ETSI EN 300 220 duty cycle limit of the EU868 sub-band that contains the
+    given frequency.
+    :return: Duty cycle as a fraction.
+    """
+    if 868.0 <= freq_mhz <= 868.6:
+        return 0.01
+    if 868.7 <= freq_mhz <= 869.2:
+        return 0.001
+    if 869.4 <= freq_mhz <= 869.65:
+        return 0.1
+    if 869.7 <= freq_mhz <= 870.0:
+        return 0.01
+    if 863.0 <= freq_mhz < 865.0:
+        return 0.001
+    return 0.01
+
+
+class DutyCycle:
+    """
+    Sliding window duty cycle budget. The window is divided in a fixed number
+    of buckets that hold the time on air spent in their time span, so the
+    state has a constant size regardless of the number of transmissions.
+    """
+
+    WINDOW_SEC  = const(3600)
+    BUCKETS     = const(12)
+
+    FILE_NAME   = "duty"
+    # Start of the current bucket followed by the airtime (ms) per bucket.
+    STATE_FMT   = "<I" + "I" * BUCKETS
+
+    def __init__(self, directory, limit):
+        """
+        :param directory: Directory of the state file.
+        :param limit: Duty cycle limit as a fraction, e.g. 0.01.
+        """
+        self.Path = directory + "/" + self.FILE_NAME
+        self.BudgetMs = int(self.WINDOW_SEC * 1000 * limit)
+        self.BucketSec = self.WINDOW_SEC // self.BUCKETS
+        self.Buckets = [0] * self.BUCKETS
+        self.Index = 0
+        # Start of the current bucket, None until the first use.
+        self.Start = None
+        self._Load()
+        return
+
+    def Record(self, airtime_ms):
+        self._Advance(utime.time())
+        self.Buckets[self.Index] += int(airtime_ms + 0.5)
+
+    def Used(self):
+        """
+        :return: Airtime (ms) used in the current window.
+        """
+        self._Advance(utime.time())
+        return sum(self.Buckets)
+
+    def Remaining(self):
+        """
+        :return: Airtime (ms) that can be spent in the current window.
+        """
+        return max(self.BudgetMs - self.Used(), 0)
+
+    def WaitTime(self, airtime_ms):
+        """
+        :return: Seconds until airtime_ms fits in the budget.
+        """
+        now = utime.time()
+        self._Advance(now)
+        excess = sum(self.Buckets) + airtime_ms - self.BudgetMs
+        if excess <= 0:
+            return 0
+
+        # Walk from the oldest bucket until enough airtime expires.
+        wait = self.Start + self.BucketSec - now
+        for i in range(1, self.BUCKETS + 1):
+            excess -= self.Buckets[(self.Index + i) % self.BUCKETS]
+            if excess <= 0:
+                return wait
+            wait += self.BucketSec
+        return self.WINDOW_SEC
+
+    def Save(self):
+        if self.Start is None:
+            return
+        with open(self.Path, "wb") as f:
+            f.write(ustruct.pack(self.STATE_FMT, self.Start,
+                                 *[self.Buckets[(self.Index + 1 + i) % self.BUCKETS]
+                                   for i in range(0, self.BUCKETS)]))
+
+    def _Load(self):
+        try:
+            with open(self.Path, "rb") as f:
+                state = ustruct.unpack(self.STATE_FMT, f.read())
+        except (OSError, ValueError):
+            return
+        self.Start = state[0]
+        # Buckets are stored oldest first, the newest bucket is the current one.
+        self.Buckets = list(state[1:])
+        self.Index = self.BUCKETS - 1
+
+    def _Advance(self, now):
+        if self.Start is None or now < self.Start:
+            # First use, or the clock went back (e.g. the RTC was reset) and
+            # the airtime of the buckets can no longer be placed in time.
+            self.Buckets = [0] * self.BUCKETS
+            self.Index = 0
+            self.Start = now - now % self.BucketSec
+            return
+
+        elapsed = (now - self.Start) // self.BucketSec
+        if elapsed <= 0:
+            return
+        for i in range(0, min(elapsed, self.BUCKETS)):
+            self.Index = (self.Index + 1) % self.BUCKETS
+            self.Buckets[self.Index] = 0
+        self.Start += elapsed * self.BucketSec
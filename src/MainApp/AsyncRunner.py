@@ -0,0 +1,101 @@
+from upyiot.system.Service.Service import Service
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+from micropython import const
+import uasyncio
+import utime
+
+
+class AsyncRunner(Service):
+    """
+    Periodic service that runs its member services as cooperative uasyncio
+    tasks. A member that implements the coroutine SvcRunAsync() yields while
+    it waits, e.g. for a sensor supply to settle (see SamplingGroup), so the
+    wait overlaps with the blocking LoRa join, transmission and receive
+    windows of the Message Exchange. Other members run as is. Cooperative
+    members are started first, so their waits have begun before a blocking
+    member runs.
+
+    Members that are due within the margin are run together. The runner
+    reschedules itself to the first member that is due next, so the deep
+    sleep decision is left to the scheduler. The members are not registered
+    to the scheduler themselves.
+    """
+
+    ASYNC_RUNNER_SERVICE_MODE = Service.MODE_RUN_PERIODIC
+
+    # Minimum interval between two runs in seconds.
+    INTERVAL_MIN = const(1)
+
+    def __init__(self, name, margin):
+        """
+        :param name: Name of the runner service.
+        :param margin: Members that are due within this number of seconds are
+        run early, together with the members that are due.
+        """
+        super().__init__(name, self.ASYNC_RUNNER_SERVICE_MODE, {})
+        self.Margin = margin
+        # List of (service, due), due is a callable that returns the time at
+        # which the service is next due.
+        self.Members = []
+        self.Log = LogRing.Create()
+        return
+
+    def MemberAdd(self, svc, due):
+        """
+        :param svc: Periodic service.
+        :param due: Callable that returns the time (sec) at which the service
+        is next due, or None if it is not scheduled.
+        """
+        self.Members.append((svc, due))
+
+    def SvcInit(self):
+        for svc, due in self.Members:
+            svc.SvcInit()
+
+    def SvcRun(self):
+        now = utime.time()
+        tasks = []
+        for svc, due in self.Members:
+            time = due()
+            if time is None or time > now + self.Margin:
+                continue
+            if hasattr(svc, "SvcRunAsync"):
+                tasks.insert(0, self._Run(svc, now))
+            else:
+                tasks.append(self._Run(svc, now))
+
+        if len(tasks) > 0:
+            self.Log.debug(LogFormats.ASYNC_RUN, len(tasks))
+            uasyncio.run(self._RunAll(tasks))
+
+        self.Reschedule(now)
+
+    def Reschedule(self, now):
+        """
+        Set the runner interval so the next run is at the time the first member
+        is due.
+        :param now: Time of the current run in seconds.
+        """
+        next_due = None
+        for svc, due in self.Members:
+            time = due()
+            if time is not None:
+                next_due = time if next_due is None else min(next_due, time)
+        if next_due is None:
+            return
+        self.SvcLastRun = now
+        self.SvcIntervalSet(max(next_due - now, self.INTERVAL_MIN))
+
+    @staticmethod
+    async def _RunAll(tasks):
+        await uasyncio.gather(*tasks)
+
+    @staticmethod
+    async def _Run(svc, now):
+        if hasattr(svc, "SvcRunAsync"):
+            await svc.SvcRunAsync()
+        else:
+            svc.SvcRun()
+        svc.SvcLastRun = now
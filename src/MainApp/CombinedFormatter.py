@@ -0,0 +1,162 @@
+from upyiot.middleware.SubjectObserver.SubjectObserver import Observer
+
+from Schemas import Metadata
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+from micropython import const
+import ujson
+import utime
+import uos
+
+
+class CombinedSectionObserver(Observer):
+
+    def __init__(self, formatter, data_key):
+        self.Formatter = formatter
+        self.Key = data_key
+        return
+
+    def Update(self, sample):
+        self.Formatter.SampleAdd(self.Key, sample)
+
+
+class CombinedFormatter:
+    """
+    Collects the samples of multiple sensors into one message of a combined
+    report specification, with one shared metadata block.
+
+    The message is put in the Message Exchange queue as soon as every section
+    that has an observer holds a fresh sample, or when the deadline since the
+    first pending sample has passed. Pending samples are kept in a file across
+    deep sleep. Spare bytes of the report are offered to the piggyback riders.
+    """
+
+    # Maximum number of pending samples per section.
+    SECTION_SAMPLES_MAX = const(8)
+
+    # Upper bound of the encoded size of a sample and of a section's key and header.
+    SAMPLE_SIZE_MAX     = const(5)
+    SECTION_OVERHEAD    = const(3)
+
+    def __init__(self, msg_ex_obj, msg_spec, directory, deadline, payload_max, piggyback=None):
+        """
+        :param msg_ex_obj: MessageExchange object
+        :type msg_ex_obj: <MessageExchange>
+        :param msg_spec: Combined report specification
+        :type msg_spec: <<MessageSpecification>CombinedSensorReport>
+        :param directory: Directory of the state file.
+        :param deadline: Seconds after the first pending sample at which the
+        report is sent, even if not all sections are fresh.
+        :param payload_max: Maximum size of the data section in bytes.
+        :param piggyback: Piggyback object, optional.
+        """
+        self.MsgEx = msg_ex_obj
+        self.Spec = msg_spec
+        self.Path = directory + "/combined"
+        self.Deadline = deadline
+        self.PayloadMax = payload_max
+        self.Piggyback = piggyback
+        self.Meta = {
+            Metadata.MSG_META_TYPE: msg_spec.Type,
+            Metadata.MSG_META_SUBTYPE: msg_spec.Subtype,
+        }
+        self.Sections = {}
+        self.Restored = {}
+        self.First = 0
+        self.Log = LogRing.Create()
+        self._Load()
+        return
+
+    def CreateObserver(self, data_key):
+        """
+        Create an observer for one section of the report. The report waits for
+        a fresh sample of every section that has an observer.
+        :param data_key: Data key of the section.
+        :return: Observer
+        """
+        if data_key not in self.Spec.DataDef:
+            raise KeyError(data_key)
+        if data_key not in self.Sections:
+            self.Sections[data_key] = self.Restored.pop(data_key, [])
+        return CombinedSectionObserver(self, data_key)
+
+    def SampleAdd(self, data_key, sample):
+        now = utime.time()
+        samples = self.Sections[data_key]
+        if len(samples) >= self.SECTION_SAMPLES_MAX:
+            samples.pop(0)
+        samples.append(sample)
+        if self.First == 0:
+            self.First = now
+
+        if self.IsComplete() or self._DeadlinePassed(now):
+            self.Flush()
+
+    def IsComplete(self):
+        for samples in self.Sections.values():
+            if len(samples) == 0:
+                return False
+        return True
+
+    def IsPending(self):
+        return self.First != 0
+
+    def Flush(self):
+        """
+        Put the pending samples in the Message Exchange queue as one message.
+        """
+        if self.IsPending() is False:
+            return
+
+        msg = {}
+        size = 0
+        for key in self.Spec.DataDef:
+            msg[key] = self.Sections.get(key, [])
+            size += self.SECTION_OVERHEAD + len(msg[key]) * self.SAMPLE_SIZE_MAX
+        if self.Piggyback is not None:
+            self.Piggyback.Fill(msg, self.PayloadMax - size)
+        self.Log.debug(LogFormats.COMBINED_FLUSH, size)
+        self.MsgEx.MessagePut(msg_data_dict=msg,
+                              msg_type=self.Spec.Type,
+                              msg_subtype=self.Spec.Subtype,
+                              msg_meta_dict=self.Meta)
+        if self.Piggyback is not None:
+            self.Piggyback.Queued(self.MsgEx.PutSeq)
+
+        for key in self.Sections:
+            self.Sections[key] = []
+        self.First = 0
+        try:
+            uos.remove(self.Path)
+        except OSError:
+            pass
+
+    def Suspend(self):
+        """
+        Called before deep sleep. Sends the report if the deadline has passed,
+        otherwise the pending samples are stored.
+        """
+        if self.IsPending() is False:
+            return
+
+        if self._DeadlinePassed(utime.time()):
+            self.Flush()
+            return
+
+        with open(self.Path, "w") as f:
+            f.write(ujson.dumps([self.First, [[k, v] for k, v in self.Sections.items()]]))
+
+    def _DeadlinePassed(self, now):
+        return self.First != 0 and now - self.First >= self.Deadline
+
+    def _Load(self):
+        try:
+            with open(self.Path) as f:
+                first, sections = ujson.loads(f.read())
+        except (OSError, ValueError):
+            return
+
+        self.First = first
+        for key, samples in sections:
+            self.Restored[key] = samples
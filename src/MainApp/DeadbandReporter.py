@@ -0,0 +1,156 @@
+from upyiot.middleware.SubjectObserver.SubjectObserver import Observer
+
+from Schemas.SensorReport import SensorReport
+from Schemas import Metadata
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+import ustruct
+import utime
+
+
+class DeadbandReporter(Observer):
+    """
+    Sensor sample observer that reports a sample only when it moved
+    meaningfully since the last reported sample or when a heartbeat is due,
+    instead of on every change.
+
+    A sample is reported when:
+     - it differs at least the deadband from the last reported sample, and the
+       minimum report interval has passed. A change in the opposite direction
+       of the last reported change must exceed the deadband plus the
+       hysteresis, so a value that jitters around a threshold is reported once.
+     - the maximum report interval has passed (heartbeat).
+    The minimum, maximum and count of the samples that were not reported are
+    added to the next report (SensorReport.DATA_KEY_SUMMARY). The state is
+    kept in a file across deep sleep. A sample that is older than the last
+    report (the clock went back) is reported and starts over.
+    """
+
+    # Time of the last report, last reported value, direction of the last
+    # reported change, summary minimum, maximum and count.
+    STATE_FMT       = "<IibiiH"
+
+    def __init__(self, msg_ex_obj, msg_spec, name, directory, deadband, hysteresis,
+                 interval_min, interval_max):
+        """
+        :param msg_ex_obj: MessageExchange object
+        :type msg_ex_obj: <MessageExchange>
+        :param msg_spec: Sensor report specification
+        :type msg_spec: <<MessageSpecification>SensorReport>
+        :param name: Reporter name, used for the state file.
+        :param directory: Directory of the state file.
+        :param deadband: Minimum change of a reported sample.
+        :param hysteresis: Additional change required when the direction reverses.
+        :param interval_min: Minimum time between two reports in seconds.
+        :param interval_max: Maximum time between two reports in seconds.
+        """
+        self.MsgEx = msg_ex_obj
+        self.Spec = msg_spec
+        self.Path = directory + "/" + name + ".db"
+        self.Deadband = deadband
+        self.Hysteresis = hysteresis
+        self.IntervalMin = interval_min
+        self.IntervalMax = interval_max
+        self.Meta = {
+            Metadata.MSG_META_TYPE: msg_spec.Type,
+            Metadata.MSG_META_SUBTYPE: msg_spec.Subtype,
+        }
+        # The report is reused for every sample.
+        self.Samples = [0]
+        self.Msg = {SensorReport.DATA_KEY_MEASUREMENTS: self.Samples}
+        self.Log = LogRing.Create()
+        self.Time = 0
+        self.Value = 0
+        self.Direction = 0
+        self.Changed = False
+        self._SummaryClear()
+        self._Load()
+        return
+
+    def Update(self, sample):
+        """
+        New sample observer callback.
+        :param sample: Sensor sample.
+        """
+        now = utime.time()
+        value = int(round(sample))
+        self.Changed = True
+
+        if now < self.Time:
+            # The clock went back (e.g. a reset that lost the time), the state
+            # is of another time base: start over with a report.
+            self.Time = 0
+            self.Direction = 0
+
+        if self.Time == 0 or self._IsDue(value, now) is True:
+            self._Report(value, now)
+            return
+
+        self.Min = min(self.Min, value)
+        self.Max = max(self.Max, value)
+        # The count is stored as uint16.
+        self.Count = min(self.Count + 1, 0xFFFF)
+
+    def Suspend(self):
+        """
+        Called before deep sleep, stores the state if it changed.
+        """
+        if self.Changed is False:
+            return
+
+        with open(self.Path, "wb") as f:
+            f.write(ustruct.pack(self.STATE_FMT, self.Time, self.Value, self.Direction,
+                                 self.Min, self.Max, self.Count))
+        self.Changed = False
+
+    def _IsDue(self, value, now):
+        elapsed = now - self.Time
+        if elapsed >= self.IntervalMax:
+            return True
+        if elapsed < self.IntervalMin:
+            return False
+
+        delta = value - self.Value
+        threshold = self.Deadband
+        if delta * self.Direction < 0:
+            threshold += self.Hysteresis
+        return abs(delta) >= threshold
+
+    def _Report(self, value, now):
+        msg = self.Msg
+        self.Samples[0] = value
+        if self.Count > 0:
+            msg[SensorReport.DATA_KEY_SUMMARY] = SensorReport.SummaryPack(self.Min, self.Max,
+                                                                          self.Count)
+            self.Log.debug(LogFormats.DBAND_REPORT, value, self.Count)
+        elif SensorReport.DATA_KEY_SUMMARY in msg:
+            del msg[SensorReport.DATA_KEY_SUMMARY]
+        self.MsgEx.MessagePut(msg_data_dict=msg,
+                              msg_type=self.Spec.Type,
+                              msg_subtype=self.Spec.Subtype,
+                              msg_meta_dict=self.Meta)
+
+        if self.Time > 0 and value != self.Value:
+            self.Direction = 1 if value > self.Value else -1
+        self.Value = value
+        self.Time = now
+        self._SummaryClear()
+
+    def _SummaryClear(self):
+        self.Count = 0
+        # The first suppressed sample sets the minimum and maximum.
+        self.Min = 0x7FFFFFFF
+        self.Max = -0x80000000
+
+    def _Load(self):
+        try:
+            with open(self.Path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+
+        if len(data) != ustruct.calcsize(self.STATE_FMT):
+            return
+        state = ustruct.unpack(self.STATE_FMT, data)
+        self.Time, self.Value, self.Direction, self.Min, self.Max, self.Count = state
@@ -0,0 +1,288 @@
+from Schemas.EventReport import EventReport
+from Schemas import Metadata
+from MainApp.RtcMemory import RtcMemory
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+from micropython import const
+import ustruct
+import utime
+
+
+class EventLog:
+    """
+    Buffer of diagnostic events (see EventReport). An event with the same code
+    and argument as a buffered event only increments the count of that event,
+    so a repeated failure takes a single slot. When the buffer is full the
+    last slot counts the events that did not fit. While that slot is on its
+    way as well, further events are dropped.
+
+    The buffered events ride along in the spare bytes of the next sensor
+    report, see Piggyback. A critical event is sent right away in an
+    EventReport of its own, at most once per hold-off time, and so are events
+    that have not found a ride within the maximum age. An event is removed
+    once the uplink that carries it has been sent, until then it takes its
+    slot and repeats of it are counted in a new one.
+
+    The buffer is kept in RTC memory, so it survives deep sleep and a crash,
+    but not a power cycle.
+    """
+
+    SLOTS           = const(8)
+    AGE_MAX_SEC     = const(21600)
+    HOLDOFF_SEC     = const(3600)
+
+    CRITICAL = (EventReport.EVENT_SLEEP_FAILED, EventReport.EVENT_SENSOR_FAULT)
+
+    # Magic, time of the last critical report, flags, event count.
+    RTC_FMT         = "<HIBB"
+    RTC_HDR_SIZE    = const(8)
+    RTC_MAGIC       = const(0x4557)
+    # A critical event waits for the hold-off time to pass.
+    FLAG_CRITICAL   = const(0x01)
+    # Code, argument, count, time of the first occurrence, sequence number of
+    # the queued record that carries the event (0 if none).
+    EVENT_FMT       = "<BHHII"
+    EVENT_SIZE      = const(13)
+
+    def __init__(self, age_max=AGE_MAX_SEC, holdoff=HOLDOFF_SEC):
+        """
+        :param age_max: Maximum time in seconds an event waits for a ride.
+        :param holdoff: Minimum time in seconds between two reports of
+        critical events.
+        """
+        self.AgeMax = age_max
+        self.Holdoff = holdoff
+        self.Rtc = RtcMemory()
+        # List of [code, argument, count, time of the first occurrence,
+        # sequence number of the record that carries the event].
+        self.Events = []
+        # Events of the last take, see RiderQueued.
+        self.Taken = []
+        self.CriticalTime = 0
+        self.Critical = False
+        self.MsgEx = None
+        self.PayloadMax = 0
+        self.Buf = None
+        self.Log = LogRing.Create()
+        self._Load()
+        return
+
+    def MsgExSet(self, msg_ex, payload_max):
+        """
+        :param msg_ex: QueuedMessageExchange of the event reports.
+        :param payload_max: Maximum size of the packed events of a report in bytes.
+        """
+        self.MsgEx = msg_ex
+        self.PayloadMax = payload_max
+        msg_ex.DeliveryObserverAdd(self.Delivered)
+        self._CriticalPut(utime.time())
+
+    def Raise(self, code, arg=0):
+        """
+        :param code: Event code, see EventReport.EVENT_*.
+        :param arg: Argument, 0 to 65535.
+        """
+        arg &= 0xFFFF
+        now = utime.time()
+        critical = code in self.CRITICAL
+        event = self._Find(code, arg)
+        if event is None and len(self.Events) >= self.SLOTS - 1:
+            # The last slot counts the events that did not fit.
+            code = EventReport.EVENT_OVERFLOW
+            arg = 0
+            event = self._Find(code, arg)
+        if event is None and len(self.Events) >= self.SLOTS:
+            # The overflow slot is on its way as well.
+            self.Log.warning(LogFormats.EVENT_DROPPED, code, arg)
+            return
+        if event is None:
+            event = [code, arg, 0, now, 0]
+            self.Events.append(event)
+        event[2] = min(event[2] + 1, 0xFFFF)
+
+        self.Log.info(LogFormats.EVENT_RAISED, code, arg, event[2])
+        if critical is True:
+            self.Critical = True
+        self._Store()
+        if critical is True:
+            self._CriticalPut(now)
+
+    def Attach(self, svc, arg):
+        """
+        Raise a sensor fault when a run of a sensor service fails.
+        :param svc: Sensor service.
+        :param arg: Argument of the fault, the subtype of the sensor report.
+        """
+        run = svc.SvcRun
+
+        def GuardedRun():
+            try:
+                run()
+            except Exception:
+                self.Raise(EventReport.EVENT_SENSOR_FAULT, arg)
+                raise
+
+        svc.SvcRun = GuardedRun
+
+    def RiderTake(self, space):
+        """
+        Piggyback rider: returns the oldest events that fit in the given space.
+        :return: Tuple of (EventReport.DATA_KEY_EVENT, bytes) or None.
+        """
+        data = self._Take(space)
+        if data is None:
+            return None
+        return EventReport.DATA_KEY_EVENT, data
+
+    def RiderQueued(self, seq):
+        """
+        Piggyback rider: the events of the last take are carried by the queued
+        record with the given sequence number, 0 if the record was dropped.
+        """
+        for event in self.Taken:
+            event[4] = seq
+        self.Taken.clear()
+        self._Store()
+
+    def Delivered(self, seqs):
+        """
+        Delivery observer callback. Removes the events of which the record
+        has been sent.
+        :param seqs: Sequence numbers of the sent records.
+        """
+        count = len(self.Events)
+        self.Events = [event for event in self.Events if event[4] == 0 or event[4] not in seqs]
+        if len(self.Events) != count:
+            self._Store()
+
+    def Put(self):
+        """
+        Put the buffered events that fit in one EventReport in the Message
+        Exchange.
+        """
+        data = self._Take(self.PayloadMax)
+        if data is None:
+            return
+        self.Log.info(LogFormats.EVENT_REPORT, len(data))
+        self.MsgEx.MessagePut(msg_data_dict={EventReport.DATA_KEY_EVENT: data},
+                              msg_type=EventReport.TYPE_EVENT,
+                              msg_subtype=EventReport.SUBTYPE_EVENT_REPORT,
+                              msg_meta_dict={
+                                  Metadata.MSG_META_TYPE: EventReport.TYPE_EVENT,
+                                  Metadata.MSG_META_SUBTYPE: EventReport.SUBTYPE_EVENT_REPORT,
+                              })
+        self.RiderQueued(self.MsgEx.PutSeq)
+
+    def Suspend(self):
+        """
+        Called before deep sleep. Events that exceed the maximum age are put in
+        an EventReport of their own.
+        """
+        if self.MsgEx is None:
+            return
+        for event in self.Events:
+            if event[4] == 0:
+                if utime.time() - event[3] >= self.AgeMax:
+                    self.Put()
+                return
+
+    def _Find(self, code, arg):
+        # Events that are on their way are not counted any more.
+        for event in self.Events:
+            if event[0] == code and event[1] == arg and event[4] == 0:
+                return event
+        return None
+
+    def _CriticalPut(self, now):
+        if self.Critical is False or self.MsgEx is None:
+            return
+        if self.CriticalTime != 0 and now - self.CriticalTime < self.Holdoff:
+            return
+        self.Critical = False
+        self.CriticalTime = now
+        self.Put()
+        self._Store()
+        self.MsgEx.SvcActivate()
+
+    def _Take(self, space):
+        """
+        Pack the oldest events that are not on their way and fit in the given
+        space, they are kept as Taken until RiderQueued.
+        :return: Packed events or None if not even the oldest event fits.
+        """
+        self.Taken.clear()
+        if len(self.Events) == 0:
+            return None
+        self._Release()
+        now = utime.time()
+        if self.Buf is None or len(self.Buf) < space:
+            self.Buf = bytearray(space)
+        offset = 0
+        for event in self.Events:
+            if event[4] != 0:
+                continue
+            code, arg, count, first = event[0:4]
+            age = max(now - first, 0)
+            if offset + EventReport.EventSize(arg, count, age) > space:
+                break
+            offset = EventReport.EventPackInto(self.Buf, offset, code, arg, count, age)
+            self.Taken.append(event)
+
+        if len(self.Taken) == 0:
+            return None
+        return bytes(self.Buf[0:offset])
+
+    def _Release(self):
+        """
+        Events of which the record was dropped from the queue wait for a ride
+        again.
+        """
+        released = False
+        for event in self.Events:
+            if event[4] != 0 and self.MsgEx is not None and self.MsgEx.IsQueued(event[4]) is False:
+                event[4] = 0
+                released = True
+        if released is False:
+            return
+
+        # Merge the repeats that were counted while an event was on its way.
+        events = []
+        for event in self.Events:
+            twin = None
+            if event[4] == 0:
+                for other in events:
+                    if other[0] == event[0] and other[1] == event[1] and other[4] == 0:
+                        twin = other
+                        break
+            if twin is None:
+                events.append(event)
+            else:
+                twin[2] = min(twin[2] + event[2], 0xFFFF)
+                twin[3] = min(twin[3], event[3])
+        self.Events = events
+        self._Store()
+
+    def _Store(self):
+        buf = bytearray(self.RTC_HDR_SIZE + self.EVENT_SIZE * len(self.Events))
+        ustruct.pack_into(self.RTC_FMT, buf, 0, self.RTC_MAGIC, self.CriticalTime,
+                          self.FLAG_CRITICAL if self.Critical is True else 0, len(self.Events))
+        offset = self.RTC_HDR_SIZE
+        for code, arg, count, first, seq in self.Events:
+            ustruct.pack_into(self.EVENT_FMT, buf, offset, code, arg, count, first, seq)
+            offset += self.EVENT_SIZE
+        self.Rtc.Write(RtcMemory.REGION_EVENT, buf)
+
+    def _Load(self):
+        data = self.Rtc.Read(RtcMemory.REGION_EVENT)
+        if data is None:
+            return
+        magic, critical_time, flags, count = ustruct.unpack_from(self.RTC_FMT, data, 0)
+        if magic != self.RTC_MAGIC or count > self.SLOTS:
+            return
+
+        self.CriticalTime = critical_time
+        self.Critical = flags & self.FLAG_CRITICAL != 0
+        for i in range(0, count):
+            self.Events.append(list(ustruct.unpack_from(self.EVENT_FMT, data,
+                                                        self.RTC_HDR_SIZE + i * self.EVENT_SIZE)))
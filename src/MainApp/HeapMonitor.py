@@ -0,0 +1,121 @@
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+import gc
+
+
+class HeapBudgetExceeded(Exception):
+
+    def __init__(self, name, alloc, budget):
+        super().__init__("{}: {} bytes allocated, budget {}".format(name, alloc, budget))
+        self.Name = name
+        self.Alloc = alloc
+        self.Budget = budget
+
+
+class HeapMonitor:
+    """
+    Records the free heap and the number of bytes allocated during every
+    Setup() stage and every run of the attached services. A stage or service
+    can be given an allocation budget: an overrun is logged, or raised as a
+    HeapBudgetExceeded in strict mode so a regression fails on the host.
+
+    The allocations are measured from gc.mem_alloc(), which includes garbage
+    that has not been collected yet, so a run that triggers a collection can
+    report less than it allocated.
+    """
+
+    # Heap probes, also used by the Profiler. The host harness replaces them as
+    # CPython has no equivalent.
+    MemAlloc = staticmethod(getattr(gc, "mem_alloc", lambda: 0))
+    MemFree = staticmethod(getattr(gc, "mem_free", lambda: 0))
+
+    def __init__(self, budgets=None, strict=False):
+        """
+        :param budgets: Dictionary of stage or service name -> maximum number of
+        bytes allocated by it.
+        :param strict: Raise a HeapBudgetExceeded when a budget is exceeded.
+        """
+        self.Budgets = budgets if budgets is not None else {}
+        self.Strict = strict
+        # List of (stage name, bytes allocated, free heap after the stage).
+        self.Stages = []
+        # Service name -> [runs, maximum bytes allocated by a run].
+        self.Runs = {}
+        self.FreeMin = HeapMonitor.MemFree()
+        self.Log = LogRing.Create()
+        self.Mark = HeapMonitor.MemAlloc()
+        return
+
+    def Stage(self, name):
+        """
+        Account the allocations since the previous stage to this stage.
+        :param name: Name of the stage that finished.
+        """
+        alloc = HeapMonitor.MemAlloc()
+        free = self._Free()
+        self.Stages.append((name, alloc - self.Mark, free))
+        self._Check(name, alloc - self.Mark)
+        self.Mark = HeapMonitor.MemAlloc()
+
+    def Attach(self, name, svc):
+        """
+        Measure every run of a service.
+        :param name: Name of the service.
+        :param svc: Service object.
+        """
+        if name not in self.Runs:
+            self.Runs[name] = [0, 0]
+        run = svc.SvcRun
+
+        def MonitoredRun():
+            self._Run(name, run)
+
+        svc.SvcRun = MonitoredRun
+
+    def _Run(self, name, run):
+        start = HeapMonitor.MemAlloc()
+
+        run()
+
+        alloc = HeapMonitor.MemAlloc() - start
+        self._Free()
+        stats = self.Runs[name]
+        stats[0] += 1
+        stats[1] = max(stats[1], alloc)
+        self._Check(name, alloc)
+
+    def Peak(self):
+        """
+        :return: Tuple of (name, bytes) of the stage or service run that
+        allocated the most.
+        :rtype: tuple
+        """
+        peak = ("", 0)
+        for name, alloc, free in self.Stages:
+            if alloc > peak[1]:
+                peak = (name, alloc)
+        for name, stats in self.Runs.items():
+            if stats[1] > peak[1]:
+                peak = (name, stats[1])
+        return peak
+
+    def Summary(self):
+        """
+        Log the lowest free heap and the largest allocation of this wake.
+        """
+        name, alloc = self.Peak()
+        self.Log.info(LogFormats.HEAP_SUMMARY, self.FreeMin, alloc, name)
+
+    def _Free(self):
+        free = HeapMonitor.MemFree()
+        self.FreeMin = min(self.FreeMin, free)
+        return free
+
+    def _Check(self, name, alloc):
+        budget = self.Budgets.get(name)
+        if budget is None or alloc <= budget:
+            return
+        self.Log.warning(LogFormats.HEAP_BUDGET, name, alloc, budget)
+        if self.Strict is True:
+            raise HeapBudgetExceeded(name, alloc, budget)
@@ -0,0 +1,140 @@
+from MainApp import Airtime
+from MainApp.RtcMemory import RtcMemory
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+from micropython import const
+import ustruct
+import math
+
+
+class LinkAdr:
+    """
+    Adaptive spreading factor selection from the link margin. Uplinks are
+    unconfirmed, so a downlink received in the RX windows of an uplink (an
+    acknowledgement, a MAC command or an application message) is the only
+    evidence of the link. The SNR of every such downlink is recorded. Once
+    HISTORY SNRs have been recorded, the spreading factor is stepped down to
+    the fastest one of which the demodulation floor is at least MARGIN_DB
+    below the lowest recorded SNR.
+
+    Like the ADR backoff of LoRaWAN, the network is expected to answer within
+    ACK_DELAY uplinks once ACK_LIMIT uplinks have gone without a downlink (the
+    LoRaWAN stack sets ADRACKReq). If it does not, the spreading factor is
+    stepped up by one, and again after every ACK_DELAY uplinks without a
+    downlink.
+
+    The history is kept in RTC memory, flash only holds the spreading factor
+    and is written when it changes. A new spreading factor takes effect at the
+    next wake, when the LoRa configuration (and everything derived from it) is
+    created.
+    """
+
+    FILE_NAME       = "adr"
+
+    SF_MIN          = const(7)
+    SF_MAX          = const(12)
+    HISTORY         = const(8)
+    # Uplinks without a downlink before the network is asked for one, and
+    # after that before every step up, see ADR_ACK_LIMIT and ADR_ACK_DELAY.
+    ACK_LIMIT       = const(16)
+    ACK_DELAY       = const(8)
+    # Margin (dB) that must remain between the SNR and the demodulation floor.
+    MARGIN_DB       = const(5)
+    # Low data rate optimization is mandatory from this spreading factor.
+    LDRO_SF         = const(11)
+
+    # Magic, spreading factor, uplinks since the last downlink, history length,
+    # last RSSI, SNRs.
+    RTC_FMT         = "<HBBBh" + "b" * HISTORY
+    RTC_MAGIC       = const(0x4145)
+
+    def __init__(self, directory, lora_config):
+        """
+        :param directory: Directory of the spreading factor file.
+        :param lora_config: LoRa configuration, its spreading factor is used
+        until a spreading factor has been selected.
+        """
+        self.Path = directory + "/" + self.FILE_NAME
+        self.Rtc = RtcMemory()
+        self.Sf = lora_config["sf"]
+        self.Missed = 0
+        self.Rssi = 0
+        self.Snrs = []
+        self.Log = LogRing.Create()
+        self._Load()
+        return
+
+    def Config(self, lora_config):
+        """
+        :return: Copy of the LoRa configuration with the selected spreading factor.
+        :rtype: dict
+        """
+        config = dict(lora_config)
+        config["sf"] = self.Sf
+        config["ldro"] = 1 if self.Sf >= self.LDRO_SF else 0
+        return config
+
+    def Record(self, rssi=None, snr=None):
+        """
+        Account an uplink.
+        :param rssi: RSSI (dBm) of the downlink received after the uplink.
+        :param snr: SNR (dB) of the downlink received after the uplink, None
+        if no downlink was received.
+        :return: True if the spreading factor changed.
+        :rtype: boolean
+        """
+        sf = self.Sf
+        if snr is None:
+            self.Missed = min(self.Missed + 1, 0xFF)
+            backoff = self.Missed - self.ACK_LIMIT
+            if backoff >= self.ACK_DELAY and backoff % self.ACK_DELAY == 0:
+                sf = min(sf + 1, self.SF_MAX)
+        else:
+            self.Missed = 0
+            if rssi is not None:
+                self.Rssi = int(rssi)
+            if snr is not None:
+                self.Snrs.append(max(min(math.floor(snr), 127), -128))
+                if len(self.Snrs) > self.HISTORY:
+                    self.Snrs.pop(0)
+                if len(self.Snrs) == self.HISTORY:
+                    snr_min = min(self.Snrs) - self.MARGIN_DB
+                    while sf > self.SF_MIN and Airtime.SNR_FLOOR[sf - 1] <= snr_min:
+                        sf -= 1
+
+        changed = sf != self.Sf
+        if changed is True:
+            self.Log.info(LogFormats.ADR_SF, self.Sf, sf)
+            self.Sf = sf
+            self.Snrs.clear()
+            with open(self.Path, "wb") as f:
+                f.write(bytes([sf]))
+        self._RtcStore()
+        return changed
+
+    def _RtcStore(self):
+        snrs = self.Snrs + [0] * (self.HISTORY - len(self.Snrs))
+        self.Rtc.Write(RtcMemory.REGION_ADR,
+                       ustruct.pack(self.RTC_FMT, self.RTC_MAGIC, self.Sf, self.Missed,
+                                    len(self.Snrs), self.Rssi, *snrs))
+
+    def _Load(self):
+        try:
+            with open(self.Path, "rb") as f:
+                sf = f.read(1)[0]
+            if self.SF_MIN <= sf <= self.SF_MAX:
+                self.Sf = sf
+        except (OSError, IndexError):
+            pass
+
+        data = self.Rtc.Read(RtcMemory.REGION_ADR)
+        if data is None:
+            return
+        state = ustruct.unpack_from(self.RTC_FMT, data, 0)
+        # The history only applies to the spreading factor it was recorded at.
+        if state[0] != self.RTC_MAGIC or state[1] != self.Sf or state[3] > self.HISTORY:
+            return
+        self.Missed = state[2]
+        self.Rssi = state[4]
+        self.Snrs = list(state[5:5 + state[3]])
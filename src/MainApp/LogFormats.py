@@ -0,0 +1,83 @@
+# Format IDs of the LogRing records. A record only holds the ID and the
+# arguments, the format strings are applied on the host (host.LogDecoder).
+# IDs must never be reused for a different format, retired IDs are removed.
+from micropython import const
+
+
+MAIN_DEVICE_ID      = const(1)
+MAIN_RESET_REASON   = const(2)
+MAIN_INIT_DONE      = const(3)
+MAIN_RESUMED        = const(4)
+MAIN_SCHED_START    = const(5)
+REG_INFO            = const(10)
+REG_COMPLETE        = const(11)
+REG_RIDER           = const(12)
+PLAN_DEFER          = const(20)
+CFG_UPDATE          = const(30)
+CFG_INVALID         = const(31)
+CFG_MALFORMED       = const(32)
+QUEUE_TOO_BIG       = const(40)
+QUEUE_FULL          = const(41)
+QUEUE_DRAINED       = const(43)
+QUEUE_KEPT          = const(44)
+LORA_FCNT_SKIP      = const(50)
+ADR_SF              = const(51)
+PWR_STATUS_FAILED   = const(60)
+PWR_SLEEP_FAILED    = const(61)
+PWR_NOT_CUT         = const(62)
+PROF_SUMMARY        = const(70)
+HEAP_BUDGET         = const(71)
+HEAP_SUMMARY        = const(72)
+GROUP_SAMPLED       = const(80)
+ASYNC_RUN           = const(81)
+ADAPT_INTERVAL      = const(82)
+DBAND_REPORT        = const(90)
+BATCH_FLUSH         = const(91)
+COMBINED_FLUSH      = const(92)
+EVENT_RAISED        = const(100)
+EVENT_REPORT        = const(101)
+EVENT_DROPPED       = const(102)
+HIST_RESTART        = const(110)
+
+
+def Formats():
+    """
+    :return: Dictionary of format ID -> format string.
+    :rtype: dict
+    """
+    return {
+        MAIN_DEVICE_ID: "Device ID: {}",
+        MAIN_RESET_REASON: "Reset reason: {}",
+        MAIN_INIT_DONE: "Finished initialization.",
+        MAIN_RESUMED: "Resumed with {} service(s) due.",
+        MAIN_SCHED_START: "Starting scheduler",
+        REG_INFO: "Registration info: HW ID {}, SW version {}, FW version {}",
+        REG_COMPLETE: "Registration complete",
+        REG_RIDER: "Registration info added to report",
+        PLAN_DEFER: "Duty cycle budget exhausted, deferring {} sec",
+        CFG_UPDATE: "Update {}: {} parameter(s) accepted, rejected {}",
+        CFG_INVALID: "Invalid configuration file",
+        CFG_MALFORMED: "Malformed update ignored",
+        QUEUE_TOO_BIG: "Record of {} bytes dropped",
+        QUEUE_FULL: "Queue full, dropped record of class {}",
+        QUEUE_DRAINED: "Drained {} queued record(s)",
+        QUEUE_KEPT: "Uplink failed, kept {} queued record(s)",
+        LORA_FCNT_SKIP: "Frame counter skipped ahead to {}",
+        ADR_SF: "Spreading factor {} -> {}",
+        PWR_STATUS_FAILED: "Status command failed: {}",
+        PWR_SLEEP_FAILED: "Sleep command failed: {}",
+        PWR_NOT_CUT: "Supply not cut after sleep command was acknowledged.",
+        PROF_SUMMARY: "Profile: {} cycles, {} ms, {} uC per cycle",
+        HEAP_BUDGET: "Heap budget of {} exceeded: {} bytes (budget {})",
+        HEAP_SUMMARY: "Heap: at least {} bytes free, peak of {} bytes in {}",
+        GROUP_SAMPLED: "Sampled {} of {} member(s)",
+        ASYNC_RUN: "Running {} service(s) cooperatively",
+        ADAPT_INTERVAL: "Interval {} -> {} sec",
+        DBAND_REPORT: "Reporting {} after {} suppressed sample(s)",
+        BATCH_FLUSH: "Flushing {} samples ({} bytes)",
+        COMBINED_FLUSH: "Combined report of up to {} bytes",
+        EVENT_RAISED: "Event {} ({}), {} time(s)",
+        EVENT_REPORT: "Event report of {} bytes",
+        EVENT_DROPPED: "Event {} ({}) dropped, every slot is on its way",
+        HIST_RESTART: "History {} restarted, clock went back {} sec",
+    }
@@ -0,0 +1,240 @@
+from MainApp.RtcMemory import RtcMemory
+from Codec import Varint
+
+from micropython import const
+import ustruct
+import utime
+import uos
+
+
+class RingLogger:
+    """
+    Logger of which the records are kept by the LogRing. A record holds a
+    format ID (see LogFormats) and the arguments, nothing is formatted on the
+    device. Records below the level of the ring are dropped before their
+    arguments are encoded. Debug records are compiled out when the code is
+    compiled with optimization (mpy-cross -O1), which makes __debug__ False.
+    """
+
+    def debug(self, fmt, *args):
+        if __debug__:
+            LogRing.Record(LogRing.DEBUG, fmt, args)
+
+    def info(self, fmt, *args):
+        LogRing.Record(LogRing.INFO, fmt, args)
+
+    def warning(self, fmt, *args):
+        LogRing.Record(LogRing.WARNING, fmt, args)
+
+    def error(self, fmt, *args):
+        LogRing.Record(LogRing.ERROR, fmt, args)
+
+    def critical(self, fmt, *args):
+        LogRing.Record(LogRing.CRITICAL, fmt, args)
+
+
+class LogRing:
+    """
+    Binary log of which the records are buffered in RAM and carried across
+    deep sleep in RTC memory. The buffer is only written to flash when it
+    reaches the threshold, when an error is logged, when the records do not
+    fit in RTC memory before deep sleep and at a boot that is not a deep sleep
+    wake (e.g. after a watchdog reset, the RTC memory holds the records that
+    led up to it). The flash side is a fixed set of files that are rotated,
+    decoded on the host by host.LogDecoder.
+
+    Record: length, level (3 MSB) and argument count (5 LSB), time (sec),
+    the format ID as varint and the arguments. An integer argument is a
+    varint of its zigzag value shifted left by one, a string or bytes argument
+    a varint of its length shifted left by one with bit 0 set, followed by
+    its bytes.
+    """
+
+    DEBUG       = const(0)
+    INFO        = const(1)
+    WARNING     = const(2)
+    ERROR       = const(3)
+    CRITICAL    = const(4)
+
+    FILE_NAME   = "blog.{}"
+
+    REC_HDR_FMT     = "<BBI"
+    REC_HDR_SIZE    = const(6)
+    REC_SIZE_MAX    = const(255)
+    ARGS_MAX        = const(31)
+    # String and bytes arguments are truncated to this length.
+    ARG_BYTES_MAX   = const(32)
+
+    # Magic, length of the records.
+    RTC_FMT     = "<HH"
+    RTC_SIZE    = const(4)
+    RTC_MAGIC   = const(0x4C47)
+
+    Level = DEBUG
+    Dir = None
+    Buf = None
+    Scratch = None
+    Len = 0
+    Threshold = 0
+    FileSize = 0
+    FileLimit = 0
+    Rtc = None
+    # True while the RTC memory holds records that are also in the buffer.
+    RtcHeld = False
+    Dropped = 0
+
+    _Logger = RingLogger()
+
+    @staticmethod
+    def ConfigGlobal(directory, level=DEBUG, buf_size=1024, threshold=768,
+                     file_size=4096, file_limit=4, cold=False):
+        """
+        :param directory: Directory of the log files.
+        :param level: Records below this level are dropped.
+        :param buf_size: Size of the RAM buffer in bytes.
+        :param threshold: Fill level (bytes) at which the buffer is flushed.
+        :param file_size: Size (bytes) after which the log file is rotated.
+        :param file_limit: Number of log files.
+        :param cold: True if the boot is not a deep sleep wake, the records
+        carried over in RTC memory are flushed.
+        """
+        LogRing.Dir = directory
+        LogRing.Level = level
+        LogRing.Buf = bytearray(buf_size)
+        LogRing.Scratch = bytearray(LogRing.REC_SIZE_MAX)
+        LogRing.Len = 0
+        LogRing.Threshold = threshold
+        LogRing.FileSize = file_size
+        LogRing.FileLimit = file_limit
+        LogRing.Rtc = RtcMemory()
+        LogRing._RtcLoad()
+        if cold is True:
+            LogRing.Flush()
+
+    @staticmethod
+    def Create():
+        """
+        :return: Logger.
+        :rtype: RingLogger
+        """
+        return LogRing._Logger
+
+    @staticmethod
+    def Record(level, fmt, args):
+        """
+        Add a record to the buffer.
+        :param level: Level of the record.
+        :param fmt: Format ID, see LogFormats.
+        :param args: Tuple of integer, string and bytes arguments.
+        """
+        if level < LogRing.Level or LogRing.Buf is None:
+            return
+
+        rec = LogRing.Scratch
+        offset = Varint.EncodeInto(fmt, rec, LogRing.REC_HDR_SIZE)
+        count = 0
+        for arg in args:
+            if isinstance(arg, int):
+                value = Varint.ZigZag(arg) << 1
+                if count == LogRing.ARGS_MAX or offset + Varint.Size(value) > len(rec):
+                    break
+                offset = Varint.EncodeInto(value, rec, offset)
+            else:
+                if isinstance(arg, str):
+                    arg = arg.encode()
+                elif not isinstance(arg, (bytes, bytearray)):
+                    arg = str(arg).encode()
+                arg = arg[0:LogRing.ARG_BYTES_MAX]
+                if count == LogRing.ARGS_MAX or offset + 1 + len(arg) > len(rec):
+                    break
+                offset = Varint.EncodeInto(len(arg) << 1 | 1, rec, offset)
+                rec[offset:offset + len(arg)] = arg
+                offset += len(arg)
+            count += 1
+        ustruct.pack_into(LogRing.REC_HDR_FMT, rec, 0, offset, level << 5 | count, utime.time())
+
+        if LogRing.Len + offset > len(LogRing.Buf) and LogRing.Flush() is False:
+            LogRing.Dropped += 1
+            return
+        LogRing.Buf[LogRing.Len:LogRing.Len + offset] = memoryview(rec)[0:offset]
+        LogRing.Len += offset
+
+        if level >= LogRing.ERROR or LogRing.Len >= LogRing.Threshold:
+            LogRing.Flush()
+
+    @staticmethod
+    def Flush():
+        """
+        Append the buffered records to the log file.
+        :return: False if the records could not be written.
+        :rtype: boolean
+        """
+        if LogRing.Len == 0:
+            return True
+
+        path = LogRing._Path(0)
+        try:
+            try:
+                size = uos.stat(path)[6]
+            except OSError:
+                size = 0
+            if size > 0 and size + LogRing.Len > LogRing.FileSize:
+                LogRing._Rotate()
+            with open(path, "ab") as f:
+                f.write(memoryview(LogRing.Buf)[0:LogRing.Len])
+        except OSError:
+            return False
+
+        LogRing.Len = 0
+        if LogRing.RtcHeld is True:
+            LogRing._RtcStore()
+        return True
+
+    @staticmethod
+    def Suspend():
+        """
+        Called before deep sleep. The records are kept in RTC memory if they
+        fit, otherwise they are flushed.
+        """
+        if LogRing.Buf is None:
+            return
+        if LogRing.RTC_SIZE + LogRing.Len > LogRing.Rtc.Sizes[RtcMemory.REGION_LOG]:
+            LogRing.Flush()
+        if LogRing.Len > 0 or LogRing.RtcHeld is True:
+            LogRing._RtcStore()
+
+    @staticmethod
+    def _RtcStore():
+        LogRing.Rtc.Write(RtcMemory.REGION_LOG,
+                          ustruct.pack(LogRing.RTC_FMT, LogRing.RTC_MAGIC, LogRing.Len) +
+                          LogRing.Buf[0:LogRing.Len])
+        LogRing.RtcHeld = LogRing.Len > 0
+
+    @staticmethod
+    def _RtcLoad():
+        data = LogRing.Rtc.Read(RtcMemory.REGION_LOG)
+        if data is None:
+            return
+        magic, length = ustruct.unpack_from(LogRing.RTC_FMT, data, 0)
+        if magic != LogRing.RTC_MAGIC or LogRing.RTC_SIZE + length > len(data) \
+                or length > len(LogRing.Buf):
+            return
+        LogRing.Buf[0:length] = data[LogRing.RTC_SIZE:LogRing.RTC_SIZE + length]
+        LogRing.Len = length
+        LogRing.RtcHeld = length > 0
+
+    @staticmethod
+    def _Rotate():
+        for i in range(LogRing.FileLimit - 1, 0, -1):
+            try:
+                uos.remove(LogRing._Path(i))
+            except OSError:
+                pass
+            try:
+                uos.rename(LogRing._Path(i - 1), LogRing._Path(i))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _Path(index):
+        return LogRing.Dir + "/" + LogRing.FILE_NAME.format(index)
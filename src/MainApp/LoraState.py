@@ -0,0 +1,204 @@
+from MainApp.RtcMemory import RtcMemory
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+from micropython import const
+import ustruct
+import uos
+
+
+class LoraState:
+    """
+    Persistence of the LoRaWAN session and frame counter, used as the Params
+    object of the LoRa protocol.
+
+    The live frame counter is kept in RTC memory. Flash only holds a limit
+    below which all used frame counters are: whenever the frame counter
+    reaches the limit, a new limit COMMIT_INTERVAL frames ahead is committed
+    to an append-only log over a fixed set of block files, so flash writes
+    are spread over the blocks. When the RTC memory is lost (power cycle or
+    supply cut) the frame counter skips ahead to the limit, so a frame
+    counter value is never reused.
+    """
+
+    SESSION_FILE    = "session"
+    # Single frame counter file (8 bytes, little endian), see devices/*/lora/.
+    FCNT_FILE       = "fcnt"
+    BLOCK_FILE      = "fcnt.{}"
+
+    BLOCKS          = const(4)
+    BLOCK_RECORDS   = const(64)
+    COMMIT_INTERVAL = const(16)
+
+    # Limit, check.
+    RECORD_FMT      = "<II"
+    RECORD_SIZE     = const(8)
+    RECORD_CHECK    = const(0xA5A5A5A5)
+
+    # Magic, frame counter, limit.
+    RTC_FMT         = "<HII"
+    RTC_MAGIC       = const(0x4C53)
+
+    # Session: device address (4), network session key (16), application session key (16).
+    SESSION_SIZE    = const(36)
+
+    def __init__(self, directory, commit_interval=COMMIT_INTERVAL):
+        """
+        :param directory: Directory of the session file and the log blocks.
+        :param commit_interval: Number of frames between two commits to flash.
+        """
+        self.Dir = directory
+        self.CommitInterval = commit_interval
+        self.Rtc = RtcMemory()
+        self.Fcnt = 0
+        self.Limit = 0
+        self.Block = 0
+        self.BlockCount = 0
+        self.Log = LogRing.Create()
+        self._Restore()
+        return
+
+    def StoreSession(self, dev_addr, app_skey, nwk_skey):
+        """
+        Store a session. The frame counter is reset when the session changes.
+        """
+        session = bytes(dev_addr) + bytes(nwk_skey) + bytes(app_skey)
+        if session == self.Session():
+            return
+
+        with open(self._Path(self.SESSION_FILE), "wb") as f:
+            f.write(session)
+
+        self._LogErase()
+        self.Block = 0
+        self.BlockCount = 0
+        self.Fcnt = 0
+        self.Limit = 0
+        self._RtcStore()
+
+    def Session(self):
+        """
+        :return: Session data or None if no session is stored.
+        :rtype: bytes
+        """
+        try:
+            with open(self._Path(self.SESSION_FILE), "rb") as f:
+                session = f.read()
+        except OSError:
+            return None
+        return session if len(session) == self.SESSION_SIZE else None
+
+    def HasSession(self):
+        return self.Session() is not None
+
+    def FrameCounter(self):
+        """
+        :return: Frame counter of the next frame. It is below the committed limit.
+        """
+        self._Reserve()
+        return self.Fcnt
+
+    def FrameCounterStore(self, fcnt):
+        """
+        Update the frame counter after a frame has been sent.
+        """
+        self.Fcnt = fcnt
+        self._Reserve()
+        self._RtcStore()
+
+    def _Path(self, name):
+        return self.Dir + "/" + name
+
+    def _Reserve(self):
+        if self.Fcnt >= self.Limit:
+            self._Commit(self.Fcnt + self.CommitInterval)
+            self._RtcStore()
+
+    def _Commit(self, limit):
+        if self.BlockCount >= self.BLOCK_RECORDS:
+            self.Block = (self.Block + 1) % self.BLOCKS
+            self.BlockCount = 0
+
+        record = ustruct.pack(self.RECORD_FMT, limit, limit ^ self.RECORD_CHECK)
+        # Starting a block overwrites its oldest records.
+        with open(self._Path(self.BLOCK_FILE.format(self.Block)),
+                  "ab" if self.BlockCount > 0 else "wb") as f:
+            f.write(record)
+
+        self.BlockCount += 1
+        self.Limit = limit
+
+    def _RtcStore(self):
+        self.Rtc.Write(RtcMemory.REGION_LORA,
+                       ustruct.pack(self.RTC_FMT, self.RTC_MAGIC, self.Fcnt, self.Limit))
+
+    def _Restore(self):
+        if self._LogLoad() is False:
+            self._Migrate()
+            return
+
+        data = self.Rtc.Read(RtcMemory.REGION_LORA)
+        if data is not None:
+            magic, fcnt, limit = ustruct.unpack_from(self.RTC_FMT, data, 0)
+            if magic == self.RTC_MAGIC and limit == self.Limit and fcnt <= limit:
+                self.Fcnt = fcnt
+                return
+
+        # The RTC memory is lost, frames up to the limit may have been sent.
+        self.Fcnt = self.Limit
+        self.Log.info(LogFormats.LORA_FCNT_SKIP, self.Fcnt)
+        self._RtcStore()
+
+    def _Migrate(self):
+        """
+        Take over the frame counter of a single frame counter file, which is
+        exact. The log is started with the first frame.
+        """
+        try:
+            with open(self._Path(self.FCNT_FILE), "rb") as f:
+                self.Fcnt = ustruct.unpack("<Q", f.read(8))[0]
+        except (OSError, ValueError):
+            self.Fcnt = 0
+        self.Limit = self.Fcnt
+        self._RtcStore()
+
+    def _LogLoad(self):
+        """
+        Find the highest valid limit of the log.
+        :return: True if the log holds a valid record.
+        :rtype: boolean
+        """
+        found = False
+        for block in range(0, self.BLOCKS):
+            try:
+                with open(self._Path(self.BLOCK_FILE.format(block)), "rb") as f:
+                    data = f.read()
+            except OSError:
+                continue
+
+            count = len(data) // self.RECORD_SIZE
+            # A torn write ends the block, the next commit starts a new block.
+            torn = len(data) % self.RECORD_SIZE != 0
+            last = False
+            for i in range(0, count):
+                limit, check = ustruct.unpack_from(self.RECORD_FMT, data, i * self.RECORD_SIZE)
+                if check != limit ^ self.RECORD_CHECK:
+                    torn = True
+                    break
+                if found is False or limit > self.Limit:
+                    found = True
+                    last = True
+                    self.Limit = limit
+                    self.Block = block
+                    self.BlockCount = i + 1
+            if last is True and torn is True:
+                self.BlockCount = self.BLOCK_RECORDS
+        return found
+
+    def _LogErase(self):
+        for name in [self.BLOCK_FILE.format(block) for block in range(0, self.BLOCKS)] + \
+                [self.FCNT_FILE]:
+            try:
+                uos.remove(self._Path(name))
+            except OSError:
+                pass
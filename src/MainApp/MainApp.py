@@ -8,7 +8,6 @@ from upyiot.system.Util.Version import Version
 from upyiot.comm.Messaging.Message import Message
 from upyiot.comm.Messaging.MessageTemplate import MessageTemplate
 from upyiot.comm.Messaging.MessageExchange import MessageExchange
-from upyiot.comm.Messaging.MessageFormatter import MessageFormatter
 from upyiot.comm.Messaging.Protocol.LoraProtocol import LoraProtocol
 from upyiot.comm.Messaging.Parser.CborParser import CborParser
 from upyiot.middleware.Sensor import Sensor
@@ -22,12 +21,41 @@ from upyiot.drivers.Board.Supply import Supply
 
 # LoRaSensor modules
 from Schemas.SensorReport import MoistureSensorReport, \
-    BatterySensorReport, TemperatureSensorReport
+    BatterySensorReport, TemperatureSensorReport, CombinedSensorReport
 from Schemas.RegistrationInfo import RegistrationInfo
+from Schemas.ProfileReport import ProfileReport
+from Schemas.EventReport import EventReport
+from Schemas.BacklogReport import BacklogReport
+from Schemas.ConfigUpdate import ConfigUpdate, ConfigAck
+from Schemas.HistoryReport import HistoryRequest, HistoryReport
 from Schemas import Metadata
 from Config.Hardware import Pins
+from Config import Node
+from Codec.FixedLayout import FixedLayoutParser
 from MainApp.PowerManager import PowerManager
 from .Registration import Registration
+from .Resume import ResumeState, DeferredService, LazyObserver
+from .SampleBatcher import SampleBatcher
+from .DeadbandReporter import DeadbandReporter
+from .ReportFormatter import ReportFormatter
+from .AdaptiveInterval import AdaptiveInterval
+from .RtcMemory import RtcMemory
+from .CombinedFormatter import CombinedFormatter
+from .Piggyback import Piggyback
+from .Profiler import Profiler
+from .HeapMonitor import HeapMonitor
+from .EventLog import EventLog
+from .SampleHistory import SampleHistory
+from .SamplingGroup import SamplingGroup, SharedSupply
+from .AsyncRunner import AsyncRunner
+from .LoraState import LoraState
+from .LogRing import LogRing
+from . import LogFormats
+from .LinkAdr import LinkAdr
+from .RemoteConfig import RemoteConfig
+from . import Airtime
+from .UplinkPlanner import UplinkPlanner
+from .MessageQueue import MessageQueue, QueuedMessageExchange
 
 # micropython modules
 from micropython import const
@@ -73,186 +101,658 @@ class MainApp:
     FILTER_DEPTH = const(5)
     DEEPSLEEP_THRESHOLD_SEC = const(5)
     SEND_LIMIT = const(1)
+    # Number of messages that are held while the node cannot send.
+    MSG_QUEUE_SLOTS = const(32)
 
     SamplesPerMessage   = const(1)
-
-    # Service intervals in seconds.
-    MsgExInterval           = const(100)
-    SensorReadInterval      = const(50)
-    MoistReadInterval       = const(20)
-
-    # TTN
-    TtnAppEui = [0x70, 0xB3, 0xD5, 0x7E, 0xD0, 0x03, 0x2C, 0xDC]
-
-    # OTAA Test node 01
-    # TtnDevEui = [0x00, 0x3C, 0x8D, 0xB2, 0x88, 0x2D, 0xC4, 0x7C]
-    # TtnAppKey = [0x38, 0x34, 0xF5, 0x1F, 0x04, 0xD0, 0x66, 0xF5,
-    #              0xF8, 0x5B, 0x5F, 0xDD, 0xAD, 0x4F, 0xC0, 0xB9]
-
-    # OTAA Test node 02
-    # TtnDevEui = [0x00, 0x2B, 0xE3, 0x70, 0x72, 0xA5, 0x9E, 0xF0]
-    # TtnAppKey = [0xD3, 0x07, 0xCF, 0xEC, 0x3E, 0x4B, 0x1D, 0xF4,
-    #              0xE8, 0x70, 0xA7, 0x44, 0xED, 0x26, 0x8C, 0xF1]
-
-    # OTAA Test node 03
-    TtnDevEui = [0x00, 0x68, 0xE0, 0x3A, 0xB9, 0xF3, 0x5E, 0x7C]
-    TtnAppKey = [0x37, 0xA2, 0x75, 0x26, 0x3C, 0xE8, 0xD6, 0x47,
-                 0x2F, 0x3E, 0xCF, 0xF2, 0x08, 0x47, 0x27, 0x34]
-
-
-    # ABP Test node 01
-    DevAddr = [0x26, 0x01, 0x37, 0x47]
-    NwkSKey = [0x13, 0x48, 0xA0, 0x44, 0x47, 0xC4, 0x3B, 0xC8,
-               0x70, 0x9B, 0x2F, 0x5B, 0x5B, 0xAA, 0xE5, 0x7A]
-    AppSKey = [0x5D, 0x5A, 0x38, 0x50, 0x41, 0xD9, 0xD5, 0x0B,
-               0x14, 0x1D, 0xC5, 0x9A, 0xB4, 0xED, 0xFB, 0x59]
-
-
-    TtnLoraConfig = {
-        "freq"  : 868.1,
-        "sf"    : 7,
-        "ldro"  : 0,
-        "app_eui" : TtnAppEui,
-        "dev_eui" : TtnDevEui,
-        "app_key" : TtnAppKey
-    }
-
-    # KPN
-    KpnAppEui = [0x00, 0x59, 0xAC, 0x00, 0x00, 0x01, 0x09, 0xCB]
-
-    # Node 01
-    KpnDevEui = [0x00, 0x59, 0xAC, 0x00, 0x00, 0x1B, 0x08, 0x08]
-    KpnAppKey = [0x08, 0x9a, 0x03, 0x5f, 0xbe, 0xda, 0xad, 0x6c,
-                 0x96, 0x72, 0xb5, 0x32, 0xb4, 0x11, 0x14, 0xf4]
-
-    # Node 02
-    # KpnDevEui = [0x00, 0x59, 0xAC, 0x00, 0x00, 0x1B, 0x07, 0xDB]
-    # KpnAppKey = [0xc4, 0x91, 0xbc, 0xe0, 0xd9, 0x21, 0x84, 0x63,
-    #              0x9a, 0x57, 0x63, 0xac, 0x87, 0x6b, 0xe4, 0x05]
-
-    # Node 03
-    # KpnDevEui = [0x00, 0x59, 0xAC, 0x00, 0x00, 0x1B, 0x06, 0xD4]
-    # KpnAppKey = [0xe5, 0x14, 0x54, 0x06, 0x19, 0x64, 0xfa, 0x3a,
-    #              0x28, 0xe6, 0xdd, 0xcb, 0x74, 0xec, 0xcb, 0xf2]
-
-    KpnLoraConfig = {
-        "freq"  : 868.1,
-        "sf"    : 12,
-        "ldro"  : 1,
-        "app_eui" : KpnAppEui,
-        "dev_eui" : KpnDevEui,
-        "app_key" : KpnAppKey
-    }
+    MoistSamplesPerUpdate   = const(3)
+    TempSamplesPerUpdate    = const(2)
+
+    # Sensor report modes:
+    #  - PER_SENSOR: every sample is reported in the report of its sensor.
+    #  - BATCHED: multiple samples are packed into the report of their sensor, see SampleBatcher.
+    #  - COMBINED: the samples of all sensors are reported in one CombinedSensorReport.
+    REPORT_PER_SENSOR       = const(0)
+    REPORT_BATCHED          = const(1)
+    REPORT_COMBINED         = const(2)
+
+    REPORT_MODE             = REPORT_PER_SENSOR
+    BATCH_AGE_MAX_SEC       = const(3600)
+    COMBINED_DEADLINE_SEC   = const(120)
+
+    # Report a sensor only when its value moved meaningfully or a heartbeat is
+    # due, instead of on every change, see DeadbandReporter. Applies to
+    # REPORT_PER_SENSOR. Per sensor: deadband, hysteresis, minimum and maximum
+    # report interval (sec).
+    DEADBAND                = False
+    MOIST_DEADBAND          = (2, 1, 300, 3600)
+    TEMP_DEADBAND           = (1, 1, 600, 3600)
+
+    # Stretch the sensor read intervals while the samples are stable, see
+    # AdaptiveInterval. The configured read interval is the minimum. Per sensor:
+    # maximum interval (sec) and the change per read that is significant.
+    ADAPTIVE_INTERVAL       = False
+    MOIST_ADAPTIVE          = (3600, 1)
+    TEMP_ADAPTIVE           = (3600, 1)
+
+    # Run the sensors as one sampling group, see SamplingGroup. Sensors that are
+    # due within the tolerance are sampled in the same wake.
+    SAMPLING_GROUP          = False
+    SAMPLING_GROUP_TOLERANCE_SEC = const(10)
+    # Settle time of the supply of the moisture and battery level sensors.
+    SENSOR_SUPPLY_SETTLE_MS = const(300)
+
+    # Run the periodic services as uasyncio tasks, see AsyncRunner. The sensor
+    # supply then settles during the LoRa join, transmission and receive
+    # windows instead of before them.
+    ASYNC_MODE              = False
+
+    # Binary log of the application, see LogRing. The records are buffered in
+    # RAM and RTC memory and only written to flash when the buffer fills up or
+    # an error is logged. Debug records are compiled out with mpy-cross -O1.
+    LOG_LEVEL               = LogRing.DEBUG
+    LOG_BUF_SIZE            = const(1024)
+    LOG_FILE_SIZE           = const(4096)
+    LOG_FILE_LIMIT          = const(4)
+
+    # Service intervals in seconds. These and the filter depth and samples per
+    # update can be changed by a ConfigUpdate downlink, see RemoteConfig.
+    MsgExInterval           = Node.CFG_MSGEX_INTERVAL
+    SensorReadInterval      = Node.CFG_SENSOR_READ_INTERVAL
+    MoistReadInterval       = Node.CFG_MOIST_READ_INTERVAL
 
     KPN = const(0)
     TTN = const(1)
     ABP = const(0)
     OTAA = const(1)
 
-    NETWORK = TTN
-    NETWORK_REG = OTAA
+    # Network, activation and keys of the node, see Config.Node and host.Provision.
+    NETWORK = Node.CFG_NODE_NETWORK
+    NETWORK_REG = Node.CFG_NODE_REG
+
+    # Default radio settings per network: frequency (MHz), spreading factor and
+    # low data rate optimization.
+    NETWORK_RADIO = {
+        KPN: (868.1, 12, 1),
+        TTN: (868.1, 7, 0),
+    }
+
+    # LoRa configuration that replaces the one of the node, e.g. by host tooling.
+    LORA_CONFIG = None
+
+    # Adapt the spreading factor to the link margin of the downlinks, see LinkAdr.
+    # The protocol must report the Rssi and Snr of a received downlink. The spreading
+    # factor of the network configuration is used until the first change.
+    ADAPTIVE_SF = False
+
+    # Add the remaining duty cycle budget to the metadata of every message.
+    DUTY_CYCLE_TELEMETRY = False
+
+    # Profile the awake time and charge of every service run, see Profiler.
+    PROFILE = False
+    PROFILE_REPORT_INTERVAL_SEC = const(86400)
+    # Current consumption in mA while active, transmitting and receiving.
+    PROFILE_CURRENTS = {
+        "active": 40,
+        "tx": 120,
+        "rx": 12,
+    }
+
+    # Record the free heap and the allocations of every Setup() stage and
+    # service run, see HeapMonitor. Budgets map a stage or service name to the
+    # bytes it may allocate, in strict mode an overrun raises.
+    HEAP_MONITOR = False
+    HEAP_BUDGETS = None
+    HEAP_STRICT = False
+
+    # Record resets, failed joins, failed sleeps and sensor faults as
+    # de-duplicated events, see EventLog. The events ride along in the spare
+    # bytes of the sensor reports, critical events and events that found no
+    # ride within the maximum age are sent in an EventReport.
+    EVENTS = False
+    EVENT_AGE_MAX_SEC = const(21600)
+
+    # Keep a history of the moisture and temperature samples on flash, raw
+    # samples and min/max/mean buckets per tier, see SampleHistory. It replaces
+    # the sample files of the sensors and is sent back on a HistoryRequest. The
+    # raw tier is sized from the read interval, a changed interval (e.g. by a
+    # ConfigUpdate) that resizes it erases the raw samples at the next wake.
+    HISTORY = False
+    HISTORY_TIERS = SampleHistory.TIERS
+
+    # Message codec. CBOR unless the fixed layout codec is configured for the
+    # node, the network server must then decode it (see host.PayloadDecoder).
+    CODEC_CBOR = const(0)
+    CODEC_FIXED = const(1)
+
+    CODEC = Node.CFG_NODE_CODEC
+
+    # Optional callable, invoked with a stage name when a Setup() stage has finished.
+    # Used by host-side tooling to measure the cost of every stage.
+    StageProbe = None
+
+    # Service names used for the resume state.
+    SVC_DUMMY   = "Dummy"
+    SVC_TEMP    = "Temp"
+    SVC_MSGEX   = "MsgEx"
+    SVC_REG     = "Reg"
+    SVC_GROUP   = "Sensors"
+    SVC_ASYNC   = "Async"
 
     def __init__(self):
+        self.Log = None
+        self.Resume = None
+        self.Resuming = False
+        self.Intervals = {}
+        self.Services = {}
+        self.LoraProtocol = None
+        self.LoraState = None
+        self.LoraConfig = None
+        self.LinkAdr = None
+        self.Planner = None
+        self.DummySensor = None
+        self.TempSensor = None
+        self.MsgEx = None
+        self.Registration = None
+        self.MoistObserver = None
+        self.BatteryObserver = None
+        self.TempObserver = None
+        self.Batchers = []
+        self.Reporters = []
+        self.CombinedFmt = None
+        self.Piggyback = None
+        self.Profiler = None
+        self.Heap = None
+        self.Events = None
+        # Sensor report subtype -> SampleHistory.
+        self.Histories = {}
+        self.SensorSupply = None
+        self.Group = None
+        self.Runner = None
+        self.Config = None
         return
 
+    def _Stage(self, name):
+        if MainApp.StageProbe is not None:
+            MainApp.StageProbe(name)
+        if self.Heap is not None:
+            self.Heap.Stage(name)
+
     def Setup(self):
+        # Records carried over in RTC memory are flushed after any reset that is
+        # not a deep sleep wake, they lead up to the reset.
+        LogRing.ConfigGlobal(self.DIR_TREE[self.DIR_LOG], level=self.LOG_LEVEL,
+                             buf_size=self.LOG_BUF_SIZE, threshold=self.LOG_BUF_SIZE * 3 // 4,
+                             file_size=self.LOG_FILE_SIZE, file_limit=self.LOG_FILE_LIMIT,
+                             cold=machine.reset_cause() != machine.DEEPSLEEP_RESET)
+        self.Log = LogRing.Create()
+        if self.HEAP_MONITOR is True:
+            self.Heap = HeapMonitor(budgets=self.HEAP_BUDGETS, strict=self.HEAP_STRICT)
+        if self.EVENTS is True:
+            self.Events = EventLog(age_max=self.EVENT_AGE_MAX_SEC)
+        self.Resume = ResumeState(self.DIR_TREE[self.DIR_SYS])
+        # Remotely configured parameters override the defaults of this class.
+        self.Config = RemoteConfig(self.DIR_TREE[self.DIR_SYS])
+        self.Config.Apply(self)
+        if self.PROFILE is True:
+            self.Profiler = Profiler(self.DIR_TREE[self.DIR_SYS],
+                                     currents=self.PROFILE_CURRENTS,
+                                     report_interval=self.PROFILE_REPORT_INTERVAL_SEC)
+
+        # A timer wake resumes from the persisted scheduler state, any other reset
+        # (or a missing/invalid state) takes the full setup path.
+        if machine.reset_cause() == machine.DEEPSLEEP_RESET and self.Resume.Load() is True \
+                and self.Resume.Flags & ResumeState.FLAG_SESSION:
+            self._SetupResume()
+        else:
+            self._SetupFull()
 
+    def _SetupFull(self):
         for dir in self.DIR_TREE.values():
             try:
                 uos.mkdir(dir)
             except OSError:
                 print("Cannot create directory '{}'".format(dir))
 
-        # Configure the ExtLogging class.
-        ExtLogging.ConfigGlobal(level=ExtLogging.DEBUG, stream=None, dir=self.DIR_TREE[self.DIR_LOG],
-                                file_prefix="log_", line_limit=1000, file_limit=10)
+        self._Stage("dirs")
 
-        StructFile.SetLogger(ExtLogging.Create("SFile"))
+        self._LoggingSetup()
 
-        self.Log = ExtLogging.Create("Main")
+        self._Stage("logging")
 
-        self.Log.info("Device ID: {}".format(DeviceId.DeviceId()))
+        self.Log.info(LogFormats.MAIN_DEVICE_ID, DeviceId.DeviceId())
 
         Version(self.DIR_TREE[self.DIR_SYS], self.VER_MAJOR, self.VER_MINOR, self.VER_PATCH)
 
         rst_reason = ResetReason.ResetReason()
-        self.Log.debug("Reset reason: {}".format(ResetReason.ResetReasonToString(rst_reason)))
-
-        # Create driver instances.
-        self.DummySensorDriver = DummySensor(self.DummySamples)
+        self.Log.debug(LogFormats.MAIN_RESET_REASON, rst_reason)
+        if self.Events is not None and machine.reset_cause() != machine.DEEPSLEEP_RESET:
+            self.Events.Raise(EventReport.EVENT_RESET, machine.reset_cause())
 
-        self.InternalTemp = InternalTemp()
+        self._Stage("device_info")
 
         # TODO: Enable actual sensor drivers.
         # self.TempSensorDriver = Mcp9700Temp(temp_pin_nr=Pins.CFG_HW_PIN_TEMP,
         #                                     en_supply_obj=Supply(Pins.CFG_HW_PIN_TEMP_EN, 3.3, 300))
-        #
+
+        self.SensorSupply = self._SensorSupplyCreate()
         # self.VBatSensorDriver = VoltageSensor(pin_nr=Pins.CFG_HW_PIN_VBAT_LVL,
-        #                                       en_supply_obj=Supply(Pins.CFG_HW_PIN_VBAT_LVL_EN, 3.3, 300))
-
-        if self.NETWORK is self.KPN:
-            self.LoraProtocol = LoraProtocol(self.KpnLoraConfig, directory=self.DIR_TREE[self.DIR_LORA])
-        elif self.NETWORK is self.TTN:
-            self.LoraProtocol = LoraProtocol(self.TtnLoraConfig, directory=self.DIR_TREE[self.DIR_LORA])
-            if self.NETWORK_REG is self.ABP:
-                self.LoraProtocol.Params.StoreSession(self.DevAddr, self.AppSKey, self.NwkSKey)
+        #                                       en_supply_obj=self.SensorSupply)
+
+        self._LoraCreate()
+
+        self._Stage("lora")
+
+        self._DummySensorCreate()
+        self._TempSensorCreate()
+
+        # self.BatteryVoltageSensor = Sensor.Sensor(self.DIR_TREE[self.DIR_SENSOR],
+        #                                           "BatLvl",
+        #                                           self.FILTER_DEPTH,
+        #                                           self.VBatSensorDriver,
+        #                                           samples_per_update=self.TempSamplesPerUpdate,
+        #                                           dec_round=False,
+        #                                           store_data=True)
+
+        self._Stage("sensors")
+
+        self._MsgExCreate()
+
+        self._Stage("msgex")
+
+        self._SchedulerCreate()
+
+        # Set service dependencies.
+        # There are no hard dependencies between the services.
+
+        # Register all services to the scheduler.
+        if self.SAMPLING_GROUP is True:
+            self._GroupCreate()
+            self._GroupMemberAdd(self.SVC_DUMMY, self.DummySensor, self.MoistReadInterval)
+            self._GroupMemberAdd(self.SVC_TEMP, self.TempSensor, self.SensorReadInterval)
+            # self._GroupMemberAdd("BatLvl", self.BatteryVoltageSensor, self.SensorReadInterval)
+            self._ServiceRegister(self.SVC_GROUP, self.Group)
         else:
+            self._ServiceRegister(self.SVC_DUMMY, self.DummySensor)
+            self._ServiceRegister(self.SVC_TEMP, self.TempSensor)
+            # self._ServiceRegister("BatLvl", self.BatteryVoltageSensor)
+        self._ServiceRegister(self.SVC_MSGEX, self.MsgEx)
+        self._ServiceRegister(self.SVC_REG, self.Registration)
+        if self.Runner is not None:
+            self.Scheduler.ServiceRegister(self.Runner)
+
+        self._Stage("scheduler")
+
+        # Link the observers to the sensors.
+        self.DummySensor.ObserverAttachNewSample(self.MoistObserver)
+        self.TempSensor.ObserverAttachNewSample(self.TempObserver)
+
+        self._Stage("observers")
+
+        # Set intervals for all services.
+        self._IntervalSet(self.SVC_MSGEX, self.MsgEx, self.MsgExInterval)
+        self.MsgEx.DefaultIntervalSet(self.MsgExInterval)
+        self._IntervalSet(self.SVC_DUMMY, self.DummySensor, self.MoistReadInterval)
+        self._IntervalSet(self.SVC_TEMP, self.TempSensor, self.SensorReadInterval)
+
+        # Activate the Message Exchange to attempt to connect to the LoRa network
+        # if no LoRaWAN session exists yet.
+        if self.LoraProtocol.HasSession() is False:
+            self.MsgEx.SvcActivate()
+
+        # self.BatteryObserver.Update(100)
+
+        self._Stage("intervals")
+
+        self.Log.info(LogFormats.MAIN_INIT_DONE)
+
+    def _SetupResume(self):
+        """
+        Resume after a timer wake. Only the services that are due are constructed,
+        all other periodic services are represented by a DeferredService which
+        constructs the real service when it becomes due during this wake.
+        """
+        self.Resuming = True
+
+        self._LoggingSetup()
+
+        self._Stage("logging")
+
+        rst_reason = ResetReason.ResetReason()
+        self.Log.debug(LogFormats.MAIN_RESET_REASON, rst_reason)
+
+        self.SensorSupply = self._SensorSupplyCreate()
+        self._SchedulerCreate()
+
+        factories = {
+            self.SVC_DUMMY: self._DummySensorCreate,
+            self.SVC_TEMP: self._TempSensorCreate,
+            self.SVC_MSGEX: self._MsgExCreate,
+        }
+
+        if self.SAMPLING_GROUP is True:
+            self._GroupCreate()
+
+        now = utime.time()
+        due = 0
+        for name, factory in factories.items():
+            if name not in self.Resume.Services:
+                continue
+            last_run, interval = self.Resume.Services[name]
+            # Members of the sampling group are run early when they are due within
+            # the tolerance of the group.
+            margin = self.DEEPSLEEP_THRESHOLD_SEC
+            if self.Group is not None and name != self.SVC_MSGEX:
+                margin += self.SAMPLING_GROUP_TOLERANCE_SEC
+            if self.Resume.IsDue(name, now, margin):
+                svc = factory()
+                due += 1
+            else:
+                svc = DeferredService(name, factory)
+            if self.Group is not None and name != self.SVC_MSGEX:
+                self._GroupMemberAdd(name, svc, interval)
+            else:
+                self._ServiceRegister(name, svc)
+            self._IntervalSet(name, svc, interval)
+            svc.SvcLastRun = last_run
+
+        if self.Group is not None:
+            # The group is scheduled from the last runs of its members.
+            self._ServiceRegister(self.SVC_GROUP, self.Group)
+            self.Group.Reschedule(now)
+
+        if self.Runner is not None:
+            # The runner is scheduled from the last runs of its members.
+            self.Scheduler.ServiceRegister(self.Runner)
+            self.Runner.Reschedule(now)
+
+        self._Stage("scheduler")
+
+        self.Log.info(LogFormats.MAIN_RESUMED, due)
+
+    def _LoggingSetup(self):
+        # The upyiot library logs text through the ExtLogging class, only its
+        # warnings and errors are kept. The application logs to the LogRing.
+        ExtLogging.ConfigGlobal(level=ExtLogging.WARNING, stream=None, dir=self.DIR_TREE[self.DIR_LOG],
+                                file_prefix="log_", line_limit=1000, file_limit=10)
+
+        StructFile.SetLogger(ExtLogging.Create("SFile"))
+
+    def _SchedulerCreate(self):
+        self.Scheduler = ServiceScheduler(deepsleep_threshold_sec=self.DEEPSLEEP_THRESHOLD_SEC,
+                                         # deep_sleep_obj=PowerManager.PowerManager(events=self.Events),
+                                          directory=self.DIR_TREE[self.DIR_SYS])
+
+        self.Scheduler.RegisterCallbackBeforeDeepSleep(self.BeforeSleep)
+
+        if self.ASYNC_MODE is True:
+            self.Runner = AsyncRunner(self.SVC_ASYNC, margin=self.DEEPSLEEP_THRESHOLD_SEC)
+            # The runner is profiled as a whole, its members on their own.
+            if self.Profiler is not None:
+                self.Profiler.Attach(self.SVC_ASYNC, self.Runner)
+
+    def _ServiceRegister(self, name, svc):
+        if self.Profiler is not None:
+            self.Profiler.Attach(name, svc)
+        if self.Heap is not None:
+            self.Heap.Attach(name, svc)
+        # The Registration service only runs once the Message Exchange connected.
+        if self.Runner is not None and name != self.SVC_REG:
+            self.Runner.MemberAdd(svc, lambda: self._NextDue(name, svc))
+        else:
+            self.Scheduler.ServiceRegister(svc)
+
+    def _NextDue(self, name, svc):
+        if name == self.SVC_GROUP:
+            return self.Group.NextDue()
+        if svc.SvcLastRun <= 0:
+            return 0
+        if name == self.SVC_MSGEX and self.MsgEx is not None:
+            # The Message Exchange is activated, e.g. by the Registration or a
+            # critical event, and deferred by the planner. svc may be the
+            # DeferredService that created it.
+            if self.MsgEx.Activated is True:
+                return 0
+            return svc.SvcLastRun + self.MsgEx.CurrentInterval()
+        return svc.SvcLastRun + self.Intervals.get(name, 0)
+
+    def _MsgExActivated(self):
+        # The runner is rescheduled when the Message Exchange is activated from
+        # outside of its run, e.g. by the Registration service. Before the first
+        # run of the runner all members are due anyway.
+        if self.Runner is not None and self.Runner.SvcLastRun > 0:
+            self.Runner.Reschedule(utime.time())
+
+    def _SensorSupplyCreate(self):
+        # The moisture and battery level sensors share a supply (CFG_HW_PIN_MOIST_EN is
+        # CFG_HW_PIN_VBAT_LVL_EN), it is passed to the sampling group as well. The
+        # settle time is waited for by the SharedSupply, so it can overlap with other work.
+        return SharedSupply(Supply(Pins.CFG_HW_PIN_MOIST_EN, 3.3, 0),
+                            settle_ms=self.SENSOR_SUPPLY_SETTLE_MS)
+
+    def _GroupCreate(self):
+        self.Group = SamplingGroup(self.SVC_GROUP,
+                                   tolerance=self.SAMPLING_GROUP_TOLERANCE_SEC,
+                                   supply=self.SensorSupply)
+        return self.Group
+
+    def _GroupMemberAdd(self, name, svc, interval):
+        if self.Profiler is not None:
+            self.Profiler.Attach(name, svc)
+        if self.Heap is not None:
+            self.Heap.Attach(name, svc)
+        self.Group.MemberAdd(svc, interval)
+
+    def _IntervalSet(self, name, svc, interval):
+        if self.Group is not None and self.Group.IsMember(svc):
+            self.Group.MemberIntervalSet(svc, interval)
+        svc.SvcIntervalSet(interval)
+        self.Intervals[name] = interval
+        self.Services[name] = svc
+
+    def _LoraConfig(self):
+        if self.LoraConfig is not None:
+            return self.LoraConfig
+
+        if self.NETWORK not in self.NETWORK_RADIO:
             raise Exception("No valid network LoRa selected.")
+        self.LoraConfig = self.LORA_CONFIG if self.LORA_CONFIG is not None else self.NodeLoraConfig()
+
+        if self.ADAPTIVE_SF is True:
+            self.LinkAdr = LinkAdr(self.DIR_TREE[self.DIR_LORA], self.LoraConfig)
+            self.LoraConfig = self.LinkAdr.Config(self.LoraConfig)
+        return self.LoraConfig
+
+    def NodeLoraConfig(self):
+        """
+        :return: LoRa configuration of the node, see Config.Node. The radio
+        settings are the defaults of the network unless the node sets a
+        spreading factor.
+        :rtype: dict
+        """
+        freq, sf, ldro = self.NETWORK_RADIO[self.NETWORK]
+        if Node.CFG_LORA_SF is not None:
+            sf = Node.CFG_LORA_SF
+            ldro = 1 if sf >= 11 else 0
+        return {
+            "freq"  : freq,
+            "sf"    : sf,
+            "ldro"  : ldro,
+            "app_eui" : Node.CFG_LORA_APP_EUI,
+            "dev_eui" : Node.CFG_LORA_DEV_EUI,
+            "app_key" : Node.CFG_LORA_APP_KEY
+        }
+
+    def _LoraCreate(self):
+        if self.LoraProtocol is not None:
+            return self.LoraProtocol
+
+        self.LoraProtocol = LoraProtocol(self._LoraConfig(), directory=self.DIR_TREE[self.DIR_LORA])
+        # Keep the frame counter in RTC memory and a wear leveled log instead of
+        # rewriting it for every frame.
+        self.LoraState = LoraState(self.DIR_TREE[self.DIR_LORA])
+        self.LoraProtocol.Params = self.LoraState
+        if self.NETWORK is self.TTN and self.NETWORK_REG is self.ABP and self.Resuming is False:
+            self.LoraProtocol.Params.StoreSession(Node.CFG_LORA_DEV_ADDR, Node.CFG_LORA_APP_SKEY,
+                                                  Node.CFG_LORA_NWK_SKEY)
+
+        return self.LoraProtocol
+
+    def _DummySensorCreate(self):
+        if self.DummySensor is not None:
+            return self.DummySensor
+
+        # Create driver instance.
+        self.DummySensorDriver = DummySensor(self.DummySamples)
 
         self.DummySensor = Sensor.Sensor(self.DIR_TREE[self.DIR_SENSOR],
                                          "Dummy",
                                          self.FILTER_DEPTH,
                                          self.DummySensorDriver,
-                                         samples_per_update=3,
+                                         samples_per_update=self.MoistSamplesPerUpdate,
                                          dec_round=True,
-                                         store_data=True)
+                                         store_data=self.HISTORY is False)
+
+        if self.Events is not None:
+            self.Events.Attach(self.DummySensor, MoistureSensorReport.SUBTYPE_MOISTURE_REPORT)
+
+        if self.HISTORY is True:
+            self.DummySensor.ObserverAttachNewSample(self._HistoryCreate(MoistureSensorReport.SUBTYPE_MOISTURE_REPORT))
+
+        if self.Resuming is True:
+            self.DummySensor.ObserverAttachNewSample(
+                LazyObserver(self._MoistObserverCreate))
+
+        if self.ADAPTIVE_INTERVAL is True:
+            self._AdaptiveAttach(self.SVC_DUMMY, self.DummySensor, RtcMemory.REGION_ADAPT_MOIST,
+                                 self.MoistReadInterval, self.MOIST_ADAPTIVE)
+
+        return self.DummySensor
+
+    def _TempSensorCreate(self):
+        if self.TempSensor is not None:
+            return self.TempSensor
+
+        # Create driver instance.
+        self.InternalTemp = InternalTemp()
 
         self.TempSensor = Sensor.Sensor(self.DIR_TREE[self.DIR_SENSOR],
                                         "Temp",
                                         self.FILTER_DEPTH,
                                         self.InternalTemp, # TODO: Replace InternalTemp driver with TempSensorDriver
-                                        samples_per_update=2,
+                                        samples_per_update=self.TempSamplesPerUpdate,
                                         dec_round=True,
-                                        store_data=True)
-
-        # self.BatteryVoltageSensor = Sensor.Sensor(self.DIR_TREE[self.DIR_SENSOR],
-        #                                           "BatLvl",
-        #                                           self.FILTER_DEPTH,
-        #                                           self.VBatSensorDriver,
-        #                                           samples_per_update=2,
-        #                                           dec_round=False,
-        #                                           store_data=True)
-
-        self.MsgEx = MessageExchange(directory=self.DIR_TREE[self.DIR_MSG],
-                                     proto_obj=self.LoraProtocol,
-                                     send_retries=self.RETRIES,
-                                     msg_size_max=self.LoraProtocol.Mtu,
-                                     msg_send_limit=self.SEND_LIMIT)
+                                        store_data=self.HISTORY is False)
+
+        if self.Events is not None:
+            self.Events.Attach(self.TempSensor, TemperatureSensorReport.SUBTYPE_TEMPERATURE_REPORT)
+
+        if self.HISTORY is True:
+            self.TempSensor.ObserverAttachNewSample(self._HistoryCreate(TemperatureSensorReport.SUBTYPE_TEMPERATURE_REPORT))
+
+        if self.Resuming is True:
+            self.TempSensor.ObserverAttachNewSample(
+                LazyObserver(self._TempObserverCreate))
+
+        if self.ADAPTIVE_INTERVAL is True:
+            self._AdaptiveAttach(self.SVC_TEMP, self.TempSensor, RtcMemory.REGION_ADAPT_TEMP,
+                                 self.SensorReadInterval, self.TEMP_ADAPTIVE)
+
+        return self.TempSensor
+
+    def _AdaptiveAttach(self, name, sensor, region, interval, settings):
+        interval_max, resolution = settings
+
+        def interval_set(value):
+            # The registered service may be a placeholder of the sensor.
+            self._IntervalSet(name, self.Services.get(name, sensor), value)
+
+        sensor.ObserverAttachNewSample(AdaptiveInterval(region,
+                                                        interval_min=interval,
+                                                        interval_max=max(interval_max, interval),
+                                                        resolution=resolution,
+                                                        interval_set=interval_set))
+
+    def _MsgExCreate(self):
+        """
+        Create the Message Exchange service together with everything that sends
+        through it: the Registration service, message specifications, formatters
+        and the sensor data observers.
+        """
+        if self.MsgEx is not None:
+            return self.MsgEx
+
+        self._LoraCreate()
+
+        self.Parser = self._ParserCreate()
+        Message.SetParser(self.Parser)
+
+        # The planner defers the Message Exchange while the duty cycle budget is exhausted.
+        # Messages are queued until the uplink that carries them has been sent and
+        # drained in batches.
+        self.Planner = UplinkPlanner(self._LoraConfig(), directory=self.DIR_TREE[self.DIR_SYS])
+        self.Planner.LinkSet(self.LinkAdr)
+        # With an adaptive spreading factor the queue slots fit the payload of
+        # every spreading factor, so the queue survives a change.
+        self.MsgQueue = MessageQueue(self.DIR_TREE[self.DIR_MSG],
+                                     slots=self.MSG_QUEUE_SLOTS,
+                                     record_max=Airtime.PAYLOAD_MAX[LinkAdr.SF_MIN]
+                                     if self.LinkAdr is not None else self.LoraProtocol.Mtu)
+        self.MsgEx = QueuedMessageExchange(self.MsgQueue,
+                                           self.Parser,
+                                           self.LoraProtocol.Mtu - SampleBatcher.MSG_OVERHEAD,
+                                           self.Planner,
+                                           self.MsgExInterval,
+                                           events=self.Events,
+                                           directory=self.DIR_TREE[self.DIR_MSG],
+                                           proto_obj=self.LoraProtocol,
+                                           send_retries=self.RETRIES,
+                                           msg_size_max=self.LoraProtocol.Mtu,
+                                           msg_send_limit=self.SEND_LIMIT)
+        self.MsgEx.ActivateCallback = self._MsgExActivated
+
+        if self.Resuming is True:
+            # The Registration service depends on the Version instance, which is
+            # otherwise created early in the full setup.
+            Version(self.DIR_TREE[self.DIR_SYS], self.VER_MAJOR, self.VER_MINOR, self.VER_PATCH)
+
+        # ConfigUpdate acknowledgements stay pending until they have been sent.
+        self.Config.MsgExSet(self.MsgEx)
+
+        # Batched and combined reports carry small data items (e.g. registration info)
+        # in their spare bytes.
+        if self.REPORT_MODE is not self.REPORT_PER_SENSOR:
+            self.Piggyback = Piggyback()
+            self.Piggyback.RiderAdd(self.Config)
 
         # Create the registration info spec and Registration service.
         # Link the Registration service to the Message Exchange service. The Message Exchange
-        # service will activate the Registration service when it connects to the LoRa network.
+        # service will activate the Registration service when it connects to the LoRa network,
+        # unless the registration info is sent via the piggyback.
         self.RegistrationInfo = RegistrationInfo()
-        self.Registration = Registration(self.MsgEx, self.RegistrationInfo)
+        self.Registration = Registration(self.MsgEx, self.RegistrationInfo,
+                                         directory=self.DIR_TREE[self.DIR_SYS],
+                                         piggyback=self.Piggyback)
         self.MsgEx.AttachConnectionStateObserver(self.Registration)
 
-        self.Scheduler = ServiceScheduler(deepsleep_threshold_sec=self.DEEPSLEEP_THRESHOLD_SEC,
-                                         # deep_sleep_obj=PowerManager.PowerManager(),
-                                          directory=self.DIR_TREE[self.DIR_SYS])
-
-        # Set service dependencies.
-        # There are no hard dependencies between the services.
+        # A ConfigUpdate acknowledgement that has not been queued on a report since
+        # it was received is sent on its own.
+        self.Config.AckPut(self.MsgEx)
 
-        # Register all services to the scheduler.
-        self.Scheduler.ServiceRegister(self.DummySensor)
-        self.Scheduler.ServiceRegister(self.TempSensor)
-        # self.Scheduler.ServiceRegister(self.BatteryVoltageSensor)
-        self.Scheduler.ServiceRegister(self.MsgEx)
-        self.Scheduler.ServiceRegister(self.Registration)
+        # Events ride along after the registration info, critical events are
+        # sent on their own.
+        if self.Events is not None:
+            if self.Piggyback is not None:
+                self.Piggyback.RiderAdd(self.Events)
+            self.EventReport = EventReport()
+            self.MsgEx.RegisterMessageType(self.EventReport)
+            if self.CODEC == self.CODEC_FIXED:
+                self.Parser.Register(self.EventReport)
 
-        Message.SetParser(CborParser())
         MessageTemplate.SectionsSet(Metadata.MSG_SECTION_META,
                                     Metadata.MSG_SECTION_DATA)
+        if self.DUTY_CYCLE_TELEMETRY is True:
+            Metadata.MetadataFuncs[Metadata.MSG_META_DUTY] = self.Planner.RemainingPercent
         MessageTemplate.MetadataTemplateSet(Metadata.Metadata,
                                             Metadata.MetadataFuncs)
 
@@ -260,78 +760,225 @@ class MainApp:
         self.MoistReport = MoistureSensorReport()
         self.BatteryReport = BatterySensorReport()
         self.TempReport = TemperatureSensorReport()
-
-        # Create MessageFormatters and couple them with their message specs.
-        moist_report_meta = {
-            Metadata.MSG_META_TYPE: self.MoistReport.Type,
-            Metadata.MSG_META_SUBTYPE: self.MoistReport.Subtype,
-        }
-        self.MoistFmt = MessageFormatter(self.MsgEx,
-                                         MessageFormatter.SEND_ON_CHANGE,
-                                         self.MoistReport,
-                                         moist_report_meta)
-
-        battery_report_meta = {
-            Metadata.MSG_META_TYPE: self.BatteryReport.Type,
-            Metadata.MSG_META_SUBTYPE: self.BatteryReport.Subtype,
-        }
-        self.BatteryFmt = MessageFormatter(self.MsgEx,
-                                         MessageFormatter.SEND_ON_CHANGE,
-                                         self.BatteryReport,
-                                         battery_report_meta)
-
-        temp_report_meta = {
-            Metadata.MSG_META_TYPE: self.TempReport.Type,
-            Metadata.MSG_META_SUBTYPE: self.TempReport.Subtype,
-        }
-        self.TempFmt = MessageFormatter(self.MsgEx,
-                                         MessageFormatter.SEND_ON_CHANGE,
-                                         self.TempReport,
-                                         temp_report_meta)
+        self.CombinedReport = CombinedSensorReport()
+        self.BacklogReport = BacklogReport()
+        self.ConfigUpdate = ConfigUpdate()
+        self.ConfigAck = ConfigAck()
+        self.HistoryRequest = HistoryRequest()
+        self.HistoryReport = HistoryReport()
 
         # Register message specs for exchange.
         self.MsgEx.RegisterMessageType(self.MoistReport)
         self.MsgEx.RegisterMessageType(self.BatteryReport)
         self.MsgEx.RegisterMessageType(self.TempReport)
+        self.MsgEx.RegisterMessageType(self.CombinedReport)
         self.MsgEx.RegisterMessageType(self.RegistrationInfo)
+        self.MsgEx.RegisterMessageType(self.BacklogReport)
+        self.MsgEx.RegisterMessageType(self.ConfigAck)
+        self.MsgEx.ReceiverAdd(self.ConfigUpdate, self._ConfigReceive)
+        self.MsgEx.RegisterMessageType(self.HistoryReport)
+        self.MsgEx.ReceiverAdd(self.HistoryRequest, self._HistoryReceive)
+        if self.Profiler is not None:
+            self.ProfileReport = ProfileReport()
+            self.MsgEx.RegisterMessageType(self.ProfileReport)
+            self.Profiler.RadioSet(self.Planner)
+            self.Profiler.ReporterSet(self.MsgEx)
+
+        if self.CODEC == self.CODEC_FIXED:
+            for msg_spec in (self.MoistReport, self.BatteryReport, self.TempReport,
+                             self.CombinedReport, self.RegistrationInfo, self.BacklogReport,
+                             self.ConfigUpdate, self.ConfigAck, self.HistoryRequest,
+                             self.HistoryReport):
+                self.Parser.Register(msg_spec)
+            if self.Profiler is not None:
+                self.Parser.Register(self.ProfileReport)
 
         # Create observers for the sensor data.
-        self.MoistObserver = self.MoistFmt.CreateObserver(MoistureSensorReport.DATA_KEY_MEASUREMENTS)
-        self.BatteryObserver = self.BatteryFmt.CreateObserver(BatterySensorReport.DATA_KEY_MEASUREMENTS)
-        self.TempObserver = self.TempFmt.CreateObserver(TemperatureSensorReport.DATA_KEY_MEASUREMENTS)
-
-        # Link the observers to the sensors.
-        self.DummySensor.ObserverAttachNewSample(self.MoistObserver)
-        self.TempSensor.ObserverAttachNewSample(self.TempObserver)
-
-        self.Scheduler.RegisterCallbackBeforeDeepSleep(MainApp.BeforeSleep)
-
-        # Set intervals for all services.
-        self.MsgEx.SvcIntervalSet(self.MsgExInterval)
-        self.MsgEx.DefaultIntervalSet(self.MsgExInterval)
-        self.DummySensor.SvcIntervalSet(self.MoistReadInterval)
-        self.TempSensor.SvcIntervalSet(self.SensorReadInterval)
-
-        # Activate the Message Exchange to attempt to connect to the LoRa network
-        # if no LoRaWAN session exists yet.
-        if self.LoraProtocol.HasSession() is False:
-            self.MsgEx.SvcActivate()
-
-        # self.BatteryObserver.Update(100)
-
-        self.Log.info("Finished initialization.")
+        if self.REPORT_MODE is self.REPORT_COMBINED:
+            # Only the sections of the enabled sensors wait for a sample, there is no
+            # battery level sensor so the battery section is sent empty.
+            self.CombinedFmt = CombinedFormatter(self.MsgEx,
+                                                 self.CombinedReport,
+                                                 directory=self.DIR_TREE[self.DIR_SENSOR],
+                                                 deadline=self.COMBINED_DEADLINE_SEC,
+                                                 payload_max=self.LoraProtocol.Mtu - SampleBatcher.MSG_OVERHEAD,
+                                                 piggyback=self.Piggyback)
+            self.MoistObserver = self.CombinedFmt.CreateObserver(CombinedSensorReport.DATA_KEY_MOISTURE)
+            self.TempObserver = self.CombinedFmt.CreateObserver(CombinedSensorReport.DATA_KEY_TEMPERATURE)
+        elif self.REPORT_MODE is self.REPORT_BATCHED:
+            self.MoistObserver = self._BatcherCreate(self.MoistReport, "Moist", self.MoistReadInterval)
+            self.TempObserver = self._BatcherCreate(self.TempReport, "Temp", self.SensorReadInterval)
+        elif self.DEADBAND is True:
+            self.MoistObserver = self._ReporterCreate(self.MoistReport, "Moist", self.MOIST_DEADBAND)
+            self.TempObserver = self._ReporterCreate(self.TempReport, "Temp", self.TEMP_DEADBAND)
+        else:
+            self.MoistObserver = ReportFormatter(self.MsgEx, self.MoistReport,
+                                                 MoistureSensorReport.DATA_KEY_MEASUREMENTS)
+            self.TempObserver = ReportFormatter(self.MsgEx, self.TempReport,
+                                                TemperatureSensorReport.DATA_KEY_MEASUREMENTS)
+        self.BatteryObserver = ReportFormatter(self.MsgEx, self.BatteryReport,
+                                               BatterySensorReport.DATA_KEY_MEASUREMENTS)
+
+        # Pending critical events are put once the message specifications are set.
+        if self.Events is not None:
+            self.Events.MsgExSet(self.MsgEx, payload_max=self.LoraProtocol.Mtu - SampleBatcher.MSG_OVERHEAD)
+
+        if self.Resuming is True:
+            self.MsgEx.DefaultIntervalSet(self.MsgExInterval)
+            # The Registration service only runs when the Message Exchange connects.
+            self._ServiceRegister(self.SVC_REG, self.Registration)
+
+        return self.MsgEx
+
+    def _ConfigReceive(self, msg):
+        """
+        Apply a ConfigUpdate to the live services. The filter depth and samples
+        per update take effect when the sensors are created at the next wake.
+        """
+        intervals = {
+            "MsgExInterval": self.SVC_MSGEX,
+            "SensorReadInterval": self.SVC_TEMP,
+            "MoistReadInterval": self.SVC_DUMMY,
+        }
+        for attr, value in self.Config.Receive(msg).items():
+            setattr(self, attr, value)
+            name = intervals.get(attr)
+            if name is not None and name in self.Services:
+                self._IntervalSet(name, self.Services[name], value)
+                if name == self.SVC_MSGEX:
+                    self.MsgEx.DefaultIntervalSet(value)
+
+        # Without a piggyback the acknowledgement is a message of its own.
+        if self.Piggyback is None:
+            self.Config.AckPut(self.MsgEx)
+
+    def _HistoryCreate(self, subtype):
+        history = self.Histories.get(subtype)
+        if history is None:
+            if subtype == MoistureSensorReport.SUBTYPE_MOISTURE_REPORT:
+                history = SampleHistory(self.DIR_TREE[self.DIR_SENSOR], "Moist",
+                                        self.MoistReadInterval, tiers=self.HISTORY_TIERS)
+            else:
+                history = SampleHistory(self.DIR_TREE[self.DIR_SENSOR], "Temp",
+                                        self.SensorReadInterval, tiers=self.HISTORY_TIERS)
+            self.Histories[subtype] = history
+        return history
+
+    def _HistoryReceive(self, msg):
+        """
+        Answer a HistoryRequest with the oldest entries of the requested range
+        that fit in one HistoryReport, an empty report if the sensor has no
+        history in the range.
+        """
+        data = msg[Metadata.MSG_SECTION_DATA]
+        subtype = data[HistoryRequest.DATA_KEY_SENSOR]
+        if self.HISTORY is False or subtype not in (MoistureSensorReport.SUBTYPE_MOISTURE_REPORT,
+                                                    TemperatureSensorReport.SUBTYPE_TEMPERATURE_REPORT):
+            return
+
+        space = self.LoraProtocol.Mtu - SampleBatcher.MSG_OVERHEAD
+        buf = bytearray(space)
+        offset = 0
+        t = 0
+        for entry in self._HistoryCreate(subtype).Query(data[HistoryRequest.DATA_KEY_START],
+                                                        data[HistoryRequest.DATA_KEY_END],
+                                                        count_max=space // 2):
+            dt = entry[0] - t
+            if offset + HistoryReport.EntrySize(dt, *entry[1:]) > space:
+                break
+            offset = HistoryReport.EntryPackInto(buf, offset, dt, *entry[1:])
+            t = entry[0]
+
+        self.MsgEx.MessagePut(msg_data_dict={HistoryRequest.DATA_KEY_SENSOR: subtype,
+                                             HistoryReport.DATA_KEY_ENTRIES: bytes(buf[0:offset])},
+                              msg_type=HistoryRequest.TYPE_HISTORY,
+                              msg_subtype=HistoryReport.SUBTYPE_HISTORY_REPORT,
+                              msg_meta_dict={
+                                  Metadata.MSG_META_TYPE: HistoryRequest.TYPE_HISTORY,
+                                  Metadata.MSG_META_SUBTYPE: HistoryReport.SUBTYPE_HISTORY_REPORT,
+                              })
+
+    def _ParserCreate(self):
+        if self.CODEC == self.CODEC_FIXED:
+            return FixedLayoutParser(buf_size=self.LoraProtocol.Mtu)
+        return CborParser()
+
+    def _BatcherCreate(self, msg_spec, name, interval):
+        batcher = SampleBatcher(self.MsgEx, msg_spec, name,
+                                directory=self.DIR_TREE[self.DIR_SENSOR],
+                                interval=interval,
+                                payload_max=self.LoraProtocol.Mtu - SampleBatcher.MSG_OVERHEAD,
+                                age_max=self.BATCH_AGE_MAX_SEC,
+                                piggyback=self.Piggyback)
+        self.Batchers.append(batcher)
+        return batcher
+
+    def _ReporterCreate(self, msg_spec, name, settings):
+        deadband, hysteresis, interval_min, interval_max = settings
+        reporter = DeadbandReporter(self.MsgEx, msg_spec, name,
+                                    directory=self.DIR_TREE[self.DIR_SENSOR],
+                                    deadband=deadband,
+                                    hysteresis=hysteresis,
+                                    interval_min=interval_min,
+                                    interval_max=interval_max)
+        self.Reporters.append(reporter)
+        return reporter
+
+    def _MoistObserverCreate(self):
+        self._MsgExCreate()
+        return self.MoistObserver
+
+    def _TempObserverCreate(self):
+        self._MsgExCreate()
+        return self.TempObserver
 
     def Reset(self):
-        self.MsgEx.Reset()
-        self.DummySensor.SamplesDelete()
+        self._MsgExCreate().Reset()
+        self._DummySensorCreate().SamplesDelete()
+        if self.HISTORY is True:
+            for subtype in (MoistureSensorReport.SUBTYPE_MOISTURE_REPORT,
+                            TemperatureSensorReport.SUBTYPE_TEMPERATURE_REPORT):
+                self._HistoryCreate(subtype).Clear()
+        self.Resume.Invalidate()
 
     def Run(self):
-        self.Log.info("Starting scheduler")
+        self.Log.info(LogFormats.MAIN_SCHED_START)
         self.Scheduler.Run()
 
-    @staticmethod
-    def BeforeSleep():
-       ExtLogging.Stop()
-       StructFile.ResetLogger()
-
+    def ResumeSave(self):
+        """
+        Persist the last run and interval of all periodic services. The state is
+        only marked resumable if a LoRaWAN session exists, otherwise the next wake
+        takes the full setup path to (re)join the network.
+        """
+        services = {}
+        for name, svc in self.Services.items():
+            services[name] = (svc.SvcLastRun, self.Intervals[name])
+
+        flags = 0
+        if self.LoraProtocol is None or self.LoraProtocol.HasSession() is True:
+            flags |= ResumeState.FLAG_SESSION
+
+        self.Resume.Save(services, flags, utime.time())
+
+    def BeforeSleep(self):
+        for batcher in self.Batchers:
+            batcher.Suspend()
+        for reporter in self.Reporters:
+            reporter.Suspend()
+        if self.CombinedFmt is not None:
+            self.CombinedFmt.Suspend()
+        # After the reports, which may have taken the events along.
+        if self.Events is not None:
+            self.Events.Suspend()
+        if self.Planner is not None:
+            self.Planner.Save()
+        if self.Profiler is not None:
+            self.Profiler.Save()
+        self.ResumeSave()
+        if self.Heap is not None:
+            self.Heap.Summary()
+        LogRing.Suspend()
+        ExtLogging.Stop()
+        StructFile.ResetLogger()
 
@@ -0,0 +1,349 @@
+from Schemas.BacklogReport import BacklogReport
+from Schemas.RegistrationInfo import RegistrationInfo
+from Schemas.EventReport import EventReport
+from Schemas import Metadata
+from Codec import Varint
+from MainApp.UplinkPlanner import PlannedMessageExchange
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+from micropython import const
+import ustruct
+import uos
+import array
+
+
+class MessageQueue:
+    """
+    Store-and-forward queue of encoded messages in a single file of a fixed
+    number of fixed size slots. Slots are read and written in place, so the
+    file never grows. Every record has a priority class: when the queue is
+    full, the oldest record of the lowest class (not above the class of the
+    new record) is dropped. Records are taken highest class first and
+    oldest first within a class. Only the slot headers are kept in RAM.
+    """
+
+    FILE_NAME       = "ring"
+
+    PRIO_REPORT         = const(0)
+    PRIO_EVENT          = const(1)
+    PRIO_REGISTRATION   = const(2)
+
+    # Sequence number, priority, record length. A slot with length 0 is free.
+    SLOT_HDR_FMT    = "<IBB"
+    SLOT_HDR_SIZE   = const(6)
+    RECORD_MAX      = const(255)
+
+    def __init__(self, directory, slots, record_max):
+        """
+        :param directory: Directory of the queue file.
+        :param slots: Number of records the queue can hold.
+        :param record_max: Maximum record length in bytes, at most RECORD_MAX.
+        """
+        self.Path = directory + "/" + self.FILE_NAME
+        self.SlotCount = slots
+        self.RecordMax = min(record_max, self.RECORD_MAX)
+        self.SlotSize = self.SLOT_HDR_SIZE + self.RecordMax
+        self.Seqs = array.array("I", [0] * slots)
+        self.Prios = bytearray(slots)
+        self.Lens = bytearray(slots)
+        self.Hdr = bytearray(self.SLOT_HDR_SIZE)
+        self.Seq = 0
+        self.Dropped = 0
+        self.Log = LogRing.Create()
+        self._Load()
+        return
+
+    def Count(self):
+        count = 0
+        for length in self.Lens:
+            if length > 0:
+                count += 1
+        return count
+
+    def Put(self, record, prio):
+        """
+        Queue a record.
+        :param record: Encoded message.
+        :param prio: Priority class, see PRIO_*.
+        :return: Sequence number of the record, 0 if it was dropped.
+        :rtype: int
+        """
+        if len(record) == 0 or len(record) > self.RecordMax:
+            self.Log.warning(LogFormats.QUEUE_TOO_BIG, len(record))
+            return 0
+
+        slot = self._Free()
+        if slot < 0:
+            slot = self._Oldest(prio)
+            if slot < 0:
+                self.Dropped += 1
+                return 0
+            self.Dropped += 1
+            self.Log.info(LogFormats.QUEUE_FULL, self.Prios[slot])
+
+        self.Seq += 1
+        ustruct.pack_into(self.SLOT_HDR_FMT, self.Hdr, 0, self.Seq, prio, len(record))
+        with open(self.Path, "r+b") as f:
+            f.seek(slot * self.SlotSize)
+            f.write(self.Hdr)
+            f.write(record)
+
+        self.Seqs[slot] = self.Seq
+        self.Prios[slot] = prio
+        self.Lens[slot] = len(record)
+        return self.Seq
+
+    def Holds(self, seq):
+        """
+        :return: True if the record with the given sequence number is queued.
+        :rtype: boolean
+        """
+        for slot in range(0, self.SlotCount):
+            if self.Lens[slot] > 0 and self.Seqs[slot] == seq:
+                return True
+        return False
+
+    def Next(self, skip=None):
+        """
+        :param skip: Slots to skip.
+        :return: Slot of the record to take next or -1 if the queue is empty.
+        :rtype: int
+        """
+        best = -1
+        for slot in range(0, self.SlotCount):
+            if self.Lens[slot] == 0 or (skip is not None and slot in skip):
+                continue
+            if best < 0 or self.Prios[slot] > self.Prios[best] or \
+                    (self.Prios[slot] == self.Prios[best] and self.Seqs[slot] < self.Seqs[best]):
+                best = slot
+        return best
+
+    def ReadInto(self, slot, buf):
+        """
+        Read the record of a slot.
+        :param buf: Buffer (memoryview) of at least the record length.
+        :return: Record length.
+        :rtype: int
+        """
+        length = self.Lens[slot]
+        with open(self.Path, "rb") as f:
+            f.seek(slot * self.SlotSize + self.SLOT_HDR_SIZE)
+            f.readinto(buf[0:length])
+        return length
+
+    def Free(self, slots):
+        """
+        Remove the records of the given slots.
+        """
+        with open(self.Path, "r+b") as f:
+            for slot in slots:
+                # Only the length byte of the header is cleared.
+                f.seek(slot * self.SlotSize + self.SLOT_HDR_SIZE - 1)
+                f.write(b"\x00")
+                self.Lens[slot] = 0
+
+    def _Free(self):
+        for slot in range(0, self.SlotCount):
+            if self.Lens[slot] == 0:
+                return slot
+        return -1
+
+    def _Oldest(self, prio):
+        """
+        :return: Slot of the oldest record of the lowest class not above prio,
+        or -1 if there is none.
+        """
+        victim = -1
+        for slot in range(0, self.SlotCount):
+            if self.Prios[slot] > prio:
+                continue
+            if victim < 0 or self.Prios[slot] < self.Prios[victim] or \
+                    (self.Prios[slot] == self.Prios[victim] and self.Seqs[slot] < self.Seqs[victim]):
+                victim = slot
+        return victim
+
+    def _Load(self):
+        try:
+            size = uos.stat(self.Path)[6]
+        except OSError:
+            size = -1
+
+        if size != self.SlotCount * self.SlotSize:
+            # Create (or re-create on a layout change) the file at its full size.
+            with open(self.Path, "wb") as f:
+                empty = bytes(self.SlotSize)
+                for slot in range(0, self.SlotCount):
+                    f.write(empty)
+            return
+
+        with open(self.Path, "rb") as f:
+            for slot in range(0, self.SlotCount):
+                f.seek(slot * self.SlotSize)
+                f.readinto(self.Hdr)
+                seq, prio, length = ustruct.unpack_from(self.SLOT_HDR_FMT, self.Hdr, 0)
+                if length > self.RecordMax:
+                    length = 0
+                self.Seqs[slot] = seq
+                self.Prios[slot] = prio
+                self.Lens[slot] = length
+                # Free slots keep the sequence number of their last record, so
+                # sequence numbers are never reused.
+                if seq > self.Seq:
+                    self.Seq = seq
+
+
+class QueuedMessageExchange(PlannedMessageExchange):
+    """
+    Message Exchange of which every message is held in a MessageQueue until
+    the uplink that carries it has been sent. The queue is drained in
+    batches: all queued records that fit in one BacklogReport are sent in a
+    single uplink, a single record is sent as its original message. A record
+    that does not fit in a BacklogReport with others (e.g. a full-size
+    report) is sent on its own. A record that does not fit in an uplink at
+    the current data rate (queued at a faster one) stays queued until it
+    does. The records of an uplink that fails stay queued for the next run.
+
+    Delivery observers are called with the sequence numbers of the records
+    of every sent uplink, so the data of a message (e.g. a piggyback rider)
+    can be committed once it has been sent, see PutSeq.
+    """
+
+    PRIORITIES = {
+        RegistrationInfo.TYPE_REGISTRATION: MessageQueue.PRIO_REGISTRATION,
+        EventReport.TYPE_EVENT: MessageQueue.PRIO_EVENT,
+    }
+
+    def __init__(self, queue, parser, payload_max, planner, interval, **kwargs):
+        """
+        :param queue: MessageQueue object.
+        :param parser: Parser used to encode the queued messages.
+        :param payload_max: Maximum size of the records of a BacklogReport in bytes.
+        :param planner: UplinkPlanner object.
+        :param interval: Nominal service interval in seconds.
+        :param kwargs: MessageExchange arguments, msg_size_max is the maximum
+        size of a record that is sent on its own.
+        """
+        self.Queue = queue
+        self.Parser = parser
+        self.Proto = kwargs["proto_obj"]
+        self.PayloadMax = payload_max
+        self.MsgSizeMax = kwargs["msg_size_max"]
+        # Holds the records of a BacklogReport, or a single record of any size.
+        self.Buf = bytearray(max(payload_max, queue.RecordMax + Varint.Size(queue.RecordMax)))
+        self.Record = bytearray(queue.RecordMax)
+        self.Taken = []
+        # Sequence number of the record of the last put message, 0 if it was dropped.
+        self.PutSeq = 0
+        self.DeliveryObservers = []
+        super().__init__(planner, interval, **kwargs)
+        return
+
+    def DeliveryObserverAdd(self, callback):
+        """
+        :param callback: Invoked with the list of sequence numbers of the
+        records of every uplink that has been sent.
+        """
+        self.DeliveryObservers.append(callback)
+
+    def IsQueued(self, seq):
+        """
+        :return: True if the record with the given sequence number has not
+        been sent (or dropped) yet.
+        :rtype: boolean
+        """
+        return seq != 0 and self.Queue.Holds(seq)
+
+    def MessagePut(self, msg_data_dict, msg_type, msg_subtype, msg_meta_dict=None):
+        record = self.Parser.Encode({
+            Metadata.MSG_SECTION_META: {
+                Metadata.MSG_META_TYPE: msg_type,
+                Metadata.MSG_META_SUBTYPE: msg_subtype,
+            },
+            Metadata.MSG_SECTION_DATA: msg_data_dict,
+        })
+        self.PutSeq = self.Queue.Put(record, self.PRIORITIES.get(msg_type, MessageQueue.PRIO_REPORT))
+
+    def SvcRun(self):
+        joining = self.Proto.HasSession() is False
+        self._Exchange()
+        if joining is True and self.Proto.HasSession() is True:
+            # The queue is drained right after the join.
+            self._Exchange()
+
+    def _Exchange(self):
+        count = 0
+        if self.Proto.HasSession() is True and self.Planner.Deferral() == 0:
+            count = self.Drain()
+        sent = self.Planned.Sent
+        super().SvcRun()
+        if count == 0:
+            return
+
+        if self.Planned.Sent == sent:
+            # The records stay queued, the copy held by the Message Exchange is
+            # dropped so it is not sent twice.
+            self.Log.info(LogFormats.QUEUE_KEPT, count)
+            super().Reset()
+            return
+
+        seqs = [self.Queue.Seqs[slot] for slot in self.Taken]
+        self.Queue.Free(self.Taken)
+        self.Taken.clear()
+        self.Log.info(LogFormats.QUEUE_DRAINED, count)
+        for callback in self.DeliveryObservers:
+            callback(seqs)
+
+    def Drain(self):
+        """
+        Move the records that fit in one uplink from the queue to the Message
+        Exchange. The records stay queued (see Taken) until the uplink has
+        been sent.
+        :return: Number of records.
+        :rtype: int
+        """
+        buf = memoryview(self.Buf)
+        length = 0
+        self.Taken.clear()
+        # Taken slots and the slots that do not fit in an uplink at the
+        # current data rate.
+        skip = []
+        while True:
+            slot = self.Queue.Next(skip)
+            if slot < 0:
+                break
+            rec_len = self.Queue.Lens[slot]
+            if length == 0:
+                if rec_len > self.MsgSizeMax:
+                    # Queued at a faster data rate, it waits for a faster one.
+                    skip.append(slot)
+                    continue
+            elif length + Varint.Size(rec_len) + rec_len > self.PayloadMax:
+                break
+            skip.append(slot)
+            length = Varint.EncodeInto(rec_len, self.Buf, length)
+            self.Queue.ReadInto(slot, buf[length:])
+            length += rec_len
+            self.Taken.append(slot)
+
+        if len(self.Taken) == 1:
+            # Send a single record as the message it was.
+            record = bytes(self.Buf[length - self.Queue.Lens[self.Taken[0]]:length])
+            msg = self.Parser.Decode(record)
+            meta = msg[Metadata.MSG_SECTION_META]
+            super().MessagePut(msg_data_dict=msg[Metadata.MSG_SECTION_DATA],
+                               msg_type=meta[Metadata.MSG_META_TYPE],
+                               msg_subtype=meta[Metadata.MSG_META_SUBTYPE],
+                               msg_meta_dict={
+                                   Metadata.MSG_META_TYPE: meta[Metadata.MSG_META_TYPE],
+                                   Metadata.MSG_META_SUBTYPE: meta[Metadata.MSG_META_SUBTYPE],
+                               })
+        elif len(self.Taken) > 1:
+            super().MessagePut(msg_data_dict={BacklogReport.DATA_KEY_RECORDS: bytes(self.Buf[0:length])},
+                               msg_type=BacklogReport.TYPE_BACKLOG,
+                               msg_subtype=BacklogReport.SUBTYPE_BACKLOG_REPORT,
+                               msg_meta_dict={
+                                   Metadata.MSG_META_TYPE: BacklogReport.TYPE_BACKLOG,
+                                   Metadata.MSG_META_SUBTYPE: BacklogReport.SUBTYPE_BACKLOG_REPORT,
+                               })
+        return len(self.Taken)
@@ -0,0 +1,54 @@
+from micropython import const
+
+
+class Piggyback:
+    """
+    Small data items (riders) that are sent in the spare bytes of sensor
+    reports instead of in messages of their own.
+
+    A rider is an object with a RiderTake(space) method that returns a tuple of
+    (data key, bytes) with at most space bytes, or None if it has nothing to
+    send (or does not fit), and a RiderQueued(seq) method that is called with
+    the sequence number of the queued record that carries the data (0 if the
+    record was dropped), see QueuedMessageExchange.PutSeq. A rider commits its
+    data once that record has been sent.
+    """
+
+    # Upper bound of the encoded size of a rider's data key and length.
+    RIDER_OVERHEAD = const(4)
+
+    def __init__(self):
+        self.Riders = []
+        # Riders of which the data was added to the message being put.
+        self.Carried = []
+        return
+
+    def RiderAdd(self, rider):
+        self.Riders.append(rider)
+
+    def Fill(self, msg_data, space):
+        """
+        Add rider data to a message.
+        :param msg_data: Data section of the message.
+        :param space: Number of spare bytes in the message.
+        :return: Number of spare bytes left.
+        """
+        self.Carried.clear()
+        for rider in self.Riders:
+            if space <= self.RIDER_OVERHEAD:
+                break
+            item = rider.RiderTake(space - self.RIDER_OVERHEAD)
+            if item is not None:
+                msg_data[item[0]] = item[1]
+                space -= len(item[1]) + self.RIDER_OVERHEAD
+                self.Carried.append(rider)
+        return space
+
+    def Queued(self, seq):
+        """
+        Called once the message of the last Fill has been put.
+        :param seq: Sequence number of the record of the message, 0 if it was dropped.
+        """
+        for rider in self.Carried:
+            rider.RiderQueued(seq)
+        self.Carried.clear()
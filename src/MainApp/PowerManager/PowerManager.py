@@ -1,30 +1,65 @@
 from upyiot.drivers.Sleep.DeepSleepBase import DeepSleepExceptionFailed
 from upyiot.drivers.Sleep.DeepSleepBase import DeepSleepBase
+from Schemas.EventReport import EventReport
 from MainApp.PowerManager import Protocol
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
 from micropython import const
 import utime
 
 
 class PowerManager(DeepSleepBase):
 
-    SLEEP_RETRY_MAX         = const(5)
-    SLEEP_RETRY_DELAY_SEC   = const(10)
+    BAUDRATE                = const(2400)
+    SLEEP_FOREVER_SEC       = const(65000)
+    # Time the power manager needs to cut the supply after acknowledging
+    # the sleep command.
+    SLEEP_CONFIRM_MS        = const(200)
 
-    def __init__(self):
-        self.Protocol = Protocol.Protocol(2400)
+    def __init__(self, uart=None, events=None):
+        """
+        :param uart: UART object connected to the power manager, by default
+        UART 2 is used.
+        :param events: EventLog object that records failed sleeps, optional.
+        """
+        self.Protocol = Protocol.Protocol(self.BAUDRATE, uart)
+        self.Events = events
+        self.Log = LogRing.Create()
         return
 
     def DeepSleep(self, msec):
-        self._RetrySleep(int(msec / 1000))
+        self._Sleep(int(msec / 1000))
 
     def DeepSleepForever(self):
-        self._RetrySleep(65000)
+        self._Sleep(self.SLEEP_FOREVER_SEC)
 
     def Status(self):
-        return
+        """
+        Poll the supply and battery state of the power manager.
+        :return: Power status or None if the power manager did not reply.
+        :rtype: Protocol.PowerStatus
+        """
+        try:
+            return self.Protocol.SendCommand(Protocol.PWR_CMD_STATUS)
+        except Protocol.ProtocolException as e:
+            self.Log.warning(LogFormats.PWR_STATUS_FAILED, str(e))
+            return None
 
-    def _RetrySleep(self, sec):
-        for i in range(0, self.SLEEP_RETRY_MAX):
+    def _Sleep(self, sec):
+        try:
             self.Protocol.SendCommand(Protocol.PWR_CMD_SLEEP, sec)
-            utime.sleep(self.SLEEP_RETRY_DELAY_SEC)
+        except Protocol.ProtocolException as e:
+            self.Log.error(LogFormats.PWR_SLEEP_FAILED, str(e))
+            self._Failed(EventReport.SLEEP_NO_REPLY)
+            raise DeepSleepExceptionFailed
+
+        # The power manager has acknowledged the command and is about to
+        # cut the supply.
+        utime.sleep_ms(self.SLEEP_CONFIRM_MS)
+        self.Log.error(LogFormats.PWR_NOT_CUT)
+        self._Failed(EventReport.SLEEP_NOT_CUT)
         raise DeepSleepExceptionFailed
+
+    def _Failed(self, reason):
+        if self.Events is not None:
+            self.Events.Raise(EventReport.EVENT_SLEEP_FAILED, reason)
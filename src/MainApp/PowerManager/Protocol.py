@@ -1,10 +1,89 @@
 from machine import UART
 from micropython import const
+import utime
 
 
 PWR_CMD_SLEEP = const(0)
 PWR_CMD_STATUS = const(1)
 
+# Frame layout: SOF | SEQ | CODE | LEN | PAYLOAD (LEN bytes) | CRC8
+# The CRC covers SEQ up to and including the payload. Replies carry the
+# sequence number of the request they answer.
+FRAME_SOF       = const(0xA5)
+FRAME_HEADER    = const(4)
+FRAME_OVERHEAD  = const(5)
+FRAME_PAYLOAD_MAX = const(16)
+FRAME_SIZE_MAX  = const(21)
+
+# Reply codes.
+RSP_ACK         = const(0x06)
+RSP_NACK        = const(0x15)
+
+# NACK reasons, first payload byte of a NACK reply.
+NACK_CRC        = const(1)
+NACK_UNKNOWN    = const(2)
+NACK_BUSY       = const(3)
+
+
+def _Crc8TableCreate():
+    table = bytearray(256)
+    for i in range(0, 256):
+        crc = i
+        for _ in range(0, 8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table[i] = crc
+    return table
+
+
+_CRC8_TABLE = _Crc8TableCreate()
+
+
+def Crc8(buf, start, end):
+    """
+    CRC-8 (polynomial 0x07, initial value 0) of buf[start:end].
+    """
+    crc = 0
+    for i in range(start, end):
+        crc = _CRC8_TABLE[crc ^ buf[i]]
+    return crc
+
+
+def FrameBuild(buf, seq, code, payload_len):
+    """
+    Complete a frame of which the payload has already been written to
+    buf[FRAME_HEADER:FRAME_HEADER + payload_len].
+    :return: Length of the frame.
+    :rtype: int
+    """
+    buf[0] = FRAME_SOF
+    buf[1] = seq
+    buf[2] = code
+    buf[3] = payload_len
+    end = FRAME_HEADER + payload_len
+    buf[end] = Crc8(buf, 1, end)
+    return end + 1
+
+
+def FrameCheck(buf, length):
+    """
+    :return: Payload length of the frame in buf[0:length], or -1 if the
+    frame is incomplete or corrupt.
+    :rtype: int
+    """
+    if length < FRAME_OVERHEAD or buf[0] != FRAME_SOF:
+        return -1
+    payload_len = buf[3]
+    end = FRAME_HEADER + payload_len
+    if payload_len > FRAME_PAYLOAD_MAX or length < end + 1:
+        return -1
+    if Crc8(buf, 1, end) != buf[end]:
+        return -1
+    return payload_len
+
+
+class ProtocolException(Exception):
+    pass
+
 
 class ProtocolCommand:
 
@@ -12,42 +91,179 @@ class ProtocolCommand:
         self.Command = command
         return
 
-    def Build(self, *args):
+    def Build(self, payload, *args):
+        """
+        Write the command payload.
+        :param payload: Payload buffer (memoryview) of the frame.
+        :return: Payload length.
+        :rtype: int
+        """
         raise NotImplementedError
 
+    def Parse(self, payload, length):
+        """
+        Parse the payload of the ACK reply.
+        :return: Command result.
+        """
+        return True
+
 
 class CommandSleep(ProtocolCommand):
 
-    CMD_LENGTH = const(5)
+    CMD_LENGTH = const(4)
     CMD_ARG_SLEEP_TIME = const(0)
     CMD_CODE = const(97)
 
     def __init__(self):
         super().__init__(self.CMD_CODE)
 
-    def Build(self, *args):
-        sleep_time_sec = args[CommandSleep.CMD_ARG_SLEEP_TIME][0]
-        message = bytearray(CommandSleep.CMD_LENGTH)
-        message[0] = self.Command & 0xFF
-        message[1] = (sleep_time_sec >> 24) & 0xFF
-        message[2] = (sleep_time_sec >> 16) & 0xFF
-        message[3] = (sleep_time_sec >> 8) & 0xFF
-        message[4] = sleep_time_sec & 0xFF
-        print(message)
+    def Build(self, payload, *args):
+        sleep_time_sec = args[CommandSleep.CMD_ARG_SLEEP_TIME]
+        payload[0] = (sleep_time_sec >> 24) & 0xFF
+        payload[1] = (sleep_time_sec >> 16) & 0xFF
+        payload[2] = (sleep_time_sec >> 8) & 0xFF
+        payload[3] = sleep_time_sec & 0xFF
+        return CommandSleep.CMD_LENGTH
+
+
+class PowerStatus:
+
+    FLAG_EXT_SUPPLY = const(0x01)
+    FLAG_CHARGING   = const(0x02)
+    FLAG_BAT_LOW    = const(0x04)
+
+    def __init__(self, supply_mv, battery_mv, flags):
+        self.SupplyMv = supply_mv
+        self.BatteryMv = battery_mv
+        self.Flags = flags
+        return
+
+    def ExternalSupply(self):
+        return self.Flags & PowerStatus.FLAG_EXT_SUPPLY != 0
+
+    def Charging(self):
+        return self.Flags & PowerStatus.FLAG_CHARGING != 0
+
+    def BatteryLow(self):
+        return self.Flags & PowerStatus.FLAG_BAT_LOW != 0
+
+
+class CommandStatus(ProtocolCommand):
+
+    # Supply voltage (mV, 2 bytes), battery voltage (mV, 2 bytes), flags (1 byte).
+    RSP_LENGTH = const(5)
+    CMD_CODE = const(98)
+
+    def __init__(self):
+        super().__init__(self.CMD_CODE)
+
+    def Build(self, payload, *args):
+        return 0
 
-        return message
+    def Parse(self, payload, length):
+        if length < CommandStatus.RSP_LENGTH:
+            raise ProtocolException("Status reply too short")
+        return PowerStatus((payload[0] << 8) | payload[1],
+                           (payload[2] << 8) | payload[3],
+                           payload[4])
 
 
 class Protocol:
+    """
+    Request/reply protocol with the power manager. Every command frame is
+    answered with an ACK or NACK frame carrying the same sequence number.
+    Commands without a valid reply within REPLY_TIMEOUT_MS are retried up to
+    RETRY_MAX times. Frame buffers are allocated once.
+    """
+
+    RETRY_MAX           = const(3)
+    REPLY_TIMEOUT_MS    = const(100)
+    POLL_INTERVAL_MS    = const(2)
 
-    def __init__(self, baudrate):
-        self.Uart = UART(2, baudrate)
+    def __init__(self, baudrate, uart=None):
+        """
+        :param baudrate: UART baudrate.
+        :param uart: UART object, by default UART 2 is used.
+        """
+        self.Uart = uart if uart is not None else UART(2, baudrate)
         self.Commands = dict()
         self.Commands[PWR_CMD_SLEEP] = CommandSleep()
+        self.Commands[PWR_CMD_STATUS] = CommandStatus()
+        self.TxBuf = bytearray(FRAME_SIZE_MAX)
+        self.RxBuf = bytearray(FRAME_SIZE_MAX)
+        self.TxView = memoryview(self.TxBuf)
+        self.RxView = memoryview(self.RxBuf)
+        self.TxPayload = memoryview(self.TxBuf)[FRAME_HEADER:FRAME_HEADER + FRAME_PAYLOAD_MAX]
+        self.RxPayload = memoryview(self.RxBuf)[FRAME_HEADER:FRAME_HEADER + FRAME_PAYLOAD_MAX]
+        self.Seq = 0
+        self.Retries = 0
+        self.Nacks = 0
         return
 
     def SendCommand(self, command, *args):
-        if command in self.Commands.keys():
-            sent = self.Uart.write(self.Commands[command].Build(args))
-            print("Sent {} bytes to PowerMngr.".format(sent))
-        return
+        """
+        Send a command and wait for its reply.
+        :param command: Command ID, e.g. PWR_CMD_SLEEP.
+        :return: Result of the command, see ProtocolCommand.Parse.
+        :raises ProtocolException: When the command is not acknowledged.
+        """
+        cmd = self.Commands.get(command)
+        if cmd is None:
+            raise ProtocolException("Unknown command {}".format(command))
+
+        self.Seq = (self.Seq + 1) & 0xFF
+        frame_len = FrameBuild(self.TxBuf, self.Seq, cmd.Command,
+                               cmd.Build(self.TxPayload, *args))
+
+        for attempt in range(0, self.RETRY_MAX):
+            if attempt > 0:
+                self.Retries += 1
+            # Drop stale bytes, e.g. the reply to a previous attempt that arrived late.
+            while self.Uart.any():
+                self.Uart.read()
+            self.Uart.write(self.TxView[0:frame_len])
+
+            payload_len = self._ReplyReceive()
+            if payload_len < 0:
+                continue
+            if self.RxBuf[2] == RSP_ACK:
+                return cmd.Parse(self.RxPayload, payload_len)
+            self.Nacks += 1
+
+        raise ProtocolException("Command {} not acknowledged".format(cmd.Command))
+
+    def _ReplyReceive(self):
+        """
+        Receive the reply to the last sent frame.
+        :return: Payload length of the reply or -1 on timeout.
+        :rtype: int
+        """
+        start = utime.ticks_ms()
+        length = 0
+        while utime.ticks_diff(utime.ticks_ms(), start) < self.REPLY_TIMEOUT_MS:
+            if self.Uart.any() > 0:
+                n = self.Uart.readinto(self.RxView[length:], FRAME_SIZE_MAX - length)
+                length += n or 0
+            elif length < FRAME_HEADER:
+                utime.sleep_ms(self.POLL_INTERVAL_MS)
+                continue
+
+            # Resynchronize on the start of frame byte.
+            sof = 0
+            while sof < length and self.RxBuf[sof] != FRAME_SOF:
+                sof += 1
+            if sof > 0:
+                self.RxBuf[0:length - sof] = self.RxBuf[sof:length]
+                length -= sof
+            if length < FRAME_HEADER:
+                continue
+
+            payload_len = FrameCheck(self.RxBuf, length)
+            if payload_len >= 0 and self.RxBuf[1] == self.Seq:
+                return payload_len
+            if self.RxBuf[3] > FRAME_PAYLOAD_MAX or length >= FRAME_OVERHEAD + self.RxBuf[3]:
+                # Corrupt or stale frame, skip its start of frame byte.
+                self.RxBuf[0] = 0
+            elif self.Uart.any() == 0:
+                utime.sleep_ms(self.POLL_INTERVAL_MS)
+        return -1
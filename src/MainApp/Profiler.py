@@ -0,0 +1,231 @@
+from Schemas.ProfileReport import ProfileReport
+from Schemas import Metadata
+from MainApp.HeapMonitor import HeapMonitor
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+from micropython import const
+import ustruct
+import utime
+
+
+class ServiceStats:
+    """
+    Rolling statistics of a service. Averages are exponentially weighted
+    with a weight of 1/2^EWMA_SHIFT for the newest run.
+    """
+
+    EWMA_SHIFT = const(3)
+
+    def __init__(self, runs=0, time_us=0, time_us_max=0, radio_ms=0, heap=0, charge_uc=0):
+        self.Runs = runs
+        self.TimeUs = time_us
+        self.TimeUsMax = time_us_max
+        self.RadioMs = radio_ms
+        self.Heap = heap
+        self.ChargeUc = charge_uc
+        return
+
+    def Add(self, time_us, radio_ms, heap, charge_uc):
+        if self.Runs == 0:
+            self.TimeUs = time_us
+            self.RadioMs = radio_ms
+            self.Heap = heap
+            self.ChargeUc = charge_uc
+        else:
+            self.TimeUs += (time_us - self.TimeUs) >> self.EWMA_SHIFT
+            self.RadioMs += (radio_ms - self.RadioMs) >> self.EWMA_SHIFT
+            self.Heap += (heap - self.Heap) >> self.EWMA_SHIFT
+            self.ChargeUc += (charge_uc - self.ChargeUc) >> self.EWMA_SHIFT
+        self.TimeUsMax = max(self.TimeUsMax, time_us)
+        self.Runs += 1
+
+
+class Profiler:
+    """
+    Measures the run time, radio time and heap usage of every run of the
+    attached services and estimates the charge it took from configurable
+    current figures. Rolling statistics per service and per wake cycle are
+    persisted in a binary file and periodically reported.
+    """
+
+    FILE_NAME       = "prof"
+    VERSION         = const(1)
+
+    # Version, service count, cycles, average awake time (ms), average charge (uC),
+    # time of the last report.
+    HEADER_FMT      = "<BBIIII"
+    # Service name, runs, average and maximum run time (us), average radio time (ms),
+    # average heap delta (bytes), average charge (uC).
+    RECORD_FMT      = "<8sIIIIiI"
+
+    # Default current consumption in mA.
+    CURRENTS = {
+        "active": 40,
+        "tx": 120,
+        "rx": 12,
+    }
+
+    def __init__(self, directory, currents=None, report_interval=86400):
+        """
+        :param directory: Directory of the statistics file.
+        :param currents: Current consumption in mA while active, transmitting and
+        receiving, see CURRENTS.
+        :param report_interval: Interval of the profile report in seconds.
+        """
+        self.Path = directory + "/" + self.FILE_NAME
+        self.Currents = currents if currents is not None else self.CURRENTS
+        self.ReportInterval = report_interval
+        self.Stats = {}
+        self.Cycles = 0
+        self.CycleMs = 0
+        self.CycleUc = 0
+        self.ReportedAt = 0
+        self.Radio = None
+        self.MsgEx = None
+        self.WakeStart = utime.ticks_ms()
+        self.Log = LogRing.Create()
+        self._Load()
+        return
+
+    def Attach(self, name, svc):
+        """
+        Profile every run of a service.
+        :param name: Name of the service, at most 8 characters. Only services
+        that are named in ProfileReport.SERVICES are reported.
+        :param svc: Service object.
+        """
+        if name not in self.Stats:
+            self.Stats[name] = ServiceStats()
+        run = svc.SvcRun
+
+        def ProfiledRun():
+            self._Run(name, run)
+
+        svc.SvcRun = ProfiledRun
+
+    def RadioSet(self, radio):
+        """
+        :param radio: Object that accounts the radio time, see UplinkPlanner.
+        """
+        self.Radio = radio
+
+    def ReporterSet(self, msg_ex_obj):
+        """
+        :param msg_ex_obj: Message Exchange used to send the profile report.
+        """
+        self.MsgEx = msg_ex_obj
+
+    def Charge(self, time_ms, tx_ms, rx_ms):
+        """
+        :return: Estimated charge in uC (mA * ms).
+        :rtype: int
+        """
+        active_ms = max(time_ms - tx_ms - rx_ms, 0)
+        return int(self.Currents["active"] * active_ms +
+                   self.Currents["tx"] * tx_ms +
+                   self.Currents["rx"] * rx_ms)
+
+    def _RadioTime(self):
+        if self.Radio is None:
+            return 0, 0
+        return self.Radio.TxMs, self.Radio.RxMs
+
+    def _Run(self, name, run):
+        tx_start, rx_start = self._RadioTime()
+        heap_start = HeapMonitor.MemAlloc()
+        start = utime.ticks_us()
+
+        run()
+
+        time_us = utime.ticks_diff(utime.ticks_us(), start)
+        heap = HeapMonitor.MemAlloc() - heap_start
+        tx_end, rx_end = self._RadioTime()
+        tx_ms = int(tx_end - tx_start)
+        rx_ms = int(rx_end - rx_start)
+        self.Stats[name].Add(time_us, tx_ms + rx_ms, heap,
+                             self.Charge(time_us // 1000, tx_ms, rx_ms))
+
+    def Save(self):
+        """
+        Account the wake cycle, queue the profile report when it is due and
+        persist the statistics. Call before deep sleep.
+        """
+        awake_ms = utime.ticks_diff(utime.ticks_ms(), self.WakeStart)
+        tx_ms, rx_ms = self._RadioTime()
+        charge = self.Charge(awake_ms, tx_ms, rx_ms)
+        if self.Cycles == 0:
+            self.CycleMs = awake_ms
+            self.CycleUc = charge
+        else:
+            self.CycleMs += (awake_ms - self.CycleMs) >> ServiceStats.EWMA_SHIFT
+            self.CycleUc += (charge - self.CycleUc) >> ServiceStats.EWMA_SHIFT
+        self.Cycles += 1
+
+        now = utime.time()
+        if self.ReportedAt == 0:
+            # First report after a full interval.
+            self.ReportedAt = now
+        if self.MsgEx is not None and now - self.ReportedAt >= self.ReportInterval:
+            self._Report()
+            self.ReportedAt = now
+
+        buf = bytearray(ustruct.calcsize(self.HEADER_FMT) +
+                        len(self.Stats) * ustruct.calcsize(self.RECORD_FMT))
+        ustruct.pack_into(self.HEADER_FMT, buf, 0, self.VERSION, len(self.Stats), self.Cycles,
+                          self.CycleMs, self.CycleUc, self.ReportedAt)
+        offset = ustruct.calcsize(self.HEADER_FMT)
+        for name, stats in self.Stats.items():
+            ustruct.pack_into(self.RECORD_FMT, buf, offset, name.encode(), stats.Runs,
+                              stats.TimeUs, stats.TimeUsMax, stats.RadioMs, stats.Heap,
+                              stats.ChargeUc)
+            offset += ustruct.calcsize(self.RECORD_FMT)
+
+        with open(self.Path, "wb") as f:
+            f.write(buf)
+
+    def _Report(self):
+        services = []
+        for service_id in range(0, len(ProfileReport.SERVICES)):
+            stats = self.Stats.get(ProfileReport.SERVICES[service_id])
+            if stats is not None:
+                services.extend((service_id, stats.Runs, stats.TimeUs // 1000, stats.RadioMs,
+                                 stats.ChargeUc))
+
+        self.Log.info(LogFormats.PROF_SUMMARY, self.Cycles, self.CycleMs, self.CycleUc)
+        report_msg = {
+            ProfileReport.DATA_KEY_CYCLE: [self.Cycles, self.CycleMs, self.CycleUc],
+            ProfileReport.DATA_KEY_SERVICES: services,
+        }
+        report_msg_meta = {
+            Metadata.MSG_META_TYPE: ProfileReport.TYPE_TELEMETRY,
+            Metadata.MSG_META_SUBTYPE: ProfileReport.SUBTYPE_PROFILE_REPORT,
+        }
+        self.MsgEx.MessagePut(msg_data_dict=report_msg,
+                              msg_type=ProfileReport.TYPE_TELEMETRY,
+                              msg_subtype=ProfileReport.SUBTYPE_PROFILE_REPORT,
+                              msg_meta_dict=report_msg_meta)
+
+    def _Load(self):
+        try:
+            with open(self.Path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+
+        hdr_size = ustruct.calcsize(self.HEADER_FMT)
+        rec_size = ustruct.calcsize(self.RECORD_FMT)
+        if len(data) < hdr_size:
+            return
+        version, count, cycles, cycle_ms, cycle_uc, reported_at = \
+            ustruct.unpack_from(self.HEADER_FMT, data, 0)
+        if version != self.VERSION or len(data) != hdr_size + count * rec_size:
+            return
+
+        self.Cycles = cycles
+        self.CycleMs = cycle_ms
+        self.CycleUc = cycle_uc
+        self.ReportedAt = reported_at
+        for i in range(0, count):
+            record = ustruct.unpack_from(self.RECORD_FMT, data, hdr_size + i * rec_size)
+            self.Stats[record[0].rstrip(b"\x00").decode()] = ServiceStats(*record[1:])
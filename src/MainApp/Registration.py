@@ -4,14 +4,18 @@ from upyiot.comm.Messaging.MessageFormatter import MessageFormatter
 from upyiot.middleware.SubjectObserver.SubjectObserver import Observer
 from upyiot.system.Service.Service import Service
 from upyiot.system.Service.Service import ServiceException
-from upyiot.system.ExtLogging import ExtLogging
 from upyiot.system.Util import DeviceId
 from upyiot.system.Util.Version import Version
 
 from Schemas.RegistrationInfo import RegistrationInfo
 from Schemas import Metadata
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
 
 from micropython import const
+import machine
+import uhashlib
+import ustruct
 
 
 class RegistrationService(Service):
@@ -23,19 +27,50 @@ class RegistrationService(Service):
 
 class Registration(RegistrationService, Observer):
 
-    def __init__(self, msg_ex_obj, reg_info_spec):
+    FW_VERSION = const(100)
+
+    FILE_NAME = "reg"
+    # Size of the registration hash in bytes.
+    HASH_SIZE = const(4)
+    # Hash of the registered combination, sequence number of the queued record
+    # that carries the registration info (0 if none).
+    FILE_FMT = "<4sI"
+    FILE_SIZE = const(8)
+
+    def __init__(self, msg_ex_obj, reg_info_spec, directory, piggyback=None):
         """
         Registration object, implements the RegistrationService and Observer classes.
+        The device is registered once for every combination of HW ID, SW and FW version,
+        a hash of the last registered combination is stored in a file once the uplink
+        that carries the registration info has been sent.
         :param msg_ex_obj: MessageExchange object
-        :type msg_ex_obj: <MessageExchange>
+        :type msg_ex_obj: <QueuedMessageExchange>
         :param reg_info_spec: Registration info specification
         :type reg_info_spec: <<MessageSpecification>RegistrationInfo>
+        :param directory: Directory of the registration file.
+        :type directory: str
+        :param piggyback: If given, the registration info is sent in the spare bytes
+        of the next sensor report instead of in a message of its own.
+        :type piggyback: <Piggyback>
         """
         super().__init__()
         self.MsgEx = msg_ex_obj
         self.RegInfoSpec = reg_info_spec
+        self.Path = directory + "/" + self.FILE_NAME
         self.Version = Version.Instance()
-        self.Log = ExtLogging.Create("Reg")
+        self.Log = LogRing.Create()
+        self.SwVersion = self.Version.SwVersionEncoded()
+        self.HwId = bytes(machine.unique_id())
+        self.Hash = self._Hash()
+        # The registration info message is composed at the first run and reused.
+        self.RegMsg = None
+        self.RegMeta = None
+        registered, self.Seq = self._Load()
+        self.Registered = registered == self.Hash
+        self.MsgEx.DeliveryObserverAdd(self.Delivered)
+        if piggyback is not None:
+            piggyback.RiderAdd(self)
+        self.Piggyback = piggyback
         return
 
     def SvcInit(self):
@@ -48,47 +83,123 @@ class Registration(RegistrationService, Observer):
         """
         Run the Registration service.
         The Registration service composes the registration info message, queues the message and activates
-        the Message Exchange service.
+        the Message Exchange service, unless the registration info is queued already.
         :except
         """
-        reg_msg = self.RegInfoSpec.DataDef.copy()
-
-        # Compose the registration info message.
-        reg_msg[RegistrationInfo.DATA_KEY_HW_ID] = DeviceId.DeviceIdString()
-        reg_msg[RegistrationInfo.DATA_KEY_SW_VER] = self.Version.SwVersionEncoded()
-        reg_msg[RegistrationInfo.DATA_KEY_FW_VER] = 100
+        if self.Registered is True or self._IsQueued() is True:
+            return
+        if self.RegMsg is None:
+            self._Compose()
 
-        self.Log.info("Registration info: {}".format(reg_msg))
-
-        reg_msg_meta = {
-            Metadata.MSG_META_TYPE: self.RegInfoSpec.Type,
-            Metadata.MSG_META_SUBTYPE: self.RegInfoSpec.Subtype,
-        }
+        self.Log.info(LogFormats.REG_INFO, self.RegMsg[RegistrationInfo.DATA_KEY_HW_ID],
+                      self.SwVersion, self.FW_VERSION)
 
         # Put the registration info in the Message Exchange queue and activate the service.
         # TODO: Add urgency to the Put function to implicitly activate the Message Exchange service.
         # TODO: Manual activation should not be necessary and should not be the responsibility of the user.
-        self.MsgEx.MessagePut(msg_data_dict=reg_msg,
+        self.MsgEx.MessagePut(msg_data_dict=self.RegMsg,
                               msg_type=self.RegInfoSpec.Type,
                               msg_subtype=self.RegInfoSpec.Subtype,
-                              msg_meta_dict=reg_msg_meta)
+                              msg_meta_dict=self.RegMeta)
         self.MsgEx.SvcActivate()
-        self.Log.info("Registration complete")
+        self.RiderQueued(self.MsgEx.PutSeq)
+
+    def RiderTake(self, space):
+        """
+        Piggyback rider: returns the compact registration info if the device is
+        not registered yet, the info is not queued already and it fits in the
+        given space.
+        :return: Tuple of (RegistrationInfo.DATA_KEY_DEVICE, bytes) or None.
+        """
+        if self.Registered is True or self._IsQueued() is True:
+            return None
+
+        info = RegistrationInfo.DeviceInfoPack(self.HwId, self.SwVersion, self.FW_VERSION)
+        if len(info) > space:
+            return None
+
+        self.Log.info(LogFormats.REG_RIDER)
+        return RegistrationInfo.DATA_KEY_DEVICE, info
+
+    def RiderQueued(self, seq):
+        """
+        Piggyback rider: the registration info is carried by the queued record
+        with the given sequence number, 0 if the record was dropped.
+        """
+        self.Seq = seq
+        self._Store()
+
+    def Delivered(self, seqs):
+        """
+        Delivery observer callback. The device is registered once the record
+        that carries the registration info has been sent.
+        :param seqs: Sequence numbers of the sent records.
+        """
+        if self.Seq == 0 or self.Seq not in seqs:
+            return
+        self.Seq = 0
+        self.Registered = True
+        self._Store()
+        self.Log.info(LogFormats.REG_COMPLETE)
 
     def DeviceIsRegistered(self):
         """
-        Check if the device has sent its registration info.
+        Check if the device has sent its registration info for the current HW ID,
+        SW and FW version, in an uplink that has been sent.
         :return: True if the device is registered.
         :rtype: boolean
         """
-        return self.SvcLastRun > 0
+        return self.Registered
 
     def Update(self, connected):
         """
         Connection state observer callback. Updates the connection state.
         Must be attached to a connection state subject.
+        If registration info is sent via the piggyback, no separate message is sent.
         :param connected: Connection state.
         :type connected: boolean
         """
-        if connected is True and self.DeviceIsRegistered() is False:
+        if connected is True and self.DeviceIsRegistered() is False and self.Piggyback is None:
             self.SvcActivate()
+
+    def _Compose(self):
+        # Compose the registration info message.
+        self.RegMsg = self.RegInfoSpec.DataDef.copy()
+        self.RegMsg[RegistrationInfo.DATA_KEY_HW_ID] = DeviceId.DeviceIdString()
+        self.RegMsg[RegistrationInfo.DATA_KEY_SW_VER] = self.SwVersion
+        self.RegMsg[RegistrationInfo.DATA_KEY_FW_VER] = self.FW_VERSION
+        self.RegMeta = {
+            Metadata.MSG_META_TYPE: self.RegInfoSpec.Type,
+            Metadata.MSG_META_SUBTYPE: self.RegInfoSpec.Subtype,
+        }
+
+    def _Hash(self):
+        h = uhashlib.sha256(self.HwId)
+        h.update(ustruct.pack("<II", self.SwVersion, self.FW_VERSION))
+        return h.digest()[0:self.HASH_SIZE]
+
+    def _IsQueued(self):
+        return self.MsgEx.IsQueued(self.Seq)
+
+    def _Load(self):
+        """
+        :return: Tuple of (registered hash, sequence number of the queued
+        registration info).
+        """
+        try:
+            with open(self.Path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None, 0
+        if len(data) == self.HASH_SIZE:
+            # Hash only, written before the sequence number was added.
+            return data, 0
+        if len(data) != self.FILE_SIZE:
+            # Corrupt, the device registers again.
+            return None, 0
+        return ustruct.unpack_from(self.FILE_FMT, data, 0)
+
+    def _Store(self):
+        registered = self.Hash if self.Registered is True else bytes(self.HASH_SIZE)
+        with open(self.Path, "wb") as f:
+            f.write(ustruct.pack(self.FILE_FMT, registered, self.Seq))
@@ -0,0 +1,226 @@
+from Schemas.ConfigUpdate import ConfigUpdate, ConfigAck
+from Schemas import Metadata
+from Codec import Varint
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+from micropython import const
+import ustruct
+
+
+class RemoteConfig:
+    """
+    Configuration parameters that are updated by ConfigUpdate downlinks. The
+    accepted values are persisted and override the MainApp attributes of the
+    same name on every wake. An update is acknowledged with a ConfigAck that
+    holds its sequence number and the parameters that were rejected. The
+    acknowledgement is persisted until the uplink that carries it, in a
+    message of its own or on a piggyback, has been sent, or a new update is
+    received. It survives deep sleep.
+    """
+
+    FILE_NAME   = "cfg"
+
+    PARAM_MSGEX_INTERVAL    = const(1)
+    PARAM_SENSOR_INTERVAL   = const(2)
+    PARAM_MOIST_INTERVAL    = const(3)
+    PARAM_FILTER_DEPTH      = const(4)
+    PARAM_MOIST_SAMPLES     = const(5)
+    PARAM_TEMP_SAMPLES      = const(6)
+
+    # Parameter ID -> (MainApp attribute, minimum, maximum).
+    PARAMS = {
+        PARAM_MSGEX_INTERVAL: ("MsgExInterval", 10, 86400),
+        PARAM_SENSOR_INTERVAL: ("SensorReadInterval", 10, 86400),
+        PARAM_MOIST_INTERVAL: ("MoistReadInterval", 10, 86400),
+        PARAM_FILTER_DEPTH: ("FILTER_DEPTH", 1, 16),
+        PARAM_MOIST_SAMPLES: ("MoistSamplesPerUpdate", 1, 16),
+        PARAM_TEMP_SAMPLES: ("TempSamplesPerUpdate", 1, 16),
+    }
+
+    # Sequence number of the last update, acknowledgement pending, parameter
+    # count, sequence number of the queued record that carries the
+    # acknowledgement (0 if none).
+    HDR_FMT     = "<HBBI"
+    HDR_SIZE    = const(8)
+    # Parameter ID, value. The rejected parameter IDs follow the parameters.
+    PARAM_FMT   = "<BI"
+    PARAM_SIZE  = const(5)
+
+    def __init__(self, directory):
+        """
+        :param directory: Directory of the configuration file.
+        """
+        self.Path = directory + "/" + self.FILE_NAME
+        self.Seq = 0
+        self.AckPending = False
+        self.AckSeq = 0
+        self.Rejected = b""
+        self.Values = {}
+        self.MsgEx = None
+        self.Log = LogRing.Create()
+        self._Load()
+        return
+
+    def MsgExSet(self, msg_ex):
+        """
+        :param msg_ex: QueuedMessageExchange that sends the acknowledgements.
+        """
+        self.MsgEx = msg_ex
+        msg_ex.DeliveryObserverAdd(self.Delivered)
+
+    def Apply(self, target):
+        """
+        Set the persisted parameter values as attributes of the target.
+        """
+        for param, value in self.Values.items():
+            setattr(target, self.PARAMS[param][0], value)
+
+    def Receive(self, msg):
+        """
+        Validate and persist a ConfigUpdate. A repeated update (same sequence
+        number) is only acknowledged again. An update of which the sequence
+        number is not an integer or the parameters are not a list is ignored.
+        :param msg: Received message.
+        :return: Dictionary of attribute name -> value of the accepted parameters.
+        :rtype: dict
+        """
+        data = msg[Metadata.MSG_SECTION_DATA]
+        seq = data.get(ConfigUpdate.DATA_KEY_SEQ, 0)
+        params = data.get(ConfigUpdate.DATA_KEY_PARAMS, [])
+        if not isinstance(seq, int) or not isinstance(params, list):
+            self.Log.warning(LogFormats.CFG_MALFORMED)
+            return {}
+        seq &= 0xFFFF
+        if seq == self.Seq and seq != 0:
+            self.AckPending = True
+            self.AckSeq = 0
+            self._Store()
+            return {}
+
+        accepted = {}
+        rejected = bytearray()
+        for i in range(0, len(params) - 1, 2):
+            param, value = params[i], params[i + 1]
+            if not isinstance(param, int):
+                # Rejected as 0, which is no parameter.
+                param = 0
+            spec = self.PARAMS.get(param)
+            if spec is None or not isinstance(value, int) or not spec[1] <= value <= spec[2]:
+                rejected.append(param & 0xFF)
+                continue
+            self.Values[param] = value
+            accepted[spec[0]] = value
+
+        self.Log.info(LogFormats.CFG_UPDATE, seq, len(accepted), bytes(rejected))
+        self.Seq = seq
+        self.Rejected = bytes(rejected)
+        self.AckPending = True
+        self.AckSeq = 0
+        self._Store()
+        return accepted
+
+    def AckTake(self):
+        """
+        :return: Pending acknowledgement (ConfigAck.DATA_KEY_ACK data) or None
+        if there is none or it is queued already. It stays pending until the
+        record that carries it has been sent, see RiderQueued.
+        :rtype: bytes
+        """
+        if self.AckPending is False or self._AckQueued() is True:
+            return None
+        buf = bytearray(3 + len(self.Rejected))
+        offset = Varint.EncodeInto(self.Seq, buf, 0)
+        buf[offset:offset + len(self.Rejected)] = self.Rejected
+        return bytes(buf[0:offset + len(self.Rejected)])
+
+    def AckPut(self, msg_ex):
+        """
+        Put the pending acknowledgement in the Message Exchange.
+        """
+        ack = self.AckTake()
+        if ack is None:
+            return
+        msg_ex.MessagePut(msg_data_dict={ConfigAck.DATA_KEY_ACK: ack},
+                          msg_type=ConfigUpdate.TYPE_CONFIG,
+                          msg_subtype=ConfigAck.SUBTYPE_CONFIG_ACK,
+                          msg_meta_dict={
+                              Metadata.MSG_META_TYPE: ConfigUpdate.TYPE_CONFIG,
+                              Metadata.MSG_META_SUBTYPE: ConfigAck.SUBTYPE_CONFIG_ACK,
+                          })
+        self.RiderQueued(msg_ex.PutSeq)
+
+    def RiderTake(self, space):
+        """
+        Piggyback rider: returns the pending acknowledgement if it fits in the
+        given space.
+        :return: Tuple of (ConfigAck.DATA_KEY_ACK, bytes) or None.
+        """
+        if 3 + len(self.Rejected) > space:
+            return None
+        ack = self.AckTake()
+        if ack is None:
+            return None
+        return ConfigAck.DATA_KEY_ACK, ack
+
+    def RiderQueued(self, seq):
+        """
+        Piggyback rider: the acknowledgement is carried by the queued record
+        with the given sequence number, 0 if the record was dropped.
+        """
+        self.AckSeq = seq
+        self._Store()
+
+    def Delivered(self, seqs):
+        """
+        Delivery observer callback. The acknowledgement is done once the
+        record that carries it has been sent.
+        :param seqs: Sequence numbers of the sent records.
+        """
+        if self.AckSeq == 0 or self.AckSeq not in seqs:
+            return
+        self.AckPending = False
+        self.AckSeq = 0
+        self._Store()
+
+    def _AckQueued(self):
+        return self.MsgEx is not None and self.MsgEx.IsQueued(self.AckSeq)
+
+    def _Store(self):
+        buf = bytearray(self.HDR_SIZE + self.PARAM_SIZE * len(self.Values))
+        ustruct.pack_into(self.HDR_FMT, buf, 0, self.Seq, self.AckPending, len(self.Values),
+                          self.AckSeq)
+        offset = self.HDR_SIZE
+        for param, value in self.Values.items():
+            ustruct.pack_into(self.PARAM_FMT, buf, offset, param, value)
+            offset += self.PARAM_SIZE
+        with open(self.Path, "wb") as f:
+            f.write(buf)
+            f.write(self.Rejected)
+
+    def _Load(self):
+        try:
+            with open(self.Path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+
+        if len(data) < self.HDR_SIZE:
+            return
+        seq, pending, count, ack_seq = ustruct.unpack_from(self.HDR_FMT, data, 0)
+        if len(data) < self.HDR_SIZE + count * self.PARAM_SIZE:
+            self.Log.warning(LogFormats.CFG_INVALID)
+            return
+
+        for i in range(0, count):
+            param, value = ustruct.unpack_from(self.PARAM_FMT, data,
+                                               self.HDR_SIZE + i * self.PARAM_SIZE)
+            # Parameters that are no longer known or valid are ignored.
+            spec = self.PARAMS.get(param)
+            if spec is not None and spec[1] <= value <= spec[2]:
+                self.Values[param] = value
+
+        self.Seq = seq
+        self.AckPending = pending != 0
+        self.AckSeq = ack_seq
+        self.Rejected = bytes(data[self.HDR_SIZE + count * self.PARAM_SIZE:])
@@ -0,0 +1,41 @@
+from upyiot.middleware.SubjectObserver.SubjectObserver import Observer
+
+from Schemas import Metadata
+
+
+class ReportFormatter(Observer):
+    """
+    Sensor sample observer that reports every sample in a report of its own,
+    like a MessageFormatter in SEND_ON_CHANGE mode. The message, its sample
+    list and the metadata are allocated once and reused for every sample, as
+    the Message Exchange serializes a message when it is put.
+    """
+
+    def __init__(self, msg_ex_obj, msg_spec, key):
+        """
+        :param msg_ex_obj: MessageExchange object
+        :type msg_ex_obj: <MessageExchange>
+        :param msg_spec: Sensor report specification
+        :type msg_spec: <<MessageSpecification>SensorReport>
+        :param key: Data key of the samples.
+        """
+        self.MsgEx = msg_ex_obj
+        self.Spec = msg_spec
+        self.Samples = [0]
+        self.Msg = {key: self.Samples}
+        self.Meta = {
+            Metadata.MSG_META_TYPE: msg_spec.Type,
+            Metadata.MSG_META_SUBTYPE: msg_spec.Subtype,
+        }
+        return
+
+    def Update(self, sample):
+        """
+        New sample observer callback.
+        :param sample: Sensor sample.
+        """
+        self.Samples[0] = sample
+        self.MsgEx.MessagePut(msg_data_dict=self.Msg,
+                              msg_type=self.Spec.Type,
+                              msg_subtype=self.Spec.Subtype,
+                              msg_meta_dict=self.Meta)
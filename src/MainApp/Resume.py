@@ -0,0 +1,135 @@
+from upyiot.system.Service.Service import Service
+from upyiot.middleware.SubjectObserver.SubjectObserver import Observer
+
+from micropython import const
+import ustruct
+import uos
+
+
+class ResumeState:
+    """
+    Minimal scheduler state that is persisted before deep sleep, so a timer
+    wake can resume without running the full MainApp setup.
+    The file holds a header followed by one record per periodic service.
+    """
+
+    FILE_NAME       = "resume"
+    VERSION         = const(1)
+
+    # Version, service count, flags, time of save.
+    HEADER_FMT      = "<BBBI"
+    # Service name, last run, interval.
+    RECORD_FMT      = "<8sii"
+
+    FLAG_SESSION    = const(0x01)
+
+    def __init__(self, directory):
+        self.Path = directory + "/" + self.FILE_NAME
+        self.Services = {}
+        self.Flags = 0
+        self.SavedAt = 0
+        return
+
+    def Load(self):
+        """
+        Load the persisted state.
+        :return: True if a valid state was loaded.
+        :rtype: boolean
+        """
+        self.Services.clear()
+        try:
+            with open(self.Path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return False
+
+        hdr_size = ustruct.calcsize(self.HEADER_FMT)
+        rec_size = ustruct.calcsize(self.RECORD_FMT)
+        if len(data) < hdr_size:
+            return False
+
+        version, count, self.Flags, self.SavedAt = ustruct.unpack_from(self.HEADER_FMT, data, 0)
+        if version != self.VERSION or len(data) != hdr_size + count * rec_size:
+            return False
+
+        for i in range(0, count):
+            name, last_run, interval = ustruct.unpack_from(self.RECORD_FMT, data,
+                                                           hdr_size + i * rec_size)
+            self.Services[name.rstrip(b"\x00").decode()] = (last_run, interval)
+        return True
+
+    def Save(self, services, flags, now):
+        """
+        Persist the state.
+        :param services: Dictionary of service name -> (last run, interval).
+        :param flags: State flags, see FLAG_*.
+        :param now: Current time in seconds.
+        """
+        buf = bytearray(ustruct.calcsize(self.HEADER_FMT) +
+                        len(services) * ustruct.calcsize(self.RECORD_FMT))
+        ustruct.pack_into(self.HEADER_FMT, buf, 0, self.VERSION, len(services), flags, now)
+        offset = ustruct.calcsize(self.HEADER_FMT)
+        for name, state in services.items():
+            ustruct.pack_into(self.RECORD_FMT, buf, offset, name.encode(), state[0], state[1])
+            offset += ustruct.calcsize(self.RECORD_FMT)
+
+        with open(self.Path, "wb") as f:
+            f.write(buf)
+
+    def Invalidate(self):
+        try:
+            uos.remove(self.Path)
+        except OSError:
+            pass
+
+    def IsDue(self, name, now, margin):
+        """
+        Check if a service is due within margin seconds from now.
+        """
+        last_run, interval = self.Services[name]
+        return last_run <= 0 or last_run + interval <= now + margin
+
+
+class DeferredService(Service):
+    """
+    Placeholder for a periodic service that is not due at the time of a resume
+    wake. The scheduler sees the same interval and last run as the real service.
+    The real service is only constructed if the placeholder is run.
+    """
+
+    DEFERRED_SERVICE_MODE = Service.MODE_RUN_PERIODIC
+
+    def __init__(self, name, factory):
+        """
+        :param name: Name of the deferred service.
+        :param factory: Callable that constructs (or returns) the real service.
+        """
+        super().__init__(name, self.DEFERRED_SERVICE_MODE, {})
+        self.Factory = factory
+        self.Svc = None
+        return
+
+    def SvcInit(self):
+        return
+
+    def SvcRun(self):
+        if self.Svc is None:
+            self.Svc = self.Factory()
+            self.Svc.SvcInit()
+        self.Svc.SvcRun()
+
+
+class LazyObserver(Observer):
+    """
+    Observer that constructs the actual observer on the first update.
+    """
+
+    def __init__(self, factory):
+        self.Factory = factory
+        self.Observer = None
+        return
+
+    def Update(self, arg):
+        if self.Observer is None:
+            self.Observer = self.Factory()
+        self.Observer.Update(arg)
@@ -0,0 +1,65 @@
+from micropython import const
+import machine
+
+
+class RtcMemory:
+    """
+    Fixed layout of the RTC slow memory, which survives deep sleep but not a
+    power cycle. Every user owns a region of a fixed size. The offsets follow
+    from the order of REGIONS, so the layout is the same on every boot.
+    Regions must validate their own contents.
+    """
+
+    REGION_LORA     = const(0)
+    REGION_ADR      = const(1)
+    REGION_ADAPT_MOIST  = const(2)
+    REGION_ADAPT_TEMP   = const(3)
+    REGION_LOG          = const(4)
+    REGION_EVENT        = const(5)
+
+    # Region sizes in bytes, in layout order.
+    REGIONS = (
+        (REGION_LORA, 12),
+        (REGION_ADR, 16),
+        (REGION_ADAPT_MOIST, 14),
+        (REGION_ADAPT_TEMP, 14),
+        (REGION_LOG, 512),
+        (REGION_EVENT, 112),
+    )
+
+    def __init__(self):
+        self.Rtc = machine.RTC()
+        self.Offsets = {}
+        self.Sizes = {}
+        offset = 0
+        for region, size in self.REGIONS:
+            self.Offsets[region] = offset
+            self.Sizes[region] = size
+            offset += size
+        self.Size = offset
+        return
+
+    def Read(self, region):
+        """
+        :return: Contents of the region, or None if the memory does not hold
+        the region (e.g. after a power cycle).
+        :rtype: bytes
+        """
+        data = self.Rtc.memory()
+        end = self.Offsets[region] + self.Sizes[region]
+        if len(data) < end:
+            return None
+        return bytes(data[self.Offsets[region]:end])
+
+    def Write(self, region, data):
+        """
+        :param data: Contents of the region, at most the size of the region.
+        """
+        if len(data) > self.Sizes[region]:
+            raise ValueError("Region {} overflow".format(region))
+        mem = bytearray(self.Rtc.memory())
+        if len(mem) < self.Size:
+            mem.extend(bytes(self.Size - len(mem)))
+        offset = self.Offsets[region]
+        mem[offset:offset + len(data)] = data
+        self.Rtc.memory(mem)
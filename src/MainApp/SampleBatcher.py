@@ -0,0 +1,171 @@
+from upyiot.middleware.SubjectObserver.SubjectObserver import Observer
+
+from Codec import Varint
+from Schemas.SensorReport import SensorReport
+from Schemas import Metadata
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+from micropython import const
+import ustruct
+import utime
+import uos
+
+
+class SampleBatcher(Observer):
+    """
+    Sensor sample observer that packs multiple samples into a single report.
+
+    The samples are delta encoded into the SensorReport.DATA_KEY_SAMPLES field:
+        varint   time of the first sample (sec)
+        varint   sample interval (sec)
+        zigzag   first sample
+    followed by a token for every next sample:
+        varint   zigzag(delta to the previous sample) << 1 | skip flag
+        varint   number of skipped intervals - 1, only present if the skip flag is set
+
+    Sample times are quantized to the interval, a sample that arrives one or
+    more intervals late (e.g. due to scheduling) is marked with a skip.
+    A batch is flushed to the Message Exchange when the next sample does not
+    fit in the payload or when the first sample exceeds the maximum age.
+    Pending samples are kept in a file across deep sleep. Spare bytes of a
+    flushed batch are offered to the piggyback riders.
+    """
+
+    # Upper bound of the encoded message overhead (sections, metadata and
+    # data key) in addition to the packed samples.
+    MSG_OVERHEAD    = const(16)
+
+    # Time of the first sample, last value, interval slot of the last sample,
+    # sample count, packed length.
+    STATE_FMT       = "<IiIHH"
+
+    def __init__(self, msg_ex_obj, msg_spec, name, directory, interval, payload_max, age_max,
+                 piggyback=None):
+        """
+        :param msg_ex_obj: MessageExchange object
+        :type msg_ex_obj: <MessageExchange>
+        :param msg_spec: Sensor report specification
+        :type msg_spec: <<MessageSpecification>SensorReport>
+        :param name: Batch name, used for the state file.
+        :param directory: Directory of the state file.
+        :param interval: Nominal sample interval in seconds.
+        :param payload_max: Maximum size of the packed samples in bytes.
+        :param age_max: Maximum age of the first sample in a batch in seconds.
+        :param piggyback: Piggyback object, optional.
+        """
+        self.MsgEx = msg_ex_obj
+        self.Spec = msg_spec
+        self.Path = directory + "/" + name + ".bat"
+        self.Interval = interval
+        self.AgeMax = age_max
+        self.Piggyback = piggyback
+        self.Buf = bytearray(payload_max)
+        self.Meta = {
+            Metadata.MSG_META_TYPE: msg_spec.Type,
+            Metadata.MSG_META_SUBTYPE: msg_spec.Subtype,
+        }
+        self.Log = LogRing.Create()
+        self._Clear()
+        self._Load()
+        return
+
+    def Update(self, sample):
+        """
+        New sample observer callback.
+        :param sample: Sensor sample.
+        """
+        now = utime.time()
+        value = int(round(sample))
+
+        if self.Count > 0:
+            slot = (now - self.Time + self.Interval // 2) // self.Interval
+            skip = max(slot - self.Slot, 1) - 1
+            token = Varint.ZigZag(value - self.Value) << 1
+            size = Varint.Size(token)
+            if skip > 0:
+                size += Varint.Size(skip - 1)
+            if now - self.Time >= self.AgeMax or self.Len + size > len(self.Buf):
+                self.Flush()
+
+        if self.Count == 0:
+            self.Time = now
+            self.Slot = 0
+            self.Len = Varint.EncodeInto(now, self.Buf, 0)
+            self.Len = Varint.EncodeInto(self.Interval, self.Buf, self.Len)
+            self.Len = Varint.EncodeSignedInto(value, self.Buf, self.Len)
+        else:
+            self.Len = Varint.EncodeInto(token | (1 if skip > 0 else 0), self.Buf, self.Len)
+            if skip > 0:
+                self.Len = Varint.EncodeInto(skip - 1, self.Buf, self.Len)
+            self.Slot += skip + 1
+
+        self.Value = value
+        self.Count += 1
+
+    def Flush(self):
+        """
+        Put the pending batch in the Message Exchange queue.
+        """
+        if self.Count == 0:
+            return
+
+        self.Log.debug(LogFormats.BATCH_FLUSH, self.Count, self.Len)
+        msg = {SensorReport.DATA_KEY_SAMPLES: bytes(self.Buf[0:self.Len])}
+        if self.Piggyback is not None:
+            self.Piggyback.Fill(msg, len(self.Buf) - self.Len)
+        self.MsgEx.MessagePut(msg_data_dict=msg,
+                              msg_type=self.Spec.Type,
+                              msg_subtype=self.Spec.Subtype,
+                              msg_meta_dict=self.Meta)
+        if self.Piggyback is not None:
+            self.Piggyback.Queued(self.MsgEx.PutSeq)
+        self._Clear()
+        try:
+            uos.remove(self.Path)
+        except OSError:
+            pass
+
+    def Suspend(self):
+        """
+        Called before deep sleep. The batch is flushed if the first sample would
+        exceed the maximum age at the next sample, otherwise it is stored.
+        """
+        if self.Count == 0:
+            return
+
+        if utime.time() + self.Interval - self.Time >= self.AgeMax:
+            self.Flush()
+            return
+
+        with open(self.Path, "wb") as f:
+            f.write(ustruct.pack(self.STATE_FMT, self.Time, self.Value, self.Slot, self.Count, self.Len))
+            f.write(self.Buf[0:self.Len])
+
+    def _Load(self):
+        hdr_size = ustruct.calcsize(self.STATE_FMT)
+        try:
+            with open(self.Path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+
+        if len(data) < hdr_size:
+            return
+        t, value, slot, count, length = ustruct.unpack_from(self.STATE_FMT, data, 0)
+        if length > len(self.Buf) or len(data) != hdr_size + length:
+            return
+
+        self.Buf[0:length] = data[hdr_size:]
+        self.Time = t
+        self.Value = value
+        self.Slot = slot
+        self.Count = count
+        self.Len = length
+
+    def _Clear(self):
+        self.Time = 0
+        self.Value = 0
+        self.Slot = 0
+        self.Count = 0
+        self.Len = 0
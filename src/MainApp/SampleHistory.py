@@ -0,0 +1,335 @@
+from upyiot.middleware.SubjectObserver.SubjectObserver import Observer
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+from micropython import const
+import ustruct
+import utime
+
+
+class SampleHistory(Observer):
+    """
+    Sensor sample observer that keeps a history of the samples in fixed-size
+    files, one per tier. The first tier holds the raw samples, every next
+    tier min/max/mean buckets of the tier before it, e.g. raw samples for the
+    last hour, 15 minute buckets for the last day and 4 hour buckets for the
+    last month. A bucket is written once it has passed, from the entries of
+    the finer tier, so the retention of a tier must cover at least one bucket
+    of the next tier.
+
+    A tier file is a ring of preallocated blocks:
+        uint32   time of the first entry (sec), 0xFFFFFFFF if the block is empty
+    followed by entries, of which the first field is the time since the
+    start of the block in units of the tier resolution (0xFFFF if empty):
+        raw      uint16 time, int16 sample
+        bucket   uint16 time, int16 minimum, maximum, mean, uint16 count
+    An entry is appended by writing it in place, a block is erased when the
+    ring wraps around to it, so the flash use is fixed and appends never
+    rewrite a file. A changed layout starts a new history: the raw tier is
+    sized from the sample interval, so a changed interval (e.g. the
+    MoistReadInterval set by a ConfigUpdate, see RemoteConfig) that changes
+    its number of blocks reformats the raw tier when the history is next
+    loaded. The bucket tiers are kept.
+
+    The entries of a tier are in time order. A sample that is older than the
+    last sample means the clock went back (e.g. the RTC was reset), the
+    history is then erased and a new one is started from the sample.
+    """
+
+    BLOCK_SIZE  = const(256)
+
+    # Resolution (sec, 0 for the raw samples) and retention (sec) per tier.
+    TIERS = ((0, 3600), (900, 86400), (14400, 2592000))
+
+    HDR_FMT     = "<I"
+    HDR_SIZE    = const(4)
+    RAW_FMT     = "<Hh"
+    RAW_SIZE    = const(4)
+    BUCKET_FMT  = "<HhhhH"
+    BUCKET_SIZE = const(10)
+
+    EMPTY       = const(0xFFFF)
+    EMPTY_BASE  = const(0xFFFFFFFF)
+    VALUE_MIN   = const(-32768)
+    VALUE_MAX   = const(32767)
+
+    def __init__(self, directory, name, interval, tiers=TIERS):
+        """
+        :param directory: Directory of the tier files.
+        :param name: History name, used for the tier files.
+        :param interval: Nominal sample interval in seconds, sizes the raw tier.
+        :param tiers: Tuple of (resolution, retention) per tier, see TIERS.
+        """
+        self.Path = directory + "/" + name + ".h{}"
+        self.Tiers = tiers
+        self.Interval = max(interval, 1)
+        self.Blocks = [self._BlockCount(tier) for tier in range(0, len(tiers))]
+        self.Buf = bytearray(self.BLOCK_SIZE)
+        self.Entry = bytearray(self.BUCKET_SIZE)
+        # Per tier: start time of every block (None if empty), the newest
+        # block, the number of entries in it and the time of the last entry.
+        # Loaded when the history is first used.
+        self.Bases = None
+        self.Head = None
+        self.Count = None
+        self.Last = None
+        self.Log = LogRing.Create()
+        return
+
+    def Update(self, sample):
+        """
+        New sample observer callback.
+        :param sample: Sensor sample.
+        """
+        self.Append(utime.time(), int(round(sample)))
+
+    def Append(self, t, value):
+        """
+        :param t: Time of the sample in seconds.
+        :param value: Sample, clamped to int16.
+        """
+        if self.Bases is None:
+            self._Load()
+        if self.Last[0] is not None and t < self.Last[0]:
+            # The times of the history are ahead of the clock.
+            self.Log.warning(LogFormats.HIST_RESTART, self.Path.format(0), self.Last[0] - t)
+            self.Clear()
+            self._Load()
+
+        value = min(max(value, self.VALUE_MIN), self.VALUE_MAX)
+        ustruct.pack_into(self.RAW_FMT, self.Entry, 0, 0, value)
+        self._Append(0, t)
+        for tier in range(1, len(self.Tiers)):
+            self._Downsample(tier, t)
+
+    def Query(self, start, end, count_max=None):
+        """
+        :param start: Start of the range in seconds.
+        :param end: End of the range in seconds, exclusive.
+        :param count_max: Maximum number of entries.
+        :return: Oldest first list of (time, minimum, maximum, mean, count)
+        tuples, from the finest tier that holds each part of the range. A raw
+        sample is an entry with a count of 1.
+        :rtype: list
+        """
+        if self.Bases is None:
+            self._Load()
+
+        # Every tier covers the part of the range before the finer tiers, up
+        # to the end of its last bucket that overlaps them, so no sample is
+        # returned twice.
+        starts = [start] * len(self.Tiers)
+        ends = [end] * len(self.Tiers)
+        for tier in range(1, len(self.Tiers)):
+            ends[tier] = ends[tier - 1]
+            oldest = self._Oldest(tier - 1)
+            if oldest is None:
+                continue
+            resolution = self.Tiers[tier][0]
+            boundary = oldest
+            if self.Last[tier] is not None:
+                boundary = min(-(-oldest // resolution) * resolution,
+                               self.Last[tier] + resolution)
+            boundary = min(boundary, ends[tier - 1])
+            starts[tier - 1] = max(starts[tier - 1], boundary)
+            ends[tier] = boundary
+
+        entries = []
+        for tier in range(len(self.Tiers) - 1, -1, -1):
+            if starts[tier] < ends[tier]:
+                limit = None if count_max is None else count_max - len(entries)
+                entries.extend(self._Entries(tier, starts[tier], ends[tier], limit))
+            if count_max is not None and len(entries) >= count_max:
+                break
+        return entries
+
+    def Clear(self):
+        """
+        Erase the history.
+        """
+        for tier in range(0, len(self.Tiers)):
+            self._Format(tier)
+        self.Bases = None
+
+    def _BlockCount(self, tier):
+        resolution, retention = self.Tiers[tier]
+        per_block = (self.BLOCK_SIZE - self.HDR_SIZE) // self._EntrySize(tier)
+        entries = retention // (resolution if resolution > 0 else self.Interval)
+        # One more block, as the oldest block is erased when the ring wraps.
+        return (entries + per_block - 1) // per_block + 1
+
+    def _EntrySize(self, tier):
+        return self.RAW_SIZE if tier == 0 else self.BUCKET_SIZE
+
+    def _Unit(self, tier):
+        return max(self.Tiers[tier][0], 1)
+
+    def _Append(self, tier, t):
+        """
+        Append the entry in self.Entry, of which the time field is set here.
+        """
+        size = self._EntrySize(tier)
+        per_block = (self.BLOCK_SIZE - self.HDR_SIZE) // size
+        head = self.Head[tier]
+        base = self.Bases[tier][head] if head >= 0 else None
+        with open(self.Path.format(tier), "r+b") as f:
+            if base is None or self.Count[tier] == per_block \
+                    or (t - base) // self._Unit(tier) >= self.EMPTY:
+                # Start the next block of the ring.
+                head = (head + 1) % self.Blocks[tier]
+                base = t
+                for i in range(0, self.BLOCK_SIZE):
+                    self.Buf[i] = 0xFF
+                ustruct.pack_into(self.HDR_FMT, self.Buf, 0, base)
+                f.seek(head * self.BLOCK_SIZE)
+                f.write(self.Buf)
+                self.Head[tier] = head
+                self.Bases[tier][head] = base
+                self.Count[tier] = 0
+
+            ustruct.pack_into("<H", self.Entry, 0, (t - base) // self._Unit(tier))
+            f.seek(head * self.BLOCK_SIZE + self.HDR_SIZE + self.Count[tier] * size)
+            f.write(memoryview(self.Entry)[0:size])
+        self.Count[tier] += 1
+        self.Last[tier] = t
+
+    def _Downsample(self, tier, now):
+        """
+        Write the buckets of the tier that have passed.
+        """
+        resolution = self.Tiers[tier][0]
+        if self.Last[tier] is not None:
+            start = self.Last[tier] + resolution
+        else:
+            start = self._Oldest(tier - 1)
+            if start is None:
+                return
+            start -= start % resolution
+        end = now - now % resolution
+        if start >= end:
+            return
+
+        bucket = None
+        for t, minimum, maximum, mean, count in self._Entries(tier - 1, start, end):
+            b = t - t % resolution
+            if bucket is not None and b != bucket[0]:
+                self._BucketAppend(tier, bucket)
+                bucket = None
+            if bucket is None:
+                bucket = [b, minimum, maximum, mean * count, count]
+            else:
+                bucket[1] = min(bucket[1], minimum)
+                bucket[2] = max(bucket[2], maximum)
+                bucket[3] += mean * count
+                bucket[4] += count
+        if bucket is not None:
+            self._BucketAppend(tier, bucket)
+
+    def _BucketAppend(self, tier, bucket):
+        b, minimum, maximum, total, count = bucket
+        mean = (total + count // 2) // count
+        ustruct.pack_into(self.BUCKET_FMT, self.Entry, 0, 0, minimum, maximum, mean,
+                          min(count, 0xFFFF))
+        self._Append(tier, b)
+
+    def _Order(self, tier):
+        """
+        :return: Blocks of the tier that hold entries, oldest first.
+        """
+        blocks = self.Blocks[tier]
+        head = self.Head[tier]
+        order = []
+        for i in range(1, blocks + 1):
+            block = (head + i) % blocks
+            if self.Bases[tier][block] is not None:
+                order.append(block)
+        return order
+
+    def _Oldest(self, tier):
+        if self.Head[tier] < 0:
+            return None
+        return self.Bases[tier][self._Order(tier)[0]]
+
+    def _Entries(self, tier, start, end, count_max=None):
+        entries = []
+        if self.Head[tier] < 0:
+            return entries
+        size = self._EntrySize(tier)
+        unit = self._Unit(tier)
+        order = self._Order(tier)
+        with open(self.Path.format(tier), "rb") as f:
+            for i in range(0, len(order)):
+                block = order[i]
+                base = self.Bases[tier][block]
+                if base >= end:
+                    break
+                if i + 1 < len(order) and self.Bases[tier][order[i + 1]] <= start:
+                    continue
+                f.seek(block * self.BLOCK_SIZE)
+                f.readinto(self.Buf)
+                for offset in range(self.HDR_SIZE, self.BLOCK_SIZE - size + 1, size):
+                    dt = ustruct.unpack_from("<H", self.Buf, offset)[0]
+                    if dt == self.EMPTY:
+                        break
+                    t = base + dt * unit
+                    if t < start:
+                        continue
+                    if t >= end:
+                        break
+                    if tier == 0:
+                        value = ustruct.unpack_from(self.RAW_FMT, self.Buf, offset)[1]
+                        entries.append((t, value, value, value, 1))
+                    else:
+                        entries.append((t,) + ustruct.unpack_from(self.BUCKET_FMT, self.Buf, offset)[1:])
+                    if count_max is not None and len(entries) >= count_max:
+                        return entries
+        return entries
+
+    def _Load(self):
+        self.Bases = []
+        self.Head = []
+        self.Count = []
+        self.Last = []
+        for tier in range(0, len(self.Tiers)):
+            bases = [None] * self.Blocks[tier]
+            head = -1
+            count = 0
+            last = None
+            try:
+                with open(self.Path.format(tier), "rb") as f:
+                    if f.seek(0, 2) != self.Blocks[tier] * self.BLOCK_SIZE:
+                        raise OSError
+                    for block in range(0, self.Blocks[tier]):
+                        f.seek(block * self.BLOCK_SIZE)
+                        base = ustruct.unpack(self.HDR_FMT, f.read(self.HDR_SIZE))[0]
+                        if base == self.EMPTY_BASE:
+                            continue
+                        bases[block] = base
+                        if head < 0 or base > bases[head]:
+                            head = block
+                    if head >= 0:
+                        f.seek(head * self.BLOCK_SIZE)
+                        f.readinto(self.Buf)
+            except OSError:
+                self._Format(tier)
+
+            if head >= 0:
+                size = self._EntrySize(tier)
+                for offset in range(self.HDR_SIZE, self.BLOCK_SIZE - size + 1, size):
+                    dt = ustruct.unpack_from("<H", self.Buf, offset)[0]
+                    if dt == self.EMPTY:
+                        break
+                    count += 1
+                    last = bases[head] + dt * self._Unit(tier)
+
+            self.Bases.append(bases)
+            self.Head.append(head)
+            self.Count.append(count)
+            self.Last.append(last)
+
+    def _Format(self, tier):
+        for i in range(0, self.BLOCK_SIZE):
+            self.Buf[i] = 0xFF
+        with open(self.Path.format(tier), "wb") as f:
+            for block in range(0, self.Blocks[tier]):
+                f.write(self.Buf)
@@ -0,0 +1,190 @@
+from upyiot.system.Service.Service import Service
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+from micropython import const
+import uasyncio
+import utime
+
+
+class SharedSupply:
+    """
+    Reference counted wrapper of a Supply that is shared by multiple sensor
+    drivers. The supply is only enabled (and waited for to settle) by the
+    first user and disabled by the last one.
+
+    If the settle time is given to this wrapper instead of the Supply, it is
+    waited for by the wrapper: only the remaining settle time is waited, and
+    EnableAsync() lets other tasks run in the meantime.
+    """
+
+    def __init__(self, supply, settle_ms=0):
+        """
+        :param supply: Supply object.
+        :param settle_ms: Settle time in milliseconds, in case the Supply has
+        been created with a settle time of 0.
+        """
+        self.Supply = supply
+        self.SettleMs = settle_ms
+        self.EnabledAt = 0
+        self.Count = 0
+        self.Enables = 0
+        # Time (ms) the supply has been on.
+        self.OnMs = 0
+        return
+
+    def Enable(self):
+        self._Enable()
+        utime.sleep_ms(self.Remaining())
+
+    async def EnableAsync(self):
+        self._Enable()
+        await uasyncio.sleep_ms(self.Remaining())
+
+    def Remaining(self):
+        """
+        :return: Time (ms) until the supply has settled.
+        :rtype: int
+        """
+        if self.Count == 0:
+            return self.SettleMs
+        return max(self.SettleMs - utime.ticks_diff(utime.ticks_ms(), self.EnabledAt), 0)
+
+    def _Enable(self):
+        if self.Count == 0:
+            self.Supply.Enable()
+            self.EnabledAt = utime.ticks_ms()
+            self.Enables += 1
+        self.Count += 1
+
+    def Disable(self):
+        if self.Count == 0:
+            return
+        self.Count -= 1
+        if self.Count == 0:
+            self.Supply.Disable()
+            self.OnMs += utime.ticks_diff(utime.ticks_ms(), self.EnabledAt)
+
+
+class SamplingGroup(Service):
+    """
+    Periodic service that runs a group of sensor services in the same wake.
+    Members that are due within the tolerance window are read back to back
+    while the (shared) supply is enabled once. The group reschedules itself
+    to the first member that is due next.
+    The members are not registered to the scheduler themselves.
+    """
+
+    SAMPLING_GROUP_SERVICE_MODE = Service.MODE_RUN_PERIODIC
+
+    # Minimum interval between two group runs in seconds.
+    INTERVAL_MIN = const(1)
+
+    def __init__(self, name, tolerance, supply=None):
+        """
+        :param name: Name of the group service.
+        :param tolerance: Members that are due within this number of seconds
+        are run early, together with the members that are due.
+        :param supply: SharedSupply of the members, optional.
+        """
+        super().__init__(name, self.SAMPLING_GROUP_SERVICE_MODE, {})
+        self.Tolerance = tolerance
+        self.Supply = supply
+        self.Members = []
+        self.Intervals = {}
+        # Start time of a run by SvcRunAsync().
+        self.RunAt = None
+        self.Log = LogRing.Create()
+        return
+
+    def MemberAdd(self, svc, interval):
+        """
+        :param svc: Sensor service.
+        :param interval: Interval of the member in seconds.
+        """
+        self.Members.append(svc)
+        self.MemberIntervalSet(svc, interval)
+
+    def MemberIntervalSet(self, svc, interval):
+        self.Intervals[id(svc)] = interval
+
+    def IsMember(self, svc):
+        return id(svc) in self.Intervals
+
+    def SvcInit(self):
+        for svc in self.Members:
+            svc.SvcInit()
+
+    def SvcRun(self):
+        now = utime.time()
+        if self.RunAt is not None:
+            # The members are accounted at the time the run was started.
+            now = self.RunAt
+            self.RunAt = None
+        due = self._DueMembers(now)
+
+        if len(due) > 0:
+            if self.Supply is not None:
+                self.Supply.Enable()
+            try:
+                for svc in due:
+                    svc.SvcRun()
+                    svc.SvcLastRun = now
+            finally:
+                if self.Supply is not None:
+                    self.Supply.Disable()
+            self.Log.debug(LogFormats.GROUP_SAMPLED, len(due), len(self.Members))
+
+        self.Reschedule(now)
+
+    async def SvcRunAsync(self):
+        """
+        Cooperative run, see AsyncRunner. Other tasks run while the supply
+        settles.
+        """
+        now = utime.time()
+        if self.Supply is None or len(self._DueMembers(now)) == 0:
+            self.SvcRun()
+            return
+
+        await self.Supply.EnableAsync()
+        try:
+            self.RunAt = now
+            self.SvcRun()
+        finally:
+            self.Supply.Disable()
+
+    def NextDue(self):
+        """
+        :return: Time (sec) at which the first member is due, None if the group
+        has no members.
+        :rtype: int
+        """
+        next_due = None
+        for svc in self.Members:
+            due = self._Due(svc)
+            next_due = due if next_due is None else min(next_due, due)
+        return next_due
+
+    def Reschedule(self, now):
+        """
+        Set the group interval so the next run is at the time the first member
+        is due.
+        :param now: Time of the current run in seconds.
+        """
+        next_due = self.NextDue()
+        if next_due is None:
+            return
+        self.SvcLastRun = now
+        self.SvcIntervalSet(max(next_due - now, self.INTERVAL_MIN))
+
+    def _DueMembers(self, now):
+        return [svc for svc in self.Members if self._IsDue(svc, now + self.Tolerance)]
+
+    def _Due(self, svc):
+        if svc.SvcLastRun <= 0:
+            return 0
+        return svc.SvcLastRun + self.Intervals[id(svc)]
+
+    def _IsDue(self, svc, time):
+        return self._Due(svc) <= time
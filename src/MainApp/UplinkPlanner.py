@@ -0,0 +1,209 @@
+from upyiot.comm.Messaging.MessageExchange import MessageExchange
+
+from Schemas.EventReport import EventReport
+from MainApp import Airtime
+from MainApp.LogRing import LogRing
+from MainApp import LogFormats
+
+from micropython import const
+
+
+class UplinkPlanner:
+    """
+    Computes the cost of uplinks under the configured LoRa settings and keeps
+    track of the duty cycle budget.
+    """
+
+    # Payload size assumed before the first uplink has been recorded.
+    PAYLOAD_ESTIMATE = const(20)
+
+    # Symbols the receiver listens for a preamble in each of the two class A
+    # receive windows.
+    RX_WINDOW_SYMBOLS = const(8)
+
+    def __init__(self, lora_config, directory):
+        """
+        :param lora_config: LoRa configuration (freq, sf, ldro).
+        :param directory: Directory of the duty cycle state file.
+        """
+        self.Sf = lora_config["sf"]
+        self.Ldro = lora_config.get("ldro", 0)
+        self.Duty = Airtime.DutyCycle(directory, Airtime.DutyCycleLimit(lora_config["freq"]))
+        self.PayloadLast = self.PAYLOAD_ESTIMATE
+        self.Link = None
+        # Radio time (ms) spent transmitting and receiving since wake.
+        self.TxMs = 0
+        self.RxMs = 0
+        self.Log = LogRing.Create()
+        return
+
+    def TimeOnAir(self, payload_len):
+        return Airtime.TimeOnAir(payload_len, self.Sf, self.Ldro)
+
+    def LinkSet(self, link):
+        """
+        :param link: Object that adapts the data rate to the outcome of every
+        uplink, see LinkAdr.
+        """
+        self.Link = link
+
+    def Record(self, payload_len, rssi=None, snr=None):
+        """
+        Account an uplink that has been transmitted.
+        :param rssi: RSSI (dBm) of the downlink that followed the uplink.
+        :param snr: SNR (dB) of the downlink that followed the uplink, None if
+        no downlink was received.
+        """
+        self.PayloadLast = payload_len
+        toa = self.TimeOnAir(payload_len)
+        self.Duty.Record(toa)
+        self.TxMs += toa
+        self.RxMs += 2 * self.RX_WINDOW_SYMBOLS * (1 << self.Sf) / 125
+        if self.Link is not None:
+            self.Link.Record(rssi, snr)
+
+    def Deferral(self, frames=1):
+        """
+        :param frames: Number of frames that are about to be sent.
+        :return: Seconds to wait until the frames fit in the duty cycle budget.
+        """
+        return self.Duty.WaitTime(frames * self.TimeOnAir(self.PayloadLast))
+
+    def Remaining(self):
+        """
+        :return: Remaining duty cycle budget in ms of airtime.
+        """
+        return self.Duty.Remaining()
+
+    def RemainingPercent(self):
+        """
+        :return: Remaining duty cycle budget as percentage of the full budget.
+        """
+        return (100 * self.Duty.Remaining()) // max(self.Duty.BudgetMs, 1)
+
+    def Save(self):
+        self.Duty.Save()
+
+
+class PlannedProtocol:
+    """
+    Wraps a messaging protocol to account the airtime of every sent payload
+    with an UplinkPlanner. The link quality of the downlink that followed the
+    uplink is taken from the Rssi and Snr attributes of the protocol, if it
+    has them. They are cleared before every uplink, so a value is only taken
+    from a downlink received in the RX windows of that uplink. Sent counts
+    the payloads that were sent without an error. A failed join is raised as
+    an event. All other attributes are passed to the protocol.
+    """
+
+    def __init__(self, proto_obj, planner, events=None):
+        """
+        :param events: EventLog object, optional.
+        """
+        self.Protocol = proto_obj
+        self.Planner = planner
+        self.Events = events
+        self.Sent = 0
+        return
+
+    def Connect(self, *args):
+        joining = self.Events is not None and self.Protocol.HasSession() is False
+        result = self.Protocol.Connect(*args)
+        if joining is True and self.Protocol.HasSession() is False:
+            self.Events.Raise(EventReport.EVENT_JOIN_FAILED)
+        return result
+
+    def Send(self, *args):
+        if hasattr(self.Protocol, "Rssi"):
+            self.Protocol.Rssi = None
+        if hasattr(self.Protocol, "Snr"):
+            self.Protocol.Snr = None
+        result = self.Protocol.Send(*args)
+        if result is not False:
+            self.Sent += 1
+        for arg in args:
+            if isinstance(arg, (bytes, bytearray)):
+                self.Planner.Record(len(arg),
+                                    getattr(self.Protocol, "Rssi", None),
+                                    getattr(self.Protocol, "Snr", None))
+                break
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.Protocol, name)
+
+
+class PlannedMessageExchange(MessageExchange):
+    """
+    Message Exchange that is deferred while the duty cycle budget does not
+    allow another uplink. Messages that are put in the meantime are sent
+    together once the budget allows it.
+    """
+
+    def __init__(self, planner, interval, events=None, **kwargs):
+        """
+        :param planner: UplinkPlanner object.
+        :param interval: Nominal service interval in seconds.
+        :param events: EventLog object that records failed joins, optional.
+        :param kwargs: MessageExchange arguments.
+        """
+        self.Planner = planner
+        self.Interval = interval
+        # Interval of a deferred run, 0 if the last run was not deferred.
+        self.Wait = 0
+        # Set when the service is activated, until it runs next.
+        self.Activated = False
+        # Optional callable, invoked when the service is activated.
+        self.ActivateCallback = None
+        self.Receivers = []
+        self.Planned = PlannedProtocol(kwargs["proto_obj"], planner, events)
+        kwargs["proto_obj"] = self.Planned
+        super().__init__(**kwargs)
+        self.Log = LogRing.Create()
+        return
+
+    def SvcIntervalSet(self, interval):
+        self.Interval = interval
+        super().SvcIntervalSet(interval)
+
+    def SvcActivate(self):
+        self.Activated = True
+        super().SvcActivate()
+        if self.ActivateCallback is not None:
+            self.ActivateCallback()
+
+    def CurrentInterval(self):
+        """
+        :return: Interval until the next run in seconds: the deferral of the
+        last run if it was deferred, otherwise the nominal interval.
+        """
+        return self.Wait if self.Wait > 0 else self.Interval
+
+    def ReceiverAdd(self, msg_spec, callback):
+        """
+        Register a callback that is invoked with every received message of the
+        given specification, after the Message Exchange has run.
+        """
+        self.RegisterMessageType(msg_spec)
+        self.Receivers.append((msg_spec, callback))
+
+    def SvcRun(self):
+        # A deferred run is rescheduled to the end of the deferral, which
+        # serves an activation as well.
+        self.Activated = False
+        wait = self.Planner.Deferral()
+        if wait > 0:
+            self.Log.info(LogFormats.PLAN_DEFER, wait)
+            self.Wait = max(wait, 1)
+            super().SvcIntervalSet(self.Wait)
+            return
+
+        self.Wait = 0
+        super().SvcIntervalSet(self.Interval)
+        super().SvcRun()
+
+        for msg_spec, callback in self.Receivers:
+            msg = self.MessageGet(msg_spec.Type, msg_spec.Subtype)
+            while msg is not None:
+                callback(msg)
+                msg = self.MessageGet(msg_spec.Type, msg_spec.Subtype)
@@ -0,0 +1,27 @@
+from upyiot.comm.Messaging.MessageSpecification import MessageSpecification
+from micropython import const
+
+
+class BacklogReport(MessageSpecification):
+    """
+    Messages that were queued while the node could not send, packed in a
+    single uplink, see MainApp.MessageQueue.
+    """
+
+    TYPE_BACKLOG             = const(4)
+    SUBTYPE_BACKLOG_REPORT   = const(1)
+
+    # Concatenated records: varint length followed by the encoded message, of
+    # which the metadata only holds the type and subtype.
+    DATA_KEY_RECORDS          = const(112)
+
+    DIRECTION_REPORT   = MessageSpecification.MSG_DIRECTION_SEND
+
+    def __init__(self):
+        self.DataDef = {BacklogReport.DATA_KEY_RECORDS: b""}
+
+        super().__init__(BacklogReport.TYPE_BACKLOG,
+                         BacklogReport.SUBTYPE_BACKLOG_REPORT,
+                         self.DataDef,
+                         "",
+                         BacklogReport.DIRECTION_REPORT)
@@ -0,0 +1,51 @@
+from upyiot.comm.Messaging.MessageSpecification import MessageSpecification
+from micropython import const
+
+
+class ConfigUpdate(MessageSpecification):
+    """
+    Downlink with configuration parameter updates, see MainApp.RemoteConfig.
+    """
+
+    TYPE_CONFIG             = const(5)
+    SUBTYPE_CONFIG_UPDATE   = const(1)
+
+    # Sequence number of the update, echoed in the acknowledgement.
+    DATA_KEY_SEQ            = const(113)
+    # Flat list of parameter ID, value pairs.
+    DATA_KEY_PARAMS         = const(114)
+
+    DIRECTION_UPDATE   = MessageSpecification.MSG_DIRECTION_RECV
+
+    def __init__(self):
+        self.DataDef = {ConfigUpdate.DATA_KEY_SEQ: 0,
+                        ConfigUpdate.DATA_KEY_PARAMS: []}
+
+        super().__init__(ConfigUpdate.TYPE_CONFIG,
+                         ConfigUpdate.SUBTYPE_CONFIG_UPDATE,
+                         self.DataDef,
+                         "",
+                         ConfigUpdate.DIRECTION_UPDATE)
+
+
+class ConfigAck(MessageSpecification):
+    """
+    Acknowledgement of a ConfigUpdate. It is sent in the spare bytes of a
+    sensor report when possible, see MainApp.Piggyback.
+    """
+
+    SUBTYPE_CONFIG_ACK      = const(2)
+
+    # Varint sequence number followed by the IDs of the rejected parameters.
+    DATA_KEY_ACK            = const(115)
+
+    DIRECTION_ACK      = MessageSpecification.MSG_DIRECTION_SEND
+
+    def __init__(self):
+        self.DataDef = {ConfigAck.DATA_KEY_ACK: b""}
+
+        super().__init__(ConfigUpdate.TYPE_CONFIG,
+                         ConfigAck.SUBTYPE_CONFIG_ACK,
+                         self.DataDef,
+                         "",
+                         ConfigAck.DIRECTION_ACK)
@@ -1,22 +1,72 @@
 from upyiot.comm.Messaging.MessageSpecification import MessageSpecification
+from Codec import Varint
 from micropython import const
 
 
 class EventReport(MessageSpecification):
+    """
+    Diagnostic events, de-duplicated on the node (see MainApp.EventLog). The
+    events are sent in a report of their own or in the spare bytes of a
+    sensor report, see MainApp.Piggyback.
+    """
 
-    TYPE_REPORT              = const(0)
+    # Type 0 is used by the sensor reports, which share subtype 1.
+    TYPE_EVENT               = const(2)
     SUBTYPE_EVENT_REPORT     = const(1)
 
+    # Packed events, see EventPackInto.
     DATA_KEY_EVENT            = const(104)
 
     DIRECTION_REPORT   = MessageSpecification.MSG_DIRECTION_SEND
 
+    # Event codes. The argument of a reset is machine.reset_cause(), of a sleep
+    # failure one of SLEEP_*, of a sensor fault the subtype of its report. An
+    # overflow counts the events that did not fit in the buffer.
+    EVENT_RESET             = const(1)
+    EVENT_JOIN_FAILED       = const(2)
+    EVENT_SLEEP_FAILED      = const(3)
+    EVENT_SENSOR_FAULT      = const(4)
+    EVENT_OVERFLOW          = const(5)
+
+    SLEEP_NO_REPLY          = const(0)
+    SLEEP_NOT_CUT           = const(1)
+
     def __init__(self):
-        self.DataDef = {EventReport.DATA_KEY_EVENT: []}
+        self.DataDef = {EventReport.DATA_KEY_EVENT: b""}
 
-        super().__init__(EventReport.TYPE_REPORT,
+        super().__init__(EventReport.TYPE_EVENT,
                          EventReport.SUBTYPE_EVENT_REPORT,
                          self.DataDef,
                          "",
                          EventReport.DIRECTION_REPORT)
 
+    @staticmethod
+    def EventSize(arg, count, age):
+        return 1 + Varint.Size(arg) + Varint.Size(count) + Varint.Size(age)
+
+    @staticmethod
+    def EventPackInto(buf, offset, code, arg, count, age):
+        """
+        Pack an event: code (byte), argument, number of occurrences and the
+        time since the first occurrence in seconds (varints).
+        :return: Offset after the event.
+        """
+        buf[offset] = code
+        offset = Varint.EncodeInto(arg, buf, offset + 1)
+        offset = Varint.EncodeInto(count, buf, offset)
+        return Varint.EncodeInto(age, buf, offset)
+
+    @staticmethod
+    def EventsUnpack(data):
+        """
+        :return: List of (code, argument, count, age) tuples.
+        """
+        events = []
+        offset = 0
+        while offset < len(data):
+            code = data[offset]
+            arg, offset = Varint.Decode(data, offset + 1)
+            count, offset = Varint.Decode(data, offset)
+            age, offset = Varint.Decode(data, offset)
+            events.append((code, arg, count, age))
+        return events
@@ -0,0 +1,104 @@
+from upyiot.comm.Messaging.MessageSpecification import MessageSpecification
+from Codec import Varint
+from micropython import const
+
+
+class HistoryRequest(MessageSpecification):
+    """
+    Downlink that requests the sample history of a sensor in a time range,
+    answered with a HistoryReport, see MainApp.SampleHistory.
+    """
+
+    TYPE_HISTORY                = const(6)
+    SUBTYPE_HISTORY_REQUEST     = const(1)
+
+    # Subtype of the sensor report of the sensor.
+    DATA_KEY_SENSOR             = const(117)
+    # Time range in seconds, the end is exclusive.
+    DATA_KEY_START              = const(118)
+    DATA_KEY_END                = const(119)
+
+    DIRECTION_REQUEST   = MessageSpecification.MSG_DIRECTION_RECV
+
+    def __init__(self):
+        self.DataDef = {HistoryRequest.DATA_KEY_SENSOR: 0,
+                        HistoryRequest.DATA_KEY_START: 0,
+                        HistoryRequest.DATA_KEY_END: 0}
+
+        super().__init__(HistoryRequest.TYPE_HISTORY,
+                         HistoryRequest.SUBTYPE_HISTORY_REQUEST,
+                         self.DataDef,
+                         "",
+                         HistoryRequest.DIRECTION_REQUEST)
+
+
+class HistoryReport(MessageSpecification):
+    """
+    The oldest history entries of the requested range that fit in one
+    uplink. The rest of the range is requested from the time after the last
+    entry.
+    """
+
+    SUBTYPE_HISTORY_REPORT      = const(2)
+
+    # Packed entries, see EntryPackInto.
+    DATA_KEY_ENTRIES            = const(120)
+
+    DIRECTION_REPORT   = MessageSpecification.MSG_DIRECTION_SEND
+
+    def __init__(self):
+        self.DataDef = {HistoryRequest.DATA_KEY_SENSOR: 0,
+                        HistoryReport.DATA_KEY_ENTRIES: b""}
+
+        super().__init__(HistoryRequest.TYPE_HISTORY,
+                         HistoryReport.SUBTYPE_HISTORY_REPORT,
+                         self.DataDef,
+                         "",
+                         HistoryReport.DIRECTION_REPORT)
+
+    @staticmethod
+    def EntrySize(dt, minimum, maximum, mean, count):
+        if count == 1:
+            return Varint.Size(dt << 1) + Varint.SizeSigned(minimum)
+        return Varint.Size(dt << 1 | 1) + Varint.SizeSigned(minimum) + \
+            Varint.Size(maximum - minimum) + Varint.Size(mean - minimum) + Varint.Size(count)
+
+    @staticmethod
+    def EntryPackInto(buf, offset, dt, minimum, maximum, mean, count):
+        """
+        Pack an entry: time since the previous entry (sec, the first entry
+        holds its absolute time) shifted left by one with the lowest bit set
+        for a bucket. A sample is followed by its value (zigzag varint), a
+        bucket by its minimum (zigzag varint), maximum and mean above the
+        minimum and the sample count (varints).
+        :return: Offset after the entry.
+        """
+        if count == 1:
+            offset = Varint.EncodeInto(dt << 1, buf, offset)
+            return Varint.EncodeSignedInto(minimum, buf, offset)
+        offset = Varint.EncodeInto(dt << 1 | 1, buf, offset)
+        offset = Varint.EncodeSignedInto(minimum, buf, offset)
+        offset = Varint.EncodeInto(maximum - minimum, buf, offset)
+        offset = Varint.EncodeInto(mean - minimum, buf, offset)
+        return Varint.EncodeInto(count, buf, offset)
+
+    @staticmethod
+    def EntriesUnpack(data):
+        """
+        :return: List of (time, minimum, maximum, mean, count) tuples.
+        """
+        entries = []
+        offset = 0
+        t = 0
+        while offset < len(data):
+            token, offset = Varint.Decode(data, offset)
+            t += token >> 1
+            minimum, offset = Varint.DecodeSigned(data, offset)
+            if token & 1 == 0:
+                entries.append((t, minimum, minimum, minimum, 1))
+                continue
+            maximum, offset = Varint.Decode(data, offset)
+            mean, offset = Varint.Decode(data, offset)
+            count, offset = Varint.Decode(data, offset)
+            entries.append((t, minimum, minimum + maximum, minimum + mean, count))
+        return entries
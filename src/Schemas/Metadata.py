@@ -7,6 +7,8 @@ MSG_META_VERSION    = const(10)
 MSG_META_TYPE       = const(11)
 MSG_META_SUBTYPE    = const(12)
 MSG_META_ID         = const(13)
+# Remaining duty cycle budget in percent, optional.
+MSG_META_DUTY       = const(14)
 
 Metadata = {
     MSG_META_VERSION:   1,
@@ -0,0 +1,36 @@
+from upyiot.comm.Messaging.MessageSpecification import MessageSpecification
+from micropython import const
+
+
+class ProfileReport(MessageSpecification):
+    """
+    Summary of the awake time and charge per wake cycle and per service,
+    see MainApp.Profiler.
+    """
+
+    TYPE_TELEMETRY           = const(3)
+    SUBTYPE_PROFILE_REPORT   = const(1)
+
+    # Number of profiled wake cycles, average awake time (ms) and average
+    # charge (uC) per cycle.
+    DATA_KEY_CYCLE            = const(110)
+    # Service ID, runs, average run time (ms), average radio time (ms) and
+    # average charge (uC) per run of every profiled service.
+    DATA_KEY_SERVICES         = const(111)
+
+    # Service names, the index of a name is its service ID. Names are only
+    # ever appended.
+    SERVICES = ("Dummy", "Temp", "MsgEx", "Reg", "Sensors", "Async")
+    SERVICE_FIELDS = const(5)
+
+    DIRECTION_REPORT   = MessageSpecification.MSG_DIRECTION_SEND
+
+    def __init__(self):
+        self.DataDef = {ProfileReport.DATA_KEY_CYCLE: [],
+                        ProfileReport.DATA_KEY_SERVICES: []}
+
+        super().__init__(ProfileReport.TYPE_TELEMETRY,
+                         ProfileReport.SUBTYPE_PROFILE_REPORT,
+                         self.DataDef,
+                         "",
+                         ProfileReport.DIRECTION_REPORT)
@@ -1,4 +1,5 @@
 from upyiot.comm.Messaging.MessageSpecification import MessageSpecification
+from Codec import Varint
 from micropython import const
 
 
@@ -10,6 +11,8 @@ class RegistrationInfo(MessageSpecification):
     DATA_KEY_HW_ID  = const(101)
     DATA_KEY_SW_VER = const(102)
     DATA_KEY_FW_VER = const(103)
+    # Compact registration info, sent along with another message. See DeviceInfoPack.
+    DATA_KEY_DEVICE = const(109)
 
     DIRECTION_REGISTRATION = MessageSpecification.MSG_DIRECTION_SEND
 
@@ -24,3 +27,26 @@ class RegistrationInfo(MessageSpecification):
                          self.DataDef,
                          "",
                          RegistrationInfo.DIRECTION_REGISTRATION)
+
+    @staticmethod
+    def DeviceInfoPack(hw_id, sw_ver, fw_ver):
+        """
+        Pack the registration info: HW ID length (byte), HW ID, SW version and
+        FW version (varints).
+        """
+        buf = bytearray(1 + len(hw_id) + 10)
+        buf[0] = len(hw_id)
+        buf[1:1 + len(hw_id)] = hw_id
+        offset = Varint.EncodeInto(sw_ver, buf, 1 + len(hw_id))
+        offset = Varint.EncodeInto(fw_ver, buf, offset)
+        return bytes(buf[0:offset])
+
+    @staticmethod
+    def DeviceInfoUnpack(data):
+        """
+        :return: Tuple of (HW ID, SW version, FW version).
+        """
+        id_len = data[0]
+        sw_ver, offset = Varint.Decode(data, 1 + id_len)
+        fw_ver, offset = Varint.Decode(data, offset)
+        return bytes(data[1:1 + id_len]), sw_ver, fw_ver
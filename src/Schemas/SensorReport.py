@@ -1,4 +1,5 @@
 from upyiot.comm.Messaging.MessageSpecification import MessageSpecification
+from Codec import Varint
 from micropython import const
 
 
@@ -7,6 +8,11 @@ class SensorReport(MessageSpecification):
     TYPE_REPORT              = const(0)
 
     DATA_KEY_MEASUREMENTS     = const(100)
+    # Delta encoded sample batch, see MainApp.SampleBatcher.
+    DATA_KEY_SAMPLES          = const(105)
+    # Minimum, maximum and count of the samples that were not reported since
+    # the previous report, see MainApp.DeadbandReporter and SummaryPack.
+    DATA_KEY_SUMMARY          = const(116)
 
     DIRECTION_REPORT   = MessageSpecification.MSG_DIRECTION_SEND
 
@@ -19,6 +25,48 @@ class SensorReport(MessageSpecification):
                          "",
                          SensorReport.DIRECTION_REPORT)
 
+    @staticmethod
+    def SummaryPack(minimum, maximum, count):
+        """
+        Pack a summary: minimum and maximum (zigzag varints) and count (varint).
+        """
+        buf = bytearray(15)
+        offset = Varint.EncodeSignedInto(minimum, buf, 0)
+        offset = Varint.EncodeSignedInto(maximum, buf, offset)
+        offset = Varint.EncodeInto(count, buf, offset)
+        return bytes(buf[0:offset])
+
+    @staticmethod
+    def SummaryUnpack(data):
+        """
+        :return: Tuple of (minimum, maximum, count).
+        """
+        minimum, offset = Varint.DecodeSigned(data, 0)
+        maximum, offset = Varint.DecodeSigned(data, offset)
+        count, offset = Varint.Decode(data, offset)
+        return minimum, maximum, count
+
+    @staticmethod
+    def SamplesUnpack(data):
+        """
+        Unpack a sample batch, see MainApp.SampleBatcher.
+        :return: List of (time, sample) tuples.
+        """
+        t, offset = Varint.Decode(data, 0)
+        interval, offset = Varint.Decode(data, offset)
+        value, offset = Varint.DecodeSigned(data, offset)
+        samples = [(t, value)]
+        slot = 0
+        while offset < len(data):
+            token, offset = Varint.Decode(data, offset)
+            slot += 1
+            if token & 1:
+                skip, offset = Varint.Decode(data, offset)
+                slot += skip + 1
+            value += Varint.UnZigZag(token >> 1)
+            samples.append((t + slot * interval, value))
+        return samples
+
 
 class MoistureSensorReport(SensorReport):
 
@@ -42,3 +90,28 @@ class TemperatureSensorReport(SensorReport):
 
     def __init__(self):
         super().__init__(self.SUBTYPE_TEMPERATURE_REPORT)
+
+
+class CombinedSensorReport(MessageSpecification):
+    """
+    Moisture, temperature and battery samples in a single report with one
+    metadata block. Each section holds the samples taken since the previous
+    report, a section is empty if its sensor has no new samples.
+    """
+
+    SUBTYPE_COMBINED_REPORT = const(4)
+
+    DATA_KEY_MOISTURE       = const(106)
+    DATA_KEY_TEMPERATURE    = const(107)
+    DATA_KEY_BATTERY        = const(108)
+
+    def __init__(self):
+        self.DataDef = {CombinedSensorReport.DATA_KEY_MOISTURE: [],
+                        CombinedSensorReport.DATA_KEY_TEMPERATURE: [],
+                        CombinedSensorReport.DATA_KEY_BATTERY: []}
+
+        super().__init__(SensorReport.TYPE_REPORT,
+                         CombinedSensorReport.SUBTYPE_COMBINED_REPORT,
+                         self.DataDef,
+                         "",
+                         SensorReport.DIRECTION_REPORT)
@@ -0,0 +1,54 @@
+"""
+The tests run the application modules on CPython with the MicroPython
+stand-ins of host/Stubs, in the sandboxed file system of the host harness.
+
+Modules that import the upyiot library (the schemas, the Message Exchange
+and the observers) need the upyiot submodule. Their tests are skipped when
+it is not checked out (git submodule update --init).
+"""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# The host tooling is imported from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from host import Paths
+
+Paths.Install()
+
+from host.Harness import Harness
+
+
+UPYIOT_MODULE = "upyiot.comm.Messaging.MessageSpecification"
+
+
+def UpyiotAvailable():
+    try:
+        return importlib.util.find_spec(UPYIOT_MODULE) is not None
+    except ImportError:
+        return False
+
+
+@pytest.fixture
+def device():
+    """
+    Harness of which the file system and RTC memory are empty, as after a
+    power-on reset. The device directories must be created by the test.
+    """
+    with Harness() as harness:
+        import machine
+        machine.SetResetCause(machine.PWRON_RESET)
+        machine.RTC.Memory = b""
+        yield harness
+
+
+@pytest.fixture
+def upyiot():
+    """
+    Skip the test if the upyiot submodule is not checked out.
+    """
+    if UpyiotAvailable() is False:
+        pytest.skip("upyiot submodule is not checked out")
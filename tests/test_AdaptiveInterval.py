@@ -0,0 +1,83 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+INTERVAL_MIN = 60
+INTERVAL_MAX = 960
+RESOLUTION = 4
+
+
+@pytest.fixture
+def applied(device):
+    return []
+
+
+def _Adaptive(applied, interval_min=INTERVAL_MIN):
+    from MainApp.AdaptiveInterval import AdaptiveInterval
+    from MainApp.RtcMemory import RtcMemory
+    return AdaptiveInterval(RtcMemory.REGION_ADAPT_MOIST, interval_min, INTERVAL_MAX,
+                            RESOLUTION, applied.append)
+
+
+def _Feed(adaptive, samples):
+    for sample in samples:
+        adaptive.Update(sample)
+
+
+def test_SteadySamplesStretch(applied):
+    adaptive = _Adaptive(applied)
+    # Changes below half the resolution.
+    _Feed(adaptive, [40, 41, 40, 41, 41, 40, 41])
+    assert applied == [60, 120, 240, 480, 960]
+    assert adaptive.Interval == INTERVAL_MAX
+
+
+def test_RapidChangeShortens(applied):
+    adaptive = _Adaptive(applied)
+    _Feed(adaptive, [40] * 5)
+    assert adaptive.Interval == INTERVAL_MAX
+    _Feed(adaptive, [80, 120, 160])
+    assert applied[-2:] == [240, 60]
+    assert adaptive.Interval == INTERVAL_MIN
+
+
+def test_ModerateChangeKeepsInterval(applied):
+    adaptive = _Adaptive(applied)
+    _Feed(adaptive, [40])
+    # Changes of the resolution, between both thresholds once settled.
+    _Feed(adaptive, [40 + RESOLUTION * (i % 2) for i in range(1, 20)])
+    interval = adaptive.Interval
+    _Feed(adaptive, [40 + RESOLUTION * (i % 2) for i in range(0, 20)])
+    assert adaptive.Interval == interval
+
+
+def test_StatePersistedInRtcMemory(applied):
+    adaptive = _Adaptive(applied)
+    _Feed(adaptive, [40, 40, 40])
+    del applied[:]
+
+    adaptive = _Adaptive(applied)
+    assert (adaptive.Value, adaptive.Interval) == (40, 240)
+    # The restored interval is applied to the service on the first sample.
+    _Feed(adaptive, [40])
+    assert applied == [480]
+
+
+def test_LostStateRestartsAtMinimum(applied):
+    import machine
+    adaptive = _Adaptive(applied)
+    _Feed(adaptive, [40, 40, 40])
+    machine.RTC.Memory = b""
+    adaptive = _Adaptive(applied)
+    assert adaptive.Value is None
+    assert adaptive.Interval == INTERVAL_MIN
+
+
+def test_IntervalOutOfBoundsIsIgnored(applied):
+    adaptive = _Adaptive(applied)
+    _Feed(adaptive, [40, 40])
+    # The bounds were reconfigured.
+    adaptive = _Adaptive(applied, interval_min=INTERVAL_MAX)
+    assert adaptive.Value is None
+    assert adaptive.Interval == INTERVAL_MAX
@@ -0,0 +1,73 @@
+import pytest
+
+
+EPOCH = 1600000200
+# 1% of an hour.
+BUDGET_MS = 36000
+
+
+@pytest.fixture
+def duty(device):
+    import uos
+    import utime
+    uos.mkdir("/sys")
+    utime.Set(EPOCH)
+    return _Duty()
+
+
+def _Duty():
+    from MainApp import Airtime
+    return Airtime.DutyCycle("/sys", 0.01)
+
+
+def test_TimeOnAir():
+    from MainApp import Airtime
+    assert Airtime.TimeOnAir(12, 7) == pytest.approx(61.696)
+    assert Airtime.TimeOnAir(12, 12, ldro=1) == pytest.approx(1482.752)
+
+
+def test_Budget(duty):
+    assert duty.BudgetMs == BUDGET_MS
+    duty.Record(10000)
+    assert duty.Used() == 10000
+    assert duty.Remaining() == BUDGET_MS - 10000
+    assert duty.WaitTime(BUDGET_MS - 10000) == 0
+
+
+def test_WaitUntilAirtimeExpires(duty):
+    import utime
+    duty.Record(BUDGET_MS)
+    wait = duty.WaitTime(1000)
+    assert 0 < wait <= duty.WINDOW_SEC
+
+    utime.Set(EPOCH + wait)
+    assert duty.WaitTime(1000) == 0
+
+
+def test_PersistedAcrossWakes(duty):
+    duty.Record(10000)
+    duty.Save()
+    assert _Duty().Used() == 10000
+
+
+def test_ClockGoesBack(duty):
+    import utime
+    duty.Record(BUDGET_MS)
+    duty.Save()
+
+    # The RTC was reset, the airtime can no longer be placed in time.
+    utime.Set(1000)
+    duty = _Duty()
+    assert duty.WaitTime(1000) == 0
+    assert duty.Used() == 0
+    duty.Record(1000)
+    assert duty.Used() == 1000
+
+
+def test_ClockStartsAtZero(duty):
+    import utime
+    utime.Set(0)
+    duty = _Duty()
+    duty.Record(BUDGET_MS)
+    utime.Set(60)
+    assert duty.Used() == BUDGET_MS
@@ -0,0 +1,118 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+EPOCH = 1600000000
+
+
+class Blocking:
+    """
+    Service that blocks for the given time, like the LoRa transmission.
+    """
+
+    def __init__(self, name, trace, block_ms=0):
+        self.Name = name
+        self.Trace = trace
+        self.BlockMs = block_ms
+        self.SvcLastRun = -1
+
+    def SvcInit(self):
+        pass
+
+    def SvcRun(self):
+        import utime
+        self.Trace.append(self.Name)
+        utime.sleep_ms(self.BlockMs)
+
+
+class Cooperative(Blocking):
+    """
+    Service that yields while it waits, like a settling sensor supply.
+    """
+
+    def __init__(self, name, trace, wait_ms):
+        super().__init__(name, trace)
+        self.WaitMs = wait_ms
+
+    async def SvcRunAsync(self):
+        import uasyncio
+        self.Trace.append(self.Name + ".wait")
+        await uasyncio.sleep_ms(self.WaitMs)
+        self.SvcRun()
+
+
+@pytest.fixture
+def runner(device):
+    import utime
+    from MainApp.AsyncRunner import AsyncRunner
+    utime.Set(EPOCH)
+    return AsyncRunner("Async", margin=10)
+
+
+def test_CooperativeMembersStartFirst(runner):
+    import utime
+    trace = []
+    radio = Blocking("radio", trace, block_ms=1000)
+    sensor = Cooperative("sensor", trace, wait_ms=300)
+    runner.MemberAdd(radio, lambda: EPOCH)
+    runner.MemberAdd(sensor, lambda: EPOCH)
+
+    start = utime.ticks_ms()
+    runner.SvcRun()
+    assert trace == ["sensor.wait", "radio", "sensor"]
+    # The wait overlapped with the blocking member.
+    assert utime.ticks_diff(utime.ticks_ms(), start) == 1000
+    assert radio.SvcLastRun == EPOCH and sensor.SvcLastRun == EPOCH
+
+
+def _Periodic(svc, first, interval):
+    """
+    :return: Due callable of a member that is first due at the given time.
+    """
+    return lambda: first if svc.SvcLastRun < 0 else svc.SvcLastRun + interval
+
+
+def test_OnlyMembersDueWithinMarginRun(runner):
+    trace = []
+    for name, first in (("due", EPOCH), ("margin", EPOCH + 10), ("later", EPOCH + 40)):
+        svc = Blocking(name, trace)
+        runner.MemberAdd(svc, _Periodic(svc, first, 300))
+    runner.MemberAdd(Blocking("unscheduled", trace), lambda: None)
+    runner.SvcRun()
+    assert trace == ["due", "margin"]
+    # Rescheduled to the first member that is due next.
+    assert runner.SvcLastRun == EPOCH
+    assert runner.SvcInterval == 40
+
+
+def test_NothingDue(runner):
+    trace = []
+    runner.MemberAdd(Blocking("later", trace), lambda: EPOCH + 60)
+    runner.SvcRun()
+    assert trace == []
+    assert runner.SvcInterval == 60
+
+
+def test_GroupWithoutSupplyRunsAsIs(runner):
+    import utime
+    from MainApp.SamplingGroup import SamplingGroup
+    trace = []
+    group = SamplingGroup("Group", tolerance=10)
+    group.MemberAdd(Blocking("sensor", trace), 60)
+    runner.MemberAdd(group, lambda: EPOCH)
+
+    start = utime.ticks_ms()
+    runner.SvcRun()
+    assert trace == ["sensor"]
+    assert utime.ticks_diff(utime.ticks_ms(), start) == 0
+
+
+def test_MainAppAsyncMode(device):
+    from host.Harness import WakeReport
+    device.Overrides["SAMPLING_GROUP"] = True
+    device.Overrides["ASYNC_MODE"] = True
+    reports = [device.Wake() for _ in range(0, 4)]
+    assert all(report.Outcome == WakeReport.OUTCOME_DEEPSLEEP for report in reports)
+    assert len(device.Radio.Uplinks) > 0
+    assert device.App.SensorSupply.Enables > 0
@@ -0,0 +1,131 @@
+import pytest
+
+from Codec import Varint
+
+
+VALUES = (0, 1, 63, 64, 127, 128, 300, 16383, 16384, 2 ** 31 - 1, 2 ** 32 + 5)
+
+
+@pytest.mark.parametrize("value", VALUES)
+def test_VarintRoundTrip(value):
+    buf = bytearray(10)
+    end = Varint.EncodeInto(value, buf, 1)
+    assert end - 1 == Varint.Size(value)
+    assert Varint.Decode(buf, 1) == (value, end)
+
+
+@pytest.mark.parametrize("value", VALUES + tuple(-v for v in VALUES))
+def test_VarintSignedRoundTrip(value):
+    buf = bytearray(10)
+    end = Varint.EncodeSignedInto(value, buf, 0)
+    assert end == Varint.SizeSigned(value)
+    assert Varint.DecodeSigned(buf, 0) == (value, end)
+
+
+def test_VarintSmallMagnitudesTakeOneByte():
+    for value in range(-64, 64):
+        assert Varint.SizeSigned(value) == 1
+    assert Varint.SizeSigned(64) == 2
+    assert Varint.SizeSigned(-65) == 2
+
+
+def test_ZigZag():
+    assert [Varint.ZigZag(v) for v in (0, -1, 1, -2, 2)] == [0, 1, 2, 3, 4]
+    for value in (0, 1, -1, 12345, -12345):
+        assert Varint.UnZigZag(Varint.ZigZag(value)) == value
+
+
+def _Message(msg_type, msg_subtype, data, version=None):
+    from Schemas import Metadata
+    meta = {Metadata.MSG_META_TYPE: msg_type, Metadata.MSG_META_SUBTYPE: msg_subtype}
+    if version is not None:
+        meta[Metadata.MSG_META_VERSION] = version
+    return {Metadata.MSG_SECTION_META: meta, Metadata.MSG_SECTION_DATA: data}
+
+
+@pytest.fixture
+def parser(upyiot):
+    from Codec.FixedLayout import FixedLayoutParser
+    parser = FixedLayoutParser()
+    parser.RegisterLayout(2, 3, {10: 0, 11: 0.0, 12: "", 13: b"", 14: []})
+    return parser
+
+
+def test_FixedLayoutRoundTrip(parser):
+    from Schemas import Metadata
+    data = {10: -300, 11: 1.5, 12: "node", 13: b"\x00\xff", 14: [500, 498, 510, -3]}
+    encoded = parser.Encode(_Message(2, 3, data))
+    assert encoded[0:2] == bytes([parser.VERSION, 0x23])
+
+    msg = parser.Decode(encoded)
+    assert msg[Metadata.MSG_SECTION_META] == {Metadata.MSG_META_VERSION: parser.VERSION,
+                                              Metadata.MSG_META_TYPE: 2,
+                                              Metadata.MSG_META_SUBTYPE: 3}
+    assert msg[Metadata.MSG_SECTION_DATA] == data
+
+
+def test_FixedLayoutDefaults(parser):
+    from Schemas import Metadata
+    msg = parser.Decode(parser.Encode(_Message(2, 3, {10: 7})))
+    assert msg[Metadata.MSG_SECTION_DATA] == {10: 7, 11: 0.0, 12: "", 13: b"", 14: []}
+
+
+def test_FixedLayoutScaledList(parser):
+    from Schemas import Metadata
+    msg = parser.Decode(parser.Encode(_Message(2, 3, {14: [21.5, 21.25, -0.5]})))
+    assert msg[Metadata.MSG_SECTION_DATA][14] == [21.5, 21.25, -0.5]
+
+
+def test_FixedLayoutExtensions(parser):
+    from Schemas import Metadata
+    data = {10: 1, 40: -2, 41: b"\x01\x02"}
+    msg = parser.Decode(parser.Encode(_Message(2, 3, data)))
+    assert msg[Metadata.MSG_SECTION_DATA][40] == -2
+    assert msg[Metadata.MSG_SECTION_DATA][41] == b"\x01\x02"
+
+
+def test_FixedLayoutRejectsUnknownVersion(parser):
+    from Codec.FixedLayout import FixedLayoutException
+    encoded = bytearray(parser.Encode(_Message(2, 3, {10: 1})))
+    encoded[0] = parser.VERSION + 1
+    with pytest.raises(FixedLayoutException):
+        parser.Decode(bytes(encoded))
+
+
+def test_FixedLayoutRejectsUnknownMessage(parser):
+    from Codec.FixedLayout import FixedLayoutException
+    with pytest.raises(FixedLayoutException):
+        parser.Decode(bytes([parser.VERSION, 0x24]))
+    with pytest.raises(FixedLayoutException):
+        parser.Encode(_Message(2, 4, {}))
+
+
+def test_FixedLayoutConflictingLayout(parser):
+    from Codec.FixedLayout import FixedLayoutException
+    parser.RegisterLayout(2, 3, {10: 0, 11: 0.0, 12: "", 13: b"", 14: []})
+    with pytest.raises(FixedLayoutException):
+        parser.RegisterLayout(2, 3, {10: 0})
+
+
+def test_FixedLayoutMessageTooBig(upyiot):
+    from Codec.FixedLayout import FixedLayoutParser, FixedLayoutException
+    parser = FixedLayoutParser(buf_size=8)
+    parser.RegisterLayout(1, 1, {10: b""})
+    with pytest.raises(FixedLayoutException):
+        parser.Encode(_Message(1, 1, {10: bytes(16)}))
+
+
+def test_FixedLayoutRejectsTruncatedMessage(parser):
+    from Codec.FixedLayout import FixedLayoutException
+    data = {10: -300, 11: 1.5, 12: "node", 13: b"\x00\xff", 14: [500, 498, 510, -3]}
+    encoded = parser.Encode(_Message(2, 3, data))
+    for end in range(2, len(encoded)):
+        with pytest.raises(FixedLayoutException):
+            parser.Decode(encoded[0:end])
+
+
+def test_FixedLayoutRejectsTruncatedExtension(parser):
+    from Codec.FixedLayout import FixedLayoutException
+    encoded = parser.Encode(_Message(2, 3, {41: b"\x01\x02"}))
+    with pytest.raises(FixedLayoutException):
+        parser.Decode(encoded[0:-1])
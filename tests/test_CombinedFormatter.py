@@ -0,0 +1,146 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+EPOCH = 1600000000
+DEADLINE = 600
+PAYLOAD_MAX = 40
+
+
+class MsgEx:
+    """
+    Stand-in for the QueuedMessageExchange that records the put messages.
+    """
+
+    def __init__(self):
+        self.Messages = []
+        self.PutSeq = 0
+
+    def MessagePut(self, msg_data_dict, msg_type, msg_subtype, msg_meta_dict):
+        self.Messages.append(dict(msg_data_dict))
+        self.PutSeq = len(self.Messages)
+
+
+class Rider:
+    """
+    Piggyback stand-in that records the space offered to the riders.
+    """
+
+    def __init__(self):
+        self.Spaces = []
+        self.Seqs = []
+
+    def Fill(self, msg_data, space):
+        self.Spaces.append(space)
+
+    def Queued(self, seq):
+        self.Seqs.append(seq)
+
+
+@pytest.fixture
+def msg_ex(device):
+    import uos
+    import utime
+    uos.mkdir("/sensor")
+    utime.Set(EPOCH)
+    return MsgEx()
+
+
+def _Formatter(msg_ex, piggyback=None):
+    from MainApp.CombinedFormatter import CombinedFormatter
+    from Schemas.SensorReport import CombinedSensorReport
+    return CombinedFormatter(msg_ex, CombinedSensorReport(), "/sensor", deadline=DEADLINE,
+                             payload_max=PAYLOAD_MAX, piggyback=piggyback)
+
+
+def test_CompleteSectionsArePackedInOneMessage(msg_ex):
+    from Schemas.SensorReport import CombinedSensorReport as Report
+    fmt = _Formatter(msg_ex)
+    moist = fmt.CreateObserver(Report.DATA_KEY_MOISTURE)
+    temp = fmt.CreateObserver(Report.DATA_KEY_TEMPERATURE)
+
+    moist.Update(40)
+    moist.Update(41)
+    assert msg_ex.Messages == []
+    temp.Update(21)
+    assert msg_ex.Messages == [{Report.DATA_KEY_MOISTURE: [40, 41],
+                                Report.DATA_KEY_TEMPERATURE: [21],
+                                Report.DATA_KEY_BATTERY: []}]
+    assert fmt.IsPending() is False
+
+
+def test_SectionKeepsNewestSamples(msg_ex):
+    from Schemas.SensorReport import CombinedSensorReport as Report
+    fmt = _Formatter(msg_ex)
+    moist = fmt.CreateObserver(Report.DATA_KEY_MOISTURE)
+    fmt.CreateObserver(Report.DATA_KEY_TEMPERATURE)
+    for sample in range(0, fmt.SECTION_SAMPLES_MAX + 3):
+        moist.Update(sample)
+    fmt.Flush()
+    assert msg_ex.Messages[0][Report.DATA_KEY_MOISTURE] == list(range(3, fmt.SECTION_SAMPLES_MAX + 3))
+
+
+def test_DeadlineSendsIncompleteReport(msg_ex):
+    import utime
+    from Schemas.SensorReport import CombinedSensorReport as Report
+    fmt = _Formatter(msg_ex)
+    moist = fmt.CreateObserver(Report.DATA_KEY_MOISTURE)
+    fmt.CreateObserver(Report.DATA_KEY_TEMPERATURE)
+    moist.Update(40)
+
+    utime.Set(EPOCH + DEADLINE)
+    moist.Update(41)
+    assert len(msg_ex.Messages) == 1
+    assert msg_ex.Messages[0][Report.DATA_KEY_MOISTURE] == [40, 41]
+    assert msg_ex.Messages[0][Report.DATA_KEY_TEMPERATURE] == []
+
+
+def test_PendingSamplesPersistedAcrossWakes(msg_ex):
+    from Schemas.SensorReport import CombinedSensorReport as Report
+    fmt = _Formatter(msg_ex)
+    moist = fmt.CreateObserver(Report.DATA_KEY_MOISTURE)
+    fmt.CreateObserver(Report.DATA_KEY_TEMPERATURE)
+    moist.Update(40)
+    fmt.Suspend()
+    assert msg_ex.Messages == []
+
+    fmt = _Formatter(msg_ex)
+    fmt.CreateObserver(Report.DATA_KEY_MOISTURE)
+    fmt.CreateObserver(Report.DATA_KEY_TEMPERATURE).Update(21)
+    assert msg_ex.Messages == [{Report.DATA_KEY_MOISTURE: [40],
+                                Report.DATA_KEY_TEMPERATURE: [21],
+                                Report.DATA_KEY_BATTERY: []}]
+
+
+def test_SuspendAfterDeadlineSends(msg_ex):
+    import utime
+    from Schemas.SensorReport import CombinedSensorReport as Report
+    fmt = _Formatter(msg_ex)
+    moist = fmt.CreateObserver(Report.DATA_KEY_MOISTURE)
+    fmt.CreateObserver(Report.DATA_KEY_TEMPERATURE)
+    moist.Update(40)
+    utime.Set(EPOCH + DEADLINE)
+    fmt.Suspend()
+    assert len(msg_ex.Messages) == 1
+    assert _Formatter(msg_ex).IsPending() is False
+
+
+def test_SpareBytesOfferedToRiders(msg_ex):
+    from Schemas.SensorReport import CombinedSensorReport as Report
+    rider = Rider()
+    fmt = _Formatter(msg_ex, piggyback=rider)
+    moist = fmt.CreateObserver(Report.DATA_KEY_MOISTURE)
+    temp = fmt.CreateObserver(Report.DATA_KEY_TEMPERATURE)
+    moist.Update(40)
+    temp.Update(21)
+    # Three sections and two samples of at most their upper bound.
+    used = 3 * fmt.SECTION_OVERHEAD + 2 * fmt.SAMPLE_SIZE_MAX
+    assert rider.Spaces == [PAYLOAD_MAX - used]
+    assert rider.Seqs == [msg_ex.PutSeq]
+
+
+def test_UnknownSection(msg_ex):
+    fmt = _Formatter(msg_ex)
+    with pytest.raises(KeyError):
+        fmt.CreateObserver(1)
@@ -0,0 +1,116 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+EPOCH = 1600000000
+DEADBAND = 5
+HYSTERESIS = 2
+INTERVAL_MIN = 60
+INTERVAL_MAX = 3600
+
+
+class MsgEx:
+    """
+    Stand-in for the QueuedMessageExchange that records a copy of the put
+    messages, the reporter reuses its message.
+    """
+
+    def __init__(self):
+        self.Messages = []
+
+    def MessagePut(self, msg_data_dict, msg_type, msg_subtype, msg_meta_dict):
+        self.Messages.append({key: value[:] if isinstance(value, list) else value
+                              for key, value in msg_data_dict.items()})
+
+
+@pytest.fixture
+def msg_ex(device):
+    import uos
+    import utime
+    uos.mkdir("/sensor")
+    utime.Set(EPOCH)
+    return MsgEx()
+
+
+def _Reporter(msg_ex):
+    from MainApp.DeadbandReporter import DeadbandReporter
+    from Schemas.SensorReport import MoistureSensorReport
+    return DeadbandReporter(msg_ex, MoistureSensorReport(), "Moist", "/sensor",
+                            deadband=DEADBAND, hysteresis=HYSTERESIS,
+                            interval_min=INTERVAL_MIN, interval_max=INTERVAL_MAX)
+
+
+def _Feed(reporter, samples, start=0, step=INTERVAL_MIN):
+    import utime
+    for i, sample in enumerate(samples):
+        utime.Set(EPOCH + start + i * step)
+        reporter.Update(sample)
+
+
+def _Reported(msg_ex):
+    from Schemas.SensorReport import SensorReport
+    return [msg[SensorReport.DATA_KEY_MEASUREMENTS][0] for msg in msg_ex.Messages]
+
+
+def _Summary(msg):
+    from Schemas.SensorReport import SensorReport
+    if SensorReport.DATA_KEY_SUMMARY not in msg:
+        return None
+    return SensorReport.SummaryUnpack(msg[SensorReport.DATA_KEY_SUMMARY])
+
+
+def test_SmallChangesAreSuppressed(msg_ex):
+    reporter = _Reporter(msg_ex)
+    _Feed(reporter, [40, 41, 43, 39, 44, 46])
+    assert _Reported(msg_ex) == [40, 46]
+    assert _Summary(msg_ex.Messages[1]) == (39, 44, 4)
+    assert _Summary(msg_ex.Messages[0]) is None
+
+
+def test_MinimumInterval(msg_ex):
+    reporter = _Reporter(msg_ex)
+    _Feed(reporter, [40, 60], step=INTERVAL_MIN // 2)
+    assert _Reported(msg_ex) == [40]
+
+
+def test_ReversalNeedsHysteresis(msg_ex):
+    reporter = _Reporter(msg_ex)
+    _Feed(reporter, [40, 50, 45, 43])
+    # Down by 5 after going up is within deadband plus hysteresis, down by 7 is not.
+    assert _Reported(msg_ex) == [40, 50, 43]
+
+
+def test_ForcedReportAfterMaxSuppression(msg_ex):
+    reporter = _Reporter(msg_ex)
+    count = INTERVAL_MAX // INTERVAL_MIN
+    _Feed(reporter, [40] + [41] * count)
+    # Every sample was suppressed until the heartbeat was due.
+    assert _Reported(msg_ex) == [40, 41]
+    assert _Summary(msg_ex.Messages[1]) == (41, 41, count - 1)
+
+
+def test_SummaryCountSaturates(msg_ex):
+    reporter = _Reporter(msg_ex)
+    _Feed(reporter, [40] + [41] * 0x10005, step=0)
+    assert reporter.Count == 0xFFFF
+
+
+def test_StatePersistedAcrossWakes(msg_ex):
+    reporter = _Reporter(msg_ex)
+    _Feed(reporter, [40, 42])
+    reporter.Suspend()
+
+    reporter = _Reporter(msg_ex)
+    _Feed(reporter, [46], start=2 * INTERVAL_MIN)
+    assert _Reported(msg_ex) == [40, 46]
+    assert _Summary(msg_ex.Messages[1]) == (42, 42, 1)
+
+
+def test_ClockGoesBack(msg_ex):
+    import utime
+    reporter = _Reporter(msg_ex)
+    _Feed(reporter, [40])
+    utime.Set(1000)
+    reporter.Update(41)
+    assert _Reported(msg_ex) == [40, 41]
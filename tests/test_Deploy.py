@@ -0,0 +1,173 @@
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+from host import Deploy
+
+
+# Stand-in of mpy-cross that copies the source, or fails on a source that
+# contains "error".
+MPY_CROSS = """#!{}
+import sys
+args = sys.argv[1:]
+src = args[-1]
+out = args[args.index("-o") + 1]
+data = open(src, "rb").read()
+if b"error" in data:
+    sys.stderr.write("SyntaxError: invalid syntax")
+    sys.exit(1)
+open(out, "wb").write(b"M" + data)
+"""
+
+
+def _Write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(data)
+
+
+def _Read(path):
+    with open(path) as f:
+        return f.read()
+
+
+@pytest.fixture
+def src(tmp_path):
+    src = tmp_path / "src"
+    _Write(str(src / "main.py"), "import MainApp\n")
+    _Write(str(src / "MainApp" / "__init__.py"), "")
+    _Write(str(src / "MainApp" / "MainApp.py"), "x = 1\n")
+    return str(src)
+
+
+@pytest.fixture
+def mpy_cross(tmp_path):
+    path = str(tmp_path / "mpy-cross")
+    _Write(path, MPY_CROSS.format(sys.executable))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path
+
+
+def _Files(src, names):
+    return Deploy.Compiler(os.path.join(src, "..", "build"), src_dir=src).Build(names)
+
+
+def test_Sources():
+    sources = Deploy.Sources()
+    assert "main.py" in sources
+    assert "MainApp/MainApp.py" in sources
+    assert all(source.endswith(".py") for source in sources)
+    assert not any("__pycache__" in source for source in sources)
+
+
+def test_CompiledOnlyWhenChanged(tmp_path, src, mpy_cross):
+    out = str(tmp_path / "build")
+    sources = ["main.py", "MainApp/__init__.py", "MainApp/MainApp.py"]
+    compiler = Deploy.Compiler(out, mpy_cross=mpy_cross, jobs=2, src_dir=src)
+    files = compiler.Build(sources)
+    # Scripts run by name are never compiled.
+    assert sorted(files) == ["/MainApp/MainApp.mpy", "/MainApp/__init__.mpy", "/main.py"]
+    assert compiler.Compiled == 2
+    assert _Read(files["/MainApp/MainApp.mpy"][0]) == "Mx = 1\n"
+
+    compiler = Deploy.Compiler(out, mpy_cross=mpy_cross, src_dir=src)
+    assert compiler.Build(sources) == files
+    assert compiler.Compiled == 0
+
+    _Write(os.path.join(src, "MainApp", "MainApp.py"), "x = 2\n")
+    compiler = Deploy.Compiler(out, mpy_cross=mpy_cross, src_dir=src)
+    changed = compiler.Build(sources)
+    assert compiler.Compiled == 1
+    assert changed["/MainApp/MainApp.mpy"][1] != files["/MainApp/MainApp.mpy"][1]
+    # Other options compile everything again.
+    compiler = Deploy.Compiler(out, mpy_cross=mpy_cross, opt=0, src_dir=src)
+    compiler.Build(sources)
+    assert compiler.Compiled == 2
+
+
+def test_CompileError(tmp_path, src, mpy_cross):
+    _Write(os.path.join(src, "MainApp", "MainApp.py"), "error\n")
+    compiler = Deploy.Compiler(str(tmp_path / "build"), mpy_cross=mpy_cross, src_dir=src)
+    with pytest.raises(Deploy.CompileError, match="MainApp/MainApp.py: SyntaxError"):
+        compiler.Build(["MainApp/MainApp.py"])
+
+
+def test_PlanWithManifest():
+    files = {"/a.mpy": ("a", "1"), "/b.mpy": ("b", "2")}
+    manifest = {"/a.mpy": "1", "/b.mpy": "0", "/c.mpy": "3"}
+    assert Deploy.Plan(files, manifest) == (["/b.mpy"], ["/c.mpy"])
+
+
+def test_PlanWithoutManifestRemovesTwins():
+    files = {"/main.py": ("m", "0"), "/a.mpy": ("a", "1"), "/b.py": ("b", "2")}
+    assert Deploy.Plan(files, None) == (["/a.mpy", "/b.py", "/main.py"], ["/a.py", "/b.mpy"])
+
+
+def test_Incremental(tmp_path, src):
+    device = str(tmp_path / "device")
+    transport = Deploy.LocalTransport(device)
+    sources = ["main.py", "MainApp/MainApp.py"]
+    files = _Files(src, sources)
+    uploads, removes = Deploy.Deploy(transport, files)
+    assert uploads == ["/MainApp/MainApp.py", "/main.py"]
+    assert _Read(os.path.join(device, "MainApp", "MainApp.py")) == "x = 1\n"
+    assert json.loads(_Read(os.path.join(device, "deploy.json"))) == \
+        {path: digest for path, (local, digest) in files.items()}
+
+    assert Deploy.Deploy(transport, files) == ([], [])
+
+    _Write(os.path.join(src, "MainApp", "MainApp.py"), "x = 2\n")
+    files = _Files(src, ["MainApp/MainApp.py"])
+    assert Deploy.Deploy(transport, files) == (["/MainApp/MainApp.py"], ["/main.py"])
+    assert not os.path.exists(os.path.join(device, "main.py"))
+    assert _Read(os.path.join(device, "MainApp", "MainApp.py")) == "x = 2\n"
+
+
+def test_DryRun(tmp_path, src):
+    device = str(tmp_path / "device")
+    files = _Files(src, ["main.py"])
+    assert Deploy.Deploy(Deploy.LocalTransport(device), files, dry_run=True) == (["/main.py"], [])
+    assert not os.path.exists(device)
+
+
+def test_CorruptManifestDeploysInFull(tmp_path, src):
+    device = str(tmp_path / "device")
+    transport = Deploy.LocalTransport(device)
+    files = _Files(src, ["main.py"])
+    Deploy.Deploy(transport, files)
+    _Write(os.path.join(device, "deploy.json"), "{")
+    assert Deploy.Deploy(transport, files)[0] == ["/main.py"]
+
+
+def test_StateKeptUnlessWiped(tmp_path, src):
+    device = str(tmp_path / "device")
+    transport = Deploy.LocalTransport(device)
+    session = os.path.join(device, "lora", "session")
+    _Write(session, "live")
+    files = _Files(src, ["main.py"])
+    Deploy.Deploy(transport, files)
+    assert _Read(session) == "live"
+
+    Deploy.Deploy(transport, files, wipe_state=True)
+    assert not os.path.exists(os.path.join(device, "lora"))
+
+
+def test_Bundle(tmp_path):
+    bundle = str(tmp_path / "bundle")
+    _Write(os.path.join(bundle, "Config", "Node.py"), "NODE = 1\n")
+    _Write(os.path.join(bundle, "lora", "session"), "seeded")
+    files, state = Deploy.BundleFiles(bundle)
+    assert sorted(files) == ["/Config/Node.py"]
+    assert state == {"/lora/session": os.path.join(bundle, "lora", "session")}
+
+    device = str(tmp_path / "device")
+    transport = Deploy.LocalTransport(device)
+    _Write(os.path.join(device, "lora", "session"), "live")
+    Deploy.Deploy(transport, files, state=state)
+    assert _Read(os.path.join(device, "lora", "session")) == "live"
+    # The pre-seeded state only replaces the state that is wiped.
+    Deploy.Deploy(transport, files, wipe_state=True, state=state)
+    assert _Read(os.path.join(device, "lora", "session")) == "seeded"
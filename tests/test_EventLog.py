@@ -0,0 +1,106 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+
+class MsgEx:
+    """
+    Stand-in for the QueuedMessageExchange: every put record stays queued
+    until it is sent.
+    """
+
+    def __init__(self):
+        self.Messages = []
+        self.Queued = set()
+        self.Observers = []
+        self.PutSeq = 0
+
+    def DeliveryObserverAdd(self, callback):
+        self.Observers.append(callback)
+
+    def IsQueued(self, seq):
+        return seq in self.Queued
+
+    def SvcActivate(self):
+        pass
+
+    def MessagePut(self, msg_data_dict, msg_type, msg_subtype, msg_meta_dict):
+        self.Messages.append(msg_data_dict)
+        self.PutSeq = len(self.Messages)
+        self.Queued.add(self.PutSeq)
+
+    def Send(self, seqs):
+        self.Queued -= set(seqs)
+        for callback in self.Observers:
+            callback(seqs)
+
+
+@pytest.fixture
+def events(device):
+    return _Events()
+
+
+def _Events():
+    from MainApp.EventLog import EventLog
+    return EventLog()
+
+
+def _Counts(events):
+    return [(event[0], event[1], event[2]) for event in events.Events]
+
+
+def test_RepeatsTakeOneSlot(events):
+    from Schemas.EventReport import EventReport
+    for i in range(0, 3):
+        events.Raise(EventReport.EVENT_JOIN_FAILED, 7)
+    events.Raise(EventReport.EVENT_RESET, 1)
+    assert _Counts(events) == [(EventReport.EVENT_JOIN_FAILED, 7, 3),
+                               (EventReport.EVENT_RESET, 1, 1)]
+
+
+def test_LastSlotCountsOverflow(events):
+    from Schemas.EventReport import EventReport
+    for arg in range(0, events.SLOTS + 2):
+        events.Raise(EventReport.EVENT_RESET, arg)
+    assert len(events.Events) == events.SLOTS
+    assert _Counts(events)[-1] == (EventReport.EVENT_OVERFLOW, 0, 3)
+
+
+def test_PersistedAcrossWakes(events):
+    from Schemas.EventReport import EventReport
+    events.Raise(EventReport.EVENT_JOIN_FAILED, 7)
+    assert _Counts(_Events()) == [(EventReport.EVENT_JOIN_FAILED, 7, 1)]
+
+
+def test_SentEventsAreRemoved(events):
+    from Schemas.EventReport import EventReport
+    msg_ex = MsgEx()
+    events.MsgExSet(msg_ex, 64)
+    events.Raise(EventReport.EVENT_JOIN_FAILED, 7)
+    events.Put()
+    # On its way, a repeat is counted in a new slot.
+    events.Raise(EventReport.EVENT_JOIN_FAILED, 7)
+    assert len(events.Events) == 2
+
+    msg_ex.Send([msg_ex.PutSeq])
+    assert _Counts(events) == [(EventReport.EVENT_JOIN_FAILED, 7, 1)]
+
+
+def test_EventsDroppedWhileEverySlotIsOnItsWay(events):
+    from Schemas.EventReport import EventReport
+    msg_ex = MsgEx()
+    events.MsgExSet(msg_ex, 255)
+    for arg in range(0, events.SLOTS):
+        events.Raise(EventReport.EVENT_RESET, arg)
+    events.Put()
+    assert all(event[4] == msg_ex.PutSeq for event in events.Events)
+
+    events.Raise(EventReport.EVENT_RESET, 100)
+    events.Raise(EventReport.EVENT_SENSOR_FAULT, 1)
+    assert len(events.Events) == events.SLOTS
+    # The buffer still fits in its RTC memory region.
+    assert len(_Events().Events) == events.SLOTS
+
+    msg_ex.Send([msg_ex.PutSeq])
+    assert events.Events == []
@@ -0,0 +1,180 @@
+import base64
+import binascii
+import json
+
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+EPOCH = 1600000000
+DEVICE = "node-01"
+DEV_EUI = "70B3D57ED0000001"
+
+
+def _Msg(msg_type, subtype, data):
+    from Schemas import Metadata
+    return {
+        Metadata.MSG_SECTION_META: {Metadata.MSG_META_TYPE: msg_type, Metadata.MSG_META_SUBTYPE: subtype},
+        Metadata.MSG_SECTION_DATA: data,
+    }
+
+
+def _Moisture(values):
+    from Schemas.SensorReport import SensorReport, MoistureSensorReport
+    return _Msg(SensorReport.TYPE_REPORT, MoistureSensorReport.SUBTYPE_MOISTURE_REPORT,
+                {SensorReport.DATA_KEY_MEASUREMENTS: values})
+
+
+def _Battery(values):
+    from Schemas.SensorReport import SensorReport, BatterySensorReport
+    return _Msg(SensorReport.TYPE_REPORT, BatterySensorReport.SUBTYPE_BATTERY_REPORT,
+                {SensorReport.DATA_KEY_MEASUREMENTS: values})
+
+
+def _Encoder(codec):
+    from host import Cbor
+    from host import PayloadDecoder
+    if codec == PayloadDecoder.CODEC_FIXED:
+        return PayloadDecoder.FixedLayoutParserCreate().Encode
+    return Cbor.Encode
+
+
+def _Backlog(encode, msgs):
+    """
+    BacklogReport of queued messages, as the MessageQueue packs them.
+    """
+    from Codec import Varint
+    from Schemas.BacklogReport import BacklogReport
+    records = bytearray(256)
+    length = 0
+    for msg in msgs:
+        record = encode(msg)
+        length = Varint.EncodeInto(len(record), records, length)
+        records[length:length + len(record)] = record
+        length += len(record)
+    return _Msg(BacklogReport.TYPE_BACKLOG, BacklogReport.SUBTYPE_BACKLOG_REPORT,
+                {BacklogReport.DATA_KEY_RECORDS: bytes(records[0:length])})
+
+
+def _Data(msg):
+    """
+    :return: Tuple of (type, subtype, data) of a message.
+    """
+    from Schemas import Metadata
+    meta = msg[Metadata.MSG_SECTION_META]
+    return meta[Metadata.MSG_META_TYPE], meta[Metadata.MSG_META_SUBTYPE], msg[Metadata.MSG_SECTION_DATA]
+
+
+def _Ttn(payload, received="2020-09-13T12:26:40.250Z"):
+    return json.dumps({"result": {
+        "end_device_ids": {"device_id": DEVICE},
+        "received_at": received,
+        "uplink_message": {"frm_payload": base64.b64encode(payload).decode()},
+    }})
+
+
+def _Kpn(payload, received="2020-09-13T14:26:41.000+02:00"):
+    return json.dumps({"DevEUI_uplink": {
+        "DevEUI": DEV_EUI,
+        "Time": received,
+        "payload_hex": binascii.hexlify(payload).decode(),
+    }})
+
+
+def test_TimeMs():
+    from host.ExportDecoder import _TimeMs
+    assert _TimeMs("2020-09-13T12:26:40Z") == EPOCH * 1000
+    assert _TimeMs("2020-09-13T12:26:40.123456789Z") == EPOCH * 1000 + 123
+    assert _TimeMs("2020-09-13T12:26:40.5Z") == EPOCH * 1000 + 500
+    assert _TimeMs("2020-09-13T14:26:40.000+02:00") == EPOCH * 1000
+    assert _TimeMs("2020-09-13T11:56:40-00:30") == EPOCH * 1000
+
+
+def test_Uplink():
+    from host.ExportDecoder import Uplink
+    assert Uplink(_Ttn(b"\x01\x02")) == (DEVICE, EPOCH * 1000 + 250, b"\x01\x02")
+    assert Uplink(_Kpn(b"\x01\x02")) == (DEV_EUI, EPOCH * 1000 + 1000, b"\x01\x02")
+    # Uplinks without application payload and other messages.
+    assert Uplink(json.dumps({"end_device_ids": {"device_id": DEVICE},
+                              "uplink_message": {"received_at": "2020-09-13T12:26:40Z"}})) is None
+    assert Uplink(json.dumps({"DevEUI_uplink": {"DevEUI": DEV_EUI}})) is None
+    assert Uplink(json.dumps({"join_accept": {}})) is None
+
+
+def test_Records():
+    from host.PayloadDecoder import Records
+    assert Records(b"\x01a\x03bcd\x00") == [b"a", b"bcd", b""]
+    assert Records(b"") == []
+
+
+@pytest.mark.parametrize("codec", ("cbor", "fixed"))
+def test_BacklogRecordsAreDecoded(codec):
+    from host.PayloadDecoder import PayloadDecoder
+    from Schemas import Metadata
+    from Schemas.BacklogReport import BacklogReport
+    encode = _Encoder(codec)
+    payload = encode(_Backlog(encode, [_Moisture([40]), _Battery([3300])]))
+    msg = PayloadDecoder(codec).Decode(payload)
+    records = msg[Metadata.MSG_SECTION_DATA][BacklogReport.DATA_KEY_RECORDS]
+    assert [_Data(record) for record in records] == [_Data(_Moisture([40])), _Data(_Battery([3300]))]
+
+
+def test_SummaryIsDecoded():
+    from host import Cbor
+    from host.PayloadDecoder import PayloadDecoder
+    from Schemas import Metadata
+    from Schemas.SensorReport import SensorReport
+    msg = _Moisture([40])
+    msg[Metadata.MSG_SECTION_DATA][SensorReport.DATA_KEY_SUMMARY] = SensorReport.SummaryPack(38, 44, 5)
+    data = PayloadDecoder().Decode(Cbor.Encode(msg))[Metadata.MSG_SECTION_DATA]
+    assert data[SensorReport.DATA_KEY_SUMMARY] == [38, 44, 5]
+
+
+def _Export(tmp_path, codec):
+    encode = _Encoder(codec)
+    lines = [
+        _Ttn(encode(_Moisture([42])), received="2020-09-13T12:30:00Z"),
+        # Sent when the node could send again: a backlog of the queued reports.
+        _Kpn(encode(_Backlog(encode, [_Moisture([40]), _Battery([3300]), _Moisture([41])])),
+             received="2020-09-13T12:20:00Z"),
+        _Ttn(encode(_Moisture([39])), received="2020-09-13T12:10:00Z"),
+        json.dumps({"join_accept": {}}),
+        _Ttn(b"\xff\xff\xff"),
+        "",
+    ]
+    path = tmp_path / "export.json"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("codec", ("cbor", "fixed"))
+@pytest.mark.parametrize("jobs", (1, 2))
+def test_DecodeExport(tmp_path, codec, jobs):
+    from host import ExportDecoder
+    out = str(tmp_path / "series")
+    stats = ExportDecoder.Decode(_Export(tmp_path, codec), out, codec=codec, jobs=jobs, lines=2, limit=2)
+    # The backlog counts as a message along with each of its records, the
+    # payload that does not decode and the empty line are errors.
+    assert (stats["uplinks"], stats["messages"], stats["errors"], stats["samples"]) == (3, 6, 2, 5)
+    assert ExportDecoder.Series(out) == [(DEV_EUI, "battery"), (DEV_EUI, "moisture"),
+                                         (DEVICE, "moisture")]
+
+    times, values = ExportDecoder.Load(out, DEVICE, "moisture")
+    # Sorted by time.
+    assert list(times) == [(EPOCH - 1000) * 1000, (EPOCH + 200) * 1000]
+    assert list(values) == [39.0, 42.0]
+    # The records of the backlog carry the receive time of the uplink.
+    times, values = ExportDecoder.Load(out, DEV_EUI, "moisture")
+    assert list(times) == [(EPOCH - 400) * 1000] * 2
+    assert list(values) == [40.0, 41.0]
+    assert list(ExportDecoder.Load(out, DEV_EUI, "battery")[1]) == [3300.0]
+
+
+def test_DecodeAppends(tmp_path):
+    from host import ExportDecoder
+    out = str(tmp_path / "series")
+    path = _Export(tmp_path, "cbor")
+    ExportDecoder.Decode(path, out)
+    ExportDecoder.Decode(path, out)
+    assert len(ExportDecoder.Load(out, DEVICE, "moisture")[0]) == 4
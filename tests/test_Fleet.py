@@ -0,0 +1,85 @@
+import pytest
+
+from host import Fleet
+
+
+JOIN = "join"
+UPLINK = "uplink"
+SEC_US = 1000000
+
+
+def _Profile(sf=7, toa=SEC_US, uplinks=(), length=3600 * SEC_US):
+    frames = [(0, sf, toa, JOIN)] + [(offset, sf, toa, UPLINK) for offset in uplinks]
+    return Fleet.Profile(sf, frames, length)
+
+
+def test_Mix():
+    assert Fleet._Mix("7=0.6,9=0.3,12=0.1") == {7: 0.6, 9: 0.3, 12: 0.1}
+
+
+def test_ReplayRepeatsSecondHalf():
+    profile = _Profile(uplinks=(10, 60, 80), length=100)
+    assert [f[0] for f in profile.Replay(200)] == [10, 60, 80, 110, 130, 160, 180]
+    assert [f[0] for f in profile.Replay(40)] == [10]
+
+
+def test_NodesFollowMix():
+    profiles = {7: _Profile(7), 12: _Profile(12)}
+    nodes = Fleet.Nodes(1000, {7: 0.8, 12: 0.2}, profiles, 60, seed=1)
+    share = sum(1 for node in nodes if node.Profile.Sf == 12) / len(nodes)
+    assert 0.15 < share < 0.25
+    assert all(0 <= node.PowerupUs <= 60 * SEC_US for node in nodes)
+    # The same seed gives the same fleet.
+    again = Fleet.Nodes(1000, {7: 0.8, 12: 0.2}, profiles, 60, seed=1)
+    assert [(n.Profile.Sf, n.PowerupUs, n.Rate) for n in nodes] == \
+        [(n.Profile.Sf, n.PowerupUs, n.Rate) for n in again]
+
+
+def test_JoinStormIsResolved():
+    profiles = {7: _Profile(7)}
+    nodes = Fleet.Nodes(2, {7: 1.0}, profiles, 0, seed=1)
+    frames = Fleet.Join(nodes, 1, seed=1)
+    # Both first requests collided, every node joins after a retry.
+    assert all(node.JoinAttempts >= 2 for node in nodes)
+    assert all(node.DelayUs > 0 for node in nodes)
+    assert len(frames) == sum(node.JoinAttempts for node in nodes)
+
+
+def test_JoinsOfOtherSpreadingFactorsDoNotCollide():
+    nodes = [Fleet.Node(0, _Profile(7), 0, 1), Fleet.Node(1, _Profile(9), 0, 1)]
+    Fleet.Join(nodes, 1, seed=1)
+    assert [(node.JoinAttempts, node.DelayUs) for node in nodes] == [(1, 0), (1, 0)]
+
+
+def test_JoinGivesUp():
+    nodes = [Fleet.Node(index, _Profile(7, toa=3600 * SEC_US), 0, 1) for index in range(0, 2)]
+    Fleet.Join(nodes, 1, seed=1)
+    assert [node.DelayUs for node in nodes] == [None, None]
+    assert [node.JoinAttempts for node in nodes] == [Fleet.JOIN_ATTEMPTS_MAX] * 2
+
+
+def test_OverlappingUplinksAreLost():
+    uplinks = {7: [(0, 7, SEC_US, UPLINK), (0, 9, SEC_US, UPLINK)]}
+    # Nodes 0 and 1 power up together, node 2 later.
+    nodes = [(0, 7, 0, 1, 0), (1, 7, 0, 1, 0), (2, 7, 10 * SEC_US, 1, 0)]
+    args = (0, 7, 1, nodes, uplinks, [], 3600 * SEC_US, 1)
+    stats, hourly = Fleet._Sweep(args)
+    assert stats == {0: [1, 1, SEC_US], 1: [1, 1, SEC_US], 2: [1, 0, SEC_US]}
+    assert hourly == [3, 0]
+
+    # A join request on the same channel and spreading factor interferes.
+    joins = [(10 * SEC_US, 11 * SEC_US, 0, 7), (10 * SEC_US, 11 * SEC_US, 0, 9)]
+    stats, hourly = Fleet._Sweep((0, 7, 1, nodes, uplinks, joins, 3600 * SEC_US, 1))
+    assert stats[2] == [1, 1, SEC_US]
+
+
+@pytest.mark.usefixtures("upyiot")
+@pytest.mark.parametrize("sf", (9, 12))
+def test_TraceUsesSpreadingFactor(sf):
+    trace_sf, frames, length = Fleet.Trace(sf, hours=0.1)
+    assert trace_sf == sf
+    assert length == 360 * SEC_US
+    assert frames[0][3] == JOIN
+    assert len(frames) > 1
+    assert all(frame[1] == sf for frame in frames)
+    assert all(0 <= frame[0] < length for frame in frames)
@@ -0,0 +1,121 @@
+import pytest
+
+
+class Heap:
+    """
+    Heap probes of which the test sets the allocated bytes.
+    """
+
+    SIZE = 100000
+
+    def __init__(self):
+        self.Alloc = 0
+
+    def Free(self):
+        return self.SIZE - self.Alloc
+
+
+class Svc:
+
+    def __init__(self, heap, alloc):
+        self.HeapObj = heap
+        self.AllocBytes = alloc
+
+    def SvcRun(self):
+        self.HeapObj.Alloc += self.AllocBytes
+
+
+@pytest.fixture
+def heap(device, monkeypatch):
+    from MainApp.HeapMonitor import HeapMonitor
+    heap = Heap()
+    monkeypatch.setattr(HeapMonitor, "MemAlloc", staticmethod(lambda: heap.Alloc))
+    monkeypatch.setattr(HeapMonitor, "MemFree", staticmethod(heap.Free))
+    return heap
+
+
+def _Monitor(budgets=None, strict=False):
+    from MainApp.HeapMonitor import HeapMonitor
+    return HeapMonitor(budgets=budgets, strict=strict)
+
+
+def test_Stages(heap):
+    monitor = _Monitor()
+    heap.Alloc += 300
+    monitor.Stage("Config")
+    heap.Alloc += 1200
+    monitor.Stage("Services")
+    assert monitor.Stages == [("Config", 300, Heap.SIZE - 300),
+                              ("Services", 1200, Heap.SIZE - 1500)]
+    assert monitor.FreeMin == Heap.SIZE - 1500
+
+
+def test_ServiceRuns(heap):
+    monitor = _Monitor()
+    small = Svc(heap, 100)
+    large = Svc(heap, 400)
+    monitor.Attach("Small", small)
+    monitor.Attach("Large", large)
+    small.SvcRun()
+    large.SvcRun()
+    large.AllocBytes = 200
+    large.SvcRun()
+    assert monitor.Runs == {"Small": [1, 100], "Large": [2, 400]}
+    assert monitor.Peak() == ("Large", 400)
+    assert monitor.FreeMin == Heap.SIZE - 700
+
+
+def test_PeakOfStagesAndRuns(heap):
+    monitor = _Monitor()
+    heap.Alloc += 500
+    monitor.Stage("Config")
+    svc = Svc(heap, 100)
+    monitor.Attach("Svc", svc)
+    svc.SvcRun()
+    assert monitor.Peak() == ("Config", 500)
+
+
+def test_BudgetExceededIsNotRaised(heap):
+    monitor = _Monitor(budgets={"Svc": 100})
+    svc = Svc(heap, 200)
+    monitor.Attach("Svc", svc)
+    svc.SvcRun()
+    assert monitor.Runs["Svc"] == [1, 200]
+
+
+def test_BudgetExceededIsRaisedInStrictMode(heap):
+    from MainApp.HeapMonitor import HeapBudgetExceeded
+    monitor = _Monitor(budgets={"Config": 100, "Svc": 200}, strict=True)
+    heap.Alloc += 100
+    monitor.Stage("Config")
+    svc = Svc(heap, 200)
+    monitor.Attach("Svc", svc)
+    svc.SvcRun()
+    svc.AllocBytes = 201
+    with pytest.raises(HeapBudgetExceeded) as exc:
+        svc.SvcRun()
+    assert (exc.value.Name, exc.value.Alloc, exc.value.Budget) == ("Svc", 201, 200)
+
+
+@pytest.mark.usefixtures("upyiot")
+def test_ProfilerSharesProbe(heap):
+    import uos
+    from MainApp.Profiler import Profiler
+    uos.mkdir("/sys")
+    profiler = Profiler("/sys", currents={"active": 10, "tx": 100, "rx": 20},
+                        report_interval=3600)
+    svc = Svc(heap, 300)
+    profiler.Attach("Svc", svc)
+    svc.SvcRun()
+    assert profiler.Stats["Svc"].Heap == 300
+
+
+@pytest.mark.usefixtures("upyiot")
+def test_HarnessMeasuresWake(device):
+    from host.Harness import Harness
+    device.Overrides["HEAP_MONITOR"] = True
+    device.Wake()
+    stages = device.App.Heap.Stages
+    assert len(stages) > 0
+    assert all(0 < free <= Harness.HEAP_BYTES for name, alloc, free in stages)
+    assert device.App.Heap.Peak()[1] > 0
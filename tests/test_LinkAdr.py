@@ -0,0 +1,88 @@
+import pytest
+
+
+@pytest.fixture
+def adr(device):
+    import uos
+    uos.mkdir("/lora")
+    return _Adr()
+
+
+def _Adr(sf=12):
+    from MainApp.LinkAdr import LinkAdr
+    return LinkAdr("/lora", {"sf": sf, "ldro": 1})
+
+
+def _Missed(adr, count):
+    return [adr.Record() for _ in range(0, count)]
+
+
+def test_StepsDownWithMargin(adr):
+    # A floor of -10 dB (SF8) is 5 dB below the lowest SNR, SF7 is not.
+    changed = [adr.Record(rssi=-90, snr=snr) for snr in (3, -4, 0, -5, 1, 2, -3, 0)]
+    assert changed == [False] * (adr.HISTORY - 1) + [True]
+    assert adr.Sf == 8
+    assert adr.Config({"sf": 12, "ldro": 1}) == {"sf": 8, "ldro": 0}
+    # The history is restarted at the new spreading factor.
+    assert adr.Snrs == []
+
+
+def test_StaysWithoutFullHistory(adr):
+    for _ in range(0, adr.HISTORY - 1):
+        assert adr.Record(rssi=-60, snr=10) is False
+    assert adr.Sf == 12
+
+
+def test_WeakLinkStays(adr):
+    for _ in range(0, adr.HISTORY):
+        adr.Record(rssi=-120, snr=-14)
+    assert adr.Sf == 12
+
+
+def test_BackoffStepsUp(adr):
+    adr = _Adr(sf=7)
+    changed = _Missed(adr, adr.ACK_LIMIT + adr.ACK_DELAY)
+    assert changed.index(True) == adr.ACK_LIMIT + adr.ACK_DELAY - 1
+    assert adr.Sf == 8
+    # Again after every ACK_DELAY uplinks without a downlink.
+    assert _Missed(adr, adr.ACK_DELAY)[-1] is True
+    assert adr.Sf == 9
+
+
+def test_DownlinkResetsBackoff(adr):
+    adr = _Adr(sf=7)
+    _Missed(adr, adr.ACK_LIMIT + adr.ACK_DELAY - 1)
+    adr.Record(rssi=-100, snr=-2)
+    assert not any(_Missed(adr, adr.ACK_LIMIT + adr.ACK_DELAY - 1))
+    assert adr.Sf == 7
+
+
+def test_BackoffStopsAtMax(adr):
+    assert not any(_Missed(adr, 0xFF + adr.ACK_DELAY))
+    assert adr.Sf == adr.SF_MAX
+
+
+def test_SpreadingFactorPersisted(adr):
+    import machine
+    for _ in range(0, adr.HISTORY):
+        adr.Record(rssi=-60, snr=10)
+    assert adr.Sf == 7
+    # Flash keeps the spreading factor across a power cycle.
+    machine.RTC.Memory = b""
+    assert _Adr().Sf == 7
+
+
+def test_HistoryKeptInRtcMemory(adr):
+    adr.Record(rssi=-95, snr=-3)
+    _Missed(adr, 2)
+    adr = _Adr()
+    assert adr.Snrs == [-3]
+    assert adr.Rssi == -95
+    assert adr.Missed == 2
+
+
+def test_HistoryOfOtherSpreadingFactorIgnored(adr):
+    adr.Record(rssi=-95, snr=-3)
+    adr = _Adr(sf=9)
+    assert adr.Sf == 9
+    assert adr.Snrs == []
@@ -0,0 +1,106 @@
+import pytest
+
+
+FMT = 7
+
+
+@pytest.fixture
+def ring(device):
+    import uos
+    uos.mkdir("/log")
+    return _Boot()
+
+
+def _Boot(cold=False, **kwargs):
+    from MainApp.LogRing import LogRing
+    LogRing.ConfigGlobal("/log", cold=cold, **kwargs)
+    return LogRing
+
+
+def _Path(ring, index):
+    return "/log/" + ring.FILE_NAME.format(index)
+
+
+def _Records(ring, index=0):
+    from host import LogDecoder
+    try:
+        with open(_Path(ring, index), "rb") as f:
+            return LogDecoder.Decode(f.read())
+    except OSError:
+        return []
+
+
+def test_RecordArguments(ring):
+    import utime
+    ring.Create().info(FMT, 1, -300, "text", b"\x00\x01")
+    ring.Flush()
+    assert _Records(ring) == [(utime.time(), ring.INFO, FMT, [1, -300, b"text", b"\x00\x01"])]
+
+
+def test_LongArgumentsAreTruncated(ring):
+    ring.Create().info(FMT, "x" * 100)
+    ring.Flush()
+    assert _Records(ring)[0][3] == [b"x" * ring.ARG_BYTES_MAX]
+
+
+def test_RecordsBelowLevelAreDropped(device):
+    import uos
+    uos.mkdir("/log")
+    from MainApp.LogRing import LogRing
+    ring = _Boot(level=LogRing.INFO)
+    ring.Create().debug(FMT, 1)
+    assert ring.Len == 0
+
+
+def test_BufferedUntilThreshold(ring):
+    log = ring.Create()
+    log.info(FMT, 1)
+    assert _Records(ring) == []
+    while ring.Len > 0:
+        log.info(FMT, 1)
+    assert len(_Records(ring)) > 1
+
+
+def test_ErrorIsFlushed(ring):
+    ring.Create().info(FMT, 1)
+    ring.Create().error(FMT, 2)
+    assert [record[3] for record in _Records(ring)] == [[1], [2]]
+
+
+def test_RecordsSurviveDeepSleep(ring):
+    ring.Create().info(FMT, 1)
+    ring.Suspend()
+
+    ring = _Boot()
+    assert _Records(ring) == []
+    ring.Create().info(FMT, 2)
+    ring.Flush()
+    assert [record[3] for record in _Records(ring)] == [[1], [2]]
+
+
+def test_RecordsFlushedAtColdBoot(ring):
+    ring.Create().info(FMT, 1)
+    ring.Suspend()
+
+    ring = _Boot(cold=True)
+    assert [record[3] for record in _Records(ring)] == [[1]]
+    # The flushed records are not carried again.
+    ring.Suspend()
+    ring = _Boot(cold=True)
+    assert len(_Records(ring)) == 1
+
+
+def test_FilesAreRotated(device):
+    import uos
+    uos.mkdir("/log")
+    ring = _Boot(buf_size=64, threshold=32, file_size=128, file_limit=3)
+    log = ring.Create()
+    for i in range(0, 100):
+        log.info(FMT, i)
+    ring.Flush()
+
+    assert uos.stat(_Path(ring, 0))[6] <= 128
+    assert uos.stat(_Path(ring, 2))[6] > 0
+    with pytest.raises(OSError):
+        uos.stat(_Path(ring, 3))
+    assert _Records(ring)[-1][3] == [99]
@@ -0,0 +1,111 @@
+import struct
+
+import pytest
+
+
+DEV_ADDR = [0x26, 0x01, 0x37, 0x47]
+NWK_SKEY = list(range(0, 16))
+APP_SKEY = list(range(16, 32))
+
+
+@pytest.fixture
+def lora(device):
+    import uos
+    uos.mkdir("/lora")
+    return _State()
+
+
+def _State(commit_interval=16):
+    from MainApp.LoraState import LoraState
+    return LoraState("/lora", commit_interval=commit_interval)
+
+
+def _PowerCycle():
+    import machine
+    machine.RTC.Memory = b""
+
+
+def test_StoreSession(lora):
+    assert not lora.HasSession()
+    lora.StoreSession(DEV_ADDR, APP_SKEY, NWK_SKEY)
+    assert lora.Session() == bytes(DEV_ADDR + NWK_SKEY + APP_SKEY)
+    assert _State().HasSession()
+
+
+def test_FrameCounterSurvivesDeepSleep(lora):
+    lora.StoreSession(DEV_ADDR, APP_SKEY, NWK_SKEY)
+    for fcnt in range(0, 21):
+        assert lora.FrameCounter() == fcnt
+        lora.FrameCounterStore(fcnt + 1)
+
+    assert _State().FrameCounter() == 21
+
+
+def test_FrameCounterSkipsAheadAfterPowerCycle(lora):
+    lora.StoreSession(DEV_ADDR, APP_SKEY, NWK_SKEY)
+    for fcnt in range(0, 21):
+        lora.FrameCounterStore(fcnt + 1)
+
+    limit = lora.Limit
+    assert limit == 33
+
+    _PowerCycle()
+    # No frame counter below the committed limit is used again.
+    assert _State().FrameCounter() == limit
+
+
+def test_CommitsAreSpreadOverBlocks(lora):
+    import uos
+    lora.StoreSession(DEV_ADDR, APP_SKEY, NWK_SKEY)
+    # A commit every CommitInterval frames, one more than a block holds.
+    for fcnt in range(0, lora.BLOCK_RECORDS * lora.CommitInterval + 1):
+        lora.FrameCounterStore(fcnt + 1)
+
+    assert uos.stat("/lora/fcnt.0")[6] == lora.BLOCK_RECORDS * lora.RECORD_SIZE
+    assert uos.stat("/lora/fcnt.1")[6] == lora.RECORD_SIZE
+    limit = lora.Limit
+    _PowerCycle()
+    assert _State().FrameCounter() == limit
+
+
+def test_TornRecordIsIgnored(lora):
+    lora.StoreSession(DEV_ADDR, APP_SKEY, NWK_SKEY)
+    for fcnt in range(0, 20):
+        lora.FrameCounterStore(fcnt + 1)
+    limit = lora.Limit
+    with open("/lora/fcnt.0", "ab") as f:
+        f.write(struct.pack("<II", limit + 100, 0))
+
+    _PowerCycle()
+    assert _State().FrameCounter() == limit
+
+
+def test_NewSessionResetsFrameCounter(lora):
+    lora.StoreSession(DEV_ADDR, APP_SKEY, NWK_SKEY)
+    for fcnt in range(0, 20):
+        lora.FrameCounterStore(fcnt + 1)
+
+    lora.StoreSession([0x26, 0x01, 0x00, 0x01], APP_SKEY, NWK_SKEY)
+    assert lora.FrameCounter() == 0
+    _PowerCycle()
+    assert _State().FrameCounter() == 16
+
+
+def test_SameSessionKeepsFrameCounter(lora):
+    lora.StoreSession(DEV_ADDR, APP_SKEY, NWK_SKEY)
+    lora.FrameCounterStore(5)
+    lora.StoreSession(DEV_ADDR, APP_SKEY, NWK_SKEY)
+    assert lora.FrameCounter() == 5
+
+
+def test_MigrateFrameCounterFile(device):
+    import uos
+    uos.mkdir("/lora")
+    with open("/lora/fcnt", "wb") as f:
+        f.write(struct.pack("<Q", 1234))
+
+    lora = _State()
+    assert lora.FrameCounter() == 1234
+    lora.FrameCounterStore(1235)
+    _PowerCycle()
+    assert _State().FrameCounter() == 1234 + 16
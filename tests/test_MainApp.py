@@ -0,0 +1,60 @@
+"""
+Contract tests of the MainApp on the upyiot library: wake cycles on the host
+harness with the loopback radio.
+"""
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+CYCLES = 12
+
+
+class Blackout:
+    """
+    Channel on which every frame is lost.
+    """
+
+    def Frame(self, sf):
+        return False, None, None
+
+
+def test_ColdBootJoinsAndSleeps(device):
+    from host.Harness import WakeReport
+    report = device.Wake()
+    assert report.Outcome == WakeReport.OUTCOME_DEEPSLEEP
+    assert report.SleepMs > 0
+    assert device.Radio.Joins == 1
+    assert device.App.LoraProtocol.HasSession()
+
+
+def test_TimerWakesKeepTheSession(device):
+    from host.Harness import WakeReport
+    reports = device.Cycles(CYCLES)
+    assert all(report.Outcome == WakeReport.OUTCOME_DEEPSLEEP for report in reports)
+    assert device.Radio.Joins == 1
+    assert len(device.Radio.Uplinks) > 0
+
+
+def test_FrameCounterIsNotReusedAfterPowerCycle(device):
+    import machine
+    device.Cycles(CYCLES)
+    fcnt = device.App.LoraProtocol.Params.FrameCounter()
+    device.Wake(reset_cause=machine.PWRON_RESET, run=False)
+    assert device.App.LoraProtocol.Params.FrameCounter() >= fcnt
+
+
+def test_RecordsStayQueuedUntilSent(device):
+    device.Radio.Confirmed = True
+    device.Radio.Channel = Blackout()
+    device.Cycles(CYCLES)
+    assert device.Radio.Uplinks == []
+    assert device.Radio.Lost > 0
+    queued = device.App.MsgQueue.Count()
+    assert queued > 0
+
+    device.Radio.Channel = None
+    for _ in range(0, CYCLES):
+        device.Wake()
+    assert len(device.Radio.Uplinks) > 0
+    assert device.App.MsgQueue.Count() < queued
@@ -0,0 +1,148 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+
+@pytest.fixture
+def queue(device):
+    import uos
+    uos.mkdir("/msg")
+    return _Queue()
+
+
+def _Queue(slots=4, record_max=16):
+    from MainApp.MessageQueue import MessageQueue
+    return MessageQueue("/msg", slots=slots, record_max=record_max)
+
+
+def _Taken(queue):
+    """
+    :return: Records in the order they are taken.
+    """
+    records = []
+    skip = []
+    slot = queue.Next()
+    while slot >= 0:
+        buf = memoryview(bytearray(queue.RecordMax))
+        length = queue.ReadInto(slot, buf)
+        records.append(bytes(buf[0:length]))
+        skip.append(slot)
+        slot = queue.Next(skip)
+    return records
+
+
+def test_PutReturnsSequenceNumbers(queue):
+    assert queue.Put(b"a", queue.PRIO_REPORT) == 1
+    assert queue.Put(b"b", queue.PRIO_REPORT) == 2
+    assert queue.Count() == 2
+    assert queue.Holds(1) and queue.Holds(2)
+    assert not queue.Holds(3)
+
+
+def test_TakenHighestClassFirstThenOldest(queue):
+    queue.Put(b"report1", queue.PRIO_REPORT)
+    queue.Put(b"event", queue.PRIO_EVENT)
+    queue.Put(b"report2", queue.PRIO_REPORT)
+    queue.Put(b"reg", queue.PRIO_REGISTRATION)
+    assert _Taken(queue) == [b"reg", b"event", b"report1", b"report2"]
+
+
+def test_FullQueueDropsOldestOfLowestClass(queue):
+    queue.Put(b"event", queue.PRIO_EVENT)
+    queue.Put(b"report1", queue.PRIO_REPORT)
+    queue.Put(b"report2", queue.PRIO_REPORT)
+    queue.Put(b"report3", queue.PRIO_REPORT)
+
+    assert queue.Put(b"report4", queue.PRIO_REPORT) == 5
+    assert queue.Dropped == 1
+    assert _Taken(queue) == [b"event", b"report2", b"report3", b"report4"]
+
+
+def test_FullQueueNeverDropsHigherClass(queue):
+    for i in range(0, 4):
+        queue.Put(b"event", queue.PRIO_EVENT)
+    assert queue.Put(b"report", queue.PRIO_REPORT) == 0
+    assert queue.Dropped == 1
+    assert _Taken(queue) == [b"event"] * 4
+
+
+def test_RecordTooBig(queue):
+    assert queue.Put(bytes(queue.RecordMax + 1), queue.PRIO_REPORT) == 0
+    assert queue.Put(b"", queue.PRIO_REPORT) == 0
+    assert queue.Count() == 0
+
+
+def test_FreedSlotIsReused(queue):
+    for i in range(0, 4):
+        queue.Put(bytes([i]), queue.PRIO_REPORT)
+    queue.Free((queue.Next(),))
+    assert queue.Count() == 3
+    assert not queue.Holds(1)
+    assert queue.Put(b"new", queue.PRIO_REPORT) == 5
+    assert queue.Dropped == 0
+
+
+def test_PersistedAcrossWakes(queue):
+    queue.Put(b"report", queue.PRIO_REPORT)
+    queue.Put(b"event", queue.PRIO_EVENT)
+    queue.Put(b"sent", queue.PRIO_REGISTRATION)
+    queue.Free((queue.Next(),))
+
+    queue = _Queue()
+    assert queue.Count() == 2
+    assert _Taken(queue) == [b"event", b"report"]
+    # Sequence numbers of freed records are not reused.
+    assert queue.Put(b"next", queue.PRIO_REPORT) == 4
+
+
+def test_LayoutChangeStartsEmptyQueue(queue):
+    queue.Put(b"report", queue.PRIO_REPORT)
+    queue = _Queue(slots=8)
+    assert queue.Count() == 0
+    assert _Taken(queue) == []
+
+
+def test_FullSizeRecordsDrain(device):
+    # KPN, at SF12 the records of a full-size report do not fit in a
+    # BacklogReport with others.
+    device.Overrides["NETWORK"] = 0
+    device.Overrides["CODEC"] = 1
+    device.Wake(run=False)
+    # The modules of the wake.
+    from Codec.FixedLayout import FixedLayoutException
+    from Schemas.BacklogReport import BacklogReport
+    from Schemas import Metadata
+    app = device.App
+    app.Planner.Deferral = lambda: 0
+    mtu = app.LoraProtocol.Mtu
+
+    def Record(size):
+        return {
+            Metadata.MSG_SECTION_META: {Metadata.MSG_META_TYPE: BacklogReport.TYPE_BACKLOG,
+                                        Metadata.MSG_META_SUBTYPE: BacklogReport.SUBTYPE_BACKLOG_REPORT},
+            Metadata.MSG_SECTION_DATA: {BacklogReport.DATA_KEY_RECORDS: bytes(size)},
+        }
+
+    def Fits(size):
+        try:
+            return len(app.Parser.Encode(Record(size))) <= mtu
+        except FixedLayoutException:
+            return False
+
+    size = 0
+    while Fits(size + 1):
+        size += 1
+    assert len(app.Parser.Encode(Record(size))) == mtu
+    queued = app.MsgQueue.SlotCount
+    for i in range(0, queued):
+        app.MsgEx.MessagePut(msg_data_dict=Record(size)[Metadata.MSG_SECTION_DATA],
+                             msg_type=BacklogReport.TYPE_BACKLOG,
+                             msg_subtype=BacklogReport.SUBTYPE_BACKLOG_REPORT)
+    assert app.MsgQueue.Count() == queued
+
+    for i in range(0, queued + 1):
+        app.MsgEx.SvcRun()
+    assert app.MsgQueue.Count() == 0
+    assert app.MsgQueue.Dropped == 0
+    assert len(device.Radio.Uplinks) == queued
@@ -0,0 +1,138 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+EPOCH = 1600000000
+CURRENTS = {"active": 10, "tx": 100, "rx": 20}
+
+
+class Radio:
+    """
+    Radio time accounting of the UplinkPlanner.
+    """
+
+    def __init__(self):
+        self.TxMs = 0
+        self.RxMs = 0
+
+
+class Svc:
+
+    def __init__(self, run_ms, radio=None, tx_ms=0, rx_ms=0):
+        self.RunMs = run_ms
+        self.Radio = radio
+        self.TxMs = tx_ms
+        self.RxMs = rx_ms
+
+    def SvcRun(self):
+        import utime
+        utime.sleep_ms(self.RunMs)
+        if self.Radio is not None:
+            self.Radio.TxMs += self.TxMs
+            self.Radio.RxMs += self.RxMs
+
+
+class MsgEx:
+
+    def __init__(self):
+        self.Messages = []
+
+    def MessagePut(self, msg_data_dict, msg_type, msg_subtype, msg_meta_dict):
+        self.Messages.append(msg_data_dict)
+
+
+@pytest.fixture
+def profiler(device):
+    import uos
+    import utime
+    uos.mkdir("/sys")
+    utime.Set(EPOCH)
+    return _Profiler()
+
+
+def _Profiler():
+    from MainApp.Profiler import Profiler
+    return Profiler("/sys", currents=CURRENTS, report_interval=3600)
+
+
+def test_Charge(profiler):
+    # 50 ms active, 30 ms transmitting, 20 ms receiving.
+    assert profiler.Charge(100, 30, 20) == 10 * 50 + 100 * 30 + 20 * 20
+    assert profiler.Charge(10, 30, 20) == 100 * 30 + 20 * 20
+
+
+def test_RunsAreProfiled(profiler):
+    radio = Radio()
+    profiler.RadioSet(radio)
+    svc = Svc(100, radio, tx_ms=40, rx_ms=10)
+    profiler.Attach("MsgEx", svc)
+    svc.SvcRun()
+
+    stats = profiler.Stats["MsgEx"]
+    assert stats.Runs == 1
+    assert stats.TimeUs == 100000
+    assert stats.RadioMs == 50
+    assert stats.ChargeUc == profiler.Charge(100, 40, 10)
+
+
+def test_RollingAverage(profiler):
+    from MainApp.Profiler import ServiceStats
+    svc = Svc(100)
+    profiler.Attach("Temp", svc)
+    svc.SvcRun()
+    svc.RunMs = 900
+    svc.SvcRun()
+    stats = profiler.Stats["Temp"]
+    assert stats.Runs == 2
+    assert stats.TimeUs == 100000 + (800000 >> ServiceStats.EWMA_SHIFT)
+    assert stats.TimeUsMax == 900000
+
+
+def test_StatisticsPersistedAcrossWakes(profiler):
+    svc = Svc(100)
+    profiler.Attach("Temp", svc)
+    svc.SvcRun()
+    profiler.Save()
+
+    profiler = _Profiler()
+    assert profiler.Cycles == 1
+    assert profiler.Stats["Temp"].Runs == 1
+    assert profiler.Stats["Temp"].TimeUs == 100000
+
+
+def test_CorruptFileIsIgnored(profiler):
+    profiler.Attach("Temp", Svc(100))
+    profiler.Save()
+    with open(profiler.Path, "rb") as f:
+        data = f.read()
+    with open(profiler.Path, "wb") as f:
+        f.write(data[0:-1])
+    profiler = _Profiler()
+    assert profiler.Cycles == 0
+    assert profiler.Stats == {}
+
+
+def test_ReportAfterInterval(profiler):
+    import utime
+    from Schemas.ProfileReport import ProfileReport
+    msg_ex = MsgEx()
+    profiler.ReporterSet(msg_ex)
+    temp = Svc(100)
+    other = Svc(100)
+    profiler.Attach("Temp", temp)
+    profiler.Attach("Other", other)
+    temp.SvcRun()
+    other.SvcRun()
+    profiler.Save()
+    assert msg_ex.Messages == []
+
+    utime.Set(EPOCH + 3600)
+    profiler.Save()
+    assert len(msg_ex.Messages) == 1
+    report = msg_ex.Messages[0]
+    assert report[ProfileReport.DATA_KEY_CYCLE][0] == 2
+    # Only services named in the report specification, by their ID.
+    temp_stats = profiler.Stats["Temp"]
+    assert report[ProfileReport.DATA_KEY_SERVICES] == [
+        ProfileReport.SERVICES.index("Temp"), 1, 100, 0, temp_stats.ChargeUc]
@@ -0,0 +1,131 @@
+"""
+Tests of the power manager protocol over the loopback UART of the host
+harness (host.Loopback.LoopbackPowerManager).
+"""
+import pytest
+
+
+@pytest.fixture
+def pm(device):
+    from host.Loopback import LoopbackPowerManager
+    return LoopbackPowerManager()
+
+
+def _Protocol(uart):
+    from MainApp.PowerManager.Protocol import Protocol
+    return Protocol(uart.Baudrate, uart=uart)
+
+
+def _Frame(seq, code, payload=b""):
+    from MainApp.PowerManager import Protocol
+    frame = bytearray(Protocol.FRAME_SIZE_MAX)
+    frame[Protocol.FRAME_HEADER:Protocol.FRAME_HEADER + len(payload)] = payload
+    length = Protocol.FrameBuild(frame, seq, code, len(payload))
+    return frame[0:length]
+
+
+def test_Crc8(device):
+    from MainApp.PowerManager import Protocol
+    # CRC-8/SMBUS check value.
+    assert Protocol.Crc8(b"123456789", 0, 9) == 0xF4
+
+
+def test_FrameRoundTrip(device):
+    from MainApp.PowerManager import Protocol
+    frame = _Frame(7, Protocol.RSP_ACK, b"\x01\x02\x03")
+    assert frame[0:4] == bytes([Protocol.FRAME_SOF, 7, Protocol.RSP_ACK, 3])
+    assert Protocol.FrameCheck(frame, len(frame)) == 3
+    # Incomplete.
+    assert Protocol.FrameCheck(frame, len(frame) - 1) == -1
+
+
+def test_FrameCrcRejected(device):
+    from MainApp.PowerManager import Protocol
+    frame = _Frame(7, Protocol.RSP_ACK, b"\x01\x02\x03")
+    for i in range(1, len(frame)):
+        corrupt = bytearray(frame)
+        corrupt[i] ^= 0x10
+        assert Protocol.FrameCheck(corrupt, len(corrupt)) == -1
+
+
+def test_StatusCommand(pm):
+    from MainApp.PowerManager import Protocol
+    pm.SupplyMv = 5000
+    pm.BatteryMv = 3700
+    pm.Flags = Protocol.PowerStatus.FLAG_EXT_SUPPLY | Protocol.PowerStatus.FLAG_CHARGING
+    status = _Protocol(pm).SendCommand(Protocol.PWR_CMD_STATUS)
+    assert (status.SupplyMv, status.BatteryMv) == (5000, 3700)
+    assert status.ExternalSupply() and status.Charging() and not status.BatteryLow()
+
+
+def test_SleepCommand(pm):
+    from MainApp.PowerManager import Protocol
+    assert _Protocol(pm).SendCommand(Protocol.PWR_CMD_SLEEP, 0x01020304) is True
+    assert pm.Sleeps == [0x01020304]
+
+
+def test_SequenceNumberWraps(pm):
+    from MainApp.PowerManager import Protocol
+    protocol = _Protocol(pm)
+    protocol.Seq = 0xFE
+    for _ in range(0, 3):
+        protocol.SendCommand(Protocol.PWR_CMD_STATUS)
+    assert protocol.Seq == 1
+    assert protocol.Retries == 0
+
+
+def test_CorruptReplyIsRetried(pm):
+    from MainApp.PowerManager import Protocol
+    protocol = _Protocol(pm)
+    pm.Corrupt = 1
+    pm.Drop = 1
+    assert protocol.SendCommand(Protocol.PWR_CMD_STATUS).BatteryMv == pm.BatteryMv
+    assert protocol.Retries == 2
+    assert len(pm.Commands) == 3
+
+
+def test_NotAcknowledged(pm):
+    from MainApp.PowerManager import Protocol
+    protocol = _Protocol(pm)
+    pm.Drop = Protocol.Protocol.RETRY_MAX
+    with pytest.raises(Protocol.ProtocolException):
+        protocol.SendCommand(Protocol.PWR_CMD_STATUS)
+    assert protocol.Retries == Protocol.Protocol.RETRY_MAX - 1
+
+
+def test_NackIsRetried(pm):
+    from MainApp.PowerManager import Protocol
+
+    class CommandUnknown(Protocol.ProtocolCommand):
+        def Build(self, payload, *args):
+            return 0
+
+    protocol = _Protocol(pm)
+    protocol.Commands[9] = CommandUnknown(99)
+    with pytest.raises(Protocol.ProtocolException):
+        protocol.SendCommand(9)
+    assert protocol.Nacks == Protocol.Protocol.RETRY_MAX
+    assert len(pm.Commands) == Protocol.Protocol.RETRY_MAX
+
+
+def test_ResyncAfterGarbage(pm):
+    from MainApp.PowerManager import Protocol
+    from host.Loopback import LoopbackPowerManager
+
+    class Noisy(LoopbackPowerManager):
+        """
+        Line noise and the late reply to an earlier request in front of
+        every reply.
+        """
+
+        def _Reply(self, seq, code, payload):
+            self.Rx.extend(b"\x00\xa5\xff\x13")
+            self.Rx.extend(_Frame((seq - 1) & 0xFF, Protocol.RSP_ACK, bytes(5)))
+            self.Rx.extend(b"\xa5\x01")
+            super()._Reply(seq, code, payload)
+
+    uart = Noisy()
+    uart.BatteryMv = 3456
+    protocol = _Protocol(uart)
+    assert protocol.SendCommand(Protocol.PWR_CMD_STATUS).BatteryMv == 3456
+    assert protocol.Retries == 0
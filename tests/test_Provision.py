@@ -0,0 +1,155 @@
+import csv
+import json
+import os
+import struct
+
+import pytest
+
+from host import Paths
+from host import Provision
+
+
+INVENTORY = os.path.join(Paths.REPO_DIR, "devices", "nodes.csv")
+
+OTAA = {
+    "name": "node",
+    "network": "ttn",
+    "activation": "otaa",
+    "dev_eui": "003C8DB2882DC47C",
+    "app_eui": "70B3D57ED0032CDC",
+    "app_key": "3834F51F04D066F5F85B5FDDAD4FC0B9",
+}
+ABP = {
+    "name": "node",
+    "network": "kpn",
+    "activation": "abp",
+    "dev_addr": "26013747",
+    "nwk_skey": "1348A04447C43BC8709B2F5B5BAAE57A",
+    "app_skey": "5D5A385041D9D50B141DC59AB4EDFB59",
+}
+
+
+def _Inventory(tmp_path, records, ext=".csv"):
+    path = str(tmp_path / ("nodes" + ext))
+    if ext == ".json":
+        with open(path, "w") as f:
+            json.dump(records, f)
+        return path
+    fields = []
+    for record in records:
+        fields.extend(field for field in record if field not in fields)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fields)
+        writer.writeheader()
+        writer.writerows(records)
+    return path
+
+
+def _Module(node):
+    """
+    :return: Dictionary of the globals of the Config/Node.py module of a node.
+    """
+    module = {}
+    exec(Provision.NodeModule(node), module)
+    return module
+
+
+def test_ShippedInventory():
+    nodes = Provision.Inventory(INVENTORY)
+    assert len(nodes) == len(set(node["name"] for node in nodes))
+    # The shipped node module is generated from the inventory.
+    node = [node for node in nodes if node["name"] == "ttn_otaa_03"][0]
+    with open(os.path.join(Paths.SRC_DIR, "Config", "Node.py")) as f:
+        assert Provision.NodeModule(node) == f.read()
+
+
+@pytest.mark.parametrize("ext", (".csv", ".json"))
+def test_Defaults(tmp_path, ext):
+    node, = Provision.Inventory(_Inventory(tmp_path, [OTAA], ext))
+    assert node["codec"] == "cbor"
+    assert node["sf"] is None
+    assert node["dev_addr"] is None
+    assert node["lora"] is None
+    assert node["dev_eui"] == list(bytes.fromhex(OTAA["dev_eui"]))
+    assert [node[field] for field in Provision.INTERVALS] == list(Provision.INTERVALS.values())
+
+
+def test_NodeModule(tmp_path):
+    record = dict(ABP, codec="Fixed", sf="9", msgex_interval="600")
+    node, = Provision.Inventory(_Inventory(tmp_path, [record]))
+    module = _Module(node)
+    assert module["CFG_NODE_NAME"] == "node"
+    assert module["CFG_NODE_NETWORK"] == Provision.NETWORKS["kpn"]
+    assert module["CFG_NODE_REG"] == Provision.ACTIVATIONS["abp"]
+    assert module["CFG_NODE_CODEC"] == Provision.CODECS["fixed"]
+    assert module["CFG_LORA_SF"] == 9
+    assert module["CFG_LORA_DEV_ADDR"] == [0x26, 0x01, 0x37, 0x47]
+    assert module["CFG_LORA_DEV_EUI"] is None
+    assert module["CFG_MSGEX_INTERVAL"] == 600
+    assert module["CFG_SENSOR_READ_INTERVAL"] == Provision.INTERVALS["sensor_read_interval"]
+
+
+@pytest.mark.parametrize("record, error", (
+    (dict(OTAA, name=""), "node without a name"),
+    (dict(OTAA, network="lorawan"), "node: network must be one of kpn, ttn"),
+    (dict(OTAA, activation=""), "node: activation must be one of abp, otaa"),
+    (dict(OTAA, codec="json"), "node: codec must be one of cbor, fixed"),
+    (dict(OTAA, app_key="3834F51F"), "node: app_key must be 16 hex bytes"),
+    (dict(OTAA, dev_eui="XX3C8DB2882DC47C"), "node: dev_eui must be 8 hex bytes"),
+    (dict(OTAA, app_key=""), "node: app_key is required for otaa"),
+    (dict(ABP, nwk_skey=""), "node: nwk_skey is required for abp"),
+    (dict(OTAA, sf="13"), "node: sf must be 7 to 12"),
+))
+def test_InvalidNode(tmp_path, record, error):
+    with pytest.raises(Provision.InventoryError) as exc:
+        Provision.Inventory(_Inventory(tmp_path, [record]))
+    assert str(exc.value) == error
+
+
+def test_DuplicateNode(tmp_path):
+    with pytest.raises(Provision.InventoryError, match="node: duplicate node"):
+        Provision.Inventory(_Inventory(tmp_path, [OTAA, ABP]))
+
+
+def test_LoraFiles(tmp_path):
+    abp, = Provision.Inventory(_Inventory(tmp_path, [ABP]))
+    files = Provision.LoraFiles(abp)
+    assert files[Provision.SESSION_FILE] == bytes.fromhex(ABP["dev_addr"] + ABP["nwk_skey"] + ABP["app_skey"])
+    assert files[Provision.FCNT_FILE] == struct.pack(Provision.FCNT_FMT, 0)
+
+    otaa, = Provision.Inventory(_Inventory(tmp_path, [OTAA]))
+    assert Provision.LoraFiles(otaa) == {}
+
+    # A dumped session, relative to the inventory, replaces the ABP session.
+    lora = tmp_path / "dump" / "lora"
+    lora.mkdir(parents=True)
+    (lora / Provision.SESSION_FILE).write_bytes(b"session")
+    (lora / Provision.FCNT_FILE).write_bytes(struct.pack(Provision.FCNT_FMT, 25))
+    dumped, = Provision.Inventory(_Inventory(tmp_path, [dict(ABP, lora="dump/lora")]))
+    assert Provision.LoraFiles(dumped) == {Provision.SESSION_FILE: b"session",
+                                           Provision.FCNT_FILE: struct.pack(Provision.FCNT_FMT, 25)}
+
+
+def test_Bundles(tmp_path):
+    nodes = Provision.Inventory(_Inventory(tmp_path, [OTAA, dict(ABP, name="abp")]))
+    out = str(tmp_path / "nodes")
+    counts = Provision.Provision(nodes, out, jobs=2)
+
+    files, state = Provision.Deploy.BundleFiles(os.path.join(out, "abp"))
+    assert counts == {"node": len(files), "abp": len(files) + 2}
+    assert sorted(state) == ["/lora/fcnt", "/lora/session"]
+    assert "/MainApp/MainApp.py" in files
+    with open(files["/" + Provision.NODE_SOURCE][0]) as f:
+        assert f.read() == Provision.NodeModule(nodes[1])
+    assert not os.path.exists(os.path.join(out, "node", "lora"))
+
+
+def test_ModuleOption(tmp_path, capsys):
+    path = _Inventory(tmp_path, [OTAA, dict(ABP, name="abp")])
+    assert Provision.main(["--module", "abp", path]) == 0
+    nodes = Provision.Inventory(path)
+    assert capsys.readouterr().out == Provision.NodeModule(nodes[1])
+
+    with pytest.raises(SystemExit):
+        Provision.main(["--module", "other", path])
+    assert Provision.main(["--module", "abp", str(tmp_path / "missing.csv")]) == 1
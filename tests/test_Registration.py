@@ -0,0 +1,115 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+
+class MsgEx:
+    """
+    Stand-in for the QueuedMessageExchange: every put record stays queued
+    until it is sent.
+    """
+
+    def __init__(self):
+        self.Messages = []
+        self.Queued = set()
+        self.Observers = []
+        self.PutSeq = 0
+
+    def DeliveryObserverAdd(self, callback):
+        self.Observers.append(callback)
+
+    def IsQueued(self, seq):
+        return seq in self.Queued
+
+    def SvcActivate(self):
+        pass
+
+    def MessagePut(self, msg_data_dict, msg_type, msg_subtype, msg_meta_dict):
+        self.Messages.append(msg_data_dict)
+        self.PutSeq = len(self.Messages)
+        self.Queued.add(self.PutSeq)
+
+    def Send(self, seqs):
+        self.Queued -= set(seqs)
+        for callback in self.Observers:
+            callback(seqs)
+
+
+@pytest.fixture
+def msg_ex(device):
+    import uos
+    from upyiot.system.Util.Version import Version
+    uos.mkdir("/sys")
+    Version("/sys", 1, 2, 3)
+    return MsgEx()
+
+
+def _Registration(msg_ex, piggyback=None):
+    from MainApp.Registration import Registration
+    from Schemas.RegistrationInfo import RegistrationInfo
+    return Registration(msg_ex, RegistrationInfo(), "/sys", piggyback=piggyback)
+
+
+def _Write(data):
+    with open("/sys/reg", "wb") as f:
+        f.write(data)
+
+
+def test_RegisteredOnceSent(msg_ex):
+    reg = _Registration(msg_ex)
+    assert reg.DeviceIsRegistered() is False
+    reg.SvcRun()
+    assert len(msg_ex.Messages) == 1
+    # Queued, not put again.
+    reg.SvcRun()
+    assert len(msg_ex.Messages) == 1
+    assert _Registration(msg_ex).DeviceIsRegistered() is False
+
+    msg_ex.Send([msg_ex.PutSeq])
+    assert reg.DeviceIsRegistered() is True
+    assert _Registration(msg_ex).DeviceIsRegistered() is True
+
+
+def test_DroppedRecordIsPutAgain(msg_ex):
+    reg = _Registration(msg_ex)
+    reg.SvcRun()
+    msg_ex.Queued.clear()
+    reg = _Registration(msg_ex)
+    reg.SvcRun()
+    assert len(msg_ex.Messages) == 2
+
+
+def test_Rider(msg_ex):
+    from Schemas.RegistrationInfo import RegistrationInfo
+    reg = _Registration(msg_ex)
+    assert reg.RiderTake(1) is None
+    key, info = reg.RiderTake(32)
+    assert key == RegistrationInfo.DATA_KEY_DEVICE
+    reg.RiderQueued(5)
+    msg_ex.Queued.add(5)
+    assert reg.RiderTake(32) is None
+
+    msg_ex.Send([5])
+    assert reg.DeviceIsRegistered() is True
+
+
+@pytest.mark.parametrize("size", (0, 2, 7, 9))
+def test_CorruptFileIsNotRegistered(msg_ex, size):
+    reg = _Registration(msg_ex)
+    _Write((reg.Hash + bytes([1, 0, 0, 0, 0]))[0:size])
+    reg = _Registration(msg_ex)
+    assert reg.DeviceIsRegistered() is False
+    assert reg.Seq == 0
+
+
+def test_OtherVersionIsNotRegistered(msg_ex):
+    reg = _Registration(msg_ex)
+    _Write(bytes(reg.HASH_SIZE + 4))
+    assert _Registration(msg_ex).DeviceIsRegistered() is False
+
+
+def test_HashOnlyFileIsRegistered(msg_ex):
+    reg = _Registration(msg_ex)
+    _Write(reg.Hash)
+    assert _Registration(msg_ex).DeviceIsRegistered() is True
@@ -0,0 +1,159 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+
+class MsgEx:
+    """
+    Stand-in for the QueuedMessageExchange: records the queued messages and
+    which of them are still queued.
+    """
+
+    def __init__(self):
+        self.Messages = []
+        self.Queued = set()
+        self.Observers = []
+        self.PutSeq = 0
+
+    def DeliveryObserverAdd(self, callback):
+        self.Observers.append(callback)
+
+    def IsQueued(self, seq):
+        return seq in self.Queued
+
+    def MessagePut(self, msg_data_dict, msg_type, msg_subtype, msg_meta_dict):
+        self.Messages.append(msg_data_dict)
+        self.PutSeq = len(self.Messages)
+        self.Queued.add(self.PutSeq)
+
+    def Send(self, seqs):
+        self.Queued -= set(seqs)
+        for callback in self.Observers:
+            callback(seqs)
+
+
+class Target:
+    pass
+
+
+@pytest.fixture
+def config(device):
+    import uos
+    uos.mkdir("/sys")
+    return _Config()
+
+
+def _Config():
+    from MainApp.RemoteConfig import RemoteConfig
+    return RemoteConfig("/sys")
+
+
+def _Update(seq, params):
+    from Schemas.ConfigUpdate import ConfigUpdate
+    from Schemas import Metadata
+    return {Metadata.MSG_SECTION_DATA: {ConfigUpdate.DATA_KEY_SEQ: seq,
+                                        ConfigUpdate.DATA_KEY_PARAMS: params}}
+
+
+def test_ValidParametersAreAccepted(config):
+    accepted = config.Receive(_Update(1, [config.PARAM_MSGEX_INTERVAL, 600,
+                                          config.PARAM_FILTER_DEPTH, 4]))
+    assert accepted == {"MsgExInterval": 600, "FILTER_DEPTH": 4}
+    assert config.AckPending is True
+
+
+def test_InvalidParametersAreRejected(config):
+    accepted = config.Receive(_Update(1, [config.PARAM_MSGEX_INTERVAL, 5,
+                                          99, 1,
+                                          config.PARAM_MOIST_SAMPLES, 8]))
+    assert accepted == {"MoistSamplesPerUpdate": 8}
+    assert config.Rejected == bytes([config.PARAM_MSGEX_INTERVAL, 99])
+
+
+def test_MalformedParametersAreRejected(config):
+    accepted = config.Receive(_Update(1, [b"\x01", 600,
+                                          [1], 600,
+                                          config.PARAM_FILTER_DEPTH, "4",
+                                          config.PARAM_MOIST_SAMPLES, 8]))
+    assert accepted == {"MoistSamplesPerUpdate": 8}
+    assert config.Rejected == bytes([0, 0, config.PARAM_FILTER_DEPTH])
+
+
+@pytest.mark.parametrize("seq, params", ((1, 600), (1, b"\x01\x02"), (1, None), ("1", [])))
+def test_MalformedUpdateIsIgnored(config, seq, params):
+    assert config.Receive(_Update(seq, params)) == {}
+    assert config.Seq == 0
+    assert config.AckPending is False
+
+
+def test_ValuesArePersistedAndApplied(config):
+    config.Receive(_Update(1, [config.PARAM_SENSOR_INTERVAL, 120]))
+    config.Receive(_Update(2, [config.PARAM_MOIST_INTERVAL, 30]))
+
+    target = Target()
+    _Config().Apply(target)
+    assert target.SensorReadInterval == 120
+    assert target.MoistReadInterval == 30
+
+
+def test_RepeatedUpdateIsOnlyAcknowledged(config):
+    config.Receive(_Update(1, [config.PARAM_SENSOR_INTERVAL, 120]))
+    assert config.Receive(_Update(1, [config.PARAM_SENSOR_INTERVAL, 240])) == {}
+    assert config.AckPending is True
+    target = Target()
+    config.Apply(target)
+    assert target.SensorReadInterval == 120
+
+
+def test_Acknowledgement(config):
+    from Codec import Varint
+    config.Receive(_Update(300, [config.PARAM_MSGEX_INTERVAL, 5]))
+    ack = config.AckTake()
+    assert Varint.Decode(ack, 0) == (300, 2)
+    assert ack[2:] == bytes([config.PARAM_MSGEX_INTERVAL])
+
+
+def test_AcknowledgementPendingUntilSent(config):
+    from Schemas.ConfigUpdate import ConfigAck
+    msg_ex = MsgEx()
+    config.MsgExSet(msg_ex)
+    config.Receive(_Update(1, [config.PARAM_SENSOR_INTERVAL, 120]))
+
+    config.AckPut(msg_ex)
+    assert len(msg_ex.Messages) == 1
+    assert ConfigAck.DATA_KEY_ACK in msg_ex.Messages[0]
+    # Queued, not taken again.
+    assert config.AckTake() is None
+    config.AckPut(msg_ex)
+    assert len(msg_ex.Messages) == 1
+
+    # The record was dropped from the queue without being sent.
+    msg_ex.Queued.clear()
+    assert config.AckTake() is not None
+
+    config.AckPut(msg_ex)
+    assert _Config().AckPending is True
+    msg_ex.Send([msg_ex.PutSeq])
+    assert config.AckPending is False
+    assert _Config().AckPending is False
+
+
+def test_Rider(config):
+    from Schemas.ConfigUpdate import ConfigAck
+    config.MsgExSet(MsgEx())
+    assert config.RiderTake(16) is None
+
+    config.Receive(_Update(1, [config.PARAM_SENSOR_INTERVAL, 5]))
+    assert config.RiderTake(2) is None
+    key, ack = config.RiderTake(16)
+    assert key == ConfigAck.DATA_KEY_ACK
+    assert ack == config.AckTake()
+
+
+def test_InvalidFileIsIgnored(config):
+    with open("/sys/" + config.FILE_NAME, "wb") as f:
+        f.write(b"\x01\x00\x01\x05")
+    config = _Config()
+    assert config.Seq == 0
+    assert config.Values == {}
@@ -0,0 +1,47 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+
+class MsgEx:
+    """
+    Stand-in for the MessageExchange that serializes a put message, like the
+    real one, by copying it.
+    """
+
+    def __init__(self):
+        self.Messages = []
+        self.Puts = []
+
+    def MessagePut(self, msg_data_dict, msg_type, msg_subtype, msg_meta_dict):
+        self.Messages.append({key: list(value) for key, value in msg_data_dict.items()})
+        self.Puts.append((msg_data_dict, msg_type, msg_subtype, msg_meta_dict))
+
+
+def test_EverySampleIsReported(device):
+    from MainApp.ReportFormatter import ReportFormatter
+    from Schemas.SensorReport import MoistureSensorReport, SensorReport
+    from Schemas import Metadata
+    spec = MoistureSensorReport()
+    msg_ex = MsgEx()
+    formatter = ReportFormatter(msg_ex, spec, SensorReport.DATA_KEY_MEASUREMENTS)
+    formatter.Update(40)
+    formatter.Update(41.5)
+    assert msg_ex.Messages == [{SensorReport.DATA_KEY_MEASUREMENTS: [40]},
+                               {SensorReport.DATA_KEY_MEASUREMENTS: [41.5]}]
+    msg, msg_type, msg_subtype, meta = msg_ex.Puts[0]
+    assert (msg_type, msg_subtype) == (spec.Type, spec.Subtype)
+    assert meta == {Metadata.MSG_META_TYPE: spec.Type, Metadata.MSG_META_SUBTYPE: spec.Subtype}
+
+
+def test_MessageIsReused(device):
+    from MainApp.ReportFormatter import ReportFormatter
+    from Schemas.SensorReport import MoistureSensorReport, SensorReport
+    msg_ex = MsgEx()
+    formatter = ReportFormatter(msg_ex, MoistureSensorReport(), SensorReport.DATA_KEY_MEASUREMENTS)
+    formatter.Update(40)
+    formatter.Update(41)
+    first, second = msg_ex.Puts
+    assert first[0] is second[0]
+    assert first[3] is second[3]
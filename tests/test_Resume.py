@@ -0,0 +1,129 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+EPOCH = 1600000000
+
+
+class Svc:
+
+    def __init__(self):
+        self.Inits = 0
+        self.Runs = 0
+
+    def SvcInit(self):
+        self.Inits += 1
+
+    def SvcRun(self):
+        self.Runs += 1
+
+
+class Counter:
+
+    def __init__(self):
+        self.Updates = []
+
+    def Update(self, arg):
+        self.Updates.append(arg)
+
+
+@pytest.fixture
+def state(device):
+    import uos
+    uos.mkdir("/sys")
+    return _State()
+
+
+def _State():
+    from MainApp.Resume import ResumeState
+    return ResumeState("/sys")
+
+
+def test_RoundTrip(state):
+    state.Save({"Dummy": (EPOCH - 10, 20), "MsgEx": (-1, 100)}, state.FLAG_SESSION, EPOCH)
+    state = _State()
+    assert state.Load() is True
+    assert state.Services == {"Dummy": (EPOCH - 10, 20), "MsgEx": (-1, 100)}
+    assert state.Flags == state.FLAG_SESSION
+    assert state.SavedAt == EPOCH
+
+
+def test_MissingOrInvalidated(state):
+    assert state.Load() is False
+    state.Save({"Dummy": (EPOCH, 20)}, 0, EPOCH)
+    state.Invalidate()
+    assert state.Load() is False
+    # Invalidating twice is harmless.
+    state.Invalidate()
+
+
+@pytest.mark.parametrize("corrupt", ("version", "truncated", "extended"))
+def test_CorruptFileIsRejected(state, corrupt):
+    state.Save({"Dummy": (EPOCH, 20)}, 0, EPOCH)
+    with open(state.Path, "rb") as f:
+        data = bytearray(f.read())
+    if corrupt == "version":
+        data[0] = state.VERSION + 1
+    elif corrupt == "truncated":
+        data = data[0:-1]
+    else:
+        data += b"\x00"
+    with open(state.Path, "wb") as f:
+        f.write(data)
+    assert state.Load() is False
+    assert state.Services == {}
+
+
+def test_IsDue(state):
+    state.Save({"Dummy": (EPOCH, 20), "New": (-1, 100)}, 0, EPOCH)
+    state.Load()
+    assert state.IsDue("Dummy", EPOCH + 10, 0) is False
+    assert state.IsDue("Dummy", EPOCH + 10, 10) is True
+    assert state.IsDue("Dummy", EPOCH + 20, 0) is True
+    # A service that never ran is due.
+    assert state.IsDue("New", EPOCH, 0) is True
+
+
+def test_DeferredServiceConstructsOnFirstRun(device):
+    from MainApp.Resume import DeferredService
+    svc = Svc()
+    constructed = []
+
+    def Factory():
+        constructed.append(svc)
+        return svc
+
+    deferred = DeferredService("Dummy", Factory)
+    deferred.SvcInit()
+    assert constructed == []
+    deferred.SvcRun()
+    deferred.SvcRun()
+    assert constructed == [svc]
+    assert (svc.Inits, svc.Runs) == (1, 2)
+
+
+def test_LazyObserverConstructsOnFirstUpdate(device):
+    from MainApp.Resume import LazyObserver
+    counters = []
+
+    def Factory():
+        counters.append(Counter())
+        return counters[-1]
+
+    observer = LazyObserver(Factory)
+    assert counters == []
+    observer.Update(1)
+    observer.Update(2)
+    assert len(counters) == 1
+    assert counters[0].Updates == [1, 2]
+
+
+def test_TimerWakeResumes(device):
+    import machine
+    device.Wake()
+    assert device.App.Resuming is False
+    device.Wake()
+    assert machine.reset_cause() == machine.DEEPSLEEP_RESET
+    assert device.App.Resuming is True
+    assert device.Radio.Joins == 1
@@ -0,0 +1,127 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+EPOCH = 1600000000
+INTERVAL = 60
+AGE_MAX = 3600
+
+
+class MsgEx:
+    """
+    Stand-in for the QueuedMessageExchange that records the put messages.
+    """
+
+    def __init__(self):
+        self.Messages = []
+        self.PutSeq = 0
+
+    def MessagePut(self, msg_data_dict, msg_type, msg_subtype, msg_meta_dict):
+        self.Messages.append(dict(msg_data_dict))
+        self.PutSeq = len(self.Messages)
+
+
+@pytest.fixture
+def msg_ex(device):
+    import uos
+    import utime
+    uos.mkdir("/sensor")
+    utime.Set(EPOCH)
+    return MsgEx()
+
+
+def _Batcher(msg_ex, payload_max=32):
+    from MainApp.SampleBatcher import SampleBatcher
+    from Schemas.SensorReport import MoistureSensorReport
+    return SampleBatcher(msg_ex, MoistureSensorReport(), "Moist", "/sensor", interval=INTERVAL,
+                         payload_max=payload_max, age_max=AGE_MAX)
+
+
+def _Feed(batcher, samples):
+    """
+    :param samples: List of (time offset, sample) tuples.
+    """
+    import utime
+    for offset, sample in samples:
+        utime.Set(EPOCH + offset)
+        batcher.Update(sample)
+
+
+def _Samples(msg_ex):
+    from Schemas.SensorReport import SensorReport
+    samples = []
+    for msg in msg_ex.Messages:
+        samples.extend(SensorReport.SamplesUnpack(msg[SensorReport.DATA_KEY_SAMPLES]))
+    return samples
+
+
+def test_DeltaEncodedRoundTrip(msg_ex):
+    from Schemas.SensorReport import SensorReport
+    batcher = _Batcher(msg_ex)
+    _Feed(batcher, [(0, 40), (60, 41), (120, 39.6), (180, -5)])
+    batcher.Flush()
+    assert _Samples(msg_ex) == [(EPOCH, 40), (EPOCH + 60, 41), (EPOCH + 120, 40), (EPOCH + 180, -5)]
+    # Time (5 bytes), interval, first sample, two small deltas of a byte and
+    # one larger delta of two bytes.
+    assert len(msg_ex.Messages[0][SensorReport.DATA_KEY_SAMPLES]) == 11
+
+
+def test_LateSamplesAreQuantized(msg_ex):
+    batcher = _Batcher(msg_ex)
+    # Two intervals are skipped, the next sample is a few seconds late.
+    _Feed(batcher, [(0, 1), (60, 2), (242, 3), (305, 4)])
+    batcher.Flush()
+    assert _Samples(msg_ex) == [(EPOCH, 1), (EPOCH + 60, 2), (EPOCH + 240, 3), (EPOCH + 300, 4)]
+
+
+def test_FullBatchIsFlushed(msg_ex):
+    batcher = _Batcher(msg_ex, payload_max=12)
+    samples = [(i * INTERVAL, i * 100) for i in range(0, 10)]
+    _Feed(batcher, samples)
+    batcher.Flush()
+    assert len(msg_ex.Messages) > 1
+    assert _Samples(msg_ex) == [(EPOCH + t, v) for t, v in samples]
+
+
+def test_AgeMaxFlushes(msg_ex):
+    batcher = _Batcher(msg_ex)
+    _Feed(batcher, [(0, 1), (AGE_MAX, 2)])
+    assert _Samples(msg_ex) == [(EPOCH, 1)]
+    assert batcher.Count == 1
+
+
+def test_PendingSamplesPersistedAcrossWakes(msg_ex):
+    import utime
+    batcher = _Batcher(msg_ex)
+    _Feed(batcher, [(0, 1), (60, 2)])
+    batcher.Suspend()
+    assert msg_ex.Messages == []
+
+    batcher = _Batcher(msg_ex)
+    _Feed(batcher, [(120, 3)])
+    batcher.Flush()
+    assert _Samples(msg_ex) == [(EPOCH, 1), (EPOCH + 60, 2), (EPOCH + 120, 3)]
+    # The flushed batch is not restored.
+    utime.Set(EPOCH + 180)
+    assert _Batcher(msg_ex).Count == 0
+
+
+def test_SuspendFlushesBeforeAgeMax(msg_ex):
+    import utime
+    batcher = _Batcher(msg_ex)
+    _Feed(batcher, [(0, 1)])
+    utime.Set(EPOCH + AGE_MAX - INTERVAL)
+    batcher.Suspend()
+    assert _Samples(msg_ex) == [(EPOCH, 1)]
+
+
+def test_CorruptStateIsIgnored(msg_ex):
+    batcher = _Batcher(msg_ex)
+    _Feed(batcher, [(0, 1), (60, 2)])
+    batcher.Suspend()
+    with open(batcher.Path, "rb") as f:
+        data = f.read()
+    with open(batcher.Path, "wb") as f:
+        f.write(data[0:-1])
+    assert _Batcher(msg_ex).Count == 0
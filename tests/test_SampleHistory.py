@@ -0,0 +1,95 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+# Aligned to the 15 minute buckets.
+EPOCH = 1600000200
+INTERVAL = 60
+# Raw samples for an hour, 15 minute buckets for a day.
+TIERS = ((0, 3600), (900, 86400))
+
+
+@pytest.fixture
+def history(device):
+    import uos
+    uos.mkdir("/sensor")
+    return _History()
+
+
+def _History(interval=INTERVAL):
+    from MainApp.SampleHistory import SampleHistory
+    return SampleHistory("/sensor", "Moist", interval, tiers=TIERS)
+
+
+def _Fill(history, start, count, value=lambda i: i):
+    for i in range(0, count):
+        history.Append(start + i * INTERVAL, value(i))
+
+
+def test_RawSamples(history):
+    _Fill(history, EPOCH, 10)
+    entries = history.Query(EPOCH, EPOCH + 3600)
+    assert entries == [(EPOCH + i * INTERVAL, i, i, i, 1) for i in range(0, 10)]
+
+
+def test_QueryRangeAndCount(history):
+    _Fill(history, EPOCH, 10)
+    entries = history.Query(EPOCH + 2 * INTERVAL, EPOCH + 5 * INTERVAL)
+    assert [entry[0] for entry in entries] == [EPOCH + i * INTERVAL for i in (2, 3, 4)]
+    assert len(history.Query(EPOCH, EPOCH + 3600, count_max=4)) == 4
+
+
+def test_ValuesAreClamped(history):
+    history.Append(EPOCH, 100000)
+    history.Append(EPOCH + INTERVAL, -100000)
+    assert [entry[1] for entry in history.Query(EPOCH, EPOCH + 3600)] == [32767, -32768]
+
+
+def test_Buckets(history):
+    # Six hours of samples, the raw tier only holds the last hour.
+    _Fill(history, EPOCH, 6 * 60, value=lambda i: i % 15)
+    now = EPOCH + 6 * 3600
+
+    entries = history.Query(EPOCH, now)
+    buckets = [entry for entry in entries if entry[4] > 1]
+    raw = [entry for entry in entries if entry[4] == 1]
+    assert len(buckets) > 0 and len(raw) > 0
+    assert buckets[0][1:] == (0, 14, 7, 15)
+    # Every sample is returned once.
+    assert sum(entry[4] for entry in entries) == 6 * 60
+    assert [entry[0] for entry in entries] == sorted(entry[0] for entry in entries)
+
+
+def test_PersistedAcrossWakes(history):
+    _Fill(history, EPOCH, 10)
+    history = _History()
+    history.Append(EPOCH + 10 * INTERVAL, 10)
+    entries = history.Query(EPOCH, EPOCH + 3600)
+    assert [entry[1] for entry in entries] == list(range(0, 11))
+
+
+def test_ClockGoesBack(history):
+    _Fill(history, EPOCH, 10)
+    # The RTC was reset, the history is restarted from the sample.
+    history.Append(1000, 5)
+    history.Append(1000 + INTERVAL, 6)
+    assert history.Query(0, EPOCH + 3600) == [(1000, 5, 5, 5, 1), (1000 + INTERVAL, 6, 6, 6, 1)]
+
+
+def test_IntervalChangeReformatsRawTier(history):
+    _Fill(history, EPOCH, 60, value=lambda i: 1)
+    assert len(history.Query(EPOCH, EPOCH + 3600)) > 0
+
+    # The raw tier of a 10 second interval takes more blocks.
+    history = _History(interval=10)
+    entries = history.Query(EPOCH, EPOCH + 3600)
+    # The raw samples are gone, the buckets are kept.
+    assert all(entry[4] > 1 for entry in entries)
+    assert len(entries) > 0
+
+
+def test_Clear(history):
+    _Fill(history, EPOCH, 10)
+    history.Clear()
+    assert history.Query(0, EPOCH + 3600) == []
@@ -0,0 +1,155 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("upyiot")
+
+EPOCH = 1600000000
+SETTLE_MS = 300
+
+
+class Member:
+    """
+    Sensor service stand-in that records whether the supply was on when it
+    ran.
+    """
+
+    def __init__(self, supply=None, fail=False):
+        self.SvcLastRun = -1
+        self.Supply = supply
+        self.Fail = fail
+        self.Runs = []
+
+    def SvcInit(self):
+        pass
+
+    def SvcRun(self):
+        import utime
+        self.Runs.append((utime.time(), self.Supply is None or self.Supply.Supply.On))
+        if self.Fail is True:
+            raise OSError("sensor")
+
+
+@pytest.fixture
+def supply(device):
+    import utime
+    from MainApp.SamplingGroup import SharedSupply
+    from host.Loopback import LoopbackSupply
+    utime.Set(EPOCH)
+    return SharedSupply(LoopbackSupply(), settle_ms=SETTLE_MS)
+
+
+def _Group(supply, tolerance=10):
+    from MainApp.SamplingGroup import SamplingGroup
+    return SamplingGroup("Group", tolerance=tolerance, supply=supply)
+
+
+def test_SupplySharedByNestedUsers(supply):
+    import utime
+    start = utime.ticks_ms()
+    supply.Enable()
+    assert utime.ticks_diff(utime.ticks_ms(), start) == SETTLE_MS
+    # Already settled, the second user does not wait.
+    supply.Enable()
+    assert utime.ticks_diff(utime.ticks_ms(), start) == SETTLE_MS
+    assert supply.Enables == 1
+
+    supply.Disable()
+    assert supply.Supply.On is True
+    supply.Disable()
+    assert supply.Supply.On is False
+    assert supply.OnMs == SETTLE_MS
+    # An unbalanced disable is ignored.
+    supply.Disable()
+    assert supply.Count == 0
+
+
+def test_AsyncEnableWaitsRemainingSettleTime(supply):
+    import uasyncio
+    import utime
+
+    async def Enable():
+        supply._Enable()
+        utime.sleep_ms(100)
+        start = utime.ticks_ms()
+        await supply.EnableAsync()
+        return utime.ticks_diff(utime.ticks_ms(), start)
+
+    assert uasyncio.run(Enable()) == SETTLE_MS - 100
+    assert supply.Count == 2
+
+
+def test_DueMembersShareOneSupplyCycle(supply):
+    import utime
+    moist = Member(supply)
+    temp = Member(supply)
+    group = _Group(supply)
+    group.MemberAdd(moist, 60)
+    group.MemberAdd(temp, 300)
+
+    group.SvcRun()
+    assert moist.Runs == [(EPOCH, True)]
+    assert temp.Runs == [(EPOCH, True)]
+    assert supply.Enables == 1
+    assert supply.Supply.On is False
+    # Rescheduled to the member that is due first.
+    assert group.SvcInterval == 60
+
+    utime.Set(EPOCH + 60)
+    group.SvcRun()
+    assert len(moist.Runs) == 2 and len(temp.Runs) == 1
+    assert supply.Enables == 2
+
+
+def test_MembersDueWithinToleranceRunEarly(supply):
+    import utime
+    first = Member(supply)
+    second = Member(supply)
+    group = _Group(supply, tolerance=10)
+    group.MemberAdd(first, 60)
+    group.MemberAdd(second, 65)
+    group.SvcRun()
+
+    utime.Set(EPOCH + 60)
+    group.SvcRun()
+    assert len(first.Runs) == 2 and len(second.Runs) == 2
+    assert supply.Enables == 2
+
+
+def test_NothingDueLeavesSupplyOff(supply):
+    group = _Group(supply)
+    member = Member(supply)
+    group.MemberAdd(member, 60)
+    group.SvcRun()
+    group.SvcRun()
+    assert len(member.Runs) == 1
+    assert supply.Enables == 1
+
+
+def test_SupplyDisabledWhenMemberFails(supply):
+    group = _Group(supply)
+    group.MemberAdd(Member(supply, fail=True), 60)
+    with pytest.raises(OSError):
+        group.SvcRun()
+    assert supply.Supply.On is False
+    assert supply.Count == 0
+
+
+def test_AsyncRunAccountsAtStartTime(supply):
+    import uasyncio
+    member = Member(supply)
+    group = _Group(supply)
+    group.MemberAdd(member, 60)
+    uasyncio.run(group.SvcRunAsync())
+    assert member.Runs == [(EPOCH, True)]
+    assert member.SvcLastRun == EPOCH
+    assert supply.Count == 0 and supply.Supply.On is False
+
+
+def test_MainAppGroupUsesSensorSupply(device):
+    device.Overrides["SAMPLING_GROUP"] = True
+    device.Wake()
+    app = device.App
+    assert app.SensorSupply is not None
+    assert app.Group.Supply is app.SensorSupply
+    assert app.SensorSupply.Enables > 0
+    assert app.SensorSupply.Count == 0